@@ -1,6 +1,7 @@
 import os
 import logging
-from src.health import start_health_server
+from src.config import METRICS_PORT
+from src.observability import start_health_server
 from src.ui import app
 
 logger = logging.getLogger(__name__)
@@ -10,7 +11,7 @@ def main():
     logger.info(f"[DEBUG] DISABLE_HEALTH = {disable}")
     if not disable:
         # Only launch if it’s not explicitly disabled
-        start_health_server(host="0.0.0.0", port=8002)
+        start_health_server(port=METRICS_PORT)
     else:
         logger.info("Health server disabled by DISABLE_HEALTH")
 
@@ -18,4 +19,4 @@ def main():
     app()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,25 +1,141 @@
 # src/api.py
-from fastapi import FastAPI, File, UploadFile, BackgroundTasks
-from typing import List
-from .tasks import process_file, get_results
-from .history import record_entry
+import asyncio
+import time
+from fastapi import FastAPI, File, UploadFile, BackgroundTasks, HTTPException, Query, Header, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import AsyncIterator, List, Optional
+from celery import states
+from celery.utils import uuid
+from .tasks import process_file, get_results, get_results_async
+from .history import MAX_PAGE_SIZE, DEFAULT_PAGE_SIZE, record_entry, get_entry, query_history
+from .export import export_path
+from .spool import get_spool
+from .progress import TERMINAL_EVENTS, format_sse, read_progress_async
+from .observability import PROGRESS_STREAMS
+from .tracing import request_context
+from .config import (
+    SPOOL_CHUNK_SIZE, PROGRESS_MAX_WAIT, PROGRESS_STREAM_SECONDS, PROGRESS_HEARTBEAT_SECONDS
+)
 
 app = FastAPI(title="OCR Green Hub API")
 
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Identifiant de requête (en-tête X-Request-ID ou généré), propagé aux tâches OCR."""
+    with request_context(request.headers.get("X-Request-ID", "")[:128] or None) as request_id:
+        response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 @app.post("/upload/")
-async def upload(files: List[UploadFile] = File(...), background_tasks: BackgroundTasks = None):
+def upload(files: List[UploadFile] = File(...), background_tasks: BackgroundTasks = None):
+    # Endpoint synchrone (threadpool) : écriture du spool, historique SQLite,
+    # comptage des pages et envoi au broker (OCR complet en mode eager) ne
+    # bloquent pas la boucle d'événements
     task_ids = []
     for f in files:
-        content = await f.read()
-        tid = process_file.delay(f.filename, content)
-        task_ids.append(tid.id)
-        record_entry(f.filename, tid.id)
+        tid = uuid()
+        # Écrit par morceaux dans le spool : ni le fichier entier en mémoire,
+        # ni ses octets dans les messages Celery (seulement l'empreinte)
+        with get_spool().writer() as w:
+            while True:
+                chunk = f.file.read(SPOOL_CHUNK_SIZE)
+                if not chunk:
+                    break
+                w.write(chunk)
+            digest = w.commit(tid)
+        # L'entrée existe avant l'envoi : l'agrégation (même en mode eager) la complète
+        record_entry(f.filename, tid)
+        process_file(f.filename, task_id=tid, digest=digest)
+        task_ids.append(tid)
     return {"task_ids": task_ids}
 
 @app.get("/results/{task_id}")
-def results(task_id: str):
-    return get_results(task_id)
+async def results(
+    task_id: str,
+    after: Optional[int] = Query(None, ge=0),
+    wait: float = Query(0.0, ge=0, le=PROGRESS_MAX_WAIT),
+):
+    # Long-poll : `wait` > 0 bloque jusqu'au prochain événement (ou l'expiration) ;
+    # le client repasse `cursor` en `after` à l'appel suivant. L'attente a lieu
+    # sur la boucle d'événements : les clients en attente n'occupent aucun thread
+    if wait and after is None:
+        after = 0
+    return await get_results_async(task_id, after=after, wait=wait)
+
+async def _progress_stream(task_id: str, after: int) -> AsyncIterator[str]:
+    """Flux SSE : événements du document jusqu'à sa fin (ou PROGRESS_STREAM_SECONDS)."""
+    PROGRESS_STREAMS.inc()
+    try:
+        # Délai de reconnexion conseillé au client (ms) ; il reprend via Last-Event-ID
+        yield "retry: 2000\n\n"
+        deadline = time.monotonic() + PROGRESS_STREAM_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            events = await read_progress_async(task_id, after,
+                                               timeout=min(PROGRESS_HEARTBEAT_SECONDS, remaining))
+            for event in events:
+                yield format_sse(event)
+                after = event["seq"]
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+            if not events:
+                state = await asyncio.to_thread(get_results, task_id)
+                if state["state"] in states.READY_STATES:
+                    # Terminé sans événement final lisible (expiré) : état Celery
+                    kind = "done" if state["state"] == states.SUCCESS else "error"
+                    yield format_sse(dict(state, type=kind, seq=after + 1))
+                    return
+                yield ": keepalive\n\n"
+    finally:
+        PROGRESS_STREAMS.dec()
+
+@app.get("/results/{task_id}/events")
+def results_events(
+    task_id: str,
+    after: int = Query(0, ge=0),
+    last_event_id: Optional[str] = Header(None),
+):
+    # Server-Sent Events ; à la reconnexion, le navigateur renvoie Last-Event-ID
+    if last_event_id and last_event_id.isdigit():
+        after = int(last_event_id)
+    return StreamingResponse(
+        _progress_stream(task_id, after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/history/")
-def history():
-    return record_entry.get_history()
+def history(
+    status: Optional[str] = None,
+    filename: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    include_result: bool = False,
+):
+    # Une page à la fois ; la suivante s'obtient avec `cursor=next_cursor`
+    try:
+        page = query_history(status=status, filename=filename, since=since, until=until,
+                             cursor=cursor, limit=limit, include_result=include_result)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"items": page.entries, "next_cursor": page.next_cursor}
+
+@app.get("/history/{task_id}")
+def history_entry(task_id: str):
+    entry = get_entry(task_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Entrée introuvable")
+    return entry
+
+@app.get("/exports/{export_id}")
+def download_export(export_id: str):
+    # Servi en flux depuis le disque : la mémoire ne dépend pas de la taille du lot
+    path = export_path(export_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Export introuvable ou expiré")
+    return FileResponse(path, media_type="application/zip", filename="batch_textract.zip")
@@ -1,29 +1,446 @@
 # src/backends.py
+
+"""
+Moteurs OCR interchangeables et routeur - Green Hub.
+
+Un `OCRBackend` reconnaît les mots d'une image (`recognize_words` ->
+`WordBoxes`), en synchrone, en asynchrone (`recognize_async`) ou par lot
+(`recognize_many`, `recognize_many_async`), et déclare son coût par page, sa
+latence attendue et la taille de lot qu'il absorbe.
+
+`BackendRouter` choisit le moteur de chaque page d'après les latences et le
+taux d'erreur observés (fenêtre glissante), et couvre les appels lents : si
+le moteur choisi dépasse le centile OCR_HEDGE_PERCENTILE de ses latences
+récentes, le moteur suivant est lancé en parallèle ; le premier résultat
+l'emporte et l'autre appel est annulé. Les pages des documents soumis à
+l'API (`src.tasks`) passent par `recognize_page`.
+"""
+
+import asyncio
+import contextvars
+import logging
+import math
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+
 from PIL import Image
 
+from .config import (
+    OCR_BACKENDS, OCR_HEDGE_PERCENTILE, OCR_ROUTER_WINDOW, TEXTRACT_BATCH_CONCURRENCY,
+)
+from .observability import BACKEND_CALLS, BACKEND_HEDGES, BACKEND_SECONDS, series
+from .tracing import span
+from .wordboxes import WordBoxes
+
+logger = logging.getLogger(__name__)
+
+
 class OCRBackend(ABC):
+    """
+    Moteur OCR. Les sous-classes implémentent `recognize_words` ; les appels
+    asynchrones et par lot passent par `submit`, qui exécute par défaut sur
+    l'exécuteur OCR du processus (`src.executor`).
+
+    Attributs déclarés (utilisés par le routeur) :
+        name: Nom du moteur (métriques, configuration).
+        cost_per_page: Coût d'une page ($ pour 1000 pages, 0 pour un moteur local).
+        expected_latency: Latence attendue d'une page (s), avant toute mesure.
+        max_batch: Pages traitées simultanément au plus par `recognize_many`.
+    """
+
+    name = "backend"
+    cost_per_page = 0.0
+    expected_latency = 1.0
+    max_batch = 1
+
     @abstractmethod
-    def recognize(self, *args, **kwargs) -> Any:
-        pass
+    def recognize_words(self, image: Image.Image, lang: str = 'eng', psm: int = 6,
+                        conf_thr: int = 30) -> WordBoxes:
+        """Mots de `image` de confiance >= `conf_thr` ; les erreurs sont propagées."""
 
-class TesseractBackend(OCRBackend):
     def recognize(self, image: Image.Image, lang='eng', psm=6, conf_thr=30) -> Dict:
-        # Implement Tesseract OCR logic
-        return {}
+        """Format historique : {"words": [{'x1', 'y1', 'x2', 'y2', 'text', 'conf'}, ...]}."""
+        return {"words": self.recognize_words(image, lang, psm, conf_thr).to_dict('records')}
+
+    def submit(self, image: Image.Image, lang: str = 'eng', psm: int = 6,
+               conf_thr: int = 30) -> Future:
+        from .executor import get_executor
+        return get_executor().submit(self.recognize_words, image, lang, psm, conf_thr)
+
+    async def recognize_async(self, image: Image.Image, lang: str = 'eng', psm: int = 6,
+                              conf_thr: int = 30) -> WordBoxes:
+        """
+        Version asynchrone de `recognize_words`. Annuler la coroutine annule
+        l'appel s'il n'a pas démarré ; un appel en cours se termine en arrière-plan.
+        """
+        return await asyncio.wrap_future(self.submit(image, lang, psm, conf_thr))
+
+    def recognize_many(self, images: Sequence[Image.Image], lang: str = 'eng', psm: int = 6,
+                       conf_thr: int = 30) -> List[WordBoxes]:
+        """Mots de chaque image, dans l'ordre, par lots de `max_batch` appels simultanés."""
+        out: List[WordBoxes] = []
+        step = max(1, self.max_batch)
+        for start in range(0, len(images), step):
+            futures = [self.submit(img, lang, psm, conf_thr) for img in images[start:start + step]]
+            out.extend(f.result() for f in futures)
+        return out
+
+    async def recognize_many_async(self, images: Sequence[Image.Image], lang: str = 'eng',
+                                   psm: int = 6, conf_thr: int = 30) -> List[WordBoxes]:
+        """Comme `recognize_many`, sans bloquer la boucle d'événements."""
+        slots = asyncio.Semaphore(max(1, self.max_batch))
+
+        async def one(img: Image.Image) -> WordBoxes:
+            async with slots:
+                return await self.recognize_async(img, lang, psm, conf_thr)
+
+        return list(await asyncio.gather(*(one(img) for img in images)))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.name})"
+
+
+class TesseractBackend(OCRBackend):
+    """
+    Tesseract local via `ocr_tess` (moteur natif persistant de `src.engine` et
+    cache), ou `ocr_layout` avec `layout` (zones de texte seules, pages
+    blanches ignorées : moteur du registre, pour les pages entières). Avec
+    `strict`, une erreur du moteur est propagée au lieu de donner une page
+    vide : le routeur la compte et bascule sur un autre moteur.
+    """
+
+    name = "tesseract"
+    cost_per_page = 0.0
+    expected_latency = 2.0
+
+    def __init__(self, strict: bool = True, layout: bool = False):
+        from .executor import get_executor
+        self.strict = strict
+        self.layout = layout
+        self.max_batch = get_executor().workers
+
+    def recognize_words(self, image: Image.Image, lang='eng', psm=6, conf_thr=30) -> WordBoxes:
+        from .layout import ocr_layout
+        from .ocr import ocr_tess
+        ocr_fn = ocr_layout if self.layout else ocr_tess
+        return ocr_fn(image, lang, psm, conf_thr, strict=self.strict)
+
 
 class TextractBackend(OCRBackend):
-    def recognize(self, image_bytes: bytes) -> Dict:
-        # Implement AWS Textract OCR logic
-        return {}
-
-class GoogleVisionBackend(OCRBackend):
-    def recognize(self, image_bytes: bytes) -> Dict:
-        # Implement Google Vision API call
-        return {}
-
-class AzureVisionBackend(OCRBackend):
-    def recognize(self, image_bytes: bytes) -> Dict:
-        # Implement Azure Computer Vision API call
-        return {}
+    """
+    AWS Textract (AnalyzeDocument). L'image est encodée par
+    `encode_for_textract`, l'appel passe par un `TextractBatchExecutor`
+    (limitation de débit adaptative, backoff) et les lignes Textract sont
+    converties en boîtes en pixels de l'image d'origine : Textract ne donne
+    pas de découpage en mots sur ce chemin, une boîte par ligne. `lang` et
+    `psm` sont ignorés (détection automatique).
+    """
+
+    name = "textract"
+    cost_per_page = 1.5  # texte seul ; FORMS / TABLES facturés en sus
+    expected_latency = 3.0
+
+    def __init__(self, client: Optional[Any] = None, batch_executor: Optional[Any] = None,
+                 max_concurrency: int = TEXTRACT_BATCH_CONCURRENCY):
+        self.client = client
+        self.max_batch = max(1, max_concurrency)
+        self._batch_executor = batch_executor
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> Any:
+        if self._batch_executor is None:
+            with self._lock:
+                if self._batch_executor is None:
+                    from .textract_batch import TextractBatchExecutor
+                    from .textract_service import analyze_document
+                    self._batch_executor = TextractBatchExecutor(
+                        self.client, max_concurrency=self.max_batch, call=analyze_document
+                    )
+        return self._batch_executor
+
+    def recognize_words(self, image: Image.Image, lang='eng', psm=6, conf_thr=30) -> WordBoxes:
+        from .encoding import encode_for_textract
+        encoded = encode_for_textract(image)
+        lines = self._executor().analyze(encoded.data).lines
+        # Géométrie relative : mêmes proportions quelle que soit la réduction d'encodage
+        width, height = image.size
+        words = WordBoxes(
+            [round(left * width) for left in lines['left']],
+            [round(top * height) for top in lines['top']],
+            [round((left + w) * width) for left, w in zip(lines['left'], lines['width'])],
+            [round((top + h) * height) for top, h in zip(lines['top'], lines['height'])],
+            lines['text'], lines['conf'],
+            line=range(1, len(lines['text']) + 1),
+        )
+        return words.filter_conf(conf_thr)
+
+    def submit(self, image: Image.Image, lang='eng', psm=6, conf_thr=30) -> Future:
+        # Appels réseau : pool de threads dédié, pas les workers CPU de l'OCR
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.max_batch, thread_name_prefix="textract-ocr")
+        return self._pool.submit(contextvars.copy_context().run,
+                                 self.recognize_words, image, lang, psm, conf_thr)
+
+
+# ----------- Routage -----------
+
+class BackendStats:
+    """
+    Latences des derniers appels réussis (fenêtre glissante) et taux d'erreur
+    lissé (moyenne exponentielle) d'un moteur. Tant que la fenêtre compte
+    moins de `min_samples` mesures, la latence déclarée du moteur fait foi.
+
+    Le taux d'erreur décroît de moitié toutes les `half_life` secondes sans
+    appel : un moteur écarté après une panne redevient candidat.
+    """
+
+    def __init__(self, expected_latency: float, window: int = OCR_ROUTER_WINDOW,
+                 alpha: float = 0.1, min_samples: int = 5, half_life: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.expected_latency = expected_latency
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.half_life = half_life
+        self._clock = clock
+        self._error_rate = 0.0
+        self._updated = clock()
+        self._latencies: Deque[float] = deque(maxlen=max(1, window))
+        self._lock = threading.Lock()
+
+    def _decayed(self, now: float) -> float:
+        return self._error_rate * 0.5 ** (max(0.0, now - self._updated) / self.half_life)
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            return self._decayed(self._clock())
+
+    def record(self, latency: Optional[float], ok: Optional[bool]) -> None:
+        """
+        Issue d'un appel : `latency` None pour une erreur sans durée exploitable,
+        `ok` None pour un appel annulé (taux d'erreur inchangé).
+        """
+        with self._lock:
+            if latency is not None:
+                self._latencies.append(latency)
+            if ok is not None:
+                now = self._clock()
+                rate = self._decayed(now)
+                self._error_rate = rate + self.alpha * ((0.0 if ok else 1.0) - rate)
+                self._updated = now
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            values = sorted(self._latencies)
+        if len(values) < self.min_samples:
+            return self.expected_latency
+        # Centile « au rang supérieur » : pas d'interpolation sur une petite fenêtre
+        return values[min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))]
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+
+class BackendRouter(OCRBackend):
+    """
+    Choisit un moteur par page et couvre les appels lents.
+
+    Le score d'un moteur est sa latence médiane divisée par son taux de
+    réussite (durée attendue pour obtenir un résultat en relançant après une
+    erreur), plus `cost_weight` x son coût par page ; le plus petit score est
+    choisi. Les moteurs dont le taux d'erreur dépasse `max_error_rate` passent
+    après les autres. Un moteur en échec est suivi du suivant dans le classement.
+
+    Args:
+        backends: Moteurs candidats (au moins un).
+        hedge_percentile: Centile de latence du moteur choisi au-delà duquel le
+            suivant est lancé en parallèle (0 : pas de relance couverte).
+        cost_weight: Poids du coût par page dans le score (s par $ pour 1000 pages).
+        max_error_rate: Taux d'erreur au-delà duquel un moteur est écarté.
+        window: Nombre d'appels retenus par moteur pour les latences.
+    """
+
+    name = "router"
+
+    def __init__(
+        self,
+        backends: Sequence[OCRBackend],
+        hedge_percentile: float = OCR_HEDGE_PERCENTILE,
+        cost_weight: float = 0.0,
+        max_error_rate: float = 0.5,
+        window: int = OCR_ROUTER_WINDOW,
+    ):
+        if not backends:
+            raise ValueError("Le routeur demande au moins un moteur")
+        self.backends = list(backends)
+        self.hedge_percentile = hedge_percentile
+        self.cost_weight = cost_weight
+        self.max_error_rate = max_error_rate
+        self.stats: Dict[str, BackendStats] = {
+            b.name: BackendStats(b.expected_latency, window) for b in self.backends
+        }
+        self.cost_per_page = min(b.cost_per_page for b in self.backends)
+        self.expected_latency = min(b.expected_latency for b in self.backends)
+        self.max_batch = sum(max(1, b.max_batch) for b in self.backends)
+
+    def score(self, backend: OCRBackend) -> float:
+        stats = self.stats[backend.name]
+        success = max(1e-3, 1.0 - stats.error_rate)
+        return stats.percentile(50) / success + self.cost_weight * backend.cost_per_page
+
+    def rank(self) -> List[OCRBackend]:
+        """Moteurs sains puis écartés, chacun du meilleur au moins bon score."""
+        return sorted(self.backends, key=lambda b: (
+            self.stats[b.name].error_rate > self.max_error_rate, self.score(b)))
+
+    def hedge_delay(self, backend: OCRBackend) -> Optional[float]:
+        if self.hedge_percentile <= 0 or len(self.backends) < 2:
+            return None
+        return self.stats[backend.name].percentile(self.hedge_percentile)
+
+    async def _call(self, backend: OCRBackend, image: Image.Image, lang: str, psm: int,
+                    conf_thr: int) -> WordBoxes:
+        stats = self.stats[backend.name]
+        t0 = time.perf_counter()
+        try:
+            with span("backend", backend=backend.name):
+                words = await backend.recognize_async(image, lang, psm, conf_thr)
+        except asyncio.CancelledError:
+            # Perdant d'une relance : sa latence réelle dépasse la durée écoulée,
+            # retenue comme borne basse pour ne pas flatter le moteur lent
+            stats.record(time.perf_counter() - t0, ok=None)
+            series(BACKEND_CALLS, backend.name, "cancelled").inc()
+            raise
+        except Exception:
+            stats.record(None, ok=False)
+            series(BACKEND_CALLS, backend.name, "error").inc()
+            raise
+        elapsed = time.perf_counter() - t0
+        stats.record(elapsed, ok=True)
+        series(BACKEND_SECONDS, backend.name).observe(elapsed)
+        series(BACKEND_CALLS, backend.name, "ok").inc()
+        return words
+
+    async def recognize_async(self, image: Image.Image, lang: str = 'eng', psm: int = 6,
+                              conf_thr: int = 30) -> WordBoxes:
+        ranked = self.rank()
+        candidates = iter(ranked[1:])
+        first = ranked[0]
+        pending: Dict["asyncio.Task[WordBoxes]", OCRBackend] = {
+            asyncio.ensure_future(self._call(first, image, lang, psm, conf_thr)): first
+        }
+        hedge_after = self.hedge_delay(first)
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=hedge_after,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Premier moteur trop lent : une seule relance par page
+                    hedge_after = None
+                    backend = next(candidates, None)
+                    if backend is not None:
+                        series(BACKEND_HEDGES, backend.name).inc()
+                        logger.debug("Relance couverte sur %s", backend.name)
+                        pending[asyncio.ensure_future(
+                            self._call(backend, image, lang, psm, conf_thr))] = backend
+                    continue
+                for task in done:
+                    backend = pending.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                    logger.warning("Moteur OCR %s en échec : %s", backend.name, error)
+                if not pending:
+                    backend = next(candidates, None)
+                    if backend is not None:
+                        pending[asyncio.ensure_future(
+                            self._call(backend, image, lang, psm, conf_thr))] = backend
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+            for task in pending:
+                if not task.cancelled():
+                    task.exception()  # terminée avant l'annulation : erreur déjà comptée
+        assert error is not None
+        raise error
+
+    def recognize_words(self, image: Image.Image, lang='eng', psm=6, conf_thr=30) -> WordBoxes:
+        """Appel bloquant ; depuis une coroutine, utiliser `recognize_async`."""
+        return asyncio.run(self.recognize_async(image, lang, psm, conf_thr))
+
+    def submit(self, image: Image.Image, lang='eng', psm=6, conf_thr=30) -> Future:
+        # Le routeur ne calcule rien : les moteurs utilisent leurs propres pools
+        future: Future = Future()
+        try:
+            future.set_result(self.recognize_words(image, lang, psm, conf_thr))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+
+    def recognize_many(self, images: Sequence[Image.Image], lang='eng', psm=6,
+                       conf_thr=30) -> List[WordBoxes]:
+        return asyncio.run(self.recognize_many_async(images, lang, psm, conf_thr))
+
+
+# ----------- Registre -----------
+
+_BACKENDS: Dict[str, Callable[[], OCRBackend]] = {
+    "tesseract": lambda: TesseractBackend(layout=True),
+    "textract": TextractBackend,
+}
+
+
+def register_ocr_backend(name: str, factory: Callable[[], OCRBackend]) -> None:
+    """Déclare un moteur supplémentaire, sélectionnable via OCR_BACKENDS."""
+    _BACKENDS[name] = factory
+
+
+def build_ocr_backend(name: str) -> OCRBackend:
+    try:
+        factory = _BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Moteur OCR inconnu : {name}")
+    return factory()
+
+
+_router: Optional[BackendRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> BackendRouter:
+    """Routeur du processus, sur les moteurs de OCR_BACKENDS (créé à la demande)."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = BackendRouter([build_ocr_backend(name) for name in OCR_BACKENDS])
+    return _router
+
+
+def set_router(router: Optional[BackendRouter]) -> None:
+    """Remplace le routeur du processus (tests, configuration dynamique)."""
+    global _router
+    with _router_lock:
+        _router = router
+
+
+def recognize_page(image: Image.Image, lang: str = 'eng', psm: int = 6, conf_thr: int = 30) -> WordBoxes:
+    """
+    OCR d'une page prétraitée par le routeur du processus. Avec un seul moteur
+    (Tesseract par défaut), il est appelé directement : rien à router ni couvrir.
+    Les erreurs sont propagées (la tâche de page est relancée).
+    """
+    router = get_router()
+    if len(router.backends) == 1:
+        return router.backends[0].recognize_words(image, lang, psm, conf_thr)
+    return router.recognize_words(image, lang, psm, conf_thr)
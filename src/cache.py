@@ -0,0 +1,374 @@
+# src/cache.py
+
+"""
+Cache des résultats OCR adressé par contenu - Green Hub.
+
+La clé est un condensat des pixels de la page et des paramètres OCR
+(langue, psm, zoom, prétraitement). Trois niveaux sont consultés dans l'ordre :
+1. LRU borné en mémoire (par processus)
+2. Répertoire sur disque avec éviction par taille
+3. Niveau partagé (Redis) entre réplicas et workers Celery
+
+Un succès dans un niveau inférieur réalimente les niveaux supérieurs.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from PIL import Image
+
+from .config import (
+    OCR_CACHE_DIR,
+    OCR_CACHE_DISK_MAX_BYTES,
+    OCR_CACHE_ENABLED,
+    OCR_CACHE_MEMORY_ITEMS,
+    OCR_CACHE_REDIS_BACKOFF,
+    OCR_CACHE_REDIS_TIMEOUT,
+    OCR_CACHE_REDIS_URL,
+    OCR_CACHE_TTL_SECONDS,
+)
+from .observability import CACHE_EVENTS, series
+from .wordboxes import WordBoxes
+
+logger = logging.getLogger(__name__)
+
+# Incrémenter pour invalider toutes les entrées si le format change
+CACHE_VERSION = "2"
+
+
+def image_digest(img: Image.Image) -> str:
+    """Condensat BLAKE2b des pixels (mode, taille et données brutes)."""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{img.mode}:{img.size[0]}x{img.size[1]}:".encode())
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+def make_key(namespace: str, img: Image.Image, **params: Any) -> str:
+    """
+    Construit une clé de cache stable à partir de l'image et des paramètres.
+
+    Args:
+        namespace: Nom de l'opération mise en cache (ex: 'ocr_tess').
+        img: Image dont les pixels déterminent la clé.
+        **params: Paramètres OCR sérialisables en JSON.
+    """
+    payload = json.dumps(params, sort_keys=True, default=str)
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{CACHE_VERSION}:{namespace}:{image_digest(img)}:{payload}".encode())
+    return f"{namespace}:{h.hexdigest()}"
+
+
+def _json_default(obj: Any) -> Any:
+    # Scalaires NumPy (int64, float32...) renvoyés par certaines versions de pandas
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+# ----------- Niveaux de cache -----------
+
+class CacheTier(ABC):
+    """Niveau de cache clé -> octets."""
+
+    name = "tier"
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: bytes) -> None:
+        pass
+
+    def _event(self, event: str) -> None:
+        series(CACHE_EVENTS, self.name, event).inc()
+
+
+class MemoryTier(CacheTier):
+    """LRU borné en nombre d'entrées, protégé par un verrou."""
+
+    name = "memory"
+
+    def __init__(self, max_items: int = 256):
+        self.max_items = max_items
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+                self._event("eviction")
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskTier(CacheTier):
+    """
+    Répertoire local, un fichier par entrée. Quand la taille totale dépasse
+    `max_bytes`, les entrées les moins récemment utilisées (mtime) sont supprimées
+    jusqu'à `low_watermark * max_bytes` : le parcours du répertoire n'est payé
+    qu'une fois par lot d'écritures, pas à chaque écriture d'un cache plein.
+    """
+
+    name = "disk"
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024,
+                 low_watermark: float = 0.9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.low_watermark = low_watermark
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total = sum(size for _, size, _ in self._scan())
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _scan(self) -> List[tuple]:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for fname in files:
+                if fname.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, fname)
+                try:
+                    st_ = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, st_.st_size, st_.st_mtime))
+        return entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                data = fh.read()
+            os.utime(path, None)
+            return data
+        except FileNotFoundError:
+            return None
+        except OSError:
+            logger.warning("Lecture du cache disque impossible : %s", path, exc_info=True)
+            return None
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(tmp, "wb") as fh:
+                fh.write(value)
+            os.replace(tmp, path)
+        except OSError:
+            logger.warning("Écriture du cache disque impossible : %s", path, exc_info=True)
+            return
+        with self._lock:
+            self._total += len(value) - previous
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = sorted(self._scan(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * self.low_watermark
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self._event("eviction")
+        self._total = total
+
+
+class SharedTier(CacheTier):
+    """
+    Niveau partagé adossé à un client de type Redis (`get`, `set(..., ex=)`).
+    Une erreur réseau est traitée comme une absence et coupe le niveau pendant
+    `backoff` s (événement 'skip') : un Redis injoignable ne coûte qu'un délai
+    d'attente par période, pas deux par appel OCR.
+    """
+
+    name = "shared"
+
+    def __init__(self, client: Any, prefix: str = "ocr-cache:", ttl: Optional[int] = None,
+                 backoff: float = OCR_CACHE_REDIS_BACKOFF, clock: Callable[[], float] = time.monotonic):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.backoff = backoff
+        self._clock = clock
+        self._skip_until = 0.0
+
+    @classmethod
+    def from_url(cls, url: str, ttl: Optional[int] = None,
+                 timeout: float = OCR_CACHE_REDIS_TIMEOUT) -> Optional["SharedTier"]:
+        """Crée le niveau depuis une URL redis://, ou None si redis est indisponible."""
+        try:
+            import redis
+        except ImportError:
+            logger.warning("Paquet redis absent, cache partagé désactivé")
+            return None
+        client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        return cls(client, ttl=ttl)
+
+    def _available(self) -> bool:
+        if self._clock() < self._skip_until:
+            self._event("skip")
+            return False
+        return True
+
+    def _failed(self, op: str, exc: Exception) -> None:
+        self._skip_until = self._clock() + self.backoff
+        self._event("error")
+        logger.warning("Cache partagé indisponible (%s : %s), ignoré pendant %.0f s", op, exc, self.backoff)
+
+    def get(self, key: str) -> Optional[bytes]:
+        if not self._available():
+            return None
+        try:
+            return self.client.get(self.prefix + key)
+        except Exception as exc:
+            self._failed("get", exc)
+            return None
+
+    def set(self, key: str, value: bytes) -> None:
+        if not self._available():
+            return
+        try:
+            self.client.set(self.prefix + key, value, ex=self.ttl)
+        except Exception as exc:
+            self._failed("set", exc)
+
+
+# ----------- Cache hiérarchique -----------
+
+class TieredCache:
+    """Enchaîne plusieurs niveaux, du plus rapide au plus partagé."""
+
+    def __init__(self, tiers: List[CacheTier]):
+        self.tiers = tiers
+
+    def get(self, key: str) -> Optional[bytes]:
+        for idx, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is None:
+                tier._event("miss")
+                continue
+            tier._event("hit")
+            for upper in self.tiers[:idx]:
+                upper.set(key, value)
+            return value
+        return None
+
+    def set(self, key: str, value: bytes) -> None:
+        for tier in self.tiers:
+            tier.set(key, value)
+
+    def get_words(self, key: str) -> Optional[WordBoxes]:
+        data = self.get(key)
+        if data is None:
+            return None
+        try:
+            return WordBoxes.from_bytes(data)
+        except (ValueError, KeyError, struct.error):
+            logger.warning("Entrée de cache illisible ignorée : %s", key)
+            return None
+
+    def set_words(self, key: str, words: WordBoxes) -> None:
+        """Stocke les mots au format binaire compact (`WordBoxes.to_bytes`)."""
+        self.set(key, words.to_bytes())
+
+    def get_json(self, key: str) -> Optional[Dict[str, Any]]:
+        data = self.get(key)
+        if data is None:
+            return None
+        try:
+            return json.loads(data.decode())
+        except (ValueError, UnicodeDecodeError):
+            logger.warning("Entrée de cache illisible ignorée : %s", key)
+            return None
+
+    def set_json(self, key: str, obj: Dict[str, Any]) -> None:
+        self.set(key, json.dumps(obj, default=_json_default).encode())
+
+
+def callable_id(fn: Callable) -> Optional[str]:
+    """
+    Identifiant stable d'une fonction pour les clés de cache, ou None si la
+    fonction n'est pas identifiable d'un processus à l'autre (lambda, closure).
+    """
+    if isinstance(fn, functools.partial):
+        inner = callable_id(fn.func)
+        if inner is None:
+            return None
+        return f"{inner}{json.dumps([fn.args, fn.keywords], sort_keys=True, default=str)}"
+    qualname = getattr(fn, "__qualname__", None)
+    if qualname is None or "<lambda>" in qualname or "<locals>" in qualname:
+        return None
+    return f"{getattr(fn, '__module__', '')}.{qualname}"
+
+
+def build_cache_from_config() -> Optional[TieredCache]:
+    """Construit le cache à partir des variables d'environnement."""
+    if not OCR_CACHE_ENABLED:
+        return None
+    tiers: List[CacheTier] = [MemoryTier(OCR_CACHE_MEMORY_ITEMS)]
+    if OCR_CACHE_DIR:
+        tiers.append(DiskTier(OCR_CACHE_DIR, OCR_CACHE_DISK_MAX_BYTES))
+    if OCR_CACHE_REDIS_URL:
+        shared = SharedTier.from_url(OCR_CACHE_REDIS_URL, ttl=OCR_CACHE_TTL_SECONDS)
+        if shared is not None:
+            tiers.append(shared)
+    return TieredCache(tiers)
+
+
+_cache: Optional[TieredCache] = None
+_cache_built = False
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache() -> Optional[TieredCache]:
+    """Retourne le cache OCR du processus (None si désactivé)."""
+    global _cache, _cache_built
+    if not _cache_built:
+        with _cache_lock:
+            if not _cache_built:
+                _cache = build_cache_from_config()
+                _cache_built = True
+    return _cache
+
+
+def set_ocr_cache(cache: Optional[TieredCache]) -> None:
+    """Remplace le cache OCR du processus (tests, configuration explicite)."""
+    global _cache, _cache_built
+    with _cache_lock:
+        _cache = cache
+        _cache_built = True
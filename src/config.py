@@ -7,7 +7,8 @@ and provides constants and helper functions for application configuration.
 """
 import os
 import json
-from typing import Optional, Dict
+import tempfile
+from typing import Optional, Dict, Tuple
 from dotenv import load_dotenv
 
 import hashlib
@@ -33,6 +34,161 @@ SECRET_NAME: Optional[str] = os.getenv('AWS_SECRETS_NAME')
 STREAMLIT_PAGE_TITLE: str = os.getenv('STREAMLIT_PAGE_TITLE', 'OCR - Green Hub')
 STREAMLIT_LAYOUT: str = os.getenv('STREAMLIT_LAYOUT', 'wide')
 
+# Cache des résultats OCR (mémoire -> disque -> partagé)
+OCR_CACHE_ENABLED: bool = os.getenv('OCR_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+OCR_CACHE_MEMORY_ITEMS: int = int(os.getenv('OCR_CACHE_MEMORY_ITEMS', '256'))
+OCR_CACHE_DIR: Optional[str] = os.getenv('OCR_CACHE_DIR') or None
+OCR_CACHE_DISK_MAX_BYTES: int = int(os.getenv('OCR_CACHE_DISK_MAX_BYTES', str(512 * 1024 * 1024)))
+OCR_CACHE_REDIS_URL: Optional[str] = os.getenv('OCR_CACHE_REDIS_URL') or None
+OCR_CACHE_TTL_SECONDS: int = int(os.getenv('OCR_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+# Délai réseau maximal d'un appel Redis (s), puis durée pendant laquelle le
+# niveau partagé est ignoré après une erreur (s)
+OCR_CACHE_REDIS_TIMEOUT: float = float(os.getenv('OCR_CACHE_REDIS_TIMEOUT', '0.2'))
+OCR_CACHE_REDIS_BACKOFF: float = float(os.getenv('OCR_CACHE_REDIS_BACKOFF', '30'))
+# Cache mémoire des images prétraitées (octets, 0 = désactivé), par processus
+PREPROCESS_CACHE_MAX_BYTES: int = int(os.getenv('PREPROCESS_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+# Chaîne de prétraitement : 'adaptive' (étapes choisies selon la page) ou 'full'
+PREPROCESS_MODE: str = os.getenv('PREPROCESS_MODE', 'adaptive').lower()
+
+# Moteur Tesseract : 'auto' (tesserocr si disponible), 'native' ou 'subprocess'
+OCR_ENGINE: str = os.getenv('OCR_ENGINE', 'auto').lower()
+
+# Recherche du zoom : 'predict' (hauteur du texte + bandes) ou 'sweep' (balayage)
+OCR_ZOOM_STRATEGY: str = os.getenv('OCR_ZOOM_STRATEGY', 'predict').lower()
+
+# Documents PDF gardés ouverts par processus (rendu des pages et des zooms)
+DOCUMENT_CACHE_HANDLES: int = int(os.getenv('DOCUMENT_CACHE_HANDLES', '8'))
+
+# PDF natifs : mots lus dans la couche texte (PyMuPDF) au lieu d'OCRiser la page,
+# si elle compte au moins PDF_TEXT_LAYER_MIN_CHARS caractères lisibles
+PDF_TEXT_LAYER_ENABLED: bool = os.getenv('PDF_TEXT_LAYER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PDF_TEXT_LAYER_MIN_CHARS: int = int(os.getenv('PDF_TEXT_LAYER_MIN_CHARS', '20'))
+
+# OCR par zones de texte : pré-analyse de mise en page (marges et pages blanches
+# ignorées), au-delà de OCR_LAYOUT_MAX_REGIONS zones ou si elles couvrent plus de
+# OCR_LAYOUT_MAX_COVERAGE de la page, une seule zone englobante est OCRisée
+OCR_LAYOUT_ENABLED: bool = os.getenv('OCR_LAYOUT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+OCR_LAYOUT_MAX_REGIONS: int = int(os.getenv('OCR_LAYOUT_MAX_REGIONS', '32'))
+OCR_LAYOUT_MAX_COVERAGE: float = float(os.getenv('OCR_LAYOUT_MAX_COVERAGE', '0.6'))
+
+# Exécuteur OCR global : budget CPU du processus et mode ('thread' ou 'process')
+def _default_cpu_budget() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+OCR_CPU_BUDGET: int = int(os.getenv('OCR_CPU_BUDGET') or _default_cpu_budget())
+OCR_EXECUTOR_MODE: str = os.getenv('OCR_EXECUTOR_MODE', 'thread').lower()
+OCR_THREADS_PER_TASK: int = int(os.getenv('OCR_THREADS_PER_TASK', '1'))
+
+# Textract : pool de connexions, tentatives botocore et lot concurrent
+TEXTRACT_MAX_POOL_CONNECTIONS: int = int(os.getenv('TEXTRACT_MAX_POOL_CONNECTIONS', '16'))
+TEXTRACT_MAX_ATTEMPTS: int = int(os.getenv('TEXTRACT_MAX_ATTEMPTS', '3'))
+TEXTRACT_BATCH_CONCURRENCY: int = int(os.getenv('TEXTRACT_BATCH_CONCURRENCY', '8'))
+TEXTRACT_MAX_RPS: float = float(os.getenv('TEXTRACT_MAX_RPS', '10'))
+# Fonctions AnalyzeDocument demandées (ex: 'FORMS,TABLES') ; LINES est toujours renvoyé
+TEXTRACT_FEATURE_TYPES: Tuple[str, ...] = tuple(
+    f.strip() for f in os.getenv('TEXTRACT_FEATURE_TYPES', 'FORMS').split(',') if f.strip()
+)
+
+# Encodage des images envoyées à Textract : taille maximale de la charge
+# (limite synchrone AnalyzeDocument), plus grand côté et hauteur de texte visée
+TEXTRACT_MAX_BYTES: int = int(os.getenv('TEXTRACT_MAX_BYTES', str(5 * 1024 * 1024)))
+TEXTRACT_MAX_SIDE: int = int(os.getenv('TEXTRACT_MAX_SIDE', '10000'))
+TEXTRACT_TEXT_HEIGHT: float = float(os.getenv('TEXTRACT_TEXT_HEIGHT', '24'))
+
+# Moteurs OCR du routeur (src.backends), par ordre de préférence initiale, et
+# relance couverte : un second moteur est lancé quand le premier dépasse ce
+# centile de ses latences récentes (0 désactive la relance)
+OCR_BACKENDS: Tuple[str, ...] = tuple(
+    b.strip() for b in os.getenv('OCR_BACKENDS', 'tesseract').split(',') if b.strip()
+)
+OCR_HEDGE_PERCENTILE: float = float(os.getenv('OCR_HEDGE_PERCENTILE', '95'))
+OCR_ROUTER_WINDOW: int = int(os.getenv('OCR_ROUTER_WINDOW', '200'))
+
+# Référentiel d'entités (src.entities) : CSV `label,term,ref` de fournisseurs,
+# IBAN et n° de TVA connus, chargé au premier usage
+ENTITY_DICTIONARY_PATH: Optional[str] = os.getenv('ENTITY_DICTIONARY_PATH') or None
+
+# Normalisation des entités (src.nlp_postprocessing) : modèle spaCy chargé au
+# premier besoin, composants conservés (vide : tokeniseur seul), taille des lots
+# de `nlp.pipe`, processus pour les traitements par lots et entrées du cache
+NLP_MODEL: str = os.getenv('NLP_MODEL', 'fr_core_news_sm')
+NLP_COMPONENTS: Tuple[str, ...] = tuple(
+    c.strip() for c in os.getenv('NLP_COMPONENTS', '').split(',') if c.strip()
+)
+NLP_BATCH_SIZE: int = int(os.getenv('NLP_BATCH_SIZE', '256'))
+NLP_PROCESSES: int = int(os.getenv('NLP_PROCESSES', '1'))
+NLP_CACHE_SIZE: int = int(os.getenv('NLP_CACHE_SIZE', '50000'))
+
+# Exports ZIP des lots : répertoire, durée de conservation et URL publique de
+# l'API (si définie, l'UI renvoie vers GET /exports/{id} au lieu de servir le fichier).
+# Sans URL publique, l'UI ne sert elle-même (en mémoire) que les exports jusqu'à
+# EXPORT_INLINE_MAX_BYTES
+EXPORT_DIR: str = os.getenv('EXPORT_DIR') or os.path.join(tempfile.gettempdir(), 'ocr_greenhub_exports')
+EXPORT_TTL_SECONDS: int = int(os.getenv('EXPORT_TTL_SECONDS', '3600'))
+EXPORT_PUBLIC_URL: Optional[str] = (os.getenv('EXPORT_PUBLIC_URL') or '').rstrip('/') or None
+EXPORT_INLINE_MAX_BYTES: int = int(os.getenv('EXPORT_INLINE_MAX_BYTES', str(50 * 1024 * 1024)))
+
+# Historique des traitements : stockage ('sqlite' ou 'memory') et base SQLite
+HISTORY_BACKEND: str = os.getenv('HISTORY_BACKEND', 'sqlite').lower()
+HISTORY_DB_PATH: str = os.getenv('HISTORY_DB_PATH', os.path.join('data', 'history.db'))
+HISTORY_PAGE_SIZE: int = int(os.getenv('HISTORY_PAGE_SIZE', '50'))
+
+# Celery : broker, résultats et mode synchrone (tests, postes de développement)
+CELERY_BROKER_URL: str = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_RESULT_BACKEND: str = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
+CELERY_ALWAYS_EAGER: bool = os.getenv('CELERY_ALWAYS_EAGER', 'false').lower() in ('1', 'true', 'yes')
+# Nouvelles tentatives d'une page OCR en échec (backoff exponentiel)
+CELERY_PAGE_MAX_RETRIES: int = int(os.getenv('CELERY_PAGE_MAX_RETRIES', '3'))
+
+# Spool des documents soumis : le broker ne transporte qu'une empreinte SHA-256,
+# les octets sont déposés dans un répertoire local partagé ('local') ou dans un
+# stockage compatible S3 ('s3')
+SPOOL_BACKEND: str = os.getenv('SPOOL_BACKEND', 'local').lower()
+SPOOL_DIR: str = os.getenv('SPOOL_DIR', os.path.join('data', 'spool'))
+SPOOL_S3_BUCKET: Optional[str] = os.getenv('SPOOL_S3_BUCKET') or None
+SPOOL_S3_PREFIX: str = os.getenv('SPOOL_S3_PREFIX', 'spool/')
+SPOOL_S3_ENDPOINT_URL: Optional[str] = os.getenv('SPOOL_S3_ENDPOINT_URL') or None
+SPOOL_CHUNK_SIZE: int = int(os.getenv('SPOOL_CHUNK_SIZE', str(1024 * 1024)))
+# Filet de sécurité : blobs orphelins (document jamais terminé) purgés après ce délai
+SPOOL_TTL_SECONDS: int = int(os.getenv('SPOOL_TTL_SECONDS', str(24 * 3600)))
+
+# Progression des documents soumis via l'API (SSE / long-poll sur /results) :
+# canal 'sqlite' (API et workers sur un volume commun), 'redis' ou 'memory'.
+# En Kubernetes (API et workers dans des pods distincts), utiliser 'redis'.
+PROGRESS_BACKEND: str = os.getenv('PROGRESS_BACKEND', 'sqlite').lower()
+PROGRESS_DB_PATH: str = os.getenv('PROGRESS_DB_PATH', os.path.join('data', 'progress.db'))
+PROGRESS_REDIS_URL: Optional[str] = os.getenv('PROGRESS_REDIS_URL') or None
+PROGRESS_TTL_SECONDS: int = int(os.getenv('PROGRESS_TTL_SECONDS', '3600'))
+# Fréquence de consultation du canal côté serveur (s), pour sqlite et redis
+PROGRESS_POLL_INTERVAL: float = float(os.getenv('PROGRESS_POLL_INTERVAL', '0.2'))
+# Attente maximale d'un long-poll, durée d'un flux SSE et intervalle des keepalive (s)
+PROGRESS_MAX_WAIT: float = float(os.getenv('PROGRESS_MAX_WAIT', '60'))
+PROGRESS_STREAM_SECONDS: float = float(os.getenv('PROGRESS_STREAM_SECONDS', '600'))
+PROGRESS_HEARTBEAT_SECONDS: float = float(os.getenv('PROGRESS_HEARTBEAT_SECONDS', '15'))
+
+# Serveur /healthz + /metrics du pod (voir `src/observability.py`)
+METRICS_HOST: str = os.getenv('METRICS_HOST', '0.0.0.0')
+METRICS_PORT: int = int(os.getenv('METRICS_PORT', '8001'))
+# Collecte multi-processus (pool de processus, workers Celery prefork) : dossier
+# partagé par tous les processus du pod, défini avant leur démarrage et vidé à
+# chaque démarrage du pod (emptyDir) ; vide = métriques du seul processus
+PROMETHEUS_MULTIPROC_DIR: Optional[str] = (
+    os.getenv('PROMETHEUS_MULTIPROC_DIR') or os.getenv('prometheus_multiproc_dir') or None
+)
+# Worker Celery dans son propre pod : port de son serveur de métriques (0 = aucun)
+CELERY_METRICS_PORT: int = int(os.getenv('CELERY_METRICS_PORT', '0'))
+
+# Traces par étape (voir `src/tracing.py`) : export OTLP/HTTP JSON vers un
+# collecteur OpenTelemetry (ex. http://localhost:4318) ; vide = pas d'export
+TRACING_OTLP_ENDPOINT: Optional[str] = os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT') or None
+TRACING_SERVICE_NAME: str = os.getenv('OTEL_SERVICE_NAME', 'ocr-greenhub')
+# Intervalle d'envoi des lots de spans (s)
+TRACING_EXPORT_INTERVAL: float = float(os.getenv('TRACING_EXPORT_INTERVAL', '2'))
+
 # Load AWS credentials from Secrets Manager if configured
 if SECRET_NAME:
     try:
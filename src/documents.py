@@ -0,0 +1,213 @@
+# src/documents.py
+
+"""
+Documents PDF ouverts et rendu au DPI demandé - Green Hub.
+
+`DocumentCache` garde un nombre borné de documents PyMuPDF ouverts (LRU), clés
+par empreinte des octets ou par chemin : les pages d'un même document (rendu,
+couche texte, zooms) ne rouvrent plus le fichier à chaque appel ni à chaque
+rerun Streamlit.
+
+Le rendu se fait directement à la résolution voulue : `PageRenderer` produit
+une page (ou une zone) à un zoom relatif à son DPI de base, à partir du
+vectoriel, au lieu d'agrandir un bitmap déjà rendu. C'est le `render_fn` de
+`find_best_zoom`.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Sequence
+
+from PIL import Image
+
+from .config import DOCUMENT_CACHE_HANDLES
+from .extensions import Source, _open_pdf, _pixmap_to_image
+from .observability import CACHE_EVENTS, series
+
+logger = logging.getLogger(__name__)
+
+
+def document_key(source: Source) -> str:
+    """
+    Clé d'un document : SHA-256 des octets, ou chemin, taille et date de
+    modification pour un fichier (blob du spool, déjà adressé par contenu).
+    """
+    if isinstance(source, str):
+        st = os.stat(source)
+        return f"path:{os.path.abspath(source)}:{st.st_size}:{st.st_mtime_ns}"
+    return hashlib.sha256(source).hexdigest()
+
+
+class _Handle:
+    """Document ouvert ; PyMuPDF n'étant pas ré-entrant, un seul utilisateur à la fois."""
+
+    __slots__ = ("doc", "lock", "closed")
+
+    def __init__(self, doc: Any):
+        self.doc = doc
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def close(self) -> None:
+        """
+        Ferme le document, sauf s'il est en cours d'utilisation (éventuellement
+        par le thread courant) : il est alors seulement retiré, et libéré par
+        le ramasse-miettes après usage.
+        """
+        self.closed = True
+        if self.lock.acquire(blocking=False):
+            try:
+                self.doc.close()
+            finally:
+                self.lock.release()
+
+
+class DocumentCache:
+    """
+    LRU de documents PyMuPDF ouverts.
+
+    Args:
+        max_handles: Documents gardés ouverts ; 0 ouvre et ferme à chaque appel.
+    """
+
+    def __init__(self, max_handles: int = DOCUMENT_CACHE_HANDLES):
+        self.max_handles = max_handles
+        self._handles: "OrderedDict[str, _Handle]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _acquire(self, source: Source, key: str) -> _Handle:
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None:
+                self._handles.move_to_end(key)
+        series(CACHE_EVENTS, "documents", "hit" if handle is not None else "miss").inc()
+        if handle is not None:
+            return handle
+
+        # Ouverture hors du verrou global : les autres documents restent accessibles
+        opened = _Handle(_open_pdf(source))
+        evicted: List[_Handle] = []
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                handle = self._handles[key] = opened
+                while len(self._handles) > self.max_handles:
+                    evicted.append(self._handles.popitem(last=False)[1])
+        if handle is not opened:
+            opened.close()
+        for old in evicted:
+            old.close()
+            series(CACHE_EVENTS, "documents", "eviction").inc()
+        return handle
+
+    @contextmanager
+    def document(self, source: Source, key: Optional[str] = None) -> Iterator[Any]:
+        """Document ouvert pour `source`, réservé à l'appelant le temps du bloc."""
+        if self.max_handles <= 0:
+            with _open_pdf(source) as doc:
+                yield doc
+            return
+        key = key or document_key(source)
+        while True:
+            handle = self._acquire(source, key)
+            with handle.lock:
+                # Évincé entre l'acquisition et le verrou : rouvrir
+                if handle.closed:
+                    continue
+                yield handle.doc
+                return
+
+    @contextmanager
+    def page(self, source: Source, index: int, key: Optional[str] = None) -> Iterator[Any]:
+        """Page `index` (à partir de 0) du document."""
+        with self.document(source, key) as doc:
+            yield doc.load_page(index)
+
+    def page_count(self, source: Source, key: Optional[str] = None) -> int:
+        with self.document(source, key) as doc:
+            return doc.page_count
+
+    def render(
+        self,
+        source: Source,
+        index: int,
+        dpi: float = 200,
+        clip: Optional[Sequence[float]] = None,
+        key: Optional[str] = None,
+    ) -> Image.Image:
+        """
+        Rend la page `index` à `dpi` (non entier accepté), éventuellement
+        limitée à `clip` (x0, y0, x1, y1 en points PDF).
+        """
+        import fitz
+
+        scale = dpi / 72.0
+        with self.page(source, index, key) as page:
+            pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=clip)
+        return _pixmap_to_image(pix)
+
+    def close(self) -> None:
+        """Ferme tous les documents ouverts."""
+        with self._lock:
+            handles, self._handles = list(self._handles.values()), OrderedDict()
+        for handle in handles:
+            handle.close()
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+
+class PageRenderer:
+    """
+    Rendu d'une page PDF à un zoom relatif à `dpi` : `renderer(2.0)` rend la
+    page à 2 x `dpi`, `renderer(2.0, clip)` la seule zone `clip` (pixels de la
+    page rendue à `dpi`, comme un `crop` de l'image de base).
+    """
+
+    __slots__ = ("source", "index", "dpi", "key", "cache")
+
+    def __init__(
+        self,
+        source: Source,
+        index: int,
+        dpi: float = 200,
+        key: Optional[str] = None,
+        cache: Optional[DocumentCache] = None,
+    ):
+        self.source = source
+        self.index = index
+        self.dpi = dpi
+        self.key = key or document_key(source)
+        self.cache = cache
+
+    def __call__(self, zoom: float = 1.0, clip: Optional[Sequence[float]] = None) -> Image.Image:
+        points = [v * 72.0 / self.dpi for v in clip] if clip is not None else None
+        cache = self.cache or get_document_cache()
+        return cache.render(self.source, self.index, self.dpi * zoom, clip=points, key=self.key)
+
+
+_cache: Optional[DocumentCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_document_cache() -> DocumentCache:
+    """Retourne le cache de documents du processus (créé à la demande)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DocumentCache()
+    return _cache
+
+
+def set_document_cache(cache: Optional[DocumentCache]) -> None:
+    """Remplace le cache du processus (None = recréer à la demande)."""
+    global _cache
+    with _cache_lock:
+        previous, _cache = _cache, cache
+    if previous is not None and previous is not cache:
+        previous.close()
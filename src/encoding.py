@@ -0,0 +1,164 @@
+# src/encoding.py
+
+"""
+Encodage adaptatif des images envoyées à Textract - Green Hub.
+
+Plutôt qu'un PNG RVB sans perte (souvent agrandi 2x), chaque image est
+encodée au format le moins coûteux qui reste lisible et sous la limite
+synchrone d'AnalyzeDocument :
+1. Classification : bitonale (texte noir sur fond clair), niveaux de gris ou couleur
+2. Résolution : réduction si le texte dépasse nettement la hauteur visée
+   (TEXTRACT_TEXT_HEIGHT) ou si l'image dépasse TEXTRACT_MAX_SIDE
+3. Format : PNG 1 bit (bitonale), PNG gris ou palette, JPEG ; le plus petit
+   candidat sous TEXTRACT_MAX_BYTES est retenu, puis JPEG dégradé et
+   réductions successives tant que le texte reste au-dessus de MIN_TEXT_HEIGHT
+
+La taille envoyée et la durée d'encodage sont exposées en métriques.
+"""
+
+import io
+import logging
+import time
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .config import TEXTRACT_MAX_BYTES, TEXTRACT_MAX_SIDE, TEXTRACT_TEXT_HEIGHT
+from .observability import TEXTRACT_ENCODE_SECONDS, TEXTRACT_PAYLOAD_BYTES
+from .ocr import estimate_text_height
+
+logger = logging.getLogger(__name__)
+
+# Hauteur de texte (px) en dessous de laquelle on ne réduit plus l'image
+MIN_TEXT_HEIGHT = 14.0
+# Écart max entre canaux (99e centile) pour considérer l'image en niveaux de gris
+GRAY_TOLERANCE = 12
+# Part max de tons moyens (64-192) pour considérer l'image bitonale
+BILEVEL_MAX_MIDTONES = 0.02
+# Qualités JPEG : la première est mise en concurrence avec le PNG, les
+# suivantes ne servent que si rien ne tient dans la limite
+JPEG_LADDER = (85, 70, 55)
+PALETTE_COLORS = 64
+# Réduction appliquée à chaque tour quand aucun encodage ne tient
+DOWNSCALE_STEP = 0.75
+
+
+@dataclass
+class EncodedImage:
+    """Image encodée pour Textract."""
+
+    data: bytes
+    format: str
+    size: Tuple[int, int]
+    scale: float = 1.0
+
+
+def classify(img: Image.Image) -> str:
+    """'bilevel', 'gray' ou 'color' (couleur testée sur une vignette)."""
+    if img.mode not in ("1", "L"):
+        thumb = img.convert("RGB")
+        thumb.thumbnail((256, 256))
+        arr = np.asarray(thumb, dtype=np.int16)
+        spread = arr.max(axis=2) - arr.min(axis=2)
+        if np.percentile(spread, 99) > GRAY_TOLERANCE:
+            return "color"
+    hist = img.convert("L").histogram()
+    midtones = sum(hist[64:192]) / max(1, sum(hist))
+    return "bilevel" if midtones <= BILEVEL_MAX_MIDTONES else "gray"
+
+
+def _to_bilevel(gray: Image.Image) -> Image.Image:
+    arr = np.asarray(gray)
+    thr, _ = cv2.threshold(arr, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return Image.fromarray(arr > thr)
+
+
+def _save(img: Image.Image, fmt: str, **params) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **params)
+    return buf.getvalue()
+
+
+def _lossless(img: Image.Image, kind: str) -> Tuple[str, bytes]:
+    if kind == "bilevel":
+        return "png-1bit", _save(_to_bilevel(img), "PNG")
+    if kind == "gray":
+        return "png-gray", _save(img, "PNG")
+    palette = img.quantize(colors=PALETTE_COLORS, method=Image.Quantize.FASTOCTREE)
+    return "png-palette", _save(palette, "PNG")
+
+
+def _candidates(img: Image.Image, kind: str) -> Iterator[Tuple[str, bytes]]:
+    """Encodages par ordre de préférence (produits à la demande)."""
+    fmt, data = _lossless(img, kind)
+    if kind == "bilevel":
+        # Le JPEG dégrade les bords nets sans gain notable sur du 1 bit
+        yield fmt, data
+        return
+    for i, quality in enumerate(JPEG_LADDER):
+        jpeg = _save(img, "JPEG", quality=quality, optimize=True)
+        if i == 0:
+            # Sans perte ou JPEG de bonne qualité : le plus petit des deux
+            yield min((fmt, data), ("jpeg", jpeg), key=lambda c: len(c[1]))
+        else:
+            yield "jpeg", jpeg
+
+
+def _resize(img: Image.Image, scale: float) -> Image.Image:
+    if scale >= 1.0:
+        return img
+    w, h = img.size
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return img.resize(size, Image.LANCZOS)
+
+
+def encode_for_textract(
+    img: Image.Image,
+    max_bytes: int = TEXTRACT_MAX_BYTES,
+    max_side: int = TEXTRACT_MAX_SIDE,
+    text_height: Optional[float] = TEXTRACT_TEXT_HEIGHT,
+) -> EncodedImage:
+    """
+    Encode `img` pour AnalyzeDocument.
+
+    Args:
+        img: Image source (tout mode PIL).
+        max_bytes: Taille maximale de la charge.
+        max_side: Plus grand côté autorisé (px).
+        text_height: Hauteur de texte visée ; None désactive la réduction
+            préalable (seules les limites de taille s'appliquent).
+
+    Raises:
+        ValueError: aucun encodage ne tient dans `max_bytes` sans rendre le
+            texte illisible.
+    """
+    t0 = time.perf_counter()
+    kind = classify(img)
+    work = img.convert("RGB" if kind == "color" else "L")
+
+    scale = min(1.0, max_side / max(work.size))
+    height, _ = estimate_text_height(work)
+    if height is not None and text_height and height * scale > text_height * 1.5:
+        # Texte nettement plus grand que nécessaire (ex: image agrandie 2x)
+        scale = text_height / height
+    min_scale = min(scale, MIN_TEXT_HEIGHT / height) if height else min(scale, 0.25)
+
+    while True:
+        scaled = _resize(work, scale)
+        for fmt, data in _candidates(scaled, kind):
+            if len(data) <= max_bytes:
+                elapsed = time.perf_counter() - t0
+                TEXTRACT_ENCODE_SECONDS.observe(elapsed)
+                TEXTRACT_PAYLOAD_BYTES.labels(fmt).observe(len(data))
+                logger.debug("Image Textract : %s %sx%s, %s octets (échelle %.2f, %.0f ms)",
+                             fmt, scaled.size[0], scaled.size[1], len(data), scale, elapsed * 1000)
+                return EncodedImage(data, fmt, scaled.size, scale)
+        if scale * DOWNSCALE_STEP < min_scale:
+            TEXTRACT_ENCODE_SECONDS.observe(time.perf_counter() - t0)
+            raise ValueError(
+                f"Image trop volumineuse pour Textract ({len(data)} octets > {max_bytes})"
+            )
+        scale *= DOWNSCALE_STEP
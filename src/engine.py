@@ -0,0 +1,204 @@
+# src/engine.py
+
+"""
+Moteurs Tesseract pour OCR - Green Hub.
+
+- `NativeEnginePool` : poignées `tesserocr.PyTessBaseAPI` persistantes, une par
+  thread et par couple (langue, psm), modèles déjà chargés. L'image est passée
+  en mémoire et les boîtes de mots sont lues directement via l'itérateur.
+- `SubprocessEngine` : repli sur pytesseract (fichier temporaire + processus
+  `tesseract` à chaque appel) quand la liaison native est absente.
+
+Les deux renvoient des `WordBoxes` (colonnes NumPy, voir `src.wordboxes`)
+sans filtre de confiance ; les erreurs sont propagées à l'appelant.
+"""
+
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+from .config import OCR_ENGINE, TESSDATA_PREFIX
+from .wordboxes import OCR_COLUMNS, WordBoxes  # noqa: F401 (réexport)
+
+logger = logging.getLogger(__name__)
+
+
+def words_from_data(data: Dict[str, List[Any]]) -> WordBoxes:
+    """
+    Convertit la sortie `image_to_data(..., output_type=Output.DICT)` en
+    `WordBoxes`, sans passer par un DataFrame. Les lignes de structure (page,
+    bloc, paragraphe : texte vide) sont ignorées ; les lignes sont numérotées
+    par (bloc, paragraphe, ligne) dans l'ordre de lecture.
+    """
+    keep = [i for i, t in enumerate(data["text"]) if str(t).strip()]
+
+    def col(name: str) -> np.ndarray:
+        values = data[name]
+        return np.asarray([values[i] for i in keep], dtype=np.int32)
+
+    x1, y1 = col("left"), col("top")
+    block = col("block_num")
+    line_ids: Dict[Tuple[int, int, int], int] = {}
+    keys = zip(block.tolist(), col("par_num").tolist(), col("line_num").tolist())
+    return WordBoxes(
+        x1, y1, x1 + col("width"), y1 + col("height"),
+        text=[str(data["text"][i]) for i in keep],
+        conf=np.asarray([float(data["conf"][i]) for i in keep], dtype=np.float32),
+        block=block,
+        line=[line_ids.setdefault(k, len(line_ids)) for k in keys],
+    )
+
+
+class SubprocessEngine:
+    """OCR via pytesseract : un processus `tesseract` par appel."""
+
+    name = "subprocess"
+
+    def recognize(self, img: Image.Image, lang: str, psm: int) -> WordBoxes:
+        cfg = f"--oem 1 --psm {psm}"
+        data = pytesseract.image_to_data(
+            img,
+            lang=lang,
+            config=cfg,
+            output_type=pytesseract.Output.DICT
+        )
+        return words_from_data(data)
+
+    def close(self) -> None:
+        pass
+
+
+class NativeEnginePool:
+    """
+    Pool de poignées Tesseract natives (tesserocr), une par thread de travail.
+
+    Chaque thread garde ses propres API initialisées par (lang, psm) : une API
+    Tesseract n'est pas ré-entrante, mais la réutiliser évite de recharger les
+    traineddata à chaque passe.
+    """
+
+    name = "native"
+
+    def __init__(self, tesserocr_module: Any, tessdata: Optional[str] = None):
+        self._tr = tesserocr_module
+        self._tessdata = tessdata
+        self._local = threading.local()
+        self._all: List[Any] = []
+        self._lock = threading.Lock()
+
+    def _api(self, lang: str, psm: int) -> Any:
+        apis: Optional[Dict[Tuple[str, int], Any]] = getattr(self._local, "apis", None)
+        if apis is None:
+            apis = self._local.apis = {}
+        api = apis.get((lang, psm))
+        if api is None:
+            kwargs: Dict[str, Any] = {
+                "lang": lang,
+                "psm": psm,
+                "oem": self._tr.OEM.LSTM_ONLY,
+            }
+            if self._tessdata:
+                kwargs["path"] = self._tessdata
+            api = self._tr.PyTessBaseAPI(**kwargs)
+            apis[(lang, psm)] = api
+            with self._lock:
+                self._all.append(api)
+            logger.info("Poignée Tesseract initialisée (lang=%s, psm=%s, thread=%s)",
+                        lang, psm, threading.current_thread().name)
+        return api
+
+    def warmup(self, lang: str, psm: int) -> None:
+        """Charge les modèles pour le thread courant sans lancer d'OCR."""
+        self._api(lang, psm)
+
+    def recognize(self, img: Image.Image, lang: str, psm: int) -> WordBoxes:
+        api = self._api(lang, psm)
+        RIL = self._tr.RIL
+        ril = RIL.WORD
+        api.SetImage(img)
+        api.Recognize()
+        boxes: List[Tuple[int, int, int, int]] = []
+        texts: List[str] = []
+        confs: List[float] = []
+        blocks: List[int] = []
+        lines: List[int] = []
+        block = line = -1
+        iterator = api.GetIterator()
+        if iterator is not None:
+            for word in self._tr.iterate_level(iterator, ril):
+                # Numérotation avant les filtres : un mot ignoré peut ouvrir une ligne
+                if word.IsAtBeginningOf(RIL.BLOCK):
+                    block += 1
+                if word.IsAtBeginningOf(RIL.TEXTLINE):
+                    line += 1
+                text = word.GetUTF8Text(ril)
+                if text is None:
+                    continue
+                box = word.BoundingBox(ril)
+                if box is None:
+                    continue
+                boxes.append(box)
+                texts.append(text)
+                confs.append(word.Confidence(ril))
+                blocks.append(max(block, 0))
+                lines.append(max(line, 0))
+        api.Clear()
+        coords = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        return WordBoxes(
+            coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3],
+            text=texts, conf=confs, block=blocks, line=lines,
+        )
+
+    def close(self) -> None:
+        """Libère toutes les poignées créées par le pool."""
+        with self._lock:
+            apis, self._all = self._all, []
+        for api in apis:
+            try:
+                api.End()
+            except Exception:
+                logger.warning("Fermeture d'une poignée Tesseract impossible", exc_info=True)
+        self._local = threading.local()
+
+
+def build_engine(kind: str = "auto") -> Any:
+    """
+    Construit le moteur demandé : 'native', 'subprocess' ou 'auto'
+    (natif si tesserocr est importable, sinon pytesseract).
+    """
+    if kind in ("auto", "native"):
+        try:
+            import tesserocr
+            return NativeEnginePool(tesserocr, TESSDATA_PREFIX)
+        except ImportError:
+            if kind == "native":
+                logger.warning("tesserocr absent, repli sur pytesseract")
+    return SubprocessEngine()
+
+
+_engine: Optional[Any] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Any:
+    """Retourne le moteur Tesseract du processus (créé à la demande)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = build_engine(OCR_ENGINE)
+                logger.info("Moteur Tesseract : %s", _engine.name)
+    return _engine
+
+
+def set_engine(engine: Optional[Any]) -> None:
+    """Remplace le moteur du processus (None = reconstruire à la demande)."""
+    global _engine
+    with _engine_lock:
+        previous, _engine = _engine, engine
+    if previous is not None and previous is not engine:
+        previous.close()
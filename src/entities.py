@@ -0,0 +1,348 @@
+# src/entities.py
+
+"""
+Extraction d'entités sur le flux de mots OCR - Green Hub.
+
+`EntityExtractor` compile une fois pour toutes :
+- les motifs (numéro de facture, date, montant, IBAN, n° de TVA), réunis en
+  une seule expression régulière à groupes nommés ;
+- les dictionnaires (fournisseurs... jusqu'à des centaines de milliers de
+  termes), dans un automate Aho-Corasick (flashtext), dont le temps de
+  recherche ne dépend pas de la taille du dictionnaire.
+
+Une page (`WordBoxes`) est parcourue une fois par chacun des deux moteurs, sur
+son texte reconstitué ligne par ligne ; chaque correspondance est ramenée aux
+mots qu'elle couvre : l'entité porte la page, la boîte englobante (px) et la
+confiance de son mot le plus faible.
+
+Les identifiants connus (IBAN, TVA d'un référentiel fournisseurs) ne passent
+pas par l'automate : l'OCR les découpe au hasard des espaces. Ils sont
+reconnus par leur motif puis cherchés, sous forme compacte, dans une table.
+"""
+
+import csv
+import logging
+import re
+import threading
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from datetime import date
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union,
+)
+
+import numpy as np
+from flashtext import KeywordProcessor
+
+from .config import ENTITY_DICTIONARY_PATH
+from .observability import ENTITY_MATCHES, series
+from .wordboxes import WordBoxes
+
+logger = logging.getLogger(__name__)
+
+DATE_PATTERN = r"(?:\d{2}[./-]\d{2}[./-]\d{4}|\d{4}[./-]\d{2}[./-]\d{2})"
+# Montant en euros : 1 234,56 € / 1.234,56 EUR / 1234.56 € (le symbole n'est
+# pas un caractère de mot : pas de \b après lui)
+AMOUNT_PATTERN = (r"(?<![\d.,])(?:\d{1,3}(?:[ \u00A0.]\d{3})+|\d+)(?:[.,]\d{2})?"
+                  r"[ \u00A0]?(?:€|EUR\b)")
+# Numéro de facture : préfixe usuel, sans égard à la casse (F1234-56789,
+# f1234-56789, FAC-2024-00042, INV-12345...) ou valeur annoncée
+# (« Facture n° 2024/117 »), seule retenue dans ce cas
+INVOICE_NUMBER_PATTERN = (
+    r"\b(?i:FACT?|FA|F|INV)[-/]?\d{4,}(?:[-/]\d{2,})*\b"
+    r"|(?:[Ff]acture|FACTURE|[Ii]nvoice|INVOICE)\s*(?:[Nn]°|[Nn]o\.?|[Nn]uméro|#)\s*:?\s*"
+    r"(?P<invoice_number__value>[A-Z0-9][A-Z0-9/-]{2,}\b)"
+)
+IBAN_PATTERN = r"\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){3,7}(?: ?[A-Z0-9]{1,3})?\b"
+VAT_PATTERN = (r"\b(?:FR ?[0-9A-HJ-NP-Z]{2} ?\d{3} ?\d{3} ?\d{3}|ATU\d{8}|BE ?0?\d{9}|DE ?\d{9}"
+               r"|ES ?[A-Z0-9]\d{7}[A-Z0-9]|IT ?\d{11}|LU ?\d{8}|NL ?\d{9}B\d{2})\b")
+
+DEFAULT_PATTERNS: Dict[str, str] = {
+    "invoice_number": INVOICE_NUMBER_PATTERN,
+    "vat_id": VAT_PATTERN,
+    "iban": IBAN_PATTERN,
+    "date": DATE_PATTERN,
+    "amount": AMOUNT_PATTERN,
+}
+
+# Lettres accentuées : intérieures aux mots pour l'automate (« Société »)
+_WORD_CHARS = "àâäáçéèêëîïíôöóùûüúÿœæñ"
+_WORD_CHARS += _WORD_CHARS.upper()
+
+
+def _compact(text: str) -> str:
+    return re.sub(r"\s+", "", text).upper()
+
+
+def _valid_iban(text: str) -> bool:
+    """Clé de contrôle ISO 13616 (mod 97)."""
+    iban = _compact(text)
+    if not 15 <= len(iban) <= 34:
+        return False
+    digits = "".join(str(int(c, 36)) for c in iban[4:] + iban[:4])
+    return int(digits) % 97 == 1
+
+
+def _valid_vat(text: str) -> bool:
+    """Clé des numéros français (SIREN) ; format seul pour les autres pays."""
+    vat = _compact(text)
+    if vat.startswith("FR") and vat[2:4].isdigit():
+        return int(vat[2:4]) == (12 + 3 * (int(vat[4:]) % 97)) % 97
+    return True
+
+
+def _valid_date(text: str) -> bool:
+    """Date du calendrier (31/02 refusé), comme `normalize_date`."""
+    parts = re.split(r"[./-]", text)
+    if len(parts[0]) != 4:
+        parts.reverse()
+    year, month, day = (int(p) for p in parts)
+    try:
+        date(year, month, day)
+    except ValueError:
+        return False
+    return True
+
+
+DEFAULT_VALIDATORS: Dict[str, Callable[[str], bool]] = {
+    "iban": _valid_iban,
+    "vat_id": _valid_vat,
+    "date": _valid_date,
+}
+# Forme canonique des identifiants (valeur de l'entité, clé de recherche)
+DEFAULT_NORMALIZERS: Dict[str, Callable[[str], str]] = {
+    "iban": _compact,
+    "vat_id": _compact,
+}
+
+
+@dataclass
+class Entity:
+    """
+    Entité reconnue.
+
+    Attributes:
+        label: Type ('invoice_number', 'date', 'amount', 'iban', 'vat_id',
+            ou le nom d'un dictionnaire, ex: 'supplier').
+        text: Texte reconnu, tel que lu.
+        value: Forme canonique (identifiant compact, terme du dictionnaire).
+        ref: Référence associée dans un dictionnaire (ex: code fournisseur).
+        page: Page (None pour un texte seul).
+        x1, y1, x2, y2: Boîte englobante des mots couverts (px).
+        conf: Confiance du mot le plus faible (0-100).
+    """
+
+    label: str
+    text: str
+    value: str
+    ref: Optional[str] = None
+    page: Optional[int] = None
+    x1: Optional[int] = None
+    y1: Optional[int] = None
+    x2: Optional[int] = None
+    y2: Optional[int] = None
+    conf: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _line_breaks(words: WordBoxes) -> np.ndarray:
+    """
+    Début de ligne de chaque mot. Sans identifiants de ligne (mots relus d'un
+    résultat de page), un mot commence une ligne quand il repart vers la
+    gauche ou que son centre sort de la hauteur du mot précédent.
+    """
+    breaks = np.zeros(len(words), dtype=bool)
+    if len(words) < 2:
+        return breaks
+    if words.line.any() or words.block.any():
+        breaks[1:] = (words.block[1:] != words.block[:-1]) | (words.line[1:] != words.line[:-1])
+    else:
+        center = (words.y1[1:] + words.y2[1:]) // 2
+        breaks[1:] = ((words.x1[1:] < words.x1[:-1])
+                      | (center > words.y2[:-1]) | (center < words.y1[:-1]))
+    return breaks
+
+
+class EntityExtractor:
+    """
+    Motifs et dictionnaires compilés une fois, partagés par toutes les pages.
+
+    Args:
+        patterns: Motifs par type (par défaut DEFAULT_PATTERNS). Un groupe
+            nommé `<type>__value` restreint l'entité à cette partie du motif.
+        validators: Contrôles par type (clé IBAN, date plausible...).
+        normalizers: Forme canonique par type (par défaut identifiants compacts).
+        case_sensitive: Casse prise en compte par les dictionnaires.
+    """
+
+    def __init__(
+        self,
+        patterns: Optional[Mapping[str, str]] = None,
+        validators: Optional[Mapping[str, Callable[[str], bool]]] = None,
+        normalizers: Optional[Mapping[str, Callable[[str], str]]] = None,
+        case_sensitive: bool = False,
+    ):
+        self.patterns = dict(DEFAULT_PATTERNS if patterns is None else patterns)
+        self.validators = dict(DEFAULT_VALIDATORS if validators is None else validators)
+        self.normalizers = dict(DEFAULT_NORMALIZERS if normalizers is None else normalizers)
+        # Ordre des alternatives : à position égale, le premier type l'emporte
+        self._regex = re.compile("|".join(
+            f"(?P<{label}>{pattern})" for label, pattern in self.patterns.items()
+        )) if self.patterns else None
+        self._keywords = KeywordProcessor(case_sensitive=case_sensitive)
+        for char in _WORD_CHARS:
+            self._keywords.add_non_word_boundary(char)
+        self._lookups: Dict[str, Dict[str, Optional[str]]] = {}
+        self.terms = 0
+
+    # ----------- Dictionnaires -----------
+
+    def add_dictionary(
+        self, label: str, entries: Union[Mapping[str, Optional[str]], Iterable[str]]
+    ) -> None:
+        """
+        Ajoute des termes au type `label`, avec leur référence éventuelle
+        ({terme: référence} ou liste de termes). Pour un type à motif (IBAN,
+        TVA), les termes alimentent la table des identifiants connus.
+        """
+        items = entries.items() if isinstance(entries, Mapping) else ((e, None) for e in entries)
+        if label in self.patterns:
+            normalize = self.normalizers.get(label, str)
+            table = self._lookups.setdefault(label, {})
+            for term, ref in items:
+                table[normalize(term)] = ref
+                self.terms += 1
+            return
+        for term, ref in items:
+            self._keywords.add_keyword(term, (label, term, ref))
+            self.terms += 1
+
+    # ----------- Recherche -----------
+
+    def _matches(self, text: str) -> Iterator[Tuple[str, int, int, str, Optional[str]]]:
+        """(type, début, fin, valeur, référence) de chaque entité de `text`."""
+        if self._regex is not None:
+            for m in self._regex.finditer(text):
+                label = m.lastgroup
+                start, end = m.span(label)
+                inner = f"{label}__value"
+                if inner in self._regex.groupindex and m.group(inner) is not None:
+                    start, end = m.span(inner)
+                found = text[start:end]
+                check = self.validators.get(label)
+                if check is not None and not check(found):
+                    continue
+                value = self.normalizers.get(label, str)(found)
+                table = self._lookups.get(label)
+                yield label, start, end, value, table.get(value) if table else None
+        if len(self._keywords):
+            for (label, term, ref), start, end in self._keywords.extract_keywords(text, span_info=True):
+                yield label, start, end, term, ref
+
+    def extract_text(self, text: str) -> List[Entity]:
+        """Entités d'un texte brut, sans position."""
+        return [Entity(label, text[s:e], value, ref)
+                for label, s, e, value, ref in sorted(self._matches(text), key=lambda m: m[1])]
+
+    def extract(self, words: WordBoxes, page: Optional[int] = None) -> List[Entity]:
+        """
+        Entités d'une page, dans l'ordre de lecture, avec leurs boîtes.
+
+        Args:
+            words: Mots de la page (ordre de lecture de l'OCR).
+            page: Numéro de page ; par défaut la colonne `page` des mots.
+        """
+        n = len(words)
+        if not n:
+            return []
+        texts = words.text.tolist()
+        breaks = _line_breaks(words)
+        text = "".join(("\n" if b else " ") + t for b, t in zip(breaks.tolist(), texts))[1:]
+        # Début de chaque mot dans `text` (séparateurs d'un caractère)
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=n)
+        starts = np.zeros(n, dtype=np.int64)
+        np.cumsum(lengths[:-1] + 1, out=starts[1:])
+        pages = words.page
+        out: List[Entity] = []
+        for label, s, e, value, ref in sorted(self._matches(text), key=lambda m: m[1]):
+            i0 = int(np.searchsorted(starts, s, side="right")) - 1
+            i1 = int(np.searchsorted(starts, e - 1, side="right"))
+            out.append(Entity(
+                label, text[s:e], value, ref,
+                page=int(pages[i0]) if page is None else page,
+                x1=int(words.x1[i0:i1].min()), y1=int(words.y1[i0:i1].min()),
+                x2=int(words.x2[i0:i1].max()), y2=int(words.y2[i0:i1].max()),
+                conf=round(float(words.conf[i0:i1].min()), 1),
+            ))
+            series(ENTITY_MATCHES, label).inc()
+        return out
+
+    def extract_pages(self, pages: Iterable[WordBoxes]) -> List[Entity]:
+        """Entités d'un document ; chaque page garde son numéro (colonne `page`)."""
+        return [entity for words in pages for entity in self.extract(words)]
+
+    def iter_documents(self, documents: Iterable[Iterable[WordBoxes]]) -> Iterator[List[Entity]]:
+        """Entités de chaque document d'un lot, au fil de l'eau."""
+        for pages in documents:
+            yield self.extract_pages(pages)
+
+    def extract_many(self, documents: Iterable[Iterable[WordBoxes]]) -> List[List[Entity]]:
+        return list(self.iter_documents(documents))
+
+
+def summarize(entities: Sequence[Entity]) -> Dict[str, Any]:
+    """
+    Résumé au format historique : premier numéro de facture, puis listes des
+    textes par type ('dates', 'amounts', 'ibans', 'vat_ids', 'suppliers'...).
+    """
+    out: Dict[str, Any] = {"invoice_number": None, "dates": [], "amounts": []}
+    for entity in entities:
+        if entity.label == "invoice_number":
+            out["invoice_number"] = out["invoice_number"] or entity.text
+        else:
+            out.setdefault(f"{entity.label}s", []).append(entity.text)
+    return out
+
+
+def load_dictionary_csv(extractor: EntityExtractor, path: str) -> int:
+    """
+    Charge un référentiel CSV `label,term,ref` (ex: supplier,ACME SAS,F0042 ;
+    iban,FR76 3000...,F0042) dans `extractor`. Renvoie le nombre de termes.
+    """
+    grouped: Dict[str, Dict[str, Optional[str]]] = defaultdict(dict)
+    with open(path, newline="", encoding="utf-8") as fh:
+        for row in csv.reader(fh):
+            if len(row) < 2 or not row[1].strip() or row[0].startswith("#"):
+                continue
+            grouped[row[0].strip()][row[1].strip()] = (row[2].strip() or None) if len(row) > 2 else None
+    for label, entries in grouped.items():
+        extractor.add_dictionary(label, entries)
+    return sum(len(entries) for entries in grouped.values())
+
+
+_extractor: Optional[EntityExtractor] = None
+_extractor_lock = threading.Lock()
+
+
+def get_entity_extractor() -> EntityExtractor:
+    """Extracteur du processus, avec le référentiel ENTITY_DICTIONARY_PATH s'il est défini."""
+    global _extractor
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                extractor = EntityExtractor()
+                if ENTITY_DICTIONARY_PATH:
+                    count = load_dictionary_csv(extractor, ENTITY_DICTIONARY_PATH)
+                    logger.info("Référentiel d'entités chargé : %s termes (%s)", count,
+                                ENTITY_DICTIONARY_PATH)
+                _extractor = extractor
+    return _extractor
+
+
+def set_entity_extractor(extractor: Optional[EntityExtractor]) -> None:
+    """Remplace l'extracteur du processus (tests, référentiel rechargé)."""
+    global _extractor
+    with _extractor_lock:
+        _extractor = extractor
@@ -0,0 +1,265 @@
+# src/executor.py
+
+"""
+Exécuteur OCR global pour OCR - Green Hub.
+
+Un seul pool par processus, dimensionné par un budget CPU (OCR_CPU_BUDGET),
+partagé par la recherche de zoom, le traitement des pages, l'onglet batch et
+les tâches Celery. Le nombre de threads natifs par tâche (OpenMP de Tesseract,
+OpenCV) est borné pour que `workers x threads_par_tâche` tienne dans le budget.
+
+Les soumissions faites depuis un worker du pool s'exécutent en ligne, ce qui
+évite l'interblocage quand une tâche (ex: une page) soumet elle-même des
+sous-tâches (ex: les zooms).
+"""
+
+import contextvars
+import logging
+import multiprocessing.util
+import os
+import pickle
+import threading
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .config import OCR_CPU_BUDGET, OCR_EXECUTOR_MODE, OCR_THREADS_PER_TASK
+from .observability import (
+    EXECUTOR_BUSY, EXECUTOR_QUEUE_DEPTH, EXECUTOR_TASKS, EXECUTOR_WORKERS, mark_process_dead, series,
+)
+
+logger = logging.getLogger(__name__)
+
+_worker_state = threading.local()
+
+
+def limit_native_threads(threads: int) -> None:
+    """
+    Borne les threads natifs du processus courant : OpenMP (Tesseract lit
+    OMP_THREAD_LIMIT au lancement, y compris via pytesseract) et OpenCV.
+    Une valeur déjà fixée dans l'environnement est respectée.
+    """
+    os.environ.setdefault("OMP_THREAD_LIMIT", str(threads))
+    cv2.setNumThreads(threads)
+
+
+def _init_process_worker(threads: int) -> None:
+    limit_native_threads(threads)
+    _worker_state.inside = True
+    # Un processus du pool se termine par os._exit (atexit ignoré) : seuls les
+    # finaliseurs de multiprocessing s'exécutent
+    multiprocessing.util.Finalize(None, mark_process_dead, args=(os.getpid(),), exitpriority=0)
+
+
+def _mark_worker_thread() -> None:
+    _worker_state.inside = True
+
+
+def in_worker() -> bool:
+    """Vrai si le code courant s'exécute dans un worker de l'exécuteur OCR."""
+    return getattr(_worker_state, "inside", False)
+
+
+class OCRExecutor:
+    """
+    Pool d'exécution OCR borné par un budget CPU.
+
+    Args:
+        cpu_budget: Nombre de cœurs alloués à l'OCR dans ce processus.
+        mode: 'thread' (défaut) ou 'process'. En mode processus, les fonctions
+            non sérialisables (lambdas, closures) s'exécutent dans le thread
+            appelant.
+        threads_per_task: Threads natifs autorisés par tâche.
+    """
+
+    def __init__(self, cpu_budget: int, mode: str = "thread", threads_per_task: int = 1):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Mode d'exécuteur inconnu : {mode}")
+        self.threads_per_task = max(1, threads_per_task)
+        self.workers = max(1, cpu_budget // self.threads_per_task)
+        self.mode = mode
+        self._inflight = 0
+        self._lock = threading.Lock()
+        limit_native_threads(self.threads_per_task)
+        if mode == "process":
+            self._pool: Executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_process_worker,
+                initargs=(self.threads_per_task,),
+            )
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="ocr",
+                initializer=_mark_worker_thread,
+            )
+        EXECUTOR_WORKERS.set(self.workers)
+        logger.info("Exécuteur OCR : %s workers (%s), %s thread(s) natif(s) par tâche",
+                    self.workers, mode, self.threads_per_task)
+
+    # ----------- Suivi de charge -----------
+
+    def _publish(self) -> None:
+        busy = min(self._inflight, self.workers)
+        EXECUTOR_BUSY.set(busy)
+        EXECUTOR_QUEUE_DEPTH.set(self._inflight - busy)
+
+    def _started(self) -> None:
+        with self._lock:
+            self._inflight += 1
+            self._publish()
+
+    def _finished(self, future: Future) -> None:
+        with self._lock:
+            self._inflight -= 1
+            self._publish()
+        series(EXECUTOR_TASKS, "error" if future.exception() else "ok").inc()
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._inflight - self.workers)
+
+    @property
+    def utilisation(self) -> float:
+        return min(self._inflight, self.workers) / self.workers
+
+    # ----------- Soumission -----------
+
+    def _run_inline(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+
+    # Arguments toujours sérialisables : pas de pickle d'essai (pages, tableaux)
+    _PLAIN = (Image.Image, np.ndarray, bytes, str, int, float, bool, type(None))
+
+    def _picklable(self, fn: Callable[..., Any], args: tuple = (), kwargs: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Vérifie que `fn` et ses arguments passent vers un processus : un
+        document ouvert ou une lambda dans les arguments échouerait sinon plus
+        tard, au `.result()`.
+        """
+        pending = [fn, *args, *(kwargs or {}).values()]
+        while pending:
+            obj = pending.pop()
+            if isinstance(obj, self._PLAIN):
+                continue
+            if isinstance(obj, (list, tuple)):
+                pending.extend(obj)
+                continue
+            try:
+                pickle.dumps(obj)
+            except Exception:
+                return False
+        return True
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Soumet `fn(*args, **kwargs)` au pool et renvoie un Future."""
+        if in_worker():
+            return self._run_inline(fn, *args, **kwargs)
+        if self.mode == "process" and not self._picklable(fn, args, kwargs):
+            logger.debug("Tâche non sérialisable, exécution en ligne : %r", fn)
+            return self._run_inline(fn, *args, **kwargs)
+        self._started()
+        try:
+            if self.mode == "process":
+                future = self._pool.submit(fn, *args, **kwargs)
+            else:
+                # Requête et span courantes suivent la tâche (voir `src.tracing`)
+                future = self._pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self._inflight -= 1
+                self._publish()
+            raise
+        future.add_done_callback(self._finished)
+        return future
+
+    def map(self, fn: Callable[..., Any], *iterables: Iterable[Any]) -> List[Future]:
+        """Soumet `fn` pour chaque jeu d'arguments ; renvoie les Futures dans l'ordre."""
+        return [self.submit(fn, *args) for args in zip(*iterables)]
+
+    def iter_completed(
+        self,
+        fn: Callable[..., Any],
+        items: Iterable[Any],
+        max_pending: Optional[int] = None,
+    ) -> Iterator[Tuple[Any, Future]]:
+        """
+        Applique `fn(item)` à chaque élément en gardant au plus `max_pending`
+        tâches en vol (par défaut 2 x workers) et produit les couples
+        (item, future) dans l'ordre de complétion. `items` est consommé au fil
+        de l'eau : un générateur de pages ou de fichiers n'est jamais matérialisé.
+        """
+        limit = max_pending or self.workers * 2
+        pending: Dict[Future, Any] = {}
+        for item in items:
+            pending[self.submit(fn, item)] = item
+            if len(pending) >= limit:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+
+_executor: Optional[OCRExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> OCRExecutor:
+    """Retourne l'exécuteur OCR du processus (créé à la demande)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = OCRExecutor(OCR_CPU_BUDGET, OCR_EXECUTOR_MODE, OCR_THREADS_PER_TASK)
+    return _executor
+
+
+def configure_executor(
+    cpu_budget: Optional[int] = None,
+    mode: Optional[str] = None,
+    threads_per_task: Optional[int] = None,
+) -> OCRExecutor:
+    """Remplace l'exécuteur du processus (les tâches en cours se terminent)."""
+    global _executor
+    with _executor_lock:
+        previous = _executor
+        _executor = OCRExecutor(
+            cpu_budget or OCR_CPU_BUDGET,
+            mode or OCR_EXECUTOR_MODE,
+            threads_per_task or OCR_THREADS_PER_TASK,
+        )
+    if previous is not None:
+        previous.shutdown(wait=False)
+    return _executor
+
+
+def _reset_after_fork() -> None:
+    # Les threads du pool ne survivent pas à un fork (workers Celery prefork)
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
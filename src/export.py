@@ -0,0 +1,163 @@
+# src/export.py
+
+"""
+Exports ZIP des résultats de lot pour OCR - Green Hub.
+
+Chaque export est un fichier ZIP sur disque (EXPORT_DIR) alimenté au fil de
+l'eau : une entrée CSV (et/ou JSON) est écrite dès qu'un résultat est
+disponible, en flux, sans construire l'archive en mémoire. L'archive n'est
+visible sous son nom définitif qu'une fois fermée ; elle est ensuite servie
+telle quelle (bouton de téléchargement Streamlit ou GET /exports/{id}).
+
+Les exports plus anciens que EXPORT_TTL_SECONDS sont purgés à chaque ouverture.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import re
+import time
+import uuid
+import zipfile
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .config import EXPORT_DIR, EXPORT_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_EXPORT_ID = re.compile(r"^[0-9a-f]{32}$")
+_UNSAFE_CHARS = re.compile(r"[^\w.\-]+")
+
+
+def _entry_stem(name: str) -> str:
+    stem = _UNSAFE_CHARS.sub("_", os.path.basename(name)).strip("._")
+    return stem or "document"
+
+
+class ZipExport:
+    """
+    Archive ZIP écrite incrémentalement sur disque.
+
+    Args:
+        directory: Répertoire des exports.
+        formats: Entrées produites par document ('csv', 'json').
+        columns: Colonnes CSV imposées (par défaut : clés du premier enregistrement).
+    """
+
+    def __init__(
+        self,
+        directory: str = EXPORT_DIR,
+        formats: Sequence[str] = ("csv",),
+        columns: Optional[Sequence[str]] = None,
+    ):
+        unknown = set(formats) - {"csv", "json"}
+        if unknown:
+            raise ValueError(f"Format d'export inconnu : {', '.join(sorted(unknown))}")
+        os.makedirs(directory, exist_ok=True)
+        self.export_id = uuid.uuid4().hex
+        self.path = os.path.join(directory, f"{self.export_id}.zip")
+        self._tmp = f"{self.path}.part"
+        self.formats = tuple(formats)
+        self.columns = list(columns) if columns else None
+        self._names: Dict[str, int] = {}
+        self.entries = 0
+        self._zip: Optional[zipfile.ZipFile] = zipfile.ZipFile(
+            self._tmp, "w", zipfile.ZIP_DEFLATED
+        )
+
+    def _unique(self, stem: str) -> str:
+        # Deux fichiers de même nom dans un lot : suffixe _2, _3...
+        n = self._names.get(stem, 0) + 1
+        self._names[stem] = n
+        return stem if n == 1 else f"{stem}_{n}"
+
+    def add(self, name: str, records: Iterable[Dict[str, Any]]) -> None:
+        """Ajoute les enregistrements d'un document (CSV UTF-8 BOM, JSON)."""
+        if self._zip is None:
+            raise RuntimeError("Export déjà fermé")
+        records = list(records)
+        stem = self._unique(_entry_stem(name))
+        if "csv" in self.formats:
+            self._write_csv(f"{stem}.csv", records)
+        if "json" in self.formats:
+            with self._zip.open(f"{stem}.json", "w", force_zip64=True) as raw:
+                with io.TextIOWrapper(raw, encoding="utf-8") as fh:
+                    json.dump(records, fh, ensure_ascii=False, default=str)
+        self.entries += 1
+
+    def _write_csv(self, arcname: str, records: List[Dict[str, Any]]) -> None:
+        columns = self.columns or (list(records[0]) if records else [])
+        with self._zip.open(arcname, "w", force_zip64=True) as raw:
+            with io.TextIOWrapper(raw, encoding="utf-8-sig", newline="") as fh:
+                if not columns:
+                    # Même sortie que DataFrame().to_csv() pour un document vide
+                    fh.write("\n")
+                    return
+                writer = csv.DictWriter(
+                    fh, fieldnames=columns, extrasaction="ignore", lineterminator="\n"
+                )
+                writer.writeheader()
+                writer.writerows(records)
+
+    def close(self) -> str:
+        """Finalise l'archive et la publie sous son nom définitif."""
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+            os.replace(self._tmp, self.path)
+        return self.path
+
+    def discard(self) -> None:
+        """Abandonne un export inachevé."""
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+        for path in (self._tmp, self.path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self) -> "ZipExport":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def open_export(formats: Sequence[str] = ("csv",), directory: str = EXPORT_DIR) -> ZipExport:
+    """Nouvel export ; purge au passage les exports expirés."""
+    purge_exports(directory=directory)
+    return ZipExport(directory, formats)
+
+
+def export_path(export_id: str, directory: str = EXPORT_DIR) -> Optional[str]:
+    """Chemin d'un export terminé, ou None (identifiant invalide ou inconnu)."""
+    if not _EXPORT_ID.match(export_id or ""):
+        return None
+    path = os.path.join(directory, f"{export_id}.zip")
+    return path if os.path.isfile(path) else None
+
+
+def purge_exports(max_age: float = EXPORT_TTL_SECONDS, directory: str = EXPORT_DIR) -> int:
+    """Supprime les exports (terminés ou abandonnés) plus vieux que `max_age` s."""
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for fname in os.listdir(directory):
+        if not fname.endswith((".zip", ".zip.part")):
+            continue
+        path = os.path.join(directory, fname)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            logger.warning("Purge de l'export impossible : %s", path, exc_info=True)
+    return removed
@@ -1,10 +1,91 @@
 # src/extensions.py
-from typing import List
-from PIL import Image
+import io
+from typing import Iterator, List, Union
+from PIL import Image, ImageSequence
+
+PDF_EXTENSIONS = ('.pdf',)
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+# Document source : octets en mémoire ou chemin d'un fichier local (blob du
+# spool) ; un chemin est ouvert sans copie (PyMuPDF, PIL lisent à la demande)
+Source = Union[bytes, str]
+
+
+def _open_pdf(source: Source):
+    import fitz
+    if isinstance(source, str):
+        return fitz.open(source, filetype='pdf')
+    return fitz.open(stream=source, filetype='pdf')
+
+
+def _open_image(source: Source) -> Image.Image:
+    return Image.open(source if isinstance(source, str) else io.BytesIO(source))
+
+
+def _pixmap_to_image(pix) -> Image.Image:
+    mode = 'RGB' if pix.n < 4 else 'RGBA'
+    return Image.frombytes(mode, [pix.width, pix.height], pix.samples).convert('RGB')
+
+
+def iter_pdf_pages(pdf_bytes: Source, dpi: int = 200) -> Iterator[Image.Image]:
+    """
+    Rend les pages d'un PDF une par une (PyMuPDF) : une seule page rastérisée
+    est vivante à la fois, quel que soit le nombre de pages.
+    """
+    with _open_pdf(pdf_bytes) as doc:
+        for page in doc:
+            yield _pixmap_to_image(page.get_pixmap(dpi=dpi))
+
+
+def iter_tiff_frames(tiff_bytes: Source) -> Iterator[Image.Image]:
+    """Parcourt les trames d'un TIFF multi-pages, décodées à la demande."""
+    with _open_image(tiff_bytes) as tiff:
+        for frame in ImageSequence.Iterator(tiff):
+            yield frame.convert('RGB')
+
+
+def iter_document_pages(raw: Source, filename: str, dpi: int = 200) -> Iterator[Image.Image]:
+    """Pages d'un document (PDF, TIFF multi-trames ou image simple), paresseusement."""
+    name = filename.lower()
+    if name.endswith(PDF_EXTENSIONS):
+        return iter_pdf_pages(raw, dpi)
+    if name.endswith(TIFF_EXTENSIONS):
+        return iter_tiff_frames(raw)
+    return iter([_open_image(raw).convert('RGB')])
+
+
+def render_page(raw: Source, filename: str, index: int, dpi: float = 200) -> Image.Image:
+    """
+    Rend la seule page `index` (à partir de 0) d'un document ; un PDF reste
+    ouvert dans le cache de documents (voir `src.documents`) pour ses autres pages.
+    """
+    name = filename.lower()
+    if name.endswith(PDF_EXTENSIONS):
+        from .documents import get_document_cache
+        return get_document_cache().render(raw, index, dpi)
+    with _open_image(raw) as img:
+        if name.endswith(TIFF_EXTENSIONS):
+            img.seek(index)
+        elif index:
+            raise IndexError(f"Page {index} absente d'une image simple")
+        return img.convert('RGB')
+
+
+def count_pages(raw: Source, filename: str) -> int:
+    """Nombre de pages sans rastériser le document."""
+    name = filename.lower()
+    if name.endswith(PDF_EXTENSIONS):
+        from .documents import get_document_cache
+        return get_document_cache().page_count(raw)
+    if name.endswith(TIFF_EXTENSIONS):
+        with _open_image(raw) as tiff:
+            return getattr(tiff, 'n_frames', 1)
+    return 1
+
 
 def convert_pdf_to_images(pdf_bytes: bytes, dpi: int = 200) -> List[Image.Image]:
-    # Convert PDF bytes to list of PIL Images
-    return []
+    # Convert PDF bytes to list of PIL Images (préférer iter_pdf_pages pour les gros PDF)
+    return list(iter_pdf_pages(pdf_bytes, dpi))
 
 def convert_docx_to_images(docx_bytes: bytes) -> List[Image.Image]:
     # Convert DOCX bytes to list of PIL Images
@@ -1,33 +1,423 @@
 # src/history.py
 
+"""
+Historique des traitements pour OCR - Green Hub.
+
+Le stockage est interchangeable (HISTORY_BACKEND) :
+- 'sqlite' (défaut) : base SQLite en mode WAL, durable et partagée entre les
+  processus d'un même hôte (UI, API, workers Celery), indexée sur l'identifiant
+  de tâche, le nom de fichier, le statut et la date
+- 'memory' : dictionnaire du processus (tests, postes de développement)
+
+Les requêtes sont paginées par curseur (pagination par clé sur un numéro de
+séquence croissant) : le coût d'une page ne dépend pas de la taille de
+l'historique. Les résultats ne sont chargés qu'à la demande.
+"""
+
+import json
+import logging
+import math
+import os
+import sqlite3
 import threading
-from typing import Dict, List, Optional
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
-_history: Dict[str, Dict] = {}
-_lock = threading.Lock()
+from .config import HISTORY_BACKEND, HISTORY_DB_PATH, HISTORY_PAGE_SIZE
 
-def record_entry(filename: str, task_id: str) -> None:
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = HISTORY_PAGE_SIZE
+MAX_PAGE_SIZE = 500
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="seconds")
+
+
+@dataclass
+class HistoryPage:
+    """Page d'historique, de la plus récente à la plus ancienne."""
+
+    entries: List[Dict[str, Any]] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+
+class HistoryStore(ABC):
+    """Interface d'un stockage d'historique."""
+
+    @abstractmethod
+    def record(self, filename: str, task_id: str) -> None:
+        """
+        Crée l'entrée `task_id` en statut 'pending' ; une entrée existante
+        (statut, résultat) est laissée telle quelle.
+        """
+
+    @abstractmethod
+    def update(self, task_id: str, result: Any, status: str = "done") -> bool:
+        """Enregistre le résultat ; False si l'entrée n'existe pas."""
+
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Entrée complète (résultat compris), ou None."""
+
+    @abstractmethod
+    def query(
+        self,
+        status: Optional[str] = None,
+        filename: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        include_result: bool = False,
+    ) -> HistoryPage:
+        """
+        Page d'entrées filtrées, de la plus récente à la plus ancienne.
+
+        Args:
+            status: Statut exact ('pending', 'done', 'error'...).
+            filename: Préfixe du nom de fichier (recherche indexée).
+            since, until: Bornes (timestamps Unix) sur la date de création.
+            cursor: `next_cursor` de la page précédente.
+            limit: Taille de page (bornée à MAX_PAGE_SIZE).
+            include_result: Charge aussi les résultats.
+        """
+
+    def iter_entries(self, page_size: int = DEFAULT_PAGE_SIZE, **filters: Any) -> Iterator[Dict[str, Any]]:
+        """Parcourt toutes les entrées filtrées, page par page."""
+        cursor = None
+        while True:
+            page = self.query(cursor=cursor, limit=page_size, **filters)
+            yield from page.entries
+            if page.next_cursor is None:
+                return
+            cursor = page.next_cursor
+
+    def close(self) -> None:
+        pass
+
+
+def _page_size(limit: int) -> int:
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def _parse_cursor(cursor: Optional[str]) -> Optional[int]:
+    if not cursor:
+        return None
+    try:
+        return int(cursor)
+    except ValueError:
+        raise ValueError(f"Curseur d'historique invalide : {cursor!r}")
+
+
+class MemoryHistoryStore(HistoryStore):
+    """Historique en mémoire du processus (non partagé, perdu au redémarrage)."""
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def record(self, filename: str, task_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            if task_id not in self._entries:
+                self._seq += 1
+                self._entries[task_id] = {"seq": self._seq, "filename": filename, "status": "pending",
+                                          "created_at": now, "updated_at": now, "result": None}
+
+    def update(self, task_id: str, result: Any, status: str = "done") -> bool:
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is None:
+                return False
+            # Copie JSON : même comportement que les stockages persistants
+            entry.update(status=status, updated_at=time.time(),
+                         result=json.loads(json.dumps(result, default=str)))
+            return True
+
+    def _public(self, task_id: str, entry: Dict[str, Any], include_result: bool) -> Dict[str, Any]:
+        out = {
+            "task_id": task_id,
+            "filename": entry["filename"],
+            "status": entry["status"],
+            "created_at": _iso(entry["created_at"]),
+            "updated_at": _iso(entry["updated_at"]),
+        }
+        if include_result:
+            out["result"] = entry["result"]
+        return out
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(task_id)
+            return None if entry is None else self._public(task_id, entry, True)
+
+    def query(self, status=None, filename=None, since=None, until=None,
+              cursor=None, limit=DEFAULT_PAGE_SIZE, include_result=False) -> HistoryPage:
+        after = _parse_cursor(cursor)
+        limit = _page_size(limit)
+        with self._lock:
+            items = sorted(self._entries.items(), key=lambda kv: kv[1]["seq"], reverse=True)
+            rows = []
+            for task_id, entry in items:
+                if after is not None and entry["seq"] >= after:
+                    continue
+                if status is not None and entry["status"] != status:
+                    continue
+                if filename and not entry["filename"].startswith(filename):
+                    continue
+                if since is not None and entry["created_at"] < since:
+                    continue
+                if until is not None and entry["created_at"] >= until:
+                    continue
+                rows.append((task_id, entry))
+                if len(rows) > limit:
+                    break
+            page = [self._public(tid, e, include_result) for tid, e in rows[:limit]]
+            next_cursor = str(rows[limit - 1][1]["seq"]) if len(rows) > limit else None
+        return HistoryPage(page, next_cursor)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id    TEXT NOT NULL UNIQUE,
+    filename   TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    result     TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_history_filename ON history (filename, seq);
+CREATE INDEX IF NOT EXISTS ix_history_status ON history (status, seq);
+CREATE INDEX IF NOT EXISTS ix_history_created_at ON history (created_at);
+"""
+
+
+def _prefix_end(prefix: str) -> Optional[str]:
     """
-    Enregistre une entrée en statut 'pending' dans l'historique.
+    Plus petite chaîne supérieure à tous les noms commençant par `prefix`
+    (ordre binaire UTF-8 de SQLite, qui suit l'ordre des points de code) ;
+    None si aucune borne n'existe.
     """
-    with _lock:
-        _history[task_id] = {
-            "filename": filename,
-            "status": "pending",
+    chars = list(prefix)
+    while chars:
+        code = ord(chars.pop()) + 1
+        if code <= 0x10FFFF:
+            # Les demi-codets ne sont pas encodables en UTF-8
+            chars.append(chr(0xE000 if 0xD800 <= code <= 0xDFFF else code))
+            return "".join(chars)
+    return None
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """
+    Historique SQLite en mode WAL : lectures concurrentes pendant les écritures,
+    une connexion par thread (et par processus après un fork).
+
+    Args:
+        path: Fichier de base (':memory:' non partagé entre threads).
+        timeout: Attente maximale d'un verrou d'écriture (s).
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        if path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def record(self, filename: str, task_id: str) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO history (task_id, filename, status, created_at, updated_at) "
+                "VALUES (?, ?, 'pending', ?, ?) ON CONFLICT(task_id) DO NOTHING",
+                (task_id, filename, now, now),
+            )
+
+    def update(self, task_id: str, result: Any, status: str = "done") -> bool:
+        payload = json.dumps(result, default=str, ensure_ascii=False)
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE history SET status = ?, updated_at = ?, result = ? WHERE task_id = ?",
+                (status, time.time(), payload, task_id),
+            )
+        return cur.rowcount > 0
+
+    @staticmethod
+    def _entry(row: sqlite3.Row, include_result: bool) -> Dict[str, Any]:
+        out = {
+            "task_id": row["task_id"],
+            "filename": row["filename"],
+            "status": row["status"],
+            "created_at": _iso(row["created_at"]),
+            "updated_at": _iso(row["updated_at"]),
         }
+        if include_result:
+            out["result"] = json.loads(row["result"]) if row["result"] is not None else None
+        return out
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT * FROM history WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        return None if row is None else self._entry(row, True)
+
+    @staticmethod
+    def _select(status, filename, since, until, after, limit, include_result):
+        """Requête paginée et ses paramètres ; chaque filtre reste un intervalle d'index."""
+        columns = "seq, task_id, filename, status, created_at, updated_at"
+        if include_result:
+            columns += ", result"
+        where, params = [], []
+        if after is not None:
+            where.append("seq < ?")
+            params.append(after)
+        if status is not None:
+            where.append("status = ?")
+            params.append(status)
+        if filename:
+            # Intervalle [préfixe, successeur) parcouru sur l'index
+            end = _prefix_end(filename)
+            if end is None:
+                where.append("filename >= ?")
+                params.append(filename)
+            else:
+                where.append("filename >= ? AND filename < ?")
+                params += [filename, end]
+        if since is not None or until is not None:
+            # Toujours deux bornes : sur une seule, SQLite parcourt toute la table
+            where.append("created_at >= ? AND created_at < ?")
+            params += [
+                -math.inf if since is None else since,
+                math.inf if until is None else until,
+            ]
+        sql = f"SELECT {columns} FROM history"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        # Une ligne de plus que la page pour savoir s'il reste une suite
+        sql += " ORDER BY seq DESC LIMIT ?"
+        params.append(limit + 1)
+        return sql, params
+
+    def query(self, status=None, filename=None, since=None, until=None,
+              cursor=None, limit=DEFAULT_PAGE_SIZE, include_result=False) -> HistoryPage:
+        after = _parse_cursor(cursor)
+        limit = _page_size(limit)
+        sql, params = self._select(status, filename, since, until, after, limit, include_result)
+        rows = self._connect().execute(sql, params).fetchall()
+        page = [self._entry(r, include_result) for r in rows[:limit]]
+        next_cursor = str(rows[limit - 1]["seq"]) if len(rows) > limit else None
+        return HistoryPage(page, next_cursor)
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# ----------- Registre des stockages -----------
+
+_BACKENDS: Dict[str, Callable[[], HistoryStore]] = {
+    "sqlite": lambda: SQLiteHistoryStore(HISTORY_DB_PATH),
+    "memory": MemoryHistoryStore,
+}
+
+
+def register_history_backend(name: str, factory: Callable[[], HistoryStore]) -> None:
+    """Déclare un stockage supplémentaire, sélectionnable via HISTORY_BACKEND."""
+    _BACKENDS[name] = factory
+
+
+def build_history_store(backend: str = HISTORY_BACKEND) -> HistoryStore:
+    try:
+        factory = _BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Stockage d'historique inconnu : {backend}")
+    return factory()
+
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """Retourne le stockage d'historique du processus (créé à la demande)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = build_history_store()
+                logger.info("Historique : %s", type(_store).__name__)
+    return _store
+
+
+def set_history_store(store: Optional[HistoryStore]) -> None:
+    """Remplace le stockage du processus (None = reconstruire à la demande)."""
+    global _store
+    with _store_lock:
+        _store = store
+
+
+# ----------- API historique -----------
+
+def record_entry(filename: str, task_id: str) -> None:
+    """
+    Enregistre une entrée en statut 'pending' dans l'historique, si elle n'existe
+    pas déjà (un résultat enregistré n'est jamais effacé).
+    """
+    get_history_store().record(filename, task_id)
+
+def update_entry(task_id: str, result: Dict, status: str = "done") -> None:
+    """
+    Met à jour le résultat et passe le statut à 'done' (ou `status`).
+    """
+    if not get_history_store().update(task_id, result, status):
+        logger.warning("Entrée d'historique inconnue : %s", task_id)
+
+def get_entry(task_id: str) -> Optional[Dict]:
+    """
+    Retourne une entrée avec son résultat, ou None.
+    """
+    return get_history_store().get(task_id)
 
-def update_entry(task_id: str, result: Dict) -> None:
+def query_history(**kwargs: Any) -> HistoryPage:
     """
-    Met à jour le résultat et passe le statut à 'done'.
+    Retourne une page d'historique (voir `HistoryStore.query`).
     """
-    with _lock:
-        entry = _history.get(task_id)
-        if entry is not None:
-            entry["status"] = "done"
+    return get_history_store().query(**kwargs)
 
-def get_history() -> List[Dict]:
+def get_history(limit: Optional[int] = None) -> List[Dict]:
     """
-    Retourne la liste des entrées d'historique.
+    Retourne les entrées d'historique (les plus récentes d'abord), avec résultats.
+    Préférer `query_history` : sans `limit`, tout l'historique est chargé.
     """
-    with _lock:
-        return list(_history.values())
+    entries: List[Dict] = []
+    for entry in get_history_store().iter_entries(page_size=MAX_PAGE_SIZE, include_result=True):
+        entries.append(entry)
+        if limit is not None and len(entries) >= limit:
+            break
+    return entries
@@ -34,7 +34,17 @@ _TRANSLATIONS = {
         "lines_msg": "Nombre de lignes détectées",
         "batch_summary": "Résumé Batch Textract",
         "details": "Détails des résultats par fichier",
-        "no_fields": "Aucun champ détecté pour ce fichier."
+        "no_fields": "Aucun champ détecté pour ce fichier.",
+        "ocr_all_pages": "OCR de toutes les pages",
+        "page_label": "Page",
+        "batch_download": "Télécharger les résultats (ZIP)",
+        "batch_download_too_large": "Export trop volumineux pour être servi par l'interface : "
+                                    "définir EXPORT_PUBLIC_URL (API, GET /exports/{id}).",
+        "history_status": "Statut",
+        "history_filename": "Nom de fichier commence par",
+        "history_prev": "← Page précédente",
+        "history_next": "Page suivante →",
+        "history_details": "Détail de l'entrée"
     },
     "en": {
         "config_header": "OCR Configuration",
@@ -65,7 +75,17 @@ _TRANSLATIONS = {
         "lines_msg": "Number of lines detected",
         "batch_summary": "Batch Textract Summary",
         "details": "Details per file",
-        "no_fields": "No fields detected for this file."
+        "no_fields": "No fields detected for this file.",
+        "ocr_all_pages": "OCR all pages",
+        "page_label": "Page",
+        "batch_download": "Download results (ZIP)",
+        "batch_download_too_large": "Export too large to be served by the UI: "
+                                    "set EXPORT_PUBLIC_URL (API, GET /exports/{id}).",
+        "history_status": "Status",
+        "history_filename": "File name starts with",
+        "history_prev": "← Previous page",
+        "history_next": "Next page →",
+        "history_details": "Entry details"
     }
 }
 
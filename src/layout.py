@@ -0,0 +1,173 @@
+# src/layout.py
+
+"""
+OCR par zones de texte - Green Hub.
+
+Une pré-analyse OpenCV de la page prétraitée (composantes connexes de l'encre,
+puis dilatation pour regrouper caractères, mots et lignes en blocs) repère les
+zones de texte. Seules ces zones sont OCRisées, en parallèle et découpées de la
+page ; les marges et les espaces vides ne passent plus par Tesseract, et une
+page blanche (verso de feuille numérisé) n'est pas OCRisée du tout.
+
+`ocr_layout` garde le contrat de `ocr_tess` (mêmes arguments, `WordBoxes` aux
+colonnes ['x1','y1','x2','y2','text','conf'] dans le repère de la page) : il
+s'utilise aussi comme `ocr_fn` de `find_best_zoom`.
+"""
+
+import logging
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .config import OCR_LAYOUT_ENABLED, OCR_LAYOUT_MAX_COVERAGE, OCR_LAYOUT_MAX_REGIONS
+from .executor import get_executor
+from .observability import OCR_BLANK_PAGES, OCR_PIXELS, series
+from .ocr import ocr_tess
+from .tracing import span
+from .wordboxes import WordBoxes
+
+logger = logging.getLogger(__name__)
+
+Box = Tuple[int, int, int, int]
+
+# Pixels plus sombres que ce seuil : encre (page prétraitée, texte noir sur blanc)
+INK_THRESHOLD = 128
+# Composantes plus petites (px) : poussière, bruit de numérisation
+SPECKLE_MAX_AREA = 6
+# Encre (px, poussière exclue) en deçà de laquelle la page est blanche : moins
+# qu'un seul petit caractère (« I » de 8 px), un « OK » ou un numéro isolé passe
+BLANK_MIN_INK_AREA = 8
+# Largeur (px) visée pour l'analyse : la page est réduite d'un facteur entier
+ANALYSIS_WIDTH = 800
+
+
+def find_text_regions(gray: np.ndarray) -> List[Box]:
+    """
+    Repère les zones de texte d'une page en niveaux de gris.
+
+    Returns:
+        Boîtes (x0, y0, x1, y1) en pixels, bornes hautes exclues, avec une
+        marge blanche pour Tesseract ; liste vide pour une page blanche.
+    """
+    h, w = gray.shape
+    ink = (gray < INK_THRESHOLD).astype(np.uint8)
+    # Analyse sur une page réduite : un pixel d'encre suffit à marquer la case
+    scale = max(1, w // ANALYSIS_WIDTH)
+    if scale > 1:
+        ink = (cv2.resize(ink, (w // scale, h // scale), interpolation=cv2.INTER_AREA) > 0).astype(np.uint8)
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    areas = stats[1:, cv2.CC_STAT_AREA] * scale * scale
+    heights = stats[1:, cv2.CC_STAT_HEIGHT] * scale
+    kept = np.flatnonzero((areas > SPECKLE_MAX_AREA) & (heights >= 3)) + 1
+    if areas[kept - 1].sum() < BLANK_MIN_INK_AREA:
+        return []
+
+    # Encre sans la poussière, puis regroupement selon la hauteur des caractères
+    lut = np.zeros(n, dtype=np.uint8)
+    lut[kept] = 255
+    mask = lut[labels]
+    text_h = int(np.clip(np.median(stats[kept, cv2.CC_STAT_HEIGHT]), 2, 200))
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * text_h + 1, text_h + 1))
+    blocks = cv2.dilate(mask, kernel)
+
+    contours, _ = cv2.findContours(blocks, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    pad = max(4, text_h * scale // 4)
+    boxes = []
+    for contour in contours:
+        x, y, bw, bh = (v * scale for v in cv2.boundingRect(contour))
+        boxes.append((max(0, x - pad), max(0, y - pad),
+                      min(w, x + bw + scale + pad), min(h, y + bh + scale + pad)))
+    return _merge_overlapping(boxes)
+
+
+def _merge_overlapping(boxes: List[Box]) -> List[Box]:
+    """Fusionne les boîtes qui se chevauchent (marges ajoutées), ordre de lecture."""
+    merged = True
+    while merged:
+        merged = False
+        out: List[Box] = []
+        for box in boxes:
+            for i, other in enumerate(out):
+                if box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]:
+                    out[i] = (min(box[0], other[0]), min(box[1], other[1]),
+                              max(box[2], other[2]), max(box[3], other[3]))
+                    merged = True
+                    break
+            else:
+                out.append(box)
+        boxes = out
+    return sorted(boxes, key=lambda b: (b[1], b[0]))
+
+
+def _area(box: Box) -> int:
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def plan_regions(
+    regions: List[Box],
+    size: Tuple[int, int],
+    max_regions: int = OCR_LAYOUT_MAX_REGIONS,
+    max_coverage: float = OCR_LAYOUT_MAX_COVERAGE,
+) -> List[Box]:
+    """
+    Zones à OCRiser. Trop de petites zones (un appel Tesseract chacune) ou des
+    zones couvrant l'essentiel de la page : une seule zone englobante, qui
+    écarte encore les marges.
+    """
+    w, h = size
+    if len(regions) > max_regions or sum(map(_area, regions)) > max_coverage * w * h:
+        return [(min(b[0] for b in regions), min(b[1] for b in regions),
+                 max(b[2] for b in regions), max(b[3] for b in regions))]
+    return regions
+
+
+def ocr_layout(
+    img: Image.Image,
+    lang: str,
+    psm: int,
+    conf_thr: int,
+    strict: bool = False
+) -> WordBoxes:
+    """
+    OCR des seules zones de texte de `img` (page prétraitée), boîtes ramenées
+    dans le repère de la page. Mêmes arguments et même résultat que `ocr_tess` ;
+    avec OCR_LAYOUT_ENABLED=false, la page entière est OCRisée.
+    """
+    if not OCR_LAYOUT_ENABLED:
+        return ocr_tess(img, lang, psm, conf_thr, strict)
+
+    total = img.size[0] * img.size[1]
+    with span("layout") as sp:
+        regions = find_text_regions(np.asarray(img.convert("L")))
+        sp.set(regions=len(regions))
+    if not regions:
+        OCR_BLANK_PAGES.inc()
+        series(OCR_PIXELS, "skipped").inc(total)
+        logger.debug("Page blanche %sx%s : OCR ignoré", *img.size)
+        return WordBoxes.blank()
+
+    regions = plan_regions(regions, img.size)
+    ocr_pixels = sum(map(_area, regions))
+    series(OCR_PIXELS, "ocr").inc(ocr_pixels)
+    series(OCR_PIXELS, "skipped").inc(total - ocr_pixels)
+    if regions == [(0, 0, img.size[0], img.size[1])]:
+        return ocr_tess(img, lang, psm, conf_thr, strict)
+
+    executor = get_executor()
+    futures = [
+        executor.submit(ocr_tess, img.crop(box), lang, psm, conf_thr, strict)
+        for box in regions
+    ]
+    parts: List[WordBoxes] = []
+    block = line = 0
+    for box, future in zip(regions, futures):
+        words = future.result()
+        if not len(words):
+            continue
+        # Identifiants uniques sur la page : chaque zone suit les précédentes
+        parts.append(words.offset(box[0], box[1], block=block, line=line))
+        block += int(words["block"].max()) + 1
+        line += int(words["line"].max()) + 1
+    return WordBoxes.concat(parts)
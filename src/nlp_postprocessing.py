@@ -1,9 +1,264 @@
 # src/nlp_postprocessing.py
-import spacy
-from typing import Dict
 
-nlp = spacy.load("fr_core_news_sm")
+"""
+Normalisation des entités extraites - Green Hub.
+
+Dates (ISO 8601), montants (décimal à deux chiffres) et identifiants sont
+normalisés par règles ; les noms (fournisseurs et autres termes de
+dictionnaire) passent par le tokeniseur spaCy, par lots (`nlp.pipe`).
+
+Le modèle spaCy (NLP_MODEL) n'est chargé qu'au premier nom à normaliser, avec
+les seuls composants de NLP_COMPONENTS (tokeniseur seul par défaut) ; sans
+modèle installé, un tokeniseur français vierge le remplace. Les valeurs
+normalisées sont gardées dans un cache LRU : les mêmes dates, montants et
+fournisseurs reviennent d'un document à l'autre.
+"""
+
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .config import NLP_BATCH_SIZE, NLP_CACHE_SIZE, NLP_COMPONENTS, NLP_MODEL, NLP_PROCESSES
+from .observability import CACHE_EVENTS, series
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Formes juridiques retirées des noms (comparées sans points ni casse)
+LEGAL_FORMS = frozenset({
+    "sa", "sas", "sasu", "sarl", "eurl", "snc", "sci", "scop", "selarl", "gie",
+    "inc", "ltd", "llc", "gmbh", "bv", "nv", "spa", "srl",
+})
+
+
+# ----------- Règles -----------
+
+def normalize_date(text: str) -> Optional[str]:
+    """'12/05/2025' ou '2025-05-12' -> '2025-05-12' ; None si la date est impossible."""
+    parts = re.split(r"[./-]", text.strip())
+    if len(parts) != 3 or not all(p.isdigit() for p in parts):
+        return None
+    if len(parts[0]) != 4:
+        parts.reverse()
+    year, month, day = parts
+    try:
+        return date(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        return None
+
+
+def normalize_amount(text: str) -> Optional[str]:
+    """'1 234,56 €' / '1.234,56 EUR' / '1234.5 €' -> '1234.56' / '1234.56' / '1234.50'."""
+    raw = re.sub(r"\s|€|EUR", "", text, flags=re.IGNORECASE)
+    if "," in raw:
+        # Virgule décimale : les points sont des séparateurs de milliers
+        raw = raw.replace(".", "").replace(",", ".")
+    elif raw.count(".") > 1 or re.search(r"\.\d{3}$", raw):
+        raw = raw.replace(".", "")
+    try:
+        return str(Decimal(raw).quantize(Decimal("0.01")))
+    except InvalidOperation:
+        return None
+
+
+def normalize_identifier(text: str) -> str:
+    """IBAN, n° de TVA : majuscules sans espaces."""
+    return re.sub(r"\s+", "", text).upper()
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def canonical_name(doc: Any) -> str:
+    """
+    Nom canonique d'un `Doc` spaCy : sans ponctuation, formes juridiques ni
+    accents, en majuscules (« Société Exemple S.A.S. » -> 'SOCIETE EXEMPLE').
+    Les lemmes sont utilisés si le lemmatiseur est chargé.
+    """
+    lemmas = doc.has_annotation("LEMMA")
+    kept = [
+        tok.lemma_ if lemmas and tok.lemma_ else tok.text
+        for tok in doc
+        if not tok.is_punct and not tok.is_space and tok.text.replace(".", "").lower() not in LEGAL_FORMS
+    ]
+    return _strip_accents(" ".join(kept)).upper()
+
+
+# Clés du résumé d'entités normalisées par règles ; les autres listes sont des noms
+RULES: Dict[str, Callable[[str], Optional[str]]] = {
+    "dates": normalize_date,
+    "amounts": normalize_amount,
+    "ibans": normalize_identifier,
+    "vat_ids": normalize_identifier,
+}
+
+
+# ----------- Modèle spaCy -----------
+
+def _pipe_names(spacy: Any, model: str) -> List[str]:
+    path = model if os.path.isdir(model) else spacy.util.get_package_path(model)
+    return list(spacy.util.get_model_meta(path).get("pipeline", []))
+
+
+def load_pipeline(model: str = NLP_MODEL, components: Sequence[str] = NLP_COMPONENTS) -> Any:
+    """
+    Charge `model` sans les composants absents de `components` (ils ne sont
+    pas lus du disque). Modèle introuvable : tokeniseur français vierge.
+    """
+    import spacy
+
+    with span("nlp_load", model=model):
+        try:
+            excluded = [name for name in _pipe_names(spacy, model) if name not in components]
+            nlp = spacy.load(model, exclude=excluded)
+        except (ImportError, OSError) as exc:
+            logger.warning("Modèle spaCy %s indisponible (%s) : tokeniseur 'fr' seul", model, exc)
+            return spacy.blank("fr")
+    logger.info("Modèle spaCy %s chargé (composants : %s)", model, ", ".join(nlp.pipe_names) or "aucun")
+    return nlp
+
+
+_nlp: Optional[Any] = None
+_nlp_lock = threading.Lock()
+
+
+def get_nlp() -> Any:
+    """Pipeline spaCy du processus, chargé au premier appel."""
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                _nlp = load_pipeline()
+    return _nlp
+
+
+def set_nlp(nlp: Optional[Any]) -> None:
+    """Remplace le pipeline du processus (tests, autre modèle) ; None le recharge au besoin."""
+    global _nlp
+    with _nlp_lock:
+        _nlp = nlp
+
+
+# ----------- Normalisation -----------
+
+class EntityNormalizer:
+    """
+    Normalise des résumés d'entités (`src.entities.summarize`) par lots.
+
+    Args:
+        nlp: Pipeline spaCy ; par défaut celui du processus (`get_nlp`),
+            chargé seulement si un nom est à normaliser.
+        batch_size: Taille des lots de `nlp.pipe`.
+        n_process: Processus de `nlp.pipe` (traitements par lots hors worker
+            Celery : un processus démon ne peut pas en créer d'autres).
+        cache_size: Valeurs normalisées gardées (0 : pas de cache).
+    """
+
+    def __init__(
+        self,
+        nlp: Optional[Any] = None,
+        batch_size: int = NLP_BATCH_SIZE,
+        n_process: int = NLP_PROCESSES,
+        cache_size: int = NLP_CACHE_SIZE,
+    ):
+        self._nlp = nlp
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str], Optional[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def nlp(self) -> Any:
+        return self._nlp if self._nlp is not None else get_nlp()
+
+    def _get(self, key: Tuple[str, str]) -> Tuple[bool, Optional[str]]:
+        with self._lock:
+            found = key in self._cache
+            value = self._cache.get(key)
+            if found:
+                self._cache.move_to_end(key)
+        series(CACHE_EVENTS, "nlp", "hit" if found else "miss").inc()
+        return found, value
+
+    def _put(self, key: Tuple[str, str], value: Optional[str]) -> None:
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def normalize_many(self, batch: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Ajoute à chaque résumé une clé 'normalized' : pour chaque liste du
+        résumé, les valeurs normalisées dans le même ordre (None si illisible).
+        Les noms absents du cache de tout le lot passent en une fois par `nlp.pipe`.
+        """
+        with span("normalize", documents=len(batch)):
+            values: Dict[Tuple[str, str], Optional[str]] = {}
+            names: Dict[str, None] = {}
+            for entities in batch:
+                for field, items in entities.items():
+                    if not isinstance(items, list):
+                        continue
+                    kind = field if field in RULES else "name"
+                    for text in items:
+                        key = (kind, text)
+                        if key in values or (kind == "name" and text in names):
+                            continue
+                        found, value = self._get(key)
+                        if found:
+                            values[key] = value
+                        elif kind == "name":
+                            names[text] = None
+                        else:
+                            values[key] = RULES[kind](text)
+                            self._put(key, values[key])
+            if names:
+                docs = self.nlp.pipe(list(names), batch_size=self.batch_size, n_process=self.n_process)
+                for text, doc in zip(names, docs):
+                    values[("name", text)] = canonical_name(doc)
+                    self._put(("name", text), values[("name", text)])
+            return [dict(entities, normalized={
+                field: [values[(field if field in RULES else "name", text)] for text in items]
+                for field, items in entities.items() if isinstance(items, list)
+            }) for entities in batch]
+
+    def normalize(self, entities: Dict[str, Any]) -> Dict[str, Any]:
+        return self.normalize_many([entities])[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+_normalizer: Optional[EntityNormalizer] = None
+_normalizer_lock = threading.Lock()
+
+
+def get_normalizer() -> EntityNormalizer:
+    global _normalizer
+    if _normalizer is None:
+        with _normalizer_lock:
+            if _normalizer is None:
+                _normalizer = EntityNormalizer()
+    return _normalizer
+
 
 def normalize_entities(entities: Dict) -> Dict:
-    # Normalize dates, numbers, apply NLP corrections
-    return entities
+    """Résumé d'entités complété de ses valeurs normalisées (clé 'normalized')."""
+    return get_normalizer().normalize(entities)
+
+
+def normalize_entities_many(batch: Iterable[Dict]) -> List[Dict]:
+    """Comme `normalize_entities`, pour un lot de documents (un seul passage spaCy)."""
+    return get_normalizer().normalize_many(list(batch))
@@ -2,17 +2,27 @@
 Module d'observabilité pour OCR - Green Hub.
 - Logging structuré au format JSON
 - Exposition de métriques Prometheus sans doublons
+- Collecte multi-processus (PROMETHEUS_MULTIPROC_DIR) : un seul /metrics par
+  pod agrège le processus principal, les processus de l'exécuteur et les
+  workers Celery
 - Helpers pour instrumenter les appels
 """
+import atexit
 import logging
+import os
 import threading
 import json
-from typing import Callable, Any
-from prometheus_client import start_http_server, Summary, Counter, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from typing import Callable, Any, Dict, Tuple
+from prometheus_client import (
+    Summary, Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, generate_latest,
+    CONTENT_TYPE_LATEST, multiprocess,
+)
 from fastapi import FastAPI
 from fastapi.responses import Response
 import uvicorn
 
+from .config import METRICS_HOST, METRICS_PORT, PROMETHEUS_MULTIPROC_DIR
+
 # ----------- Logging Structuré -----------
 class JSONFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
@@ -22,6 +32,11 @@ class JSONFormatter(logging.Formatter):
             'logger': record.name,
             'message': record.getMessage(),
         }
+        # Import tardif : tracing dépend des métriques de ce module
+        from .tracing import get_request_id
+        request_id = get_request_id()
+        if request_id:
+            payload['request_id'] = request_id
         if record.exc_info:
             payload['exc_info'] = self.formatException(record.exc_info)
         return json.dumps(payload)
@@ -56,6 +71,180 @@ def _ensure_summary():
 REQUEST_COUNTER = _ensure_counter()
 REQUEST_LATENCY = _ensure_summary()
 
+
+def _ensure_metric(metric_cls, name: str, documentation: str, labelnames=(), **kwargs):
+    """Crée (ou récupère si déjà enregistrée) une métrique du registre global."""
+    try:
+        return REGISTRY._names_to_collectors[name]
+    except KeyError:
+        return metric_cls(name, documentation, labelnames, registry=REGISTRY, **kwargs)
+
+
+_series: Dict[Tuple[Any, Tuple[str, ...]], Any] = {}
+
+
+def series(metric, *labelvalues: str):
+    """
+    Série `metric{labelvalues}`, gardée pour les appels suivants : dans les
+    chemins chauds (cache, spans), évite le verrou et la validation de
+    `labels()` à chaque incrément.
+    """
+    key = (metric, labelvalues)
+    child = _series.get(key)
+    if child is None:
+        child = _series[key] = metric.labels(*labelvalues)
+    return child
+
+
+# Cache des résultats OCR : événements par niveau (memory/disk/shared)
+CACHE_EVENTS = _ensure_metric(
+    Counter, 'ocr_greenhub_cache_events_total',
+    'Événements du cache OCR (hit, miss, eviction) par niveau', ['tier', 'event']
+)
+
+# Exécuteur OCR global : capacité, occupation et file d'attente
+# (jauges sommées sur les processus vivants du pod en collecte multi-processus)
+EXECUTOR_WORKERS = _ensure_metric(
+    Gauge, 'ocr_greenhub_executor_workers', "Nombre de workers de l'exécuteur OCR",
+    multiprocess_mode='livesum'
+)
+EXECUTOR_BUSY = _ensure_metric(
+    Gauge, 'ocr_greenhub_executor_busy_workers', "Workers de l'exécuteur OCR occupés",
+    multiprocess_mode='livesum'
+)
+EXECUTOR_QUEUE_DEPTH = _ensure_metric(
+    Gauge, 'ocr_greenhub_executor_queue_depth', "Tâches OCR en attente d'un worker",
+    multiprocess_mode='livesum'
+)
+EXECUTOR_TASKS = _ensure_metric(
+    Counter, 'ocr_greenhub_executor_tasks_total', "Tâches soumises à l'exécuteur OCR", ['outcome']
+)
+
+# Lots Textract : limitation de débit côté client
+TEXTRACT_THROTTLES = _ensure_metric(
+    Counter, 'ocr_greenhub_textract_throttles_total', 'Réponses de limitation Textract reçues', ['code']
+)
+TEXTRACT_RATE = _ensure_metric(
+    Gauge, 'ocr_greenhub_textract_rate_limit', 'Débit Textract autorisé (requêtes/s)',
+    multiprocess_mode='livesum'
+)
+
+# Encodage des images envoyées à Textract
+TEXTRACT_PAYLOAD_BYTES = _ensure_metric(
+    Histogram, 'ocr_greenhub_textract_payload_bytes', 'Taille des images envoyées à Textract',
+    ['format'], buckets=(32e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 5e6, 10e6)
+)
+TEXTRACT_ENCODE_SECONDS = _ensure_metric(
+    Histogram, 'ocr_greenhub_textract_encode_seconds', "Durée d'encodage des images pour Textract",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+# Prétraitement adaptatif : classe des pages et durée de chaque étape
+PREPROCESS_PAGES = _ensure_metric(
+    Counter, 'ocr_greenhub_preprocess_pages_total', 'Pages prétraitées par classe et mode', ['kind', 'mode']
+)
+PREPROCESS_STAGE_SECONDS = _ensure_metric(
+    Histogram, 'ocr_greenhub_preprocess_stage_seconds', "Durée des étapes de prétraitement", ['stage'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+# OCR par zones : pixels réellement envoyés à Tesseract, pages blanches ignorées
+OCR_PIXELS = _ensure_metric(
+    Counter, 'ocr_greenhub_ocr_pixels_total', 'Pixels de page OCRisés ou ignorés', ['outcome']
+)
+OCR_BLANK_PAGES = _ensure_metric(
+    Counter, 'ocr_greenhub_ocr_blank_pages_total', 'Pages blanches ignorées sans OCR'
+)
+
+# PDF : pages lues dans la couche texte ('text'), complétées par l'OCR des
+# images ('mixed') ou rastérisées puis OCRisées ('raster')
+PDF_PAGES = _ensure_metric(
+    Counter, 'ocr_greenhub_pdf_pages_total', 'Pages PDF par chemin de traitement', ['path']
+)
+
+# Progression des documents : événements publiés et clients abonnés
+PROGRESS_EVENTS = _ensure_metric(
+    Counter, 'ocr_greenhub_progress_events_total', 'Événements de progression publiés par type', ['type']
+)
+PROGRESS_STREAMS = _ensure_metric(
+    Gauge, 'ocr_greenhub_progress_streams', 'Flux SSE de progression ouverts',
+    multiprocess_mode='livesum'
+)
+
+# Moteurs OCR du routeur (voir `src/backends.py`) : appels par issue, latences
+# et relances couvertes
+BACKEND_CALLS = _ensure_metric(
+    Counter, 'ocr_greenhub_backend_calls_total', 'Appels aux moteurs OCR par issue',
+    ['backend', 'outcome']
+)
+BACKEND_SECONDS = _ensure_metric(
+    Histogram, 'ocr_greenhub_backend_seconds', "Durée d'un appel à un moteur OCR", ['backend'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+BACKEND_HEDGES = _ensure_metric(
+    Counter, 'ocr_greenhub_backend_hedges_total', 'Relances couvertes par moteur relancé', ['backend']
+)
+
+# Entités reconnues par type (voir `src/entities.py`)
+ENTITY_MATCHES = _ensure_metric(
+    Counter, 'ocr_greenhub_entity_matches_total', 'Entités reconnues par type', ['label']
+)
+
+# Durées par étape (voir `src/tracing.py`), par niveau de zoom essayé et par page
+_STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+REQUEST_DURATION = _ensure_metric(
+    Histogram, 'ocr_greenhub_request_duration_seconds', 'Durée des requêtes par type', ['type'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+)
+STAGE_SECONDS = _ensure_metric(
+    Histogram, 'ocr_greenhub_stage_seconds', 'Durée des étapes de la chaîne OCR', ['stage'],
+    buckets=_STAGE_BUCKETS
+)
+ZOOM_SECONDS = _ensure_metric(
+    Histogram, 'ocr_greenhub_zoom_seconds',
+    "Durée d'un essai de zoom sur la page ou une bande (rendu, prétraitement, OCR)",
+    ['zoom'], buckets=_STAGE_BUCKETS
+)
+PAGE_SECONDS = _ensure_metric(
+    Histogram, 'ocr_greenhub_page_seconds', "Durée de traitement d'une page", ['path'],
+    buckets=_STAGE_BUCKETS
+)
+TRACE_SPANS = _ensure_metric(
+    Counter, 'ocr_greenhub_trace_spans_total', 'Spans exportées ou abandonnées', ['outcome']
+)
+
+# ----------- Collecte multi-processus -----------
+
+
+def multiprocess_enabled() -> bool:
+    return bool(PROMETHEUS_MULTIPROC_DIR)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    Registre à exposer : en collecte multi-processus, un registre éphémère qui
+    agrège les fichiers de tous les processus du pod ; sinon le registre global.
+    """
+    if not multiprocess_enabled():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=PROMETHEUS_MULTIPROC_DIR)
+    return registry
+
+
+def mark_process_dead(pid: int = 0) -> None:
+    """
+    Retire les jauges d'un processus terminé (`pid`, par défaut le processus
+    courant) ; compteurs et histogrammes restent acquis au pod.
+    """
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(pid or os.getpid(), path=PROMETHEUS_MULTIPROC_DIR)
+
+
+if multiprocess_enabled():
+    # Sortie normale d'un processus (les forks héritent du handler, pid lu à l'appel)
+    atexit.register(mark_process_dead)
+
 # ----------- Serveur FastAPI -----------
 app = FastAPI()
 
@@ -65,12 +254,27 @@ async def healthz() -> dict:
 
 @app.get('/metrics')
 async def metrics() -> Response:
-    data = generate_latest(REGISTRY)
+    data = generate_latest(metrics_registry())
     return Response(content=data, media_type=CONTENT_TYPE_LATEST)
 
 
-def start_health_server(host: str = '0.0.0.0', port: int = 8001) -> None:
-    """Démarre le serveur FastAPI en thread détaché pour healthz et metrics."""
+_server_started = False
+_server_lock = threading.Lock()
+
+
+def start_health_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> None:
+    """
+    Démarre le serveur FastAPI (/healthz et /metrics) en thread détaché ; un
+    seul par pod, les autres processus écrivent leurs métriques dans
+    PROMETHEUS_MULTIPROC_DIR. Sans effet s'il tourne déjà dans ce processus
+    (Streamlit réexécute le script à chaque interaction).
+    """
+    global _server_started
+    with _server_lock:
+        if _server_started:
+            return
+        _server_started = True
+
     def _run():
         uvicorn.run(app, host=host, port=port, log_level='warning')
     thread = threading.Thread(target=_run, daemon=True)
@@ -79,8 +283,15 @@ def start_health_server(host: str = '0.0.0.0', port: int = 8001) -> None:
 # ----------- Helper pour instrumentation -----------
 
 def record_request(request_type: str, func: Callable[..., Any], *args, **kwargs) -> Any:
-    """Exécute `func`, mesure la latence et incrémente les métriques."""
-    with REQUEST_LATENCY.labels(request_type).time():
-        result = func(*args, **kwargs)
+    """
+    Exécute `func` dans une requête tracée (span 'request'), mesure la latence
+    et incrémente les métriques.
+    """
+    from .tracing import request_context, span
+
+    with request_context(), span("request", type=request_type) as sp:
+        with REQUEST_LATENCY.labels(request_type).time():
+            result = func(*args, **kwargs)
+    REQUEST_DURATION.labels(request_type).observe(sp.duration)
     REQUEST_COUNTER.labels(request_type).inc()
     return result
@@ -5,83 +5,136 @@ Module d'OCR avec Tesseract : fonctions pour lancer l'OCR rapide
 et trouver le meilleur zoom sans planter en cas d'erreur.
 """
 
+import functools
 import logging
 from typing import Tuple, List, Optional, Callable, Any
 from PIL import Image
 import pytesseract
 import pandas as pd
-from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+
+from .config import OCR_ZOOM_STRATEGY
+from .cache import callable_id, get_ocr_cache, make_key
+from .engine import get_engine
+from .executor import get_executor
+from .observability import ZOOM_SECONDS, series
+from .tracing import span
+from .wordboxes import WORD_COLUMNS, WordBoxes
 
 logger = logging.getLogger(__name__)
 
+# Rendu d'une page à un zoom donné (voir `src.documents.PageRenderer`) :
+# render_fn(zoom) ou render_fn(zoom, clip) pour une zone de l'image de base
+RenderFn = Callable[..., Image.Image]
 
-def ocr_tess(
+
+def _zoomed(img: Image.Image, zoom: float, render_fn: Optional[RenderFn] = None) -> Image.Image:
+    """`img` au zoom demandé : rendue à cette résolution si possible, sinon agrandie."""
+    if zoom == 1.0:
+        return img
+    if render_fn is not None:
+        with span("render", zoom=zoom):
+            return render_fn(zoom)
+    w, h = img.size
+    with span("resize", zoom=zoom):
+        return img.resize((int(w * zoom), int(h * zoom)), Image.LANCZOS)
+
+
+def _preprocess_and_ocr(
     img: Image.Image,
+    preprocess_fn: Callable[[Image.Image], Image.Image],
+    ocr_fn: Callable[..., WordBoxes],
     lang: str,
     psm: int,
     conf_thr: int
-) -> pd.DataFrame:
+) -> Tuple[Image.Image, WordBoxes]:
+    with span("preprocess"):
+        proc = preprocess_fn(img)
+    with span("ocr"):
+        return proc, WordBoxes.coerce(ocr_fn(proc, lang, psm, conf_thr))
+
+
+def _run_tesseract(img: Image.Image, lang: str, psm: int) -> WordBoxes:
+    """
+    Lance Tesseract via le moteur du processus (voir `src.engine`) et renvoie
+    tous les mots reconnus, sans filtre de confiance. Les erreurs sont propagées.
+    """
+    return get_engine().recognize(img, lang, psm)
+
+
+def ocr_tess(
+    img: Image.Image,
+    lang: str,
+    psm: int,
+    conf_thr: int,
+    strict: bool = False
+) -> WordBoxes:
     """
     Effectue un OCR Tesseract sur une image prétraitée,
-    filtre par confiance et renvoie un DataFrame.
+    filtre par confiance et renvoie les boîtes de mots.
+
+    Les mots bruts sont mis en cache (voir `src.cache`) selon les pixels,
+    la langue et le psm : le seuil de confiance est appliqué après coup.
 
     Args:
         img: Image PIL en niveaux de gris ou binaire.
         lang: Langues pour Tesseract (ex: 'fra+eng').
         psm: Page segmentation mode pour Tesseract.
         conf_thr: Seuil minimal de confiance (0–100).
+        strict: Propage les erreurs du moteur au lieu de renvoyer un
+            résultat vide (tâches relancées en cas d'échec).
 
     Returns:
-        DataFrame avec colonnes ['x1','y1','x2','y2','text','conf'],
-        ou un DataFrame vide si Tesseract n'est pas disponible
-        ou qu'une erreur survient.
+        `WordBoxes` (colonnes ['x1','y1','x2','y2','text','conf'] et
+        identifiants de bloc / ligne ; `to_frame()` pour un DataFrame),
+        vide si Tesseract n'est pas disponible ou qu'une erreur survient.
     """
-    try:
-        cfg = f"--oem 1 --psm {psm}"
-        df = pytesseract.image_to_data(
-            img,
-            lang=lang,
-            config=cfg,
-            output_type=pytesseract.Output.DATAFRAME
-        )
-    except pytesseract.pytesseract.TesseractNotFoundError as exc:
-        logger.error("Tesseract binaire introuvable, OCR désactivé", exc_info=True)
-        return pd.DataFrame(columns=["x1","y1","x2","y2","text","conf"])
-    except Exception:
-        logger.exception("Erreur pendant l'appel à pytesseract.image_to_data")
-        return pd.DataFrame(columns=["x1","y1","x2","y2","text","conf"])
-
-    # Nettoyage des résultats
-    df = df.dropna(subset=["text"]).copy()
-    df["conf"] = df["conf"].astype(float)
-    df = df[df["conf"] >= conf_thr]
-    # Renommage & calcul des coins bas-droite
-    df = df.rename(columns={"left": "x1", "top": "y1", "width": "w", "height": "h"})
-    df["x2"] = df["x1"] + df["w"]
-    df["y2"] = df["y1"] + df["h"]
-    return df[["x1", "y1", "x2", "y2", "text", "conf"]]
+    cache = get_ocr_cache()
+    key = make_key("ocr_tess", img, lang=lang, psm=psm) if cache is not None else None
+    words = cache.get_words(key) if cache is not None else None
+
+    if words is None:
+        try:
+            with span("tesseract", lang=lang, psm=psm):
+                words = WordBoxes.coerce(_run_tesseract(img, lang, psm))
+        except pytesseract.pytesseract.TesseractNotFoundError as exc:
+            if strict:
+                raise
+            logger.error("Tesseract binaire introuvable, OCR désactivé", exc_info=True)
+            return WordBoxes.blank()
+        except Exception:
+            if strict:
+                raise
+            logger.exception("Erreur pendant l'appel au moteur Tesseract")
+            return WordBoxes.blank()
+        if cache is not None:
+            cache.set_words(key, words)
+
+    return words.filter_conf(conf_thr)
 
 
 def test_zoom(
     base_img: Image.Image,
     zoom_factor: float,
     preprocess_fn: Callable[[Image.Image], Image.Image],
-    ocr_fn: Callable[..., pd.DataFrame],
+    ocr_fn: Callable[..., WordBoxes],
     lang: str,
     psm: int,
-    conf_thr: int
-) -> Optional[Tuple[float, int, float, float, pd.DataFrame, Image.Image]]:
+    conf_thr: int,
+    render_fn: Optional[RenderFn] = None
+) -> Optional[Tuple[float, int, float, float, WordBoxes, Image.Image]]:
     """
     Teste un facteur de zoom pour l'OCR : renvoie
     (zoom, count, mean_conf, score, df, proc_img) ou None si échec.
     """
     try:
-        w, h = base_img.size
-        img_z = base_img.resize((int(w * zoom_factor), int(h * zoom_factor)), Image.LANCZOS)
-        proc = preprocess_fn(img_z)
-        df = ocr_fn(proc, lang, psm, conf_thr)
+        with span("zoom_try", zoom=zoom_factor) as sp:
+            proc, df = _preprocess_and_ocr(_zoomed(base_img, zoom_factor, render_fn),
+                                           preprocess_fn, ocr_fn, lang, psm, conf_thr)
+        series(ZOOM_SECONDS, f"{zoom_factor:g}").observe(sp.duration)
         cnt = len(df)
-        mc = float(df["conf"].mean()) if cnt > 0 else 0.0
+        mc = df.mean_conf()
         score = cnt * mc
         return (zoom_factor, cnt, mc, score, df, proc)
     except pytesseract.pytesseract.TesseractNotFoundError:
@@ -98,86 +151,340 @@ def find_best_zoom(
     psm: int,
     conf_thr: int,
     preprocess_fn: Callable[[Image.Image], Image.Image],
-    ocr_fn: Callable[..., pd.DataFrame],
-    zoom_steps: Optional[List[float]] = None
-) -> Tuple[float, int, float, pd.DataFrame, Image.Image, pd.DataFrame]:
+    ocr_fn: Callable[..., WordBoxes],
+    zoom_steps: Optional[List[float]] = None,
+    strategy: Optional[str] = None,
+    render_fn: Optional[RenderFn] = None
+) -> Tuple[float, int, float, WordBoxes, Image.Image, pd.DataFrame]:
     """
     Recherche le meilleur zoom pour maximiser count * mean_conf.
     Ignore les zooms qui lèvent et retombe sur un OCR simple (zoom=1)
     si tous les essais échouent.
 
+    Stratégies (`strategy`, par défaut OCR_ZOOM_STRATEGY) :
+    - 'predict' : zoom prédit depuis la hauteur du texte (composantes connexes),
+      confirmé sur quelques bandes de texte ; une seule passe pleine page.
+    - 'sweep' : balayage pleine page de `zoom_steps` puis raffinement ±0.5.
+    Le `summary_df` (colonne 'stage') retrace les essais dans les deux cas.
+
+    Avec `render_fn` (page PDF, voir `src.documents.PageRenderer`), chaque zoom
+    est rendu depuis le vectoriel à la résolution voulue au lieu d'agrandir
+    `base_img`, qui sert alors seulement d'aperçu au zoom 1.
+
+    Le résultat est mis en cache selon les pixels de `base_img`, les paramètres
+    OCR et l'identité de `preprocess_fn` / `ocr_fn` ; en cas de succès, seule
+    l'image prétraitée au zoom retenu est recalculée.
+
     Returns:
         best_zoom, best_count, best_mean_conf,
         best_df, best_proc_img, summary_df
     """
     if zoom_steps is None:
         zoom_steps = [1.0, 2.0, 3.0, 4.0]
+    strategy = strategy or OCR_ZOOM_STRATEGY
+    if strategy not in _STRATEGIES:
+        raise ValueError(f"Stratégie de zoom inconnue : {strategy}")
+    with span("zoom_search", strategy=strategy, rendered=render_fn is not None) as sp:
+        result = _find_best_zoom(base_img, lang, psm, conf_thr, preprocess_fn, ocr_fn,
+                                 list(zoom_steps), strategy, render_fn)
+        sp.set(zoom=result[0], words=result[1])
+    return result
 
-    max_workers = min(32, (len(zoom_steps) or 1))
-    results: List[Tuple[float, int, float, float, pd.DataFrame, Image.Image]] = []
 
-    # 1) Passage coarse
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+def _find_best_zoom(
+    base_img: Image.Image,
+    lang: str,
+    psm: int,
+    conf_thr: int,
+    preprocess_fn: Callable[[Image.Image], Image.Image],
+    ocr_fn: Callable[..., WordBoxes],
+    zoom_steps: List[float],
+    strategy: str,
+    render_fn: Optional[RenderFn]
+) -> Tuple[float, int, float, WordBoxes, Image.Image, pd.DataFrame]:
+    """`find_best_zoom` sans la validation des arguments : cache puis stratégie."""
+    cache = get_ocr_cache()
+    fn_ids = (callable_id(preprocess_fn), callable_id(ocr_fn))
+    key = None
+    if cache is not None and None not in fn_ids:
+        key = make_key(
+            "find_best_zoom", base_img, lang=lang, psm=psm, conf_thr=conf_thr,
+            zoom_steps=list(zoom_steps), strategy=strategy, preprocess=fn_ids[0], ocr=fn_ids[1],
+            rendered=render_fn is not None
+        )
+        hit = cache.get_json(key)
+        if hit is not None:
+            zf = hit["zoom"]
+            return (
+                zf, hit["count"], hit["mean_conf"],
+                WordBoxes.from_dict(hit["df"]),
+                preprocess_fn(_zoomed(base_img, zf, render_fn)),
+                pd.DataFrame(hit["summary"])
+            )
+
+    search = _STRATEGIES[strategy]
+    result = search(base_img, lang, psm, conf_thr, preprocess_fn, ocr_fn, list(zoom_steps), render_fn)
+
+    # On ne met en cache que les recherches ayant produit du texte
+    if key is not None and result[1] > 0:
+        zf, cnt, mc, df, _, summary = result
+        cache.set_json(key, {
+            "zoom": zf, "count": cnt, "mean_conf": mc,
+            "df": df.to_dict("list", columns=WORD_COLUMNS), "summary": summary.to_dict("records")
+        })
+    return result
+
+
+def _sweep_best_zoom(
+    base_img: Image.Image,
+    lang: str,
+    psm: int,
+    conf_thr: int,
+    preprocess_fn: Callable[[Image.Image], Image.Image],
+    ocr_fn: Callable[..., WordBoxes],
+    zoom_steps: List[float],
+    render_fn: Optional[RenderFn] = None
+) -> Tuple[float, int, float, WordBoxes, Image.Image, pd.DataFrame]:
+    """
+    Balayage exhaustif des zooms (stratégie 'sweep') : OCR pleine page à chaque
+    zoom puis raffinement ±0.5 autour du meilleur. Seul le meilleur résultat
+    (image + mots) est conservé en mémoire au fil du balayage.
+    """
+    best: Optional[Tuple[float, int, float, float, WordBoxes, Image.Image]] = None
+    rows: List[dict] = []
+
+    def _run(zooms: List[float], label: str) -> None:
+        nonlocal best
+        executor = get_executor()
         futures = [
-            executor.submit(test_zoom, base_img, z, preprocess_fn, ocr_fn, lang, psm, conf_thr)
-            for z in zoom_steps
+            executor.submit(test_zoom, base_img, z, preprocess_fn, ocr_fn, lang, psm, conf_thr, render_fn)
+            for z in zooms
         ]
         for future in futures:
             try:
                 res = future.result()
-                if res:
-                    results.append(res)
             except pytesseract.pytesseract.TesseractNotFoundError:
                 # Remonter tant qu'on veut masquer le bouton ailleurs
                 raise
             except Exception:
-                logger.warning("Un zoom a levé une exception et a été ignoré")
+                logger.warning("Un zoom (%s) a levé une exception et a été ignoré", label)
+                continue
+            if not res:
+                continue
+            zf, cnt, mc, sc, _, _ = res
+            rows.append({"zoom": zf, "count": cnt, "mean_conf": mc, "score": sc, "stage": label})
+            if best is None or sc > best[3]:
+                best = res
+
+    # 1) Passage coarse
+    with span("zoom_sweep"):
+        _run(list(zoom_steps), "sweep")
 
     # 2) Fallback si aucun résultat valide
-    if not results:
-        logger.error("find_best_zoom : tous les zooms ont échoué, fallback OCR simple")
-        proc0 = preprocess_fn(base_img)
-        df0 = ocr_fn(proc0, lang, psm, conf_thr)
-        cnt0 = len(df0)
-        mc0 = float(df0["conf"].mean()) if cnt0 > 0 else 0.0
-        summary = pd.DataFrame([{
-            "zoom": 1.0,
-            "count": cnt0,
-            "mean_conf": mc0,
-            "score": cnt0 * mc0
-        }])
-        return (1.0, cnt0, mc0, df0, proc0, summary)
-
-    # 3) Raffinement autour du meilleur initial
-    best_initial = max(results, key=lambda x: x[3])[0]
-    neighbors = {best_initial}
-    if best_initial - 0.5 >= min(zoom_steps):
-        neighbors.add(best_initial - 0.5)
-    if best_initial + 0.5 <= max(zoom_steps):
-        neighbors.add(best_initial + 0.5)
-
-    with ThreadPoolExecutor(max_workers=len(neighbors)) as executor:
+    if best is None:
+        return _single_pass(base_img, 1.0, lang, psm, conf_thr, preprocess_fn, ocr_fn, "fallback", render_fn)
+
+    # 3) Raffinement autour du meilleur initial (sans re-tester les zooms connus)
+    best_initial = best[0]
+    tested = {row["zoom"] for row in rows}
+    neighbors = [
+        z for z in (best_initial - 0.5, best_initial + 0.5)
+        if min(zoom_steps) <= z <= max(zoom_steps) and z not in tested
+    ]
+    if neighbors:
+        with span("zoom_refine"):
+            _run(neighbors, "refine")
+
+    # 4) Choix final
+    best_zoom, best_count, best_mean_conf, _, best_df, best_proc_img = best
+    return (best_zoom, best_count, best_mean_conf, best_df, best_proc_img, pd.DataFrame(rows))
+
+
+def _single_pass(
+    base_img: Image.Image,
+    zoom: float,
+    lang: str,
+    psm: int,
+    conf_thr: int,
+    preprocess_fn: Callable[[Image.Image], Image.Image],
+    ocr_fn: Callable[..., WordBoxes],
+    stage: str,
+    render_fn: Optional[RenderFn] = None
+) -> Tuple[float, int, float, WordBoxes, Image.Image, pd.DataFrame]:
+    """OCR pleine page unique à `zoom`, avec un résumé d'une ligne."""
+    with span("zoom_pass", zoom=zoom, stage=stage):
+        proc, df = _preprocess_and_ocr(_zoomed(base_img, zoom, render_fn),
+                                       preprocess_fn, ocr_fn, lang, psm, conf_thr)
+    cnt = len(df)
+    mc = df.mean_conf()
+    summary = pd.DataFrame([{
+        "zoom": zoom,
+        "count": cnt,
+        "mean_conf": mc,
+        "score": cnt * mc,
+        "stage": stage
+    }])
+    return (zoom, cnt, mc, df, proc, summary)
+
+
+# ----------- Stratégie prédictive -----------
+
+# Hauteur médiane des caractères (px) visée pour Tesseract
+TARGET_TEXT_HEIGHT = 24.0
+
+
+def estimate_text_height(img: Image.Image) -> Tuple[Optional[float], np.ndarray]:
+    """
+    Estime la hauteur typique du texte via les composantes connexes d'une
+    binarisation d'Otsu (une seule passe, sans OCR).
+
+    Returns:
+        (hauteur médiane en px ou None, masque binaire encre=255). La hauteur
+        vaut None si trop peu de composantes ressemblent à des caractères.
+    """
+    gray = np.asarray(img.convert("L"))
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    n, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    if n <= 1:
+        return None, ink
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    fill = areas / np.maximum(widths * heights, 1)
+    # Caractères plausibles : ni poussière, ni traits de tableau, ni aplats
+    char_like = (
+        (heights >= 3)
+        & (heights <= gray.shape[0] * 0.1)
+        & (widths <= heights * 3)
+        & (fill > 0.1)
+    )
+    if char_like.sum() < 10:
+        return None, ink
+    return float(np.median(heights[char_like])), ink
+
+
+def _snap_zoom(zoom: float, zoom_steps: List[float]) -> float:
+    zoom = round(zoom * 2) / 2
+    return float(min(max(zoom, min(zoom_steps)), max(zoom_steps)))
+
+
+def _text_strips(ink: np.ndarray, text_height: float, n_strips: int = 3) -> List[Tuple[int, int]]:
+    """
+    Choisit `n_strips` bandes horizontales (y0, y1) parmi les plus denses en encre,
+    une par tranche verticale de la page pour rester représentatif.
+    """
+    h = ink.shape[0]
+    band = int(min(h, max(32, text_height * 8)))
+    profile = (ink > 0).sum(axis=1).astype(np.float64)
+    # Somme glissante de l'encre sur une hauteur de bande
+    window = np.convolve(profile, np.ones(band), mode="valid")
+    if window.size == 0:
+        return [(0, h)]
+    strips: List[Tuple[int, int]] = []
+    section = max(1, window.size // n_strips)
+    for start in range(0, window.size, section):
+        seg = window[start:start + section]
+        if seg.size == 0 or seg.max() <= 0:
+            continue
+        y0 = start + int(seg.argmax())
+        strips.append((y0, y0 + band))
+        if len(strips) == n_strips:
+            break
+    return strips or [(0, h)]
+
+
+def _score_strips(
+    strips: List[Tuple[Image.Image, Optional[RenderFn]]],
+    zoom: float,
+    preprocess_fn: Callable[[Image.Image], Image.Image],
+    ocr_fn: Callable[..., WordBoxes],
+    lang: str,
+    psm: int,
+    conf_thr: int
+) -> Optional[Tuple[float, int, float, float]]:
+    """OCR des bandes échantillons (image, rendu) à `zoom` : (zoom, count, mean_conf, score)."""
+    cnt, conf_sum = 0, 0.0
+    for strip, strip_render in strips:
+        res = test_zoom(strip, zoom, preprocess_fn, ocr_fn, lang, psm, conf_thr, strip_render)
+        if res is None:
+            return None
+        cnt += res[1]
+        conf_sum += res[1] * res[2]
+    mc = conf_sum / cnt if cnt else 0.0
+    return (zoom, cnt, mc, cnt * mc)
+
+
+def _predict_best_zoom(
+    base_img: Image.Image,
+    lang: str,
+    psm: int,
+    conf_thr: int,
+    preprocess_fn: Callable[[Image.Image], Image.Image],
+    ocr_fn: Callable[..., WordBoxes],
+    zoom_steps: List[float],
+    render_fn: Optional[RenderFn] = None
+) -> Tuple[float, int, float, WordBoxes, Image.Image, pd.DataFrame]:
+    """
+    Stratégie 'predict' : estime le zoom depuis la hauteur du texte, le confirme
+    sur quelques bandes échantillons (zoom prédit ±0.5), puis OCRise la page
+    entière une seule fois au zoom retenu.
+    """
+    text_height, ink = estimate_text_height(base_img)
+    if text_height is None:
+        if not ink.any():
+            # Page blanche : inutile de chercher un zoom
+            return _single_pass(base_img, float(min(zoom_steps)), lang, psm, conf_thr,
+                                preprocess_fn, ocr_fn, "blank", render_fn)
+        logger.info("find_best_zoom : hauteur de texte non estimable, balayage complet")
+        return _sweep_best_zoom(base_img, lang, psm, conf_thr, preprocess_fn, ocr_fn, zoom_steps, render_fn)
+
+    predicted = _snap_zoom(TARGET_TEXT_HEIGHT / text_height, zoom_steps)
+    candidates = sorted({
+        _snap_zoom(z, zoom_steps) for z in (predicted - 0.5, predicted, predicted + 0.5)
+    })
+    w = base_img.size[0]
+    strips = [
+        (base_img.crop(box), functools.partial(render_fn, clip=box) if render_fn is not None else None)
+        for box in ((0, y0, w, y1) for y0, y1 in _text_strips(ink, text_height))
+    ]
+    del ink
+
+    rows: List[dict] = []
+    best_zoom, best_score = predicted, -1.0
+    with span("zoom_strips", predicted=predicted, strips=len(strips), text_height=text_height):
+        executor = get_executor()
         futures = [
-            executor.submit(test_zoom, base_img, z, preprocess_fn, ocr_fn, lang, psm, conf_thr)
-            for z in sorted(neighbors)
+            executor.submit(_score_strips, strips, z, preprocess_fn, ocr_fn, lang, psm, conf_thr)
+            for z in candidates
         ]
-        for future in futures:
+        for z, future in zip(candidates, futures):
             try:
                 res = future.result()
-                if res:
-                    results.append(res)
             except pytesseract.pytesseract.TesseractNotFoundError:
                 raise
             except Exception:
-                logger.warning("Un zoom de raffinage a levé et a été ignoré")
+                logger.warning("Un zoom (%s) a levé une exception et a été ignoré", z)
+                continue
+            if res is None:
+                continue
+            zf, cnt, mc, sc = res
+            rows.append({
+                "zoom": zf, "count": cnt, "mean_conf": mc, "score": sc,
+                "stage": "strips" if zf != predicted else "predicted"
+            })
+            # À score égal, le plus petit zoom est le moins coûteux
+            if sc > best_score:
+                best_zoom, best_score = zf, sc
 
-    # 4) Choix final
-    best_zoom, best_count, best_mean_conf, _, best_df, best_proc_img = max(results, key=lambda x: x[3])
+    zoom, cnt, mc, df, proc, final = _single_pass(
+        base_img, best_zoom, lang, psm, conf_thr, preprocess_fn, ocr_fn, "page", render_fn
+    )
+    summary = pd.DataFrame(rows + final.to_dict("records"))
+    summary.attrs["text_height"] = text_height
+    return (zoom, cnt, mc, df, proc, summary)
 
-    # 5) Construction du résumé
-    summary_df = pd.DataFrame([
-        {"zoom": zf, "count": cnt, "mean_conf": mc, "score": sc}
-        for (zf, cnt, mc, sc, _, _) in results
-    ])
 
-    return (best_zoom, best_count, best_mean_conf, best_df, best_proc_img, summary_df)
+_STRATEGIES = {
+    "predict": _predict_best_zoom,
+    "sweep": _sweep_best_zoom,
+}
@@ -0,0 +1,202 @@
+# src/pipeline.py
+
+"""
+Pipeline documentaire en flux pour OCR - Green Hub.
+
+Les pages sont rendues paresseusement (PDF via PyMuPDF, TIFF multi-trames)
+dans un thread dédié et placées dans une file bornée ; une page PDF dotée
+d'une couche texte y est lue sans rendu (voir `src.textlayer`). Le
+prétraitement et l'OCR de chaque page tournent sur l'exécuteur OCR global avec un nombre borné
+de pages en vol. Le rendu, le prétraitement et l'OCR de pages différentes se
+chevauchent, et la mémoire de pointe ne dépend pas du nombre de pages.
+
+Les résultats sont produits page par page, dans l'ordre de complétion, pour
+que l'UI et l'API puissent afficher des résultats partiels.
+"""
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional, Tuple, Union
+
+import pandas as pd
+from PIL import Image
+
+from .documents import PageRenderer, document_key
+from .executor import get_executor
+from .extensions import PDF_EXTENSIONS
+from .layout import ocr_layout
+from .observability import PAGE_SECONDS
+from .ocr import RenderFn, find_best_zoom
+from .textlayer import TextLayerPage, iter_document_contents, text_layer_words
+from .tracing import get_request_id, new_request_id, request_context, span
+from .wordboxes import WordBoxes
+
+logger = logging.getLogger(__name__)
+
+# Pages rendues en attente d'OCR
+RENDER_QUEUE_SIZE = 2
+
+_DONE = object()
+
+
+@dataclass
+class PageResult:
+    """Résultat OCR d'une page (index à partir de 0)."""
+
+    page: int
+    words: WordBoxes
+    zoom: float = 1.0
+    count: int = 0
+    mean_conf: float = 0.0
+    summary: Optional[pd.DataFrame] = None
+    error: Optional[str] = None
+    timings: dict = field(default_factory=dict)
+
+
+PageContent = Union[Image.Image, TextLayerPage]
+
+
+def _put(out: "queue.Queue", item: object, stop: threading.Event) -> bool:
+    """Dépose `item` dans `out` sans bloquer au-delà d'un arrêt ; False si arrêté."""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _render_worker(
+    pages: Iterator[PageContent],
+    out: "queue.Queue",
+    stop: threading.Event,
+) -> None:
+    """
+    Rend les pages dans `out` (bornée) jusqu'à épuisement ou arrêt. Un
+    consommateur parti ne bloque jamais le thread, et le document est fermé
+    dans tous les cas.
+    """
+    try:
+        for idx, img in enumerate(pages):
+            if not _put(out, (idx, img), stop):
+                return
+        _put(out, _DONE, stop)
+    except Exception as exc:
+        logger.exception("Erreur de rendu du document")
+        _put(out, exc, stop)
+    finally:
+        close = getattr(pages, "close", None)
+        if close is not None:
+            close()
+
+
+def _rendered(pages: Iterator[PageContent], stop: threading.Event) -> Iterator[Tuple[int, PageContent]]:
+    """Consomme les pages rendues par le thread de rendu."""
+    buf: "queue.Queue" = queue.Queue(maxsize=RENDER_QUEUE_SIZE)
+    thread = threading.Thread(target=_render_worker, args=(pages, buf, stop),
+                              name="ocr-render", daemon=True)
+    thread.start()
+    while True:
+        item = buf.get()
+        if item is _DONE:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def ocr_page(
+    img: PageContent,
+    page: int,
+    lang: str,
+    psm: int,
+    conf_thr: int,
+    preprocess_fn: Callable[[Image.Image], Image.Image],
+    auto_zoom: bool = True,
+    render_fn: Optional[RenderFn] = None,
+) -> PageResult:
+    """
+    Prétraitement + OCR des zones de texte d'une page (avec recherche de zoom
+    si `auto_zoom`). Une page PDF lue dans sa couche texte n'est OCRisée que
+    sur ses images ; une page PDF rastérisée est rendue à chaque zoom essayé
+    par `render_fn` (voir `find_best_zoom`).
+    """
+    t0 = time.perf_counter()
+    path = "text" if isinstance(img, TextLayerPage) else "raster"
+    with span("page", page=page, path=path) as sp:
+        try:
+            if isinstance(img, TextLayerPage):
+                df = text_layer_words(img, lang, psm, conf_thr, preprocess_fn)
+                result = PageResult(page, df, 1.0, len(df), df.mean_conf())
+            elif auto_zoom:
+                zoom, cnt, mc, df, _, summary = find_best_zoom(
+                    img, lang, psm, conf_thr, preprocess_fn, ocr_layout, render_fn=render_fn
+                )
+                result = PageResult(page, df, zoom, cnt, mc, summary)
+            else:
+                with span("preprocess"):
+                    proc = preprocess_fn(img)
+                df = ocr_layout(proc, lang, psm, conf_thr)
+                cnt = len(df)
+                mc = df.mean_conf()
+                result = PageResult(page, df, 1.0, cnt, mc)
+        except Exception as exc:
+            logger.exception("OCR de la page %s échoué", page + 1)
+            result = PageResult(page, WordBoxes.blank(), error=str(exc))
+            sp.error = str(exc)
+        sp.set(words=result.count)
+    result.timings["ocr"] = time.perf_counter() - t0
+    PAGE_SECONDS.labels(path).observe(result.timings["ocr"])
+    return result
+
+
+def process_document(
+    raw: bytes,
+    filename: str,
+    lang: str,
+    psm: int,
+    conf_thr: int,
+    preprocess_fn: Callable[[Image.Image], Image.Image],
+    auto_zoom: bool = True,
+    dpi: int = 200,
+    max_pending: Optional[int] = None,
+) -> Iterator[PageResult]:
+    """
+    OCR d'un document multi-pages en flux.
+
+    Args:
+        raw: Octets du document (PDF, TIFF ou image).
+        filename: Nom du fichier (détermine le format).
+        lang, psm, conf_thr: Paramètres Tesseract.
+        preprocess_fn: Fonction de prétraitement appliquée à chaque page.
+        auto_zoom: Active la recherche de zoom par page.
+        dpi: Résolution de rendu des pages PDF.
+        max_pending: Pages en cours d'OCR au plus (défaut : 2 x workers).
+
+    Yields:
+        PageResult, dans l'ordre de complétion des pages.
+    """
+    stop = threading.Event()
+    pages = _rendered(iter_document_contents(raw, filename, dpi), stop)
+    # Toutes les pages du document dans la même requête (générateur : pas de
+    # contexte ouvert entre deux `yield`, chaque tâche le rétablit)
+    request_id = get_request_id() or new_request_id()
+    # PDF : les zooms sont rendus depuis le document ouvert (cache de documents)
+    doc_key = document_key(raw) if auto_zoom and filename.lower().endswith(PDF_EXTENSIONS) else None
+
+    def _task(item: Tuple[int, PageContent]) -> PageResult:
+        idx, img = item
+        render_fn = PageRenderer(raw, idx, dpi, key=doc_key) if doc_key else None
+        with request_context(request_id):
+            return ocr_page(img, idx, lang, psm, conf_thr, preprocess_fn, auto_zoom, render_fn)
+
+    try:
+        for _, future in get_executor().iter_completed(_task, pages, max_pending):
+            yield future.result()
+    finally:
+        # Consommateur arrêté (ou erreur) : libérer le thread de rendu
+        stop.set()
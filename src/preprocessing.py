@@ -1,31 +1,343 @@
 """
 Module de prétraitement des images pour l'application OCR - Green Hub.
 Inclut la conversion en niveaux de gris, CLAHE, seuillage adaptatif et fermeture morphologique.
+
+Le prétraitement ne dépend d'aucun framework : le même moteur sert l'UI,
+l'API et les workers Celery. Les objets OpenCV (CLAHE, élément structurant)
+sont construits une fois par jeu de paramètres, et les résultats sont mis en
+cache en mémoire sous une clé calculée sur les pixels de l'image
+(`cache.image_digest`, et non le hachage générique de Streamlit).
+
+En mode 'adaptive' (PREPROCESS_MODE, défaut), chaque page est d'abord
+analysée (échantillon, vignette) puis classée : déjà binaire, propre (page
+PDF rendue, scan net), faible contraste, bruitée ou photographiée (éclairage
+inégal). Seules les étapes utiles à sa classe sont exécutées ; le mode 'full'
+applique toujours la chaîne complète. La chaîne exécutée et la durée de chaque
+étape sont jointes à l'image résultat (`preprocess_report`).
 """
-import streamlit as st
+import functools
+import hashlib
 import logging
-from typing import Tuple
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import astuple, dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+
 from PIL import Image
 import numpy as np
 import cv2
 
+from .cache import image_digest
+from .config import PREPROCESS_CACHE_MAX_BYTES, PREPROCESS_MODE
+from .observability import CACHE_EVENTS, PREPROCESS_PAGES, PREPROCESS_STAGE_SECONDS, series
+
 logger = logging.getLogger(__name__)
 
-@st.cache_data(show_spinner=False)
+PREPROCESS_MODES = ("adaptive", "full")
+
+
+@dataclass(frozen=True)
+class PreprocessParams:
+    """Paramètres du prétraitement (voir `preprocess`)."""
+
+    clip_limit: float = 2.0
+    tile_grid_size: Tuple[int, int] = (8, 8)
+    thresh_block_size: int = 15
+    thresh_C: int = 3
+    morph_kernel: Tuple[int, int] = (3, 3)
+    mode: str = PREPROCESS_MODE
+
+    def __post_init__(self):
+        if self.mode not in PREPROCESS_MODES:
+            raise ValueError(f"Mode de prétraitement inconnu : {self.mode}")
+
+
+@dataclass
+class PageAnalysis:
+    """Mesures d'une page et classe retenue (voir `analyze_page`)."""
+
+    kind: str
+    midtones: float
+    contrast: float
+    unevenness: float
+    noise: float
+
+
+@dataclass
+class PreprocessReport:
+    """Chaîne exécutée pour une image et durée de chaque étape (s)."""
+
+    mode: str
+    kind: str
+    chain: Tuple[str, ...]
+    timings: Dict[str, float] = field(default_factory=dict)
+    analysis: Optional[PageAnalysis] = None
+
+
+@functools.lru_cache(maxsize=32)
+def _structuring_element(size: Tuple[int, int]) -> np.ndarray:
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, size)
+    kernel.setflags(write=False)
+    return kernel
+
+
+_clahe_local = threading.local()
+
+
+def _clahe(clip_limit: float, tile_grid_size: Tuple[int, int]):
+    # Un objet CLAHE conserve des tampons internes : un par thread et par paramètres
+    cache: Dict[Tuple, object] = getattr(_clahe_local, "objects", None)
+    if cache is None:
+        cache = _clahe_local.objects = {}
+    key = (clip_limit, tuple(tile_grid_size))
+    clahe = cache.get(key)
+    if clahe is None:
+        clahe = cache[key] = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tuple(tile_grid_size))
+    return clahe
+
+
+def _to_gray(img: Image.Image) -> np.ndarray:
+    if img.mode == "L":
+        return np.asarray(img)
+    arr = np.asarray(img if img.mode == "RGB" else img.convert("RGB"))
+    return cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
+
+
+def _adaptive(gray: np.ndarray, params: PreprocessParams) -> np.ndarray:
+    return cv2.adaptiveThreshold(
+        gray,
+        maxValue=255,
+        adaptiveMethod=cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        thresholdType=cv2.THRESH_BINARY,
+        blockSize=params.thresh_block_size,
+        C=params.thresh_C
+    )
+
+
+# Étapes appliquées après la conversion en niveaux de gris
+STAGES: Dict[str, Callable[[np.ndarray, PreprocessParams], np.ndarray]] = {
+    # CLAHE (Contrast Limited Adaptive Histogram Equalization)
+    "clahe": lambda g, p: _clahe(p.clip_limit, p.tile_grid_size).apply(g),
+    # Filtre médian : supprime le bruit impulsionnel avant seuillage
+    "median": lambda g, p: cv2.medianBlur(g, 3),
+    # Seuillage adaptatif gaussien
+    "adaptive": _adaptive,
+    # Seuillage global d'Otsu (fond uniforme)
+    "otsu": lambda g, p: cv2.threshold(g, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1],
+    # Fermeture morphologique
+    "close": lambda g, p: cv2.morphologyEx(
+        g, cv2.MORPH_CLOSE, _structuring_element(tuple(p.morph_kernel))
+    ),
+}
+
+FULL_CHAIN: Tuple[str, ...] = ("clahe", "adaptive", "close")
+# Chaîne minimale par classe de page
+CHAINS: Dict[str, Tuple[str, ...]] = {
+    "binary": ("otsu",),
+    "clean": ("otsu",),
+    "low_contrast": ("clahe", "otsu"),
+    "noisy": ("median", "adaptive", "close"),
+    "photo": FULL_CHAIN,
+}
+
+# Seuils de classification (niveaux de gris 0-255)
+BINARY_MAX_MIDTONES = 0.01  # part de pixels entre 32 et 224
+PHOTO_MIN_UNEVENNESS = 40.0  # écart du fond (5e-95e centile) sur la page
+NOISY_MIN_NOISE = 6.0  # écart-type du résidu haute fréquence sur le fond
+LOW_CONTRAST_MAX = 100.0  # écart moyen fond / encre
+
+
+def analyze_page(gray: np.ndarray) -> PageAnalysis:
+    """
+    Classe une page en niveaux de gris à partir de mesures bon marché :
+    échantillon 1 pixel sur 2 (tons moyens, contraste), vignette 256 px
+    (régularité du fond) et fenêtre centrale 512 px pleine résolution (bruit).
+    """
+    sample = gray[::2, ::2]
+    midtones = float(((sample > 32) & (sample < 224)).mean())
+    thr, _ = cv2.threshold(sample, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    ink, paper = sample[sample <= thr], sample[sample > thr]
+    contrast = float(paper.mean() - ink.mean()) if ink.size and paper.size else 0.0
+
+    # Fond estimé en effaçant le texte (dilatation) sur une vignette
+    scale = min(1.0, 256 / max(gray.shape))
+    thumb = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    background = cv2.medianBlur(cv2.dilate(thumb, np.ones((9, 9), np.uint8)), 5)
+    unevenness = float(np.percentile(background, 95) - np.percentile(background, 5))
+
+    h, w = gray.shape
+    crop = gray[max(0, h // 2 - 256):h // 2 + 256, max(0, w // 2 - 256):w // 2 + 256].astype(np.float32)
+    residual = crop - cv2.GaussianBlur(crop, (0, 0), 1.5)
+    # Fond seulement : les bords des caractères ne comptent pas comme du bruit
+    paper_mask = cv2.erode((crop > thr).astype(np.uint8), np.ones((5, 5), np.uint8)).astype(bool)
+    noise = float(residual[paper_mask].std()) if paper_mask.any() else 0.0
+
+    if midtones <= BINARY_MAX_MIDTONES:
+        kind = "binary"
+    elif unevenness > PHOTO_MIN_UNEVENNESS:
+        kind = "photo"
+    elif noise > NOISY_MIN_NOISE:
+        kind = "noisy"
+    elif contrast < LOW_CONTRAST_MAX:
+        kind = "low_contrast"
+    else:
+        kind = "clean"
+    return PageAnalysis(kind, midtones, contrast, unevenness, noise)
+
+
+def _run(img: Image.Image, params: PreprocessParams) -> Image.Image:
+    """Chaîne OpenCV, sans cache ; le rapport est joint à `image.info['preprocess']`."""
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    arr = _to_gray(img)
+    t0 = _timed(timings, "gray", t0)
+    analysis = None
+    if params.mode == "full":
+        kind, chain = "full", FULL_CHAIN
+    else:
+        analysis = analyze_page(arr)
+        t0 = _timed(timings, "analyze", t0)
+        kind, chain = analysis.kind, CHAINS[analysis.kind]
+    for stage in chain:
+        arr = STAGES[stage](arr, params)
+        t0 = _timed(timings, stage, t0)
+    PREPROCESS_PAGES.labels(kind, params.mode).inc()
+    out = Image.fromarray(arr)
+    out.info["preprocess"] = PreprocessReport(params.mode, kind, ("gray",) + chain, timings, analysis)
+    return out
+
+
+def _timed(timings: Dict[str, float], stage: str, t0: float) -> float:
+    now = time.perf_counter()
+    timings[stage] = now - t0
+    series(PREPROCESS_STAGE_SECONDS, stage).observe(now - t0)
+    return now
+
+
+def preprocess_report(img: Image.Image) -> Optional[PreprocessReport]:
+    """Rapport (classe, chaîne, durées) d'une image issue du prétraitement."""
+    return img.info.get("preprocess")
+
+
+class PreprocessEngine:
+    """
+    Prétraitement avec cache LRU borné en octets (images binaires résultantes).
+
+    Args:
+        max_bytes: Taille maximale du cache ; 0 le désactive.
+    """
+
+    def __init__(self, max_bytes: int = PREPROCESS_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, Image.Image]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(digest: str, params: PreprocessParams) -> str:
+        payload = f"{digest}:{astuple(params)}"
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def _get(self, key: str) -> Optional[Image.Image]:
+        with self._lock:
+            img = self._data.get(key)
+            if img is not None:
+                self._data.move_to_end(key)
+        series(CACHE_EVENTS, "preprocess", "hit" if img is not None else "miss").inc()
+        # Copie : l'appelant peut modifier l'image sans altérer le cache
+        return img.copy() if img is not None else None
+
+    def _set(self, key: str, img: Image.Image) -> None:
+        size = img.width * img.height
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._total -= previous.width * previous.height
+            self._data[key] = img.copy()
+            self._total += size
+            while self._total > self.max_bytes:
+                _, old = self._data.popitem(last=False)
+                self._total -= old.width * old.height
+                series(CACHE_EVENTS, "preprocess", "eviction").inc()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._total = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def run(
+        self,
+        img: Image.Image,
+        params: PreprocessParams = PreprocessParams(),
+        key: Optional[str] = None,
+    ) -> Image.Image:
+        """Prétraite `img` ; `key` évite de hacher l'image si l'appelant la connaît."""
+        if not isinstance(img, Image.Image):
+            raise ValueError("L'argument 'img' doit être une instance de PIL.Image.Image.")
+        if self.max_bytes <= 0:
+            return self._run_checked(img, params)
+        key = key or self.make_key(image_digest(img), params)
+        cached = self._get(key)
+        if cached is not None:
+            return cached
+        out = self._run_checked(img, params)
+        self._set(key, out)
+        return out
+
+    @staticmethod
+    def _run_checked(img: Image.Image, params: PreprocessParams) -> Image.Image:
+        try:
+            return _run(img, params)
+        except Exception as exc:
+            logger.exception("Erreur lors du prétraitement de l'image")
+            raise RuntimeError("Échec du prétraitement de l'image") from exc
+
+
+_engine: Optional[PreprocessEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_preprocess_engine() -> PreprocessEngine:
+    """Retourne le moteur de prétraitement du processus (créé à la demande)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = PreprocessEngine()
+    return _engine
+
+
+def set_preprocess_engine(engine: Optional[PreprocessEngine]) -> None:
+    """Remplace le moteur du processus (None = reconstruire à la demande)."""
+    global _engine
+    with _engine_lock:
+        _engine = engine
+
+
 def preprocess(
     img: Image.Image,
     clip_limit: float = 2.0,
     tile_grid_size: Tuple[int, int] = (8, 8),
     thresh_block_size: int = 15,
     thresh_C: int = 3,
-    morph_kernel: Tuple[int, int] = (3, 3)
+    morph_kernel: Tuple[int, int] = (3, 3),
+    mode: Optional[str] = None,
 ) -> Image.Image:
     """
-    Améliore la lisibilité d'une image pour l'OCR en appliquant :
+    Améliore la lisibilité d'une image pour l'OCR. La chaîne complète
+    (mode 'full') applique :
     1. Conversion en niveaux de gris
     2. CLAHE (Contrast Limited Adaptive Histogram Equalization)
     3. Seuillage adaptatif gaussien
     4. Fermeture morphologique
+    En mode 'adaptive', seules les étapes utiles à la classe de la page sont
+    appliquées (voir `CHAINS`).
 
     Args:
         img (Image.Image): Image PIL en couleur.
@@ -34,38 +346,16 @@ def preprocess(
         thresh_block_size (int): Taille du bloc (impair) pour le seuillage adaptatif.
         thresh_C (int): Constante soustraite dans le seuillage adaptatif.
         morph_kernel (Tuple[int, int]): Taille du noyau pour la fermeture morphologique.
+        mode (str): 'adaptive' ou 'full' (défaut : PREPROCESS_MODE).
 
     Returns:
-        Image.Image: Image binaire traitée prête pour l'OCR.
+        Image.Image: Image binaire traitée prête pour l'OCR ; la chaîne
+        exécutée est lisible via `preprocess_report`.
 
     Raises:
         ValueError: Si `img` n'est pas une instance de PIL.Image.Image.
         RuntimeError: En cas d'erreur lors du traitement OpenCV.
     """
-    # Validation d'entrée
-    if not isinstance(img, Image.Image):
-        raise ValueError("L'argument 'img' doit être une instance de PIL.Image.Image.")
-
-    try:
-        # Conversion en niveaux de gris
-        arr = np.array(img)
-        gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
-        # CLAHE
-        clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
-        cl = clahe.apply(gray)
-        # Seuillage adaptatif
-        th = cv2.adaptiveThreshold(
-            cl,
-            maxValue=255,
-            adaptiveMethod=cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            thresholdType=cv2.THRESH_BINARY,
-            blockSize=thresh_block_size,
-            C=thresh_C
-        )
-        # Fermeture morphologique
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, morph_kernel)
-        closed = cv2.morphologyEx(th, cv2.MORPH_CLOSE, kernel)
-        return Image.fromarray(closed)
-    except Exception as exc:
-        logger.exception("Erreur lors du prétraitement de l'image")
-        raise RuntimeError("Échec du prétraitement de l'image") from exc
+    params = PreprocessParams(clip_limit, tuple(tile_grid_size), thresh_block_size,
+                              thresh_C, tuple(morph_kernel), mode or PREPROCESS_MODE)
+    return get_preprocess_engine().run(img, params)
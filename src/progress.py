@@ -0,0 +1,307 @@
+# src/progress.py
+
+"""
+Canal de progression des documents pour OCR - Green Hub.
+
+Les tâches Celery publient des événements numérotés par document :
+- `queued` : document accepté (nombre de pages)
+- `stage` : étape terminée pour une page (render, preprocess, ocr, ou textlayer
+  pour un PDF natif) et sa durée
+- `page` : résultat d'une page, dès qu'il est disponible
+- `retry` : nouvelle tentative d'une page
+- `done` / `error` : fin du document (événements terminaux)
+
+L'API les relit à partir d'un curseur (`seq` du dernier événement reçu) :
+flux Server-Sent Events ou long-poll qui bloque jusqu'au prochain événement.
+L'attente a lieu côté serveur, sur le canal, plutôt qu'en requêtes HTTP
+répétées par les clients ; dans l'API, elle passe par `read_progress_async`,
+qui n'occupe aucun thread entre deux lectures.
+
+Canaux : SQLite (défaut, processus sur un volume commun ; en Kubernetes,
+où API et workers sont dans des pods distincts, utiliser Redis), Redis (listes à
+expiration) ou mémoire (un seul processus : tests, mode eager). La publication
+ne fait jamais échouer un traitement : une erreur du canal est journalisée.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import (
+    PROGRESS_BACKEND,
+    PROGRESS_DB_PATH,
+    PROGRESS_POLL_INTERVAL,
+    PROGRESS_REDIS_URL,
+    PROGRESS_TTL_SECONDS,
+)
+from .observability import PROGRESS_EVENTS
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_EVENTS = ("done", "error")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    event TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_progress_ts ON progress_events (ts);
+"""
+
+
+class ProgressChannel(ABC):
+    """
+    Journal d'événements par document, lu à partir d'un curseur.
+
+    Chaque événement est un dict JSON avec `seq` (croissant à partir de 1,
+    par document), `type`, `ts` et les données propres au type.
+    """
+
+    poll_interval = PROGRESS_POLL_INTERVAL
+
+    @abstractmethod
+    def publish(self, job_id: str, event: Dict[str, Any]) -> int:
+        """Ajoute un événement ; retourne son numéro."""
+
+    @abstractmethod
+    def fetch(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """Événements de numéro > `after`, sans attendre."""
+
+    def _wait(self, job_id: str, after: int, timeout: float) -> None:
+        time.sleep(min(self.poll_interval, timeout))
+
+    def read(self, job_id: str, after: int = 0, timeout: float = 0.0) -> List[Dict[str, Any]]:
+        """Événements de numéro > `after`, en attendant jusqu'à `timeout` s qu'il y en ait."""
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self.fetch(job_id, after)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events
+            self._wait(job_id, after, remaining)
+
+    async def read_async(self, job_id: str, after: int = 0, timeout: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        Comme `read`, pour la boucle d'événements : chaque lecture passe
+        brièvement par un thread, l'attente entre deux lectures est un
+        `asyncio.sleep` (aucun thread bloqué pendant un long-poll ou un flux SSE).
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            events = await asyncio.to_thread(self.fetch, job_id, after)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events
+            await asyncio.sleep(min(self.poll_interval, remaining))
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryProgressChannel(ProgressChannel):
+    """Canal en mémoire, réveil immédiat des lecteurs (un seul processus)."""
+
+    def __init__(self, max_jobs: int = 1000):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._cond = threading.Condition()
+
+    def publish(self, job_id: str, event: Dict[str, Any]) -> int:
+        with self._cond:
+            events = self._jobs.setdefault(job_id, [])
+            self._jobs.move_to_end(job_id)
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            seq = len(events) + 1
+            events.append(dict(event, seq=seq))
+            self._cond.notify_all()
+        return seq
+
+    def fetch(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        with self._cond:
+            return list(self._jobs.get(job_id, [])[after:])
+
+    def _wait(self, job_id: str, after: int, timeout: float) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._jobs.get(job_id, [])) > after, timeout)
+
+
+class SQLiteProgressChannel(ProgressChannel):
+    """
+    Canal SQLite (WAL), partagé par les processus d'un même hôte ou volume.
+    Les événements plus vieux que `ttl` s sont supprimés à chaque fin de document.
+    """
+
+    def __init__(self, path: str, ttl: float = PROGRESS_TTL_SECONDS, timeout: float = 30.0):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def publish(self, job_id: str, event: Dict[str, Any]) -> int:
+        conn = self._connect()
+        # IMMEDIATE : numérotation sans doublon entre workers concurrents
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (seq,) = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM progress_events WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO progress_events (job_id, seq, ts, event) VALUES (?, ?, ?, ?)",
+                (job_id, seq, event["ts"], json.dumps(dict(event, seq=seq), default=str)),
+            )
+            if event["type"] in TERMINAL_EVENTS:
+                conn.execute("DELETE FROM progress_events WHERE ts < ?", (time.time() - self.ttl,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return seq
+
+    def fetch(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT event FROM progress_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+            (job_id, after),
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RedisProgressChannel(ProgressChannel):
+    """
+    Canal Redis : une liste par document (RPUSH donne le numéro de façon
+    atomique), expirée `ttl` s après le dernier événement.
+    """
+
+    def __init__(self, client: Any, prefix: str = "ocr-progress:", ttl: int = PROGRESS_TTL_SECONDS):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisProgressChannel":
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def publish(self, job_id: str, event: Dict[str, Any]) -> int:
+        key = self.prefix + job_id
+        # Le numéro est connu après RPUSH : il est ajouté à la lecture
+        seq = self.client.rpush(key, json.dumps(event, default=str))
+        self.client.expire(key, self.ttl)
+        return seq
+
+    def fetch(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        raw = self.client.lrange(self.prefix + job_id, after, -1)
+        return [dict(json.loads(item), seq=after + i + 1) for i, item in enumerate(raw)]
+
+
+def _build_redis_channel() -> RedisProgressChannel:
+    if not PROGRESS_REDIS_URL:
+        raise ValueError("PROGRESS_REDIS_URL requis pour le canal 'redis'")
+    return RedisProgressChannel.from_url(PROGRESS_REDIS_URL)
+
+
+_BACKENDS: Dict[str, Callable[[], ProgressChannel]] = {
+    "sqlite": lambda: SQLiteProgressChannel(PROGRESS_DB_PATH),
+    "redis": _build_redis_channel,
+    "memory": MemoryProgressChannel,
+}
+
+
+def register_progress_backend(name: str, factory: Callable[[], ProgressChannel]) -> None:
+    """Déclare un canal supplémentaire, sélectionnable via PROGRESS_BACKEND."""
+    _BACKENDS[name] = factory
+
+
+def build_progress_channel(backend: str = PROGRESS_BACKEND) -> ProgressChannel:
+    try:
+        factory = _BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Canal de progression inconnu : {backend}")
+    return factory()
+
+
+_channel: Optional[ProgressChannel] = None
+_channel_lock = threading.Lock()
+
+
+def get_progress_channel() -> ProgressChannel:
+    """Retourne le canal de progression du processus (créé à la demande)."""
+    global _channel
+    if _channel is None:
+        with _channel_lock:
+            if _channel is None:
+                _channel = build_progress_channel()
+                logger.info("Progression : %s", type(_channel).__name__)
+    return _channel
+
+
+def set_progress_channel(channel: Optional[ProgressChannel]) -> None:
+    """Remplace le canal du processus (None = reconstruire à la demande)."""
+    global _channel
+    with _channel_lock:
+        _channel = channel
+
+
+# ----------- API progression -----------
+
+def publish_progress(job_id: str, event_type: str, **data: Any) -> Optional[int]:
+    """
+    Publie un événement pour `job_id` ; retourne son numéro, ou None si le
+    canal est indisponible (le traitement continue).
+    """
+    event = dict(data, type=event_type, ts=time.time())
+    try:
+        seq = get_progress_channel().publish(job_id, event)
+    except Exception:
+        logger.warning("Publication de progression impossible (%s, %s)", job_id, event_type,
+                       exc_info=True)
+        return None
+    PROGRESS_EVENTS.labels(event_type).inc()
+    return seq
+
+
+def read_progress(job_id: str, after: int = 0, timeout: float = 0.0) -> List[Dict[str, Any]]:
+    """Événements postérieurs au curseur `after`, en attendant au plus `timeout` s."""
+    return get_progress_channel().read(job_id, after, timeout)
+
+
+async def read_progress_async(job_id: str, after: int = 0, timeout: float = 0.0) -> List[Dict[str, Any]]:
+    """Comme `read_progress`, sans bloquer de thread pendant l'attente."""
+    return await get_progress_channel().read_async(job_id, after, timeout)
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Sérialise un événement au format Server-Sent Events (id = seq)."""
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {data}\n\n"
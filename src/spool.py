@@ -0,0 +1,409 @@
+# src/spool.py
+
+"""
+Spool des documents soumis pour OCR - Green Hub.
+
+Les octets d'un document ne transitent jamais par le broker Celery : l'API
+les écrit par morceaux dans un stockage adressé par contenu (empreinte
+SHA-256) et les tâches ne transportent que cette empreinte. Chaque worker
+ouvre le blob par son chemin local (PyMuPDF et PIL ne lisent que les pages
+utiles) ; le même document soumis deux fois n'est stocké qu'une fois.
+
+Cycle de vie :
+- `SpoolWriter.commit(owner)` publie le blob et pose une réservation au nom
+  du document (`owner`)
+- `release(digest, owner)` lève la réservation une fois le résultat
+  enregistré ; le blob est supprimé quand plus aucun document ne le réserve
+- `purge` supprime les blobs orphelins (document jamais terminé) après
+  SPOOL_TTL_SECONDS
+
+Stockages : répertoire partagé ('local', par défaut) ou compatible S3 ('s3',
+avec SPOOL_S3_ENDPOINT_URL pour MinIO & co). Le backend S3 garde une copie
+locale, vérifiée à l'empreinte, des blobs lus par le processus.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from .config import (
+    SPOOL_BACKEND,
+    SPOOL_CHUNK_SIZE,
+    SPOOL_DIR,
+    SPOOL_S3_BUCKET,
+    SPOOL_S3_ENDPOINT_URL,
+    SPOOL_S3_PREFIX,
+    SPOOL_TTL_SECONDS,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+_OWNER = re.compile(r"^[\w.\-]+$")
+# Intervalle minimal entre deux purges déclenchées par une écriture (s)
+PURGE_INTERVAL = 300.0
+
+
+def _check_digest(digest: str) -> str:
+    if not _DIGEST.match(digest or ""):
+        raise ValueError(f"Empreinte de blob invalide : {digest!r}")
+    return digest
+
+
+def _check_owner(owner: str) -> str:
+    if not _OWNER.match(owner or ""):
+        raise ValueError(f"Propriétaire de blob invalide : {owner!r}")
+    return owner
+
+
+def file_digest(path: str, chunk_size: int = SPOOL_CHUNK_SIZE) -> str:
+    """SHA-256 d'un fichier, lu par morceaux."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class SpoolWriter:
+    """
+    Écriture en flux d'un blob : fichier temporaire + SHA-256 calculé au fil
+    de l'eau, publié sous son empreinte par `commit`.
+    """
+
+    def __init__(self, store: "SpoolStore", staging_dir: str):
+        os.makedirs(staging_dir, exist_ok=True)
+        fd, self._tmp = tempfile.mkstemp(dir=staging_dir, suffix=".part")
+        self._fh = os.fdopen(fd, "wb")
+        self._store = store
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self._fh.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self, owner: str) -> str:
+        """Publie le blob, réservé au nom de `owner` ; retourne son empreinte."""
+        if self._tmp is None:
+            raise RuntimeError("Blob déjà publié ou abandonné")
+        self._fh.close()
+        digest = self._hash.hexdigest()
+        try:
+            self._store._publish(self._tmp, digest, _check_owner(owner))
+        except Exception:
+            self.discard()
+            raise
+        self._tmp = None
+        logger.debug("Blob %s publié (%s octets) pour %s", digest[:12], self.size, owner)
+        return digest
+
+    def discard(self) -> None:
+        if self._tmp is not None:
+            self._fh.close()
+            _remove(self._tmp)
+            self._tmp = None
+
+    def __enter__(self) -> "SpoolWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # Non publié (erreur ou commit oublié) : rien ne reste sur disque
+        self.discard()
+
+
+class SpoolStore(ABC):
+    """Stockage des blobs, adressés par leur empreinte SHA-256."""
+
+    @abstractmethod
+    def writer(self) -> SpoolWriter:
+        """Nouveau blob à écrire par morceaux."""
+
+    @abstractmethod
+    def _publish(self, tmp_path: str, digest: str, owner: str) -> None:
+        """Pose la réservation de `owner` puis publie le fichier temporaire."""
+
+    @abstractmethod
+    @contextmanager
+    def open_blob(self, digest: str) -> Iterator[str]:
+        """Chemin local du blob, valable dans le bloc `with`."""
+
+    @abstractmethod
+    def release(self, digest: str, owner: str) -> bool:
+        """Lève la réservation ; True si le blob, devenu orphelin, est supprimé."""
+
+    @abstractmethod
+    def purge(self, max_age: float = SPOOL_TTL_SECONDS) -> int:
+        """Supprime les blobs (et temporaires) plus vieux que `max_age` s."""
+
+    def put_stream(self, chunks: Iterable[bytes], owner: str) -> str:
+        """Écrit un blob à partir d'un itérable de morceaux ; retourne son empreinte."""
+        with self.writer() as w:
+            for chunk in chunks:
+                w.write(chunk)
+            return w.commit(owner)
+
+    def put_bytes(self, data: bytes, owner: str) -> str:
+        return self.put_stream([data], owner)
+
+
+class LocalSpool(SpoolStore):
+    """
+    Répertoire partagé par l'API et les workers (volume commun).
+
+    Arborescence : `<dd>/<empreinte>` pour les blobs, `holds/<empreinte>/<owner>`
+    pour les réservations, `tmp/` pour les écritures en cours. Publication et
+    libération sont sérialisées par un verrou de fichier (entre processus).
+    """
+
+    def __init__(self, directory: str = SPOOL_DIR):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "tmp"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "holds"), exist_ok=True)
+        self._thread_lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def blob_path(self, digest: str) -> str:
+        digest = _check_digest(digest)
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _holds_dir(self, digest: str) -> str:
+        return os.path.join(self.directory, "holds", digest)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.directory, ".lock"), "a") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def writer(self) -> SpoolWriter:
+        if time.time() - self._last_purge > PURGE_INTERVAL:
+            self.purge()
+        return SpoolWriter(self, os.path.join(self.directory, "tmp"))
+
+    def _publish(self, tmp_path: str, digest: str, owner: str) -> None:
+        path = self.blob_path(digest)
+        with self._locked():
+            os.makedirs(self._holds_dir(digest), exist_ok=True)
+            open(os.path.join(self._holds_dir(digest), owner), "a").close()
+            if os.path.exists(path):
+                # Contenu déjà présent : on rafraîchit seulement son âge
+                os.remove(tmp_path)
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+
+    @contextmanager
+    def open_blob(self, digest: str) -> Iterator[str]:
+        path = self.blob_path(digest)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Blob absent du spool : {digest}")
+        yield path
+
+    def release(self, digest: str, owner: str) -> bool:
+        path = self.blob_path(digest)
+        holds = self._holds_dir(digest)
+        with self._locked():
+            _remove(os.path.join(holds, _check_owner(owner)))
+            if os.path.isdir(holds) and os.listdir(holds):
+                return False
+            try:
+                os.rmdir(holds)
+            except FileNotFoundError:
+                pass
+            if not os.path.exists(path):
+                return False
+            os.remove(path)
+        logger.debug("Blob %s libéré", digest[:12])
+        return True
+
+    def purge(self, max_age: float = SPOOL_TTL_SECONDS) -> int:
+        self._last_purge = time.time()
+        cutoff = self._last_purge - max_age
+        removed = 0
+        with self._locked():
+            tmp_dir = os.path.join(self.directory, "tmp")
+            for fname in os.listdir(tmp_dir):
+                path = os.path.join(tmp_dir, fname)
+                if os.path.getmtime(path) < cutoff:
+                    _remove(path)
+            for sub in os.listdir(self.directory):
+                if len(sub) != 2 or not os.path.isdir(os.path.join(self.directory, sub)):
+                    continue
+                for digest in os.listdir(os.path.join(self.directory, sub)):
+                    path = os.path.join(self.directory, sub, digest)
+                    try:
+                        if os.path.getmtime(path) >= cutoff:
+                            continue
+                        holds = self._holds_dir(digest)
+                        if os.path.isdir(holds):
+                            for owner in os.listdir(holds):
+                                os.remove(os.path.join(holds, owner))
+                            os.rmdir(holds)
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        logger.warning("Purge du blob impossible : %s", path, exc_info=True)
+        if removed:
+            logger.info("Spool : %s blob(s) orphelin(s) purgé(s)", removed)
+        return removed
+
+
+class S3Spool(SpoolStore):
+    """
+    Stockage compatible S3 (AWS, MinIO...) : blobs sous `<prefix><empreinte>`,
+    réservations sous `<prefix>holds/<empreinte>/<owner>`.
+
+    Les lectures passent par un cache local (`cache_dir`) ; le contenu
+    téléchargé est vérifié à l'empreinte. S3 n'offrant pas de verrou, la
+    libération n'est pas atomique vis-à-vis d'une publication concurrente du
+    même contenu : l'expiration des objets doit être confiée à une règle de
+    cycle de vie du bucket plutôt qu'à `purge`, qui ne nettoie que le cache.
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        prefix: str = SPOOL_S3_PREFIX,
+        cache_dir: Optional[str] = None,
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "ocr_greenhub_spool")
+        os.makedirs(os.path.join(self.cache_dir, "tmp"), exist_ok=True)
+
+    def _key(self, digest: str) -> str:
+        return f"{self.prefix}{_check_digest(digest)}"
+
+    def _hold_key(self, digest: str, owner: str = "") -> str:
+        return f"{self.prefix}holds/{_check_digest(digest)}/{owner}"
+
+    def _cache_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, _check_digest(digest))
+
+    def writer(self) -> SpoolWriter:
+        return SpoolWriter(self, os.path.join(self.cache_dir, "tmp"))
+
+    def _publish(self, tmp_path: str, digest: str, owner: str) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._hold_key(digest, owner), Body=b"")
+        # upload_file lit le fichier par parties (multipart au-delà du seuil boto3)
+        self.client.upload_file(tmp_path, self.bucket, self._key(digest))
+        os.replace(tmp_path, self._cache_path(digest))
+
+    @contextmanager
+    def open_blob(self, digest: str) -> Iterator[str]:
+        path = self._cache_path(digest)
+        if not os.path.isfile(path):
+            fd, tmp = tempfile.mkstemp(dir=os.path.join(self.cache_dir, "tmp"), suffix=".part")
+            os.close(fd)
+            try:
+                self.client.download_file(self.bucket, self._key(digest), tmp)
+                if file_digest(tmp) != digest:
+                    raise ValueError(f"Blob corrompu (empreinte différente) : {digest}")
+                os.replace(tmp, path)
+            finally:
+                _remove(tmp)
+        yield path
+
+    def release(self, digest: str, owner: str) -> bool:
+        self.client.delete_object(Bucket=self.bucket, Key=self._hold_key(digest, _check_owner(owner)))
+        _remove(self._cache_path(digest))
+        listing = self.client.list_objects_v2(
+            Bucket=self.bucket, Prefix=self._hold_key(digest), MaxKeys=1
+        )
+        if listing.get("KeyCount", len(listing.get("Contents", []))):
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(digest))
+        logger.debug("Blob %s libéré", digest[:12])
+        return True
+
+    def purge(self, max_age: float = SPOOL_TTL_SECONDS) -> int:
+        cutoff = time.time() - max_age
+        removed = 0
+        for root in (self.cache_dir, os.path.join(self.cache_dir, "tmp")):
+            for fname in os.listdir(root):
+                path = os.path.join(root, fname)
+                if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                    _remove(path)
+                    removed += 1
+        return removed
+
+
+def _build_s3_spool() -> S3Spool:
+    if not SPOOL_S3_BUCKET:
+        raise ValueError("SPOOL_S3_BUCKET requis pour le spool 's3'")
+    import boto3
+    from .config import get_textract_client_params
+    client = boto3.client("s3", endpoint_url=SPOOL_S3_ENDPOINT_URL, **get_textract_client_params())
+    return S3Spool(client, SPOOL_S3_BUCKET)
+
+
+_BACKENDS: Dict[str, Callable[[], SpoolStore]] = {
+    "local": LocalSpool,
+    "s3": _build_s3_spool,
+}
+
+
+def register_spool_backend(name: str, factory: Callable[[], SpoolStore]) -> None:
+    """Déclare un stockage supplémentaire, sélectionnable via SPOOL_BACKEND."""
+    _BACKENDS[name] = factory
+
+
+def build_spool(backend: str = SPOOL_BACKEND) -> SpoolStore:
+    try:
+        factory = _BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Spool inconnu : {backend}")
+    return factory()
+
+
+_spool: Optional[SpoolStore] = None
+_spool_lock = threading.Lock()
+
+
+def get_spool() -> SpoolStore:
+    """Retourne le spool du processus (créé à la demande)."""
+    global _spool
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                _spool = build_spool()
+                logger.info("Spool : %s", type(_spool).__name__)
+    return _spool
+
+
+def set_spool(store: Optional[SpoolStore]) -> None:
+    """Remplace le spool du processus (None = reconstruire à la demande)."""
+    global _spool
+    with _spool_lock:
+        _spool = store
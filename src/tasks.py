@@ -1,23 +1,294 @@
 # src/tasks.py
-from celery import Celery
-from .celeryconfig import broker_url, result_backend
-from .backends import TesseractBackend, TextractBackend
+
+"""
+Tâches Celery pour OCR - Green Hub.
+
+Le document est déposé dans le spool (`src/spool.py`) : les messages Celery
+ne portent que son empreinte SHA-256, jamais ses octets. Il est ensuite
+traité en éventail/regroupement (chord) :
+- `ocr_page_task` : une tâche par page, exécutable par n'importe quel worker
+  (qui ne rend que sa page depuis le blob) et relancée seule en cas d'échec
+  (backoff exponentiel)
+- `aggregate_document` : rassemble les pages dans l'ordre, extrait les entités,
+  enregistre le résultat du document dans l'historique puis libère le blob
+
+Chaque étape publie sa progression (`src/progress.py`) : `get_results` la
+restitue à partir d'un curseur, en attendant si besoin le prochain événement.
+
+L'identifiant du document est celui de la tâche d'agrégation : `get_results`
+le suit comme n'importe quel résultat Celery.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from celery import Celery, chord, group
+from celery.signals import before_task_publish, task_postrun, task_prerun, worker_init, worker_process_shutdown
+from celery.utils import uuid
+
+from .config import (
+    CELERY_ALWAYS_EAGER,
+    CELERY_BROKER_URL,
+    CELERY_METRICS_PORT,
+    CELERY_PAGE_MAX_RETRIES,
+    CELERY_RESULT_BACKEND,
+)
+from .entities import get_entity_extractor, summarize
+from .executor import get_executor
+from .extensions import count_pages, render_page
 from .history import update_entry
-from .nlp_postprocessing import normalize_entities
+from .observability import PAGE_SECONDS, mark_process_dead, start_health_server
+from .progress import publish_progress, read_progress, read_progress_async
+from .spool import get_spool
+from .tracing import bind_request_id, get_request_id, request_context, reset_request_id, span
+from .wordboxes import WordBoxes
+
+logger = logging.getLogger(__name__)
+
+app = Celery('tasks', broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
+app.conf.update(
+    task_always_eager=CELERY_ALWAYS_EAGER,
+    # Une page n'est acquittée qu'une fois traitée : relancée si le worker meurt
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+)
+
+# Identifiant de requête propagé aux tâches : en-tête `request_id` du message,
+# rétabli dans le contexte du worker le temps de la tâche (voir `src.tracing`)
+_request_tokens: Dict[str, Any] = {}
+
+
+@before_task_publish.connect
+def _publish_request_id(headers: Optional[Dict[str, Any]] = None, **_: Any) -> None:
+    request_id = get_request_id()
+    if request_id and headers is not None:
+        headers.setdefault("request_id", request_id)
+
+
+@task_prerun.connect
+def _bind_task_request_id(task_id: Optional[str] = None, task: Any = None, **_: Any) -> None:
+    request_id = getattr(task.request, "request_id", None) if task is not None else None
+    if request_id and task_id:
+        _request_tokens[task_id] = bind_request_id(request_id)
+
+
+@task_postrun.connect
+def _reset_task_request_id(task_id: Optional[str] = None, **_: Any) -> None:
+    token = _request_tokens.pop(task_id, None)
+    if token is not None:
+        reset_request_id(token)
+
+
+# Métriques des workers : chaque processus enfant écrit dans
+# PROMETHEUS_MULTIPROC_DIR, agrégé par le /metrics du pod
+@worker_process_shutdown.connect
+def _worker_metrics_done(pid: Optional[int] = None, **_: Any) -> None:
+    mark_process_dead(pid or 0)
+
+
+@worker_init.connect
+def _start_worker_metrics(**_: Any) -> None:
+    # Worker seul dans son pod : il expose lui-même le /metrics du pod
+    if CELERY_METRICS_PORT:
+        start_health_server(port=CELERY_METRICS_PORT)
+
+
+# Paramètres OCR par défaut des documents soumis via l'API
+DEFAULT_OCR_PARAMS: Dict[str, Any] = {"lang": "fra+eng", "psm": 6, "conf_thr": 30}
+
+
+def _ocr_page_blob(
+    document_id: str, filename: str, digest: str, page: int, params: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Rendu + prétraitement + OCR d'une page (ou lecture de sa couche texte pour
+    un PDF natif), sur l'exécuteur OCR du worker.
+    """
+    from .backends import recognize_page
+    from .preprocessing import preprocess, preprocess_report
+    from .textlayer import load_text_layer, text_layer_words
+
+    def _stage(name: str, t0: float, **extra: Any) -> float:
+        now = time.perf_counter()
+        publish_progress(document_id, "stage", page=page, stage=name, seconds=round(now - t0, 3), **extra)
+        return now
+
+    with span("page", page=page, document_id=document_id) as sp:
+        t0 = time.perf_counter()
+        with span("render"), get_spool().open_blob(digest) as path:
+            content = load_text_layer(path, filename, page)
+            img = render_page(path, filename, page) if content is None else None
+        sp.set(path="raster" if content is None else "text")
+        if content is not None:
+            # PDF natif : mots de la couche texte, OCR des seules images de la page
+            t0 = _stage("textlayer", t0, regions=len(content.regions))
+            words = text_layer_words(content, params["lang"], params["psm"], params["conf_thr"],
+                                     preprocess, strict=True)
+            _stage("ocr", t0)
+        else:
+            t0 = _stage("render", t0)
+            with span("preprocess"):
+                img = preprocess(img)
+            report = preprocess_report(img)
+            # Classe de la page et étapes réellement exécutées (mode adaptatif)
+            t0 = _stage("preprocess", t0, kind=report.kind, chain=list(report.chain))
+            # Moteur choisi par le routeur (OCR_BACKENDS) ; une erreur de tous les
+            # moteurs fait échouer (et relancer) la page
+            words = recognize_page(img, params["lang"], params["psm"], params["conf_thr"])
+            _stage("ocr", t0)
+        sp.set(words=len(words))
+    PAGE_SECONDS.labels(sp.attributes["path"]).observe(sp.duration)
+    result = {
+        "page": page,
+        "count": len(words),
+        "mean_conf": round(words.mean_conf(), 1),
+        "text": words.join_text(),
+        "words": words.to_dict("records"),
+    }
+    # Résultat de la page disponible avant la fin du document
+    publish_progress(document_id, "page", **result)
+    return result
+
+
+@app.task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_backoff_max=60,
+    max_retries=CELERY_PAGE_MAX_RETRIES,
+)
+def ocr_page_task(
+    self, document_id: str, filename: str, digest: str, page: int, params: Dict[str, Any]
+) -> Dict[str, Any]:
+    # Le worker Celery partage le budget CPU du processus avec les autres tâches
+    if self.request.retries:
+        logger.info("Nouvelle tentative %s pour la page %s (%s)",
+                    self.request.retries, page + 1, filename)
+        publish_progress(document_id, "retry", page=page, attempt=self.request.retries)
+    return get_executor().submit(
+        _ocr_page_blob, document_id, filename, digest, page, params
+    ).result()
 
-app = Celery('tasks', broker=broker_url, backend=result_backend)
-app.config_from_object('celeryconfig')
 
 @app.task
-def process_file(filename: str, content: bytes):
-    # Determine and convert formats
-    # Choose backend based on arguments
-    # Perform OCR, post-process, update history
-    result = {"filename": filename, "entities": {}}
-    update_entry(filename, result)
+def aggregate_document(
+    page_results: List[Dict[str, Any]], filename: str, document_id: str, digest: str
+) -> Dict[str, Any]:
+    """Regroupe les pages dans l'ordre et calcule les entités du document."""
+    from .nlp_postprocessing import normalize_entities
+    pages = sorted(page_results, key=lambda p: p["page"])
+    # Entités relevées sur les mots de chaque page : positions et confiances conservées
+    with span("entities"):
+        entities = get_entity_extractor().extract_pages(
+            WordBoxes.from_records(p["words"]).with_page(p["page"]) for p in pages
+        )
+    result = {
+        "filename": filename,
+        "page_count": len(pages),
+        "pages": [{k: p[k] for k in ("page", "count", "mean_conf", "words")} for p in pages],
+        "entities": normalize_entities(summarize(entities)),
+        "entity_boxes": [e.to_dict() for e in entities],
+    }
+    update_entry(document_id, result)
+    # Résultat persisté : le blob n'est plus utile à ce document
+    get_spool().release(digest, document_id)
+    publish_progress(document_id, "done", page_count=result["page_count"], entities=result["entities"])
     return result
 
+
 @app.task
-def get_results(task_id: str):
-    # Retrieve results for given task_id
-    return {}
+def document_failed(request, exc, traceback, document_id: str, digest: str) -> None:
+    """Errback du chord : une page a épuisé ses tentatives."""
+    logger.error("Document %s en échec : %s", document_id, exc)
+    update_entry(document_id, {"error": str(exc)}, status="error")
+    get_spool().release(digest, document_id)
+    publish_progress(document_id, "error", error=str(exc))
+
+
+def process_file(
+    filename: str,
+    content: Optional[bytes] = None,
+    task_id: Optional[str] = None,
+    params: Optional[Dict[str, Any]] = None,
+    digest: Optional[str] = None,
+) -> str:
+    """
+    Lance l'OCR en parallèle des pages d'un document.
+
+    Args:
+        filename: Nom du fichier (détermine le format).
+        content: Octets du document, déposés dans le spool ; inutile si le
+            document y est déjà (`digest`).
+        task_id: Identifiant du document (généré si absent) ; l'entrée
+            d'historique doit être créée avant l'appel.
+        params: Paramètres OCR (lang, psm, conf_thr).
+        digest: Empreinte d'un blob déjà publié dans le spool au nom de
+            `task_id` (upload en flux de l'API).
+
+    Returns:
+        Identifiant du document, à passer à `get_results`.
+    """
+    document_id = task_id or uuid()
+    ocr_params = dict(DEFAULT_OCR_PARAMS, **(params or {}))
+    spool = get_spool()
+    if digest is None:
+        if content is None:
+            raise ValueError("content ou digest requis")
+        digest = spool.put_bytes(content, document_id)
+    # Requête de l'appelant (API) ou, à défaut, le document lui-même :
+    # l'identifiant suit les tâches des pages dans l'en-tête des messages
+    with request_context(get_request_id() or document_id):
+        try:
+            with spool.open_blob(digest) as path:
+                n_pages = count_pages(path, filename)
+            header = group(
+                ocr_page_task.s(document_id, filename, digest, idx, ocr_params) for idx in range(n_pages)
+            )
+            body = aggregate_document.s(filename, document_id, digest).set(task_id=document_id)
+            publish_progress(document_id, "queued", filename=filename, page_count=n_pages)
+            chord(header)(body.on_error(document_failed.s(document_id, digest)))
+        except Exception as exc:
+            # Rien n'a été soumis : le blob ne serait jamais libéré
+            spool.release(digest, document_id)
+            publish_progress(document_id, "error", error=str(exc))
+            raise
+    logger.info("Document %s : %s page(s) soumise(s)", document_id, n_pages)
+    return document_id
+
+
+def get_results(task_id: str, after: Optional[int] = None, wait: float = 0.0) -> Dict[str, Any]:
+    """
+    État et, une fois terminé, résultat d'un document.
+
+    Args:
+        task_id: Identifiant du document.
+        after: Curseur de progression ; si fourni, la réponse contient les
+            événements postérieurs (`events`) et le nouveau curseur (`cursor`).
+        wait: Long-poll : attente maximale (s) d'un nouvel événement quand le
+            document n'est pas terminé et qu'aucun événement n'est en attente.
+    """
+    res = app.AsyncResult(task_id)
+    if after is not None and wait > 0 and not res.ready():
+        read_progress(task_id, after, timeout=wait)
+    out: Dict[str, Any] = {"task_id": task_id, "state": res.state}
+    if res.successful():
+        out["result"] = res.result
+    elif res.failed():
+        out["error"] = str(res.result)
+    if after is not None:
+        events = read_progress(task_id, after)
+        out["events"] = events
+        out["cursor"] = events[-1]["seq"] if events else after
+    return out
+
+
+async def get_results_async(task_id: str, after: Optional[int] = None, wait: float = 0.0) -> Dict[str, Any]:
+    """
+    Comme `get_results`, pour l'API asynchrone : le long-poll attend sur la
+    boucle d'événements (`read_progress_async`), sans occuper de thread.
+    """
+    if after is not None and wait > 0 and not await asyncio.to_thread(app.AsyncResult(task_id).ready):
+        await read_progress_async(task_id, after, timeout=wait)
+    return await asyncio.to_thread(get_results, task_id, after)
@@ -0,0 +1,163 @@
+# src/textlayer.py
+
+"""
+Couche texte des PDF natifs - Green Hub.
+
+Une page PDF produite par un logiciel (factures fournisseurs) contient déjà son
+texte : les mots et leurs boîtes sont lus directement avec PyMuPDF, dans le
+format des résultats OCR (`WordBoxes`, coordonnées en pixels au DPI de rendu,
+confiance 100). Seules les images de la page qui ne sont pas recouvertes de
+texte (logo, tampon, scan collé) sont rastérisées et OCRisées ; une page sans
+couche texte exploitable (scan) suit le chemin OCR habituel.
+"""
+
+import logging
+import math
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, List, Optional, Tuple, Union
+
+from PIL import Image
+
+from .config import PDF_TEXT_LAYER_ENABLED, PDF_TEXT_LAYER_MIN_CHARS
+from .documents import get_document_cache
+from .extensions import PDF_EXTENSIONS, Source, _open_pdf, _pixmap_to_image, iter_document_pages
+from .layout import ocr_layout
+from .observability import PDF_PAGES
+from .wordboxes import WordBoxes
+
+logger = logging.getLogger(__name__)
+
+Box = Tuple[int, int, int, int]
+
+# Part maximale de caractères illisibles (polices sans table Unicode)
+MAX_GARBAGE_RATIO = 0.05
+# Images plus petites que cette part de la page : puces, filets
+MIN_IMAGE_AREA = 0.01
+# Image recouverte d'au moins autant de mots : scan déjà OCRisé (texte invisible)
+COVERED_IMAGE_WORDS = 3
+
+
+@dataclass
+class TextLayerPage:
+    """
+    Page lue depuis sa couche texte.
+
+    Attributes:
+        words: Mots de la couche texte (pixels au DPI de rendu).
+        regions: Images à OCRiser : (boîte en pixels, rendu de la zone).
+        size: Taille de la page rendue (pixels).
+    """
+
+    words: WordBoxes
+    size: Tuple[int, int]
+    regions: List[Tuple[Box, Image.Image]] = field(default_factory=list)
+
+
+def _is_garbage(ch: str) -> bool:
+    # Caractère de remplacement, zone privée (glyphes sans Unicode), contrôle
+    return ch == "\ufffd" or unicodedata.category(ch) in ("Co", "Cc", "Cn")
+
+
+def _pixel_box(rect: Any, scale: float) -> Box:
+    return (int(rect[0] * scale), int(rect[1] * scale),
+            int(math.ceil(rect[2] * scale)), int(math.ceil(rect[3] * scale)))
+
+
+def read_text_layer(page: Any, dpi: int = 200) -> Optional[TextLayerPage]:
+    """
+    Lit les mots d'une page PyMuPDF ; None si la couche texte est absente ou
+    inexploitable (trop peu de caractères, police illisible).
+    """
+    import fitz
+
+    raw_words = page.get_text("words")
+    chars = sum(len(w[4]) for w in raw_words)
+    if chars < PDF_TEXT_LAYER_MIN_CHARS:
+        return None
+    garbage = sum(_is_garbage(ch) for w in raw_words for ch in w[4])
+    if garbage > MAX_GARBAGE_RATIO * chars:
+        logger.info("Couche texte illisible (%s/%s caractères), OCR de la page", garbage, chars)
+        return None
+
+    scale = dpi / 72.0
+    # Mots lus dans le repère de la page non tournée, rendu dans celui de l'affichage
+    rotation = page.rotation_matrix if page.rotation else None
+    rects = [fitz.Rect(w[:4]) * rotation if rotation else w[:4] for w in raw_words]
+    boxes = [_pixel_box(r, scale) for r in rects]
+    line_ids: dict = {}
+    words = WordBoxes(
+        [b[0] for b in boxes], [b[1] for b in boxes], [b[2] for b in boxes], [b[3] for b in boxes],
+        text=[w[4] for w in raw_words],
+        conf=[100.0] * len(raw_words),
+        block=[w[5] for w in raw_words],
+        line=[line_ids.setdefault((w[5], w[6]), len(line_ids)) for w in raw_words],
+    )
+
+    bounds = page.rect
+    size = (int(math.ceil(bounds.width * scale)), int(math.ceil(bounds.height * scale)))
+    centers = [((r[0] + r[2]) / 2, (r[1] + r[3]) / 2) for r in rects]
+    regions: List[Tuple[Box, Image.Image]] = []
+    for info in page.get_image_info():
+        # Même repère que les mots : celui de la page affichée (rendu, `clip`)
+        rect = fitz.Rect(info["bbox"])
+        rect = (rect * rotation if rotation else rect) & bounds
+        if rect.is_empty or rect.get_area() < MIN_IMAGE_AREA * bounds.get_area():
+            continue
+        if sum(rect.contains(c) for c in centers) >= COVERED_IMAGE_WORDS:
+            continue
+        crop = _pixmap_to_image(page.get_pixmap(dpi=dpi, clip=rect))
+        regions.append((_pixel_box(rect, scale), crop))
+    return TextLayerPage(words, size, regions)
+
+
+def iter_document_contents(
+    raw: Source, filename: str, dpi: int = 200
+) -> Iterator[Union[Image.Image, TextLayerPage]]:
+    """
+    Comme `iter_document_pages`, mais une page PDF dotée d'une couche texte
+    exploitable est produite en `TextLayerPage` au lieu d'être rastérisée.
+    """
+    if not (PDF_TEXT_LAYER_ENABLED and filename.lower().endswith(PDF_EXTENSIONS)):
+        yield from iter_document_pages(raw, filename, dpi)
+        return
+    with _open_pdf(raw) as doc:
+        for page in doc:
+            content = read_text_layer(page, dpi)
+            if content is None:
+                PDF_PAGES.labels("raster").inc()
+                content = _pixmap_to_image(page.get_pixmap(dpi=dpi))
+            else:
+                PDF_PAGES.labels("mixed" if content.regions else "text").inc()
+            yield content
+
+
+def load_text_layer(raw: Source, filename: str, index: int, dpi: int = 200) -> Optional[TextLayerPage]:
+    """Couche texte de la seule page `index` ; None hors PDF ou sans texte exploitable."""
+    if not (PDF_TEXT_LAYER_ENABLED and filename.lower().endswith(PDF_EXTENSIONS)):
+        return None
+    with get_document_cache().page(raw, index) as page:
+        content = read_text_layer(page, dpi)
+    PDF_PAGES.labels("raster" if content is None else "mixed" if content.regions else "text").inc()
+    return content
+
+
+def text_layer_words(
+    content: TextLayerPage,
+    lang: str,
+    psm: int,
+    conf_thr: int,
+    preprocess_fn: Callable[[Image.Image], Image.Image],
+    strict: bool = False,
+) -> WordBoxes:
+    """Mots de la couche texte complétés par l'OCR des images de la page."""
+    parts = [content.words]
+    block = int(content.words["block"].max()) + 1 if len(content.words) else 0
+    line = int(content.words["line"].max()) + 1 if len(content.words) else 0
+    for box, crop in content.regions:
+        words = ocr_layout(preprocess_fn(crop), lang, psm, conf_thr, strict)
+        if len(words):
+            parts.append(words.offset(box[0], box[1], block=block, line=line))
+            block += int(words["block"].max()) + 1
+            line += int(words["line"].max()) + 1
+    return WordBoxes.concat(parts)
@@ -0,0 +1,243 @@
+# src/textract_batch.py
+
+"""
+Traitement Textract par lots pour OCR - Green Hub.
+
+- Concurrence bornée (pool de threads dédié : les appels sont réseau, pas CPU)
+- Limitation de débit adaptative côté client (AIMD) : hausse additive à chaque
+  succès, division par deux à chaque `ThrottlingException` /
+  `ProvisionedThroughputExceededException`
+- Nouvelles tentatives avec backoff exponentiel à gigue complète, sur
+  limitation comme sur erreur transitoire (5xx, coupure réseau, délai dépassé)
+- Résultats produits dans l'ordre de complétion
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+from .config import TEXTRACT_BATCH_CONCURRENCY, TEXTRACT_MAX_RPS
+from .observability import TEXTRACT_RATE, TEXTRACT_THROTTLES, record_request
+from .textract_service import analyze_document_kv, build_textract_client
+
+logger = logging.getLogger(__name__)
+
+THROTTLING_CODES = frozenset({
+    "ThrottlingException",
+    "ProvisionedThroughputExceededException",
+    "LimitExceededException",
+})
+
+
+def throttling_code(exc: BaseException) -> Optional[str]:
+    """Code d'erreur AWS si `exc` est une limitation de débit, sinon None."""
+    if isinstance(exc, ClientError):
+        code = exc.response.get("Error", {}).get("Code")
+        if code in THROTTLING_CODES:
+            return code
+    return None
+
+
+TRANSIENT_CODES = frozenset({
+    "InternalServerError",
+    "InternalFailure",
+    "ServiceUnavailable",
+    "ServiceUnavailableException",
+    "RequestTimeout",
+    "RequestTimeoutException",
+})
+
+
+def transient_code(exc: BaseException) -> Optional[str]:
+    """Code (ou type) de l'erreur si `exc` est transitoire et mérite un nouvel essai, sinon None."""
+    if isinstance(exc, ClientError):
+        code = exc.response.get("Error", {}).get("Code")
+        status = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        if code in TRANSIENT_CODES or status >= 500:
+            return code or str(status)
+    elif isinstance(exc, (BotoConnectionError, HTTPClientError)):
+        return type(exc).__name__
+    return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Seau à jetons dont le débit s'adapte (AIMD) aux limitations reçues.
+
+    Args:
+        rate: Débit initial (requêtes/s).
+        min_rate, max_rate: Bornes du débit.
+        increase: Hausse additive du débit après chaque succès.
+        decrease: Facteur multiplicatif appliqué après une limitation.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        min_rate: float = 0.5,
+        max_rate: Optional[float] = None,
+        increase: float = 0.1,
+        decrease: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate
+        self.increase = increase
+        self.decrease = decrease
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next = clock()
+        TEXTRACT_RATE.set(rate)
+
+    def acquire(self) -> None:
+        """Bloque jusqu'au prochain créneau autorisé."""
+        with self._lock:
+            now = self._clock()
+            slot = max(self._next, now)
+            self._next = slot + 1.0 / self.rate
+        delay = slot - now
+        if delay > 0:
+            self._sleep(delay)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+        TEXTRACT_RATE.set(self.rate)
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            # Les créneaux déjà réservés sont repoussés au nouveau rythme
+            self._next = max(self._next, self._clock()) + 1.0 / self.rate
+        TEXTRACT_RATE.set(self.rate)
+
+
+class TextractBatchExecutor:
+    """
+    Exécute des appels Textract en parallèle avec limitation adaptative.
+
+    Args:
+        client: Client Textract (par défaut un client dédié dont le pool de
+            connexions est dimensionné sur `max_concurrency`, sans tentatives
+            botocore : limitations et erreurs transitoires sont gérées ici).
+        max_concurrency: Appels simultanés au plus.
+        limiter: Limiteur de débit partagé (par défaut TEXTRACT_MAX_RPS).
+        max_retries: Tentatives supplémentaires après une limitation ou une
+            erreur transitoire.
+        base_delay, max_delay: Paramètres du backoff exponentiel (s).
+        call: Fonction (octets, client) -> résultat ; par défaut FORMS -> clé/valeur.
+    """
+
+    def __init__(
+        self,
+        client: Optional[Any] = None,
+        max_concurrency: int = TEXTRACT_BATCH_CONCURRENCY,
+        limiter: Optional[AdaptiveRateLimiter] = None,
+        max_retries: int = 5,
+        base_delay: float = 0.2,
+        max_delay: float = 10.0,
+        call: Callable[[bytes, Any], Any] = analyze_document_kv,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.client = client or build_textract_client(
+            max_pool_connections=self.max_concurrency, max_attempts=1
+        )
+        self.limiter = limiter or AdaptiveRateLimiter(TEXTRACT_MAX_RPS, sleep=sleep)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._call = call
+        self._sleep = sleep
+
+    def analyze(self, img_bytes: bytes) -> Any:
+        """Un appel Textract avec limitation de débit et backoff sur limitation
+        ou erreur transitoire ; seules les limitations ralentissent le débit."""
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                result = self._call(img_bytes, self.client)
+            except Exception as exc:
+                code = throttling_code(exc)
+                if code is not None:
+                    TEXTRACT_THROTTLES.labels(code).inc()
+                    self.limiter.on_throttle()
+                    reason = "limité"
+                else:
+                    code = transient_code(exc)
+                    if code is None:
+                        raise
+                    reason = "en erreur transitoire"
+                if attempt >= self.max_retries:
+                    raise
+                # Backoff exponentiel à gigue complète
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                logger.info("Textract %s (%s), nouvel essai dans %.2fs", reason, code, delay)
+                self._sleep(delay)
+                attempt += 1
+                continue
+            self.limiter.on_success()
+            return result
+
+    def iter_results(
+        self, items: Iterable[Tuple[Hashable, bytes]]
+    ) -> Iterator[Tuple[Hashable, Any, Optional[BaseException]]]:
+        """
+        Traite des couples (clé, octets) et produit (clé, résultat, erreur) dans
+        l'ordre de complétion. `items` est consommé au fil de l'eau, avec au plus
+        2 x `max_concurrency` documents encodés en mémoire.
+        """
+        limit = self.max_concurrency * 2
+        pending: Dict[Future, Hashable] = {}
+        with ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                thread_name_prefix="textract") as pool:
+
+            def _drain(block: bool) -> Iterator[Tuple[Hashable, Any, Optional[BaseException]]]:
+                if block:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                else:
+                    done = [f for f in pending if f.done()]
+                for future in done:
+                    key = pending.pop(future)
+                    exc = future.exception()
+                    yield key, (None if exc else future.result()), exc
+
+            for key, payload in items:
+                pending[pool.submit(self.analyze, payload)] = key
+                if len(pending) >= limit:
+                    yield from _drain(True)
+                else:
+                    yield from _drain(False)
+            while pending:
+                yield from _drain(True)
+
+    def run(self, items: Iterable[Tuple[Hashable, bytes]]) -> List[Tuple[Hashable, Any, Optional[BaseException]]]:
+        return list(self.iter_results(items))
+
+
+def _recorded_call(img_bytes: bytes, client: Any) -> Any:
+    return record_request("textract", analyze_document_kv, img_bytes, client)
+
+
+_batch_executor: Optional[TextractBatchExecutor] = None
+_batch_lock = threading.Lock()
+
+
+def get_textract_batch_executor() -> TextractBatchExecutor:
+    """Exécuteur de lots du processus : le limiteur de débit est partagé par
+    toutes les sessions, comme le quota Textract du compte."""
+    global _batch_executor
+    if _batch_executor is None:
+        with _batch_lock:
+            if _batch_executor is None:
+                _batch_executor = TextractBatchExecutor(call=_recorded_call)
+    return _batch_executor
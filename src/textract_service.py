@@ -1,7 +1,13 @@
 import boto3
-from typing import List, Dict, Any
+from botocore.config import Config
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 import logging
-from .config import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION
+import pandas as pd
+from .config import (
+    AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION,
+    TEXTRACT_MAX_POOL_CONNECTIONS, TEXTRACT_MAX_ATTEMPTS, TEXTRACT_FEATURE_TYPES
+)
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -12,50 +18,204 @@ if AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY:
         'aws_secret_access_key': AWS_SECRET_ACCESS_KEY
     })
 
-textract_client = boto3.client('textract', **client_args)
+
+def build_textract_client(
+    max_pool_connections: int = TEXTRACT_MAX_POOL_CONNECTIONS,
+    max_attempts: int = TEXTRACT_MAX_ATTEMPTS
+):
+    """Client Textract avec pool de connexions et tentatives configurables."""
+    cfg = Config(
+        max_pool_connections=max_pool_connections,
+        retries={'mode': 'standard', 'max_attempts': max_attempts}
+    )
+    return boto3.client('textract', config=cfg, **client_args)
+
+
+textract_client = build_textract_client()
+
+class TextractResult:
+    """
+    Résultat Textract en colonnes (listes parallèles) plutôt qu'en liste de dicts.
+
+    - `kv` : key, value, conf, page
+    - `tables` : table, row, col, text, conf, page (une entrée par cellule)
+    - `lines` : text, conf, left, top, width, height, page (géométrie relative),
+      construit au premier accès : le chemin clé/valeur ne paie pas les lignes
+    """
+
+    __slots__ = ('kv', 'tables', '_lines', '_line_blocks')
+
+    def __init__(self):
+        self.kv: Dict[str, list] = {'key': [], 'value': [], 'conf': [], 'page': []}
+        self.tables: Dict[str, list] = {
+            'table': [], 'row': [], 'col': [], 'text': [], 'conf': [], 'page': []
+        }
+        self._lines: Optional[Dict[str, list]] = None
+        self._line_blocks: List[Dict[str, Any]] = []
+
+    @property
+    def lines(self) -> Dict[str, list]:
+        if self._lines is None:
+            blocks = self._line_blocks
+            boxes = [b.get('Geometry', {}).get('BoundingBox', {}) for b in blocks]
+            self._lines = {
+                'text': [b.get('Text', '') for b in blocks],
+                'conf': [b.get('Confidence', 0.0) for b in blocks],
+                'left': [box.get('Left', 0.0) for box in boxes],
+                'top': [box.get('Top', 0.0) for box in boxes],
+                'width': [box.get('Width', 0.0) for box in boxes],
+                'height': [box.get('Height', 0.0) for box in boxes],
+                'page': [b.get('Page', 1) for b in blocks],
+            }
+            self._line_blocks = []
+        return self._lines
+
+    def kv_records(self) -> List[Dict[str, Any]]:
+        """Paires clé/valeur au format historique [{'key','value','conf'}]."""
+        kv = self.kv
+        return [
+            {'key': k, 'value': v, 'conf': c}
+            for k, v, c in zip(kv['key'], kv['value'], kv['conf'])
+        ]
+
+    def to_frames(self) -> Dict[str, pd.DataFrame]:
+        """Conversion en DataFrames, uniquement à la demande (UI, export)."""
+        return {
+            'kv': pd.DataFrame(self.kv),
+            'tables': pd.DataFrame(self.tables),
+            'lines': pd.DataFrame(self.lines),
+        }
+
+
+def _child_ids(block: Optional[Dict[str, Any]]) -> List[str]:
+    ids: List[str] = []
+    if block is not None:
+        for rel in block.get('Relationships', ()):
+            if rel['Type'] == 'CHILD':
+                ids += rel['Ids']
+    return ids
+
+
+def parse_textract(resp: Dict[str, Any]) -> TextractResult:
+    """
+    Analyse une réponse Textract en temps linéaire.
+
+    Une seule passe indexe le texte et la confiance des mots et range les
+    autres blocs par type ; les relations de chaque clé sont ensuite parcourues
+    une seule fois, et le texte d'un bloc VALUE partagé par plusieurs clés est
+    mémorisé. Les chaînes sont construites par `join` (pas de `+=`).
+    """
+    text: Dict[str, str] = {}
+    conf: Dict[str, float] = {}
+    values: Dict[str, Dict[str, Any]] = {}
+    cells: Dict[str, Dict[str, Any]] = {}
+    keys: List[Dict[str, Any]] = []
+    line_blocks: List[Dict[str, Any]] = []
+    tables: List[Dict[str, Any]] = []
+
+    # 1) Indexation en une passe
+    for b in resp.get('Blocks', ()):
+        btype = b['BlockType']
+        if btype == 'WORD':
+            bid = b['Id']
+            text[bid] = b.get('Text', '')
+            conf[bid] = b.get('Confidence', 0.0)
+        elif btype == 'KEY_VALUE_SET':
+            if 'KEY' in b.get('EntityTypes', ()):
+                keys.append(b)
+            else:
+                values[b['Id']] = b
+        elif btype == 'LINE':
+            line_blocks.append(b)
+        elif btype == 'CELL':
+            cells[b['Id']] = b
+        elif btype == 'TABLE':
+            tables.append(b)
+
+    result = TextractResult()
+
+    # 2) Paires clé/valeur
+    value_cache: Dict[str, Tuple[str, List[float]]] = {}
+    k_col: List[str] = []
+    v_col: List[str] = []
+    c_col: List[float] = []
+    p_col: List[int] = []
+    for b in keys:
+        children: List[str] = []
+        value_ids: List[str] = []
+        for rel in b.get('Relationships', ()):
+            rtype = rel['Type']
+            if rtype == 'CHILD':
+                children += rel['Ids']
+            elif rtype == 'VALUE':
+                value_ids += rel['Ids']
+        key_text = ' '.join([text[i] for i in children if i in text]).strip()
+        if not key_text:
+            continue
+        value_parts: List[str] = []
+        value_confs: List[float] = []
+        for vid in value_ids:
+            cached = value_cache.get(vid)
+            if cached is None:
+                ids = [i for i in _child_ids(values.get(vid)) if i in text]
+                cached = value_cache[vid] = (
+                    ' '.join([text[i] for i in ids]).strip(),
+                    [conf[i] for i in ids],
+                )
+            if cached[0]:
+                value_parts.append(cached[0])
+            value_confs += cached[1]
+        k_col.append(key_text)
+        v_col.append(' '.join(value_parts))
+        c_col.append(round(sum(value_confs) / len(value_confs), 1) if value_confs else 0.0)
+        p_col.append(b.get('Page', 1))
+    result.kv = {'key': k_col, 'value': v_col, 'conf': c_col, 'page': p_col}
+
+    # 3) Lignes : colonnes construites à la demande (TextractResult.lines)
+    result._line_blocks = line_blocks
+
+    # 4) Cellules de tables
+    tcol = result.tables
+    for t_idx, tb in enumerate(tables):
+        for cid in _child_ids(tb):
+            cell = cells.get(cid)
+            if cell is None:
+                continue
+            tcol['table'].append(t_idx)
+            tcol['row'].append(cell.get('RowIndex', 0))
+            tcol['col'].append(cell.get('ColumnIndex', 0))
+            tcol['text'].append(' '.join([text[i] for i in _child_ids(cell) if i in text]).strip())
+            tcol['conf'].append(cell.get('Confidence', 0.0))
+            tcol['page'].append(cell.get('Page', tb.get('Page', 1)))
+
+    return result
+
 
 def parse_textract_kv(resp: Dict[str, Any]) -> List[Dict[str, Any]]:
-    blocks = resp.get('Blocks', [])
-    block_map = {b['Id']: b for b in blocks}
-    kv_list: List[Dict[str, Any]] = []
-
-    for b in blocks:
-        if b['BlockType'] == 'KEY_VALUE_SET' and 'KEY' in b.get('EntityTypes', []):
-            key_text = ''
-            key_confs: List[float] = []
-            value_text = ''
-            value_confs: List[float] = []
-            for rel in b.get('Relationships', []):
-                if rel['Type'] == 'CHILD':
-                    for cid in rel['Ids']:
-                        word = block_map[cid]
-                        if word['BlockType'] == 'WORD':
-                            key_text += word.get('Text', '') + ' '
-                            key_confs.append(word.get('Confidence', 0.0))
-            for rel in b.get('Relationships', []):
-                if rel['Type'] == 'VALUE':
-                    for vid in rel['Ids']:
-                        vb = block_map[vid]
-                        for vrel in vb.get('Relationships', []):
-                            if vrel['Type'] == 'CHILD':
-                                for cid2 in vrel['Ids']:
-                                    word = block_map[cid2]
-                                    if word['BlockType'] == 'WORD':
-                                        value_text += word.get('Text', '') + ' '
-                                        value_confs.append(word.get('Confidence', 0.0))
-            key_text = key_text.strip()
-            value_text = value_text.strip()
-            avg_conf = round(sum(value_confs) / len(value_confs), 1) if value_confs else 0.0
-            if key_text:
-                kv_list.append({'key': key_text, 'value': value_text, 'conf': avg_conf})
-    return kv_list
-def textract_parse(img_bytes: bytes) -> List[Dict[str, Any]]:
-    try:
-        resp = textract_client.analyze_document(
+    """Paires clé/valeur (FORMS) au format [{'key','value','conf'}]."""
+    return parse_textract(resp).kv_records()
+
+def analyze_document(
+    img_bytes: bytes,
+    client: Optional[Any] = None,
+    feature_types: Sequence[str] = TEXTRACT_FEATURE_TYPES
+) -> TextractResult:
+    """Appel AnalyzeDocument, résultat en colonnes ; les erreurs sont propagées."""
+    with span("textract", payload_bytes=len(img_bytes)):
+        resp = (client or textract_client).analyze_document(
             Document={'Bytes': img_bytes},
-            FeatureTypes=['FORMS']
+            FeatureTypes=list(feature_types)
         )
-        return parse_textract_kv(resp)
+    with span("textract_parse"):
+        return parse_textract(resp)
+
+def analyze_document_kv(img_bytes: bytes, client: Optional[Any] = None) -> List[Dict[str, Any]]:
+    """Appel AnalyzeDocument, paires clé/valeur ; les erreurs sont propagées."""
+    return analyze_document(img_bytes, client).kv_records()
+
+def textract_parse(img_bytes: bytes) -> List[Dict[str, Any]]:
+    try:
+        return analyze_document_kv(img_bytes)
     except Exception:
         logger.exception('Textract error')
         return []
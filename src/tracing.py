@@ -0,0 +1,296 @@
+# src/tracing.py
+
+"""
+Traces par étape de la chaîne OCR - Green Hub.
+
+`span("preprocess")` chronomètre une étape : sa durée alimente l'histogramme
+Prometheus `ocr_greenhub_stage_seconds{stage=...}` et, si un collecteur est
+configuré (OTEL_EXPORTER_OTLP_ENDPOINT), la span est exportée au format
+OTLP/HTTP JSON. Les spans s'imbriquent (requête > page > recherche de zoom >
+essai de zoom > prétraitement / Tesseract) et portent l'identifiant de la
+requête en cours, qui sert d'identifiant de trace.
+
+L'identifiant de requête et la span courante vivent dans des `contextvars` :
+ils suivent les tâches soumises à l'exécuteur OCR (contexte copié à la
+soumission) et les tâches Celery (en-tête `request_id` du message, voir
+`src.tasks`).
+"""
+
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import TRACING_EXPORT_INTERVAL, TRACING_OTLP_ENDPOINT, TRACING_SERVICE_NAME
+from .observability import STAGE_SECONDS, TRACE_SPANS, series
+
+logger = logging.getLogger(__name__)
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("ocr_request_id", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("ocr_span", default=None)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_request_id() -> Optional[str]:
+    """Identifiant de la requête en cours (None hors requête)."""
+    return _request_id.get()
+
+
+def bind_request_id(request_id: Optional[str]) -> contextvars.Token:
+    """Fixe l'identifiant de requête ; rétablir avec `reset_request_id(token)`."""
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token: contextvars.Token) -> None:
+    _request_id.reset(token)
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Délimite une requête. Sans `request_id`, la requête en cours est conservée
+    (appel imbriqué) ou un nouvel identifiant est créé.
+    """
+    request_id = request_id or _request_id.get() or new_request_id()
+    token = _request_id.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _request_id.reset(token)
+
+
+@dataclass
+class Span:
+    """Étape chronométrée ; `attributes` décrit l'appel (zoom, page, stratégie...)."""
+
+    name: str
+    request_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        """Durée en secondes (0 tant que la span est ouverte)."""
+        return max(0, self.end_ns - self.start_ns) / 1e9
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Chronomètre le bloc comme étape `name`, enfant de la span courante. Hors
+    requête, la span ouvre sa propre trace. Les exceptions sont notées sur la
+    span puis propagées.
+    """
+    parent = _current_span.get()
+    request_id = _request_id.get()
+    rid_token = None
+    if request_id is None:
+        request_id = new_request_id()
+        rid_token = _request_id.set(request_id)
+    sp = Span(name, request_id, secrets.token_hex(8), parent.span_id if parent else None,
+              time.time_ns(), attributes=attributes)
+    token = _current_span.set(sp)
+    t0 = time.perf_counter()
+    try:
+        yield sp
+    except BaseException as exc:
+        sp.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        sp.end_ns = sp.start_ns + int(elapsed * 1e9)
+        _current_span.reset(token)
+        if rid_token is not None:
+            _request_id.reset(rid_token)
+        series(STAGE_SECONDS, name).observe(elapsed)
+        exporter = get_span_exporter()
+        if exporter is not None:
+            exporter.export(sp)
+
+
+# ----------- Export OTLP/HTTP JSON -----------
+
+def _trace_id(request_id: str) -> str:
+    """Identifiant de trace OTLP (32 hex) : l'UUID de la requête, sinon son empreinte."""
+    try:
+        return uuid.UUID(request_id).hex
+    except ValueError:
+        return hashlib.md5(request_id.encode("utf-8")).hexdigest()
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def span_to_otlp(sp: Span) -> Dict[str, Any]:
+    """Span au format OTLP JSON (`resourceSpans[].scopeSpans[].spans[]`)."""
+    attributes = dict(sp.attributes, request_id=sp.request_id)
+    out: Dict[str, Any] = {
+        "traceId": _trace_id(sp.request_id),
+        "spanId": sp.span_id,
+        "name": sp.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(sp.start_ns),
+        "endTimeUnixNano": str(sp.end_ns),
+        "attributes": [_attribute(k, v) for k, v in attributes.items() if v is not None],
+        # STATUS_CODE_OK / STATUS_CODE_ERROR
+        "status": {"code": 2, "message": sp.error} if sp.error else {"code": 1},
+    }
+    if sp.parent_id:
+        out["parentSpanId"] = sp.parent_id
+    return out
+
+
+class OTLPJsonExporter:
+    """
+    Exporte les spans terminées par lots, en JSON sur `<endpoint>/v1/traces`
+    (récepteur OTLP/HTTP d'un collecteur OpenTelemetry), depuis un thread
+    dédié : l'OCR n'attend jamais le collecteur. Au-delà de `max_queue` spans
+    en attente (collecteur absent), les nouvelles spans sont abandonnées.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        service_name: str = TRACING_SERVICE_NAME,
+        interval: float = TRACING_EXPORT_INTERVAL,
+        batch_size: int = 512,
+        max_queue: int = 8192,
+        timeout: float = 5.0,
+    ):
+        endpoint = endpoint.rstrip("/")
+        self.url = endpoint if endpoint.endswith("/v1/traces") else endpoint + "/v1/traces"
+        self.service_name = service_name
+        self.interval = interval
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_queue)
+        self._send_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, sp: Span) -> None:
+        try:
+            self._queue.put_nowait(sp)
+        except queue.Full:
+            TRACE_SPANS.labels("dropped").inc()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def _drain(self) -> List[Span]:
+        batch: List[Span] = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _payload(self, batch: List[Span]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": "ocr-greenhub"},
+                "spans": [span_to_otlp(sp) for sp in batch],
+            }],
+        }]}
+
+    def flush(self) -> None:
+        """Envoie toutes les spans en attente ; un lot refusé est abandonné."""
+        with self._send_lock:
+            while True:
+                batch = self._drain()
+                if not batch:
+                    return
+                body = json.dumps(self._payload(batch)).encode("utf-8")
+                req = urllib.request.Request(self.url, data=body, method="POST",
+                                             headers={"Content-Type": "application/json"})
+                try:
+                    with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                        resp.read()
+                except Exception as exc:
+                    logger.warning("Export OTLP vers %s impossible (%s spans perdues) : %s",
+                                   self.url, len(batch), exc)
+                    TRACE_SPANS.labels("dropped").inc(len(batch))
+                    continue
+                TRACE_SPANS.labels("exported").inc(len(batch))
+
+    def shutdown(self) -> None:
+        """Arrête le thread d'export après un dernier envoi."""
+        self._stop.set()
+        self._thread.join(timeout=self.timeout)
+        self.flush()
+
+
+_exporter: Optional[OTLPJsonExporter] = None
+_exporter_built = False
+_exporter_lock = threading.Lock()
+
+
+def get_span_exporter() -> Optional[OTLPJsonExporter]:
+    """Exporteur du processus (None si TRACING_OTLP_ENDPOINT n'est pas défini)."""
+    global _exporter, _exporter_built
+    if not _exporter_built:
+        with _exporter_lock:
+            if not _exporter_built:
+                if TRACING_OTLP_ENDPOINT:
+                    _exporter = OTLPJsonExporter(TRACING_OTLP_ENDPOINT)
+                    logger.info("Export des traces vers %s", _exporter.url)
+                _exporter_built = True
+    return _exporter
+
+
+def _reset_after_fork() -> None:
+    # Le thread d'export ne survit pas à un fork (exécuteur en processus,
+    # workers Celery prefork) : l'enfant reconstruit son propre exporteur
+    global _exporter, _exporter_built, _exporter_lock
+    _exporter = None
+    _exporter_built = False
+    _exporter_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def set_span_exporter(exporter: Optional[OTLPJsonExporter]) -> None:
+    """Remplace l'exporteur du processus (tests, collecteur local)."""
+    global _exporter, _exporter_built
+    with _exporter_lock:
+        previous, _exporter = _exporter, exporter
+        _exporter_built = True
+    if previous is not None and previous is not exporter:
+        previous.shutdown()
@@ -1,40 +1,108 @@
 # src/ui.py
 
 import io
-import base64
-import zipfile
 import logging
+import os
 
+import numpy as np
 import streamlit as st
-import streamlit.components.v1 as components  # nécessaire pour components.html
 from PIL import Image
 import pandas as pd
-from .config import STREAMLIT_PAGE_TITLE, STREAMLIT_LAYOUT
+from .config import STREAMLIT_PAGE_TITLE, STREAMLIT_LAYOUT, EXPORT_PUBLIC_URL, EXPORT_INLINE_MAX_BYTES
 from .i18n import t
 from .preprocessing import preprocess
-from .ocr import ocr_tess, find_best_zoom
+from .layout import ocr_layout
+from .ocr import find_best_zoom
 from .textract_service import textract_parse
+from .encoding import encode_for_textract
+from .export import open_export, export_path
 from .observability import record_request
 from .alerting import send_alert
-from .history import record_entry, update_entry, get_history
+from .history import record_entry, update_entry, get_entry, query_history
 from .auth import check_credentials
+from .executor import get_executor
+from .textract_batch import get_textract_batch_executor
+from .documents import PageRenderer, get_document_cache
+from .extensions import count_pages
+from .pipeline import process_document
+from .textlayer import load_text_layer, text_layer_words
+from .wordboxes import OCR_COLUMNS, WordBoxes
 
 logger = logging.getLogger(__name__)
 
+# Résolution des aperçus PDF (fitz.Matrix(2, 2))
+PDF_PREVIEW_DPI = 144
+
 @st.cache_data(show_spinner=False)
 def load_pdf_page(file_bytes: bytes, page_number: int = 0) -> Image.Image:
-    import fitz
     try:
-        doc = fitz.open(stream=file_bytes, filetype='pdf')
-        page = doc.load_page(page_number)
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-        mode = 'RGB' if pix.n < 4 else 'RGBA'
-        img = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
-        return img.convert('RGB')
+        return get_document_cache().render(file_bytes, page_number, dpi=PDF_PREVIEW_DPI)
     except Exception:
         st.error(t("pdf_load_error", "fr"))
         st.stop()
 
+def _encode_for_textract(item) -> bytes:
+    """Encode une image (nom, PIL) au format le plus compact pour Textract."""
+    _, img = item
+    return encode_for_textract(img).data
+
+def _run_batch(files, conf_thr: int, batch_key: tuple) -> dict:
+    """
+    Lot Textract : chaque résultat est écrit dans l'export ZIP sur disque dès
+    qu'il arrive. Renvoie le résumé, les détails et l'identifiant de l'export.
+    """
+    summary = []
+    all_kv = []
+    progress = st.progress(0)
+    total = len(files)
+    skipped = []
+
+    def _decoded():
+        # Décodage paresseux : seules les pages en vol restent en mémoire
+        for f in files:
+            record_entry(f.name, f"textract-batch-{f.name}")
+            raw = f.read()
+            if f.name.lower().endswith('.pdf'):
+                img = load_pdf_page(raw)
+            else:
+                img = Image.open(io.BytesIO(raw)).convert('RGB')
+            yield f.name, img
+
+    def _encoded():
+        # Encodage sur l'exécuteur OCR (CPU), au fil du décodage
+        for (fname, _), future in get_executor().iter_completed(_encode_for_textract, _decoded()):
+            if future.exception() is not None:
+                logger.error("Encodage impossible pour %s : %s", fname, future.exception())
+                skipped.append(fname)
+                continue
+            yield fname, future.result()
+
+    with open_export() as export:
+        # Appels Textract concurrents, limités en débit, dans l'ordre de complétion
+        results = get_textract_batch_executor().iter_results(_encoded())
+        for idx, (fname, kv_list, err) in enumerate(results):
+            if err is not None:
+                logger.error("Textract error pour %s : %s", fname, err)
+                kv_list = []
+            update_entry(f"textract-batch-{fname}", {"service": "batch-textract", "result": kv_list})
+
+            kv_list = [i for i in kv_list if i.get('conf', 0.0) >= conf_thr]
+            export.add(fname, kv_list)
+            cnt = len(kv_list)
+            avg = round(sum(i.get('conf', 0.0) for i in kv_list) / cnt, 1) if cnt else 0.0
+            summary.append({'fichier': fname, 'nb_champs': cnt, 'conf_moy': avg})
+            all_kv.append((fname, kv_list))
+            progress.progress((idx + 1) / total)
+
+        for fname in skipped:
+            update_entry(f"textract-batch-{fname}", {"service": "batch-textract", "result": []})
+            export.add(fname, [])
+            summary.append({'fichier': fname, 'nb_champs': 0, 'conf_moy': 0.0})
+            all_kv.append((fname, []))
+    progress.empty()
+
+    return {"key": batch_key, "export_id": export.export_id, "summary": summary, "details": all_kv}
+
 def app():
     # Configuration de la page
     st.set_page_config(page_title=STREAMLIT_PAGE_TITLE, layout=STREAMLIT_LAYOUT)
@@ -126,11 +194,9 @@ def app():
             key="single"
         )
         if file:
-            # Enregistrement en historique
+            # Entrées d'historique créées au lancement d'une analyse, pas à chaque rerun
             task_tex = f"textract-single-{file.name}"
             task_ocr = f"ocr-single-{file.name}"
-            record_entry(file.name, task_tex)
-            record_entry(file.name, task_ocr)
 
             raw = file.read()
             if file.name.lower().endswith('.pdf'):
@@ -146,9 +212,13 @@ def app():
 
             # Textract
             if st.button(t("analyze_tex", ui_lang), key="tex1"):
-                buf = io.BytesIO()
-                base_img.save(buf, format='PNG')
-                kv_list = record_request('textract', textract_parse, buf.getvalue())
+                try:
+                    payload = encode_for_textract(base_img).data
+                except ValueError as exc:
+                    st.error(str(exc))
+                    st.stop()
+                record_entry(file.name, task_tex)
+                kv_list = record_request('textract', textract_parse, payload)
                 update_entry(task_tex, {"service": "textract", "result": kv_list})
 
                 kv_list = [i for i in kv_list if i.get('conf', 0.0) >= conf_thr]
@@ -162,29 +232,66 @@ def app():
 
             # OCR
             if st.button(t("go_ocr", ui_lang), key="ocr1"):
+                record_entry(file.name, task_ocr)
                 with st.spinner(t("ocr_spinner", ui_lang)):
-                    if auto_zoom:
+                    # PDF natif : mots lus dans la couche texte, au DPI de l'aperçu
+                    text_layer = (load_text_layer(raw, file.name, page_idx, dpi=PDF_PREVIEW_DPI)
+                                  if file.name.lower().endswith('.pdf') else None)
+                    if text_layer is not None:
+                        df_res = record_request('ocr', text_layer_words, text_layer,
+                                                lang, psm, conf_thr, preprocess)
+                        cnt = len(df_res)
+                        mc = df_res.mean_conf()
+                        st.write(f"{t('ocr_stats', ui_lang)} {mc:.1f}% · {cnt} lignes")
+                    elif auto_zoom:
                         z, cnt, mc, df_res, proc_img, summary = record_request(
                             'ocr', find_best_zoom,
                             base_img, lang, psm, conf_thr,
-                            preprocess, ocr_tess
+                            preprocess, ocr_layout,
+                            # PDF : zooms rendus depuis le vectoriel
+                            render_fn=(PageRenderer(raw, page_idx, PDF_PREVIEW_DPI)
+                                       if file.name.lower().endswith('.pdf') else None)
                         )
                         st.subheader(t("zoom_summary", ui_lang))
                         st.dataframe(summary)
                     else:
                         proc_img = preprocess(base_img)
-                        df_res = record_request('ocr', ocr_tess, proc_img, lang, psm, conf_thr)
+                        df_res = record_request('ocr', ocr_layout, proc_img, lang, psm, conf_thr)
                         cnt = len(df_res)
-                        mc = df_res['conf'].mean() if cnt else 0.0
+                        mc = df_res.mean_conf()
                         st.write(f"{t('ocr_stats', ui_lang)} {mc:.1f}% · {cnt} lignes")
 
                 update_entry(task_ocr, {"service": "ocr", "result": df_res.to_dict('records')})
 
                 if not df_res.empty:
                     st.subheader(t("ocr_results", ui_lang))
-                    st.dataframe(df_res)
+                    st.dataframe(df_res.to_frame())
                     st.success(f"{cnt} lignes · Conf : {mc:.1f}%")
 
+            # OCR multi-pages en flux (PDF / TIFF)
+            n_pages = count_pages(raw, file.name)
+            if n_pages > 1 and st.button(f"{t('ocr_all_pages', ui_lang)} ({n_pages})", key="ocr_all"):
+                record_entry(file.name, task_ocr)
+                progress = st.progress(0)
+                pages_out = []
+                for done, page in enumerate(process_document(
+                    raw, file.name, lang, psm, conf_thr, preprocess, auto_zoom
+                ), start=1):
+                    progress.progress(done / n_pages)
+                    pages_out.append(page.words.with_page(page.page + 1))
+                    with st.expander(f"{t('page_label', ui_lang)} {page.page + 1} — "
+                                     f"{page.count} lignes · Conf : {page.mean_conf:.1f}%"):
+                        if page.error:
+                            st.error(page.error)
+                        else:
+                            st.dataframe(page.words.to_frame())
+                words_all = WordBoxes.concat(pages_out)
+                words_all = words_all[np.argsort(words_all["page"], kind="stable")]
+                update_entry(task_ocr, {
+                    "service": "ocr",
+                    "result": words_all.to_dict('records', columns=OCR_COLUMNS + ["page"])
+                })
+
     # --- Onglet 2 : Batch Textract ---
     with tab2:
         files = st.file_uploader(
@@ -194,53 +301,32 @@ def app():
             key="batch"
         )
         if files:
-            summary = []
-            all_kv = []
-            progress = st.progress(0)
-            total = len(files)
-            for idx, f in enumerate(files):
-                task_id = f"textract-batch-{f.name}"
-                record_entry(f.name, task_id)
-
-                raw = f.read()
-                if f.name.lower().endswith('.pdf'):
-                    img = load_pdf_page(raw)
-                else:
-                    img = Image.open(io.BytesIO(raw)).convert('RGB')
-
-                buf = io.BytesIO()
-                img.save(buf, format='PNG')
-                kv_list = record_request('textract', textract_parse, buf.getvalue())
-                update_entry(task_id, {"service": "batch-textract", "result": kv_list})
+            # Le lot n'est retraité que si les fichiers ou le seuil changent
+            # (ou si l'export a expiré), pas à chaque rerun Streamlit
+            batch_key = (conf_thr, tuple((f.name, f.size) for f in files))
+            batch = st.session_state.get("batch_result")
+            if batch is None or batch["key"] != batch_key or export_path(batch["export_id"]) is None:
+                batch = st.session_state["batch_result"] = _run_batch(files, conf_thr, batch_key)
 
-                kv_list = [i for i in kv_list if i.get('conf', 0.0) >= conf_thr]
-                cnt = len(kv_list)
-                avg = round(sum(i.get('conf', 0.0) for i in kv_list) / cnt, 1) if cnt else 0.0
-                summary.append({'fichier': f.name, 'nb_champs': cnt, 'conf_moy': avg})
-                all_kv.append((f.name, kv_list))
-                progress.progress((idx + 1) / total)
-
-            df_sum = pd.DataFrame(summary)
             st.subheader(t("batch_summary", ui_lang))
-            st.dataframe(df_sum)
+            st.dataframe(pd.DataFrame(batch["summary"]))
             st.success(f"{len(files)} fichiers traités")
 
-            # Téléchargement ZIP automatique
-            buffer = io.BytesIO()
-            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for fname, kv_list in all_kv:
-                    df = pd.DataFrame(kv_list)
-                    zipf.writestr(f"{fname.replace(' ', '_')}.csv", df.to_csv(index=False).encode('utf-8-sig'))
-            b64zip = base64.b64encode(buffer.getvalue()).decode()
-            components.html(
-                f"<a id='dl-batch' href='data:application/zip;base64,{b64zip}' "
-                f"download='batch_textract.zip'></a>"
-                "<script>document.getElementById('dl-batch').click();</script>",
-                height=0, width=0
-            )
+            # Export ZIP servi en flux depuis le disque par l'API ; download_button
+            # charge tout le fichier en mémoire du serveur Streamlit : taille bornée
+            zip_path = export_path(batch["export_id"])
+            if EXPORT_PUBLIC_URL:
+                st.link_button(t("batch_download", ui_lang),
+                               f"{EXPORT_PUBLIC_URL}/exports/{batch['export_id']}")
+            elif os.path.getsize(zip_path) <= EXPORT_INLINE_MAX_BYTES:
+                with open(zip_path, "rb") as fh:
+                    st.download_button(t("batch_download", ui_lang), fh,
+                                       "batch_textract.zip", "application/zip")
+            else:
+                st.warning(t("batch_download_too_large", ui_lang))
 
             st.subheader(t("details", ui_lang))
-            for fname, kv_list in all_kv:
+            for fname, kv_list in batch["details"]:
                 with st.expander(fname):
                     df = pd.DataFrame(kv_list)
                     if not df.empty:
@@ -252,10 +338,29 @@ def app():
     # --- Onglet 3 : Historique ---
     with tab3:
         st.subheader(t("history", ui_lang))
-        history = get_history()
-        if history:
-            df_hist = pd.DataFrame(history)
+        col_status, col_file = st.columns(2)
+        status = col_status.selectbox(
+            t("history_status", ui_lang), ["", "pending", "done", "error"],
+            format_func=lambda s: s or "—"
+        )
+        name_filter = col_file.text_input(t("history_filename", ui_lang))
+        filters = {"status": status or None, "filename": name_filter or None}
+
+        # Pile des curseurs de pages : revenir en arrière sans tout relire
+        if st.session_state.get("history_filters") != filters:
+            st.session_state["history_filters"] = filters
+            st.session_state["history_cursors"] = [None]
+        cursors = st.session_state["history_cursors"]
+        page = query_history(cursor=cursors[-1], **filters)
+
+        if page.entries:
+            df_hist = pd.DataFrame(page.entries)
             st.dataframe(df_hist)
+            col_prev, col_next = st.columns(2)
+            col_prev.button(t("history_prev", ui_lang), disabled=len(cursors) == 1,
+                            on_click=cursors.pop)
+            col_next.button(t("history_next", ui_lang), disabled=page.next_cursor is None,
+                            on_click=cursors.append, args=(page.next_cursor,))
             csv = df_hist.to_csv(index=False).encode('utf-8-sig')
             st.download_button(
                 t("history_download", ui_lang),
@@ -263,10 +368,14 @@ def app():
                 "history.csv",
                 "text/csv"
             )
-            for entry in history:
-                fname = entry.get("filename", "—")
-                status = entry.get("status", "—")
-                with st.expander(f"{fname} — {status}"):
-                    st.json(entry.get("result", {}))
+            # Résultat chargé uniquement pour l'entrée sélectionnée
+            names = {e["task_id"]: e["filename"] for e in page.entries}
+            selected = st.selectbox(
+                t("history_details", ui_lang), list(names),
+                format_func=lambda tid: f"{names[tid]} — {tid}"
+            )
+            entry = get_entry(selected)
+            if entry is not None:
+                st.json(entry.get("result") or {})
         else:
             st.info(t("no_history", ui_lang))
@@ -1,17 +1,15 @@
-import re
-from flashtext import KeywordProcessor
-from typing import Dict, List, Optional
+from typing import Any, Dict
 
-date_pattern = r"(?:\d{2}[./-]\d{2}[./-]\d{4}|\d{4}[./-]\d{2}[./-]\d{2})"
-amount_pattern = r"\b\d{1,3}(?:[ \u00A0]\d{3})*(?:[.,]\d{2})?\s?€\b"
+from .entities import AMOUNT_PATTERN as amount_pattern, DATE_PATTERN as date_pattern
+from .entities import get_entity_extractor, summarize
 
-keyword_processor = KeywordProcessor()
-keyword_processor.add_keyword('invoice', 'INVOICE_NUMBER')
+__all__ = ["amount_pattern", "date_pattern", "extract_entities_ocr"]
 
-def extract_entities_ocr(text: str) -> Dict[str, Optional[List[str]]]:
-    entities: Dict[str, Optional[List[str]]] = {}
-    m = re.search(r"[Ff]\d{4}-\d{5}", text)
-    entities['invoice_number'] = m.group(0) if m else None
-    entities['dates'] = re.findall(date_pattern, text)
-    entities['amounts'] = re.findall(amount_pattern, text)
-    return entities
+
+def extract_entities_ocr(text: str) -> Dict[str, Any]:
+    """
+    Entités d'un texte OCR au format historique (numéro de facture, dates,
+    montants, puis IBAN, n° de TVA et termes des dictionnaires). Pour les
+    positions, voir `src.entities.EntityExtractor.extract`.
+    """
+    return summarize(get_entity_extractor().extract_text(text))
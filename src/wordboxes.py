@@ -0,0 +1,230 @@
+# src/wordboxes.py
+
+"""
+Boîtes de mots OCR en colonnes NumPy - Green Hub.
+
+`WordBoxes` remplace le DataFrame pandas construit à chaque passe OCR :
+coordonnées (int32), confiances (float32), textes internés (tableau d'objets)
+et identifiants page / bloc / ligne. Le découpage par tranche renvoie des vues
+(aucune copie), le filtrage ne copie que les lignes retenues, et la conversion
+en DataFrame n'a lieu que lorsque l'UI ou un export la demande (`to_frame`).
+
+L'objet expose le sous-ensemble d'interface DataFrame utilisé dans le projet
+(`len`, `empty`, `columns`, `words["conf"]`, `to_dict("records")`) : les
+appelants existants fonctionnent sans conversion.
+"""
+
+import json
+import struct
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+OCR_COLUMNS = ["x1", "y1", "x2", "y2", "text", "conf"]
+ID_COLUMNS = ["page", "block", "line"]
+WORD_COLUMNS = OCR_COLUMNS + ID_COLUMNS
+
+_INT_COLUMNS = ("x1", "y1", "x2", "y2", "page", "block", "line")
+_HEADER = struct.Struct("<I")
+
+
+def _intern_texts(texts: Iterable[Any]) -> np.ndarray:
+    # Les mots fréquents (« de », « la », « EUR »...) partagent un seul objet str
+    values = [sys.intern(t) if isinstance(t, str) else sys.intern(str(t)) for t in texts]
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr
+
+
+class WordBoxes:
+    """
+    Mots reconnus sur une page, en colonnes parallèles.
+
+    Args:
+        x1, y1, x2, y2: Coins des boîtes (px).
+        text: Textes des mots.
+        conf: Confiances (0-100).
+        page, block, line: Identifiants (0 si inconnus).
+    """
+
+    __slots__ = _INT_COLUMNS[:4] + ("text", "conf") + _INT_COLUMNS[4:]
+
+    def __init__(
+        self,
+        x1: Any, y1: Any, x2: Any, y2: Any,
+        text: Any,
+        conf: Any,
+        page: Any = None, block: Any = None, line: Any = None,
+    ):
+        self.x1 = np.asarray(x1, dtype=np.int32)
+        self.y1 = np.asarray(y1, dtype=np.int32)
+        self.x2 = np.asarray(x2, dtype=np.int32)
+        self.y2 = np.asarray(y2, dtype=np.int32)
+        if isinstance(text, np.ndarray) and text.dtype == object:
+            self.text = text
+        else:
+            self.text = _intern_texts(text)
+        self.conf = np.asarray(conf, dtype=np.float32)
+        n = len(self.x1)
+        zeros = None
+        for name, values in (("page", page), ("block", block), ("line", line)):
+            if values is None:
+                # Colonne absente : un seul tableau de zéros partagé
+                zeros = zeros if zeros is not None else np.zeros(n, dtype=np.int32)
+                setattr(self, name, zeros)
+            else:
+                setattr(self, name, np.asarray(values, dtype=np.int32))
+
+    # ----------- Construction -----------
+
+    @classmethod
+    def blank(cls) -> "WordBoxes":
+        """Aucun mot (page vide ou OCR en erreur)."""
+        return cls([], [], [], [], [], [])
+
+    @classmethod
+    def from_dict(cls, columns: Dict[str, Sequence[Any]]) -> "WordBoxes":
+        """Depuis des listes par colonne (`to_dict('list')`, cache JSON)."""
+        return cls(*(columns[c] for c in OCR_COLUMNS), **{c: columns.get(c) for c in ID_COLUMNS})
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]]) -> "WordBoxes":
+        columns = {c: [r[c] for r in records] for c in OCR_COLUMNS}
+        for c in ID_COLUMNS:
+            if records and c in records[0]:
+                columns[c] = [r[c] for r in records]
+        return cls.from_dict(columns)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "WordBoxes":
+        columns: Dict[str, Any] = {c: df[c].to_numpy() for c in OCR_COLUMNS}
+        for c in ID_COLUMNS:
+            if c in df.columns:
+                columns[c] = df[c].to_numpy()
+        return cls.from_dict(columns)
+
+    @classmethod
+    def coerce(cls, words: Union["WordBoxes", pd.DataFrame]) -> "WordBoxes":
+        """Accepte aussi le DataFrame d'un moteur ou d'une fonction OCR tierce."""
+        if isinstance(words, WordBoxes):
+            return words
+        if isinstance(words, pd.DataFrame):
+            return cls.from_frame(words)
+        raise TypeError(f"Résultat OCR non reconnu : {type(words).__name__}")
+
+    @classmethod
+    def concat(cls, parts: Sequence["WordBoxes"]) -> "WordBoxes":
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.blank()
+        if len(parts) == 1:
+            return parts[0]
+        return cls(**{c: np.concatenate([getattr(p, c) for p in parts]) for c in WordBoxes.__slots__})
+
+    # ----------- Accès -----------
+
+    def __len__(self) -> int:
+        return len(self.x1)
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    @property
+    def columns(self) -> List[str]:
+        return list(OCR_COLUMNS)
+
+    @property
+    def nbytes(self) -> int:
+        """Mémoire des tableaux (les chaînes internées ne sont pas comptées)."""
+        return sum(getattr(self, c).nbytes for c in self.__slots__)
+
+    def __getitem__(self, key: Any) -> Any:
+        """
+        `words["conf"]` : colonne (tableau NumPy) ; tranche, masque booléen ou
+        indices : sous-ensemble. Une tranche partage les tableaux (vues).
+        """
+        if isinstance(key, str):
+            if key not in self.__slots__:
+                raise KeyError(key)
+            return getattr(self, key)
+        return WordBoxes(**{c: getattr(self, c)[key] for c in self.__slots__})
+
+    def filter_conf(self, conf_thr: float) -> "WordBoxes":
+        """Mots de confiance >= `conf_thr` (aucune copie si tous sont retenus)."""
+        mask = self.conf >= conf_thr
+        return self if mask.all() else self[mask]
+
+    def with_page(self, page: int) -> "WordBoxes":
+        """Mêmes mots (tableaux partagés) avec un numéro de page."""
+        return WordBoxes(
+            **{c: getattr(self, c) for c in self.__slots__ if c != "page"},
+            page=np.full(len(self), page, dtype=np.int32),
+        )
+
+    def offset(self, dx: int, dy: int, block: int = 0, line: int = 0) -> "WordBoxes":
+        """
+        Translate les boîtes de (dx, dy) et décale les identifiants de bloc /
+        ligne (mots d'un découpage ramenés dans le repère de la page).
+        """
+        return WordBoxes(
+            self.x1 + dx, self.y1 + dy, self.x2 + dx, self.y2 + dy,
+            text=self.text, conf=self.conf, page=self.page,
+            block=self.block + block, line=self.line + line,
+        )
+
+    def mean_conf(self) -> float:
+        return float(self.conf.mean()) if len(self) else 0.0
+
+    def join_text(self, sep: str = " ") -> str:
+        return sep.join(self.text.tolist())
+
+    # ----------- Conversions -----------
+
+    def to_frame(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """DataFrame (par défaut colonnes OCR_COLUMNS, ajouter ID_COLUMNS au besoin)."""
+        columns = list(columns or OCR_COLUMNS)
+        return pd.DataFrame({c: self[c] for c in columns}, columns=columns)
+
+    def to_dict(self, orient: str = "records", columns: Optional[Sequence[str]] = None) -> Any:
+        """
+        Comme `DataFrame.to_dict` ('records' ou 'list'), en types Python natifs
+        (sérialisables en JSON sans conversion).
+        """
+        columns = list(columns or OCR_COLUMNS)
+        lists = {c: self[c].tolist() for c in columns}
+        if orient == "list":
+            return lists
+        if orient == "records":
+            return [dict(zip(columns, row)) for row in zip(*(lists[c] for c in columns))]
+        raise ValueError(f"Orientation non prise en charge : {orient}")
+
+    def to_bytes(self) -> bytes:
+        """
+        Sérialisation compacte : en-tête JSON (textes) puis colonnes brutes,
+        entières sur 16 bits quand les valeurs le permettent (cas d'une page).
+        """
+        n = len(self)
+        ints = np.stack([getattr(self, c) for c in _INT_COLUMNS]) if n else np.empty((7, 0), np.int32)
+        dtype = "<u2" if not n or (ints.min() >= 0 and ints.max() <= 0xFFFF) else "<i4"
+        header = json.dumps({"n": n, "int": dtype, "text": self.text.tolist()}).encode()
+        return b"".join((
+            _HEADER.pack(len(header)), header,
+            ints.astype(dtype).tobytes(), self.conf.astype("<f4").tobytes(),
+        ))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "WordBoxes":
+        (size,) = _HEADER.unpack_from(data)
+        start = _HEADER.size + size
+        header = json.loads(data[_HEADER.size:start].decode())
+        n, dtype = header["n"], np.dtype(header["int"])
+        ints = np.frombuffer(data, dtype=dtype, count=7 * n, offset=start).reshape(7, n)
+        conf = np.frombuffer(data, dtype="<f4", count=n, offset=start + 7 * n * dtype.itemsize)
+        columns = dict(zip(_INT_COLUMNS, ints))
+        return cls(text=header["text"], conf=conf, **columns)
+
+    def __repr__(self) -> str:
+        return f"WordBoxes({len(self)} mots)"
@@ -0,0 +1,174 @@
+"""
+Benchmark de l'extraction d'entités à l'échelle d'un référentiel fournisseurs.
+
+Pour chaque taille de dictionnaire (1k, 10k, 100k noms, plus un IBAN et un n°
+de TVA connus par tranche de dix fournisseurs), mesure la construction de
+`EntityExtractor` (temps, pic mémoire) puis l'extraction page par page sur
+des factures synthétiques (mots positionnés) : débit, p50/p95. Deux repères :
+la copie du chemin d'origine (trois regex sur le texte joint, sans positions
+ni dictionnaire) et une recherche naïve des noms un par un (`nom in texte`).
+
+Usage :
+    python tests/benchmarks/bench_entities.py --pages 50 --sizes 1000 10000 100000 --json out.json
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+try:
+    from src import engine
+except ImportError:  # lancé depuis tests/benchmarks
+    import os
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+    from src import engine
+from src.entities import EntityExtractor
+from src.wordboxes import WordBoxes
+
+from bench_pipeline import invoice_lines, measure, tesseract_dict  # noqa: E402  (même dossier)
+
+SYLLABLES = ["val", "mar", "ret", "lu", "bor", "ga", "tin", "sel", "vo", "ra", "den", "qui",
+             "lo", "pra", "ne", "cor", "mi", "dal", "fer", "ant"]
+SUFFIXES = ["SAS", "SARL", "SA", "Industries", "Services", "Conseil", "Distribution", "& Fils"]
+
+
+def supplier_names(n: int, seed: int = 0) -> List[str]:
+    """`n` raisons sociales distinctes (« Valmaret Conseil SAS »)."""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < n:
+        stem = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+        names.add(f"{stem} {rng.choice(SUFFIXES)}" + (f" {rng.randint(1, 99)}" if rng.random() < 0.3 else ""))
+    return sorted(names)
+
+
+def iban(rng: random.Random) -> str:
+    """IBAN français à clé valide, groupé par 4."""
+    bban = "".join(str(rng.randrange(10)) for _ in range(23))
+    digits = "".join(str(int(c, 36)) for c in bban + "FR00")
+    compact = f"FR{98 - int(digits) % 97:02d}{bban}"
+    return " ".join(compact[i:i + 4] for i in range(0, len(compact), 4))
+
+
+def vat_id(rng: random.Random) -> str:
+    siren = rng.randrange(100_000_000, 999_999_999)
+    return f"FR{(12 + 3 * (siren % 97)) % 97:02d} {str(siren)[:3]} {str(siren)[3:6]} {str(siren)[6:]}"
+
+
+def make_reference(size: int, seed: int = 0) -> Dict[str, Dict[str, str]]:
+    rng = random.Random(seed)
+    names = supplier_names(size, seed)
+    known = names[::10]
+    return {
+        "supplier": {name: f"S{i:06d}" for i, name in enumerate(names)},
+        "iban": {iban(rng).replace(" ", ""): f"S{i * 10:06d}" for i in range(len(known))},
+        "vat_id": {vat_id(rng).replace(" ", ""): f"S{i * 10:06d}" for i in range(len(known))},
+    }
+
+
+def make_pages(pages: int, reference: Dict[str, Dict[str, str]], dpi: int = 200) -> List[WordBoxes]:
+    """Factures dont l'en-tête cite un fournisseur, son IBAN et son n° de TVA."""
+    rng = random.Random(pages)
+    names = list(reference["supplier"])
+    ibans, vats = list(reference["iban"]), list(reference["vat_id"])
+    out = []
+    for p in range(pages):
+        k = rng.randrange(len(ibans))
+        header = [
+            f"Fournisseur : {names[k * 10]}",
+            "IBAN " + " ".join(ibans[k][i:i + 4] for i in range(0, len(ibans[k]), 4)),
+            f"TVA intracommunautaire {vats[k]}",
+        ]
+        data = tesseract_dict(header + invoice_lines(p), dpi)
+        data["conf"] = [c if c < 0 else 90.0 for c in data["conf"]]
+        out.append(engine.words_from_data(data).with_page(p))
+    return out
+
+
+def legacy_entities(text: str) -> Dict[str, Any]:
+    """Copie du chemin d'origine (trois recherches sur le texte joint)."""
+    date_pattern = r"(?:\d{2}[./-]\d{2}[./-]\d{4}|\d{4}[./-]\d{2}[./-]\d{2})"
+    amount_pattern = r"\b\d{1,3}(?:[ \u00A0]\d{3})*(?:[.,]\d{2})?\s?€\b"
+    m = re.search(r"[Ff]\d{4}-\d{5}", text)
+    return {
+        "invoice_number": m.group(0) if m else None,
+        "dates": re.findall(date_pattern, text),
+        "amounts": re.findall(amount_pattern, text),
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for size in args.sizes:
+        reference = make_reference(size)
+        pages = make_pages(args.pages, reference)
+        texts = [page.join_text() for page in pages]
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        extractor = EntityExtractor()
+        for label, entries in reference.items():
+            extractor.add_dictionary(label, entries)
+        build_s = time.perf_counter() - t0
+        _, build_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        found = [extractor.extract(page) for page in pages]
+        matched = sum(1 for ents in found for e in ents if e.ref is not None)
+        names = list(reference["supplier"])
+        results[str(size)] = {
+            "terms": extractor.terms,
+            "build_s": build_s,
+            "build_peak_mib": build_peak / 2 ** 20,
+            "entities_per_page": sum(map(len, found)) / len(pages),
+            "referenced_per_page": matched / len(pages),
+            "extract": measure(extractor.extract, pages, args.repeat),
+            "naive_names": measure(lambda text: [n for n in names if n in text], texts, 1),
+        }
+    results["legacy"] = measure(legacy_entities, [p.join_text() for p in make_pages(args.pages, make_reference(10))],
+                                args.repeat)
+    return {"meta": {"pages": args.pages, "repeat": args.repeat,
+                     "time": time.strftime("%Y-%m-%dT%H:%M:%S")}, "sizes": results}
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    meta = report["meta"]
+    print(f"{meta['pages']} page(s), {meta['repeat']} passage(s)")
+    print(f"  {'termes':>8} {'constr. s':>9} {'constr. MiB':>11} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'pages/s':>8} {'entités':>8} {'réf.':>5} {'naïf p50 ms':>12}")
+    legacy = report["sizes"]["legacy"]
+    for size, row in report["sizes"].items():
+        if size == "legacy":
+            continue
+        ext = row["extract"]
+        print(f"  {row['terms']:>8} {row['build_s']:9.2f} {row['build_peak_mib']:11.1f} "
+              f"{ext['p50_ms']:8.2f} {ext['p95_ms']:8.2f} {ext['throughput']:8.0f} "
+              f"{row['entities_per_page']:8.1f} {row['referenced_per_page']:5.1f} "
+              f"{row['naive_names']['p50_ms']:12.2f}")
+    print(f"  chemin d'origine (sans positions ni dictionnaire) : p50 {legacy['p50_ms']:.2f} ms, "
+          f"{legacy['throughput']:.0f} pages/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="écrit le rapport JSON dans ce fichier")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+        print(f"Rapport écrit : {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+Benchmark par étape de la chaîne OCR, sur des factures synthétiques.
+
+Chaque étape est chronométrée séparément, élément par élément : rendu PDF,
+décodage d'image, prétraitement, Tesseract, nettoyage des mots, recherche de
+zoom, parsing Textract (client factice), extraction d'entités, chargement
+du modèle spaCy et normalisation des entités (sans cache, puis avec). Le rapport
+donne le débit, les latences p50/p95 et le pic mémoire (tracemalloc : Python et
+numpy, pas les tampons internes d'OpenCV ni de Tesseract). Les étapes qui
+demandent un binaire absent (Tesseract) sont marquées « ignorée ».
+
+Usage :
+    python tests/benchmarks/bench_pipeline.py --pages 4 --dpi 200 --repeat 3 --json out.json
+    python tests/benchmarks/bench_pipeline.py --save-baseline tests/benchmarks/baseline_pipeline.json
+    python tests/benchmarks/bench_pipeline.py --baseline tests/benchmarks/baseline_pipeline.json
+
+Avec --baseline, une étape dont le p50 ou le pic mémoire dépasse la référence
+de plus de --tolerance est signalée en régression, et le code de sortie vaut 1.
+Une référence n'a de sens que sur la machine qui l'a produite.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+try:
+    from src import engine
+except ImportError:  # lancé depuis tests/benchmarks
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+    from src import engine
+from src.cache import set_ocr_cache
+from src.extensions import iter_pdf_pages, render_page
+from src.layout import ocr_layout
+from src.nlp_postprocessing import EntityNormalizer, load_pipeline
+from src.ocr import find_best_zoom
+from src.preprocessing import PreprocessEngine, PreprocessParams
+from src.textract_service import analyze_document
+from src.entities import EntityExtractor, get_entity_extractor, summarize
+
+from bench_textract_parser import synthetic_response  # noqa: E402  (même dossier)
+
+LANG, PSM, CONF_THR = "fra", 6, 30
+ZOOM_STEPS = [1.0, 1.5, 2.0]
+LABELS = ["Désignation", "Prestation", "Licence", "Maintenance", "Hébergement", "Support"]
+
+
+# --- Factures synthétiques ---------------------------------------------------
+
+def invoice_lines(seed: int, n_items: int = 25) -> List[str]:
+    """Texte d'une facture : en-tête, numéro, dates, lignes de montants."""
+    rng = random.Random(seed)
+    issued = date(2024, 1, 1) + timedelta(days=rng.randrange(365))
+    lines = [
+        "Green Hub France - 12 rue de la République, 69002 Lyon",
+        f"Facture F2024-{rng.randrange(100000):05d}",
+        f"Date : {issued:%d/%m/%Y}   Échéance : {issued + timedelta(days=30):%d/%m/%Y}",
+        "Client : Société Exemple SAS - SIRET 123 456 789 00012",
+        "",
+    ]
+    total = 0.0
+    for i in range(n_items):
+        amount = rng.uniform(10, 5000)
+        total += amount
+        lines.append(f"{rng.choice(LABELS)} {i + 1:02d}  x{rng.randint(1, 9)}   {_euros(amount)}")
+    lines += ["", f"Total HT {_euros(total)}", f"TVA 20 % {_euros(total * 0.2)}",
+              f"Total TTC {_euros(total * 1.2)}"]
+    return lines
+
+
+def _euros(amount: float) -> str:
+    whole, cents = f"{amount:.2f}".split(".")
+    grouped = f"{int(whole):,}".replace(",", " ")
+    return f"{grouped},{cents} €"
+
+
+def make_invoice_pdf(pages: int, seed: int = 0) -> bytes:
+    """PDF natif de `pages` factures (texte vectoriel, police standard)."""
+    import fitz
+
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page(width=595, height=842)
+        for i, text in enumerate(invoice_lines(seed + p)):
+            page.insert_text((50, 60 + i * 19), text, fontsize=10)
+    return doc.tobytes()
+
+
+def degrade(img: Image.Image, noise: float, skew: float, seed: int = 0) -> Image.Image:
+    """Simule une numérisation : rotation de `skew` degrés et bruit gaussien."""
+    if skew:
+        img = img.rotate(skew, resample=Image.BICUBIC, expand=True, fillcolor=(255, 255, 255))
+    if noise:
+        rng = np.random.default_rng(seed)
+        arr = np.asarray(img, dtype=np.int16) + rng.normal(0, noise, (img.height, img.width, 1)).astype(np.int16)
+        img = Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+    return img
+
+
+def make_scans(pdf: bytes, dpi: int, noise: float, skew: float) -> List[Image.Image]:
+    return [degrade(img, noise, skew, seed=i) for i, img in enumerate(iter_pdf_pages(pdf, dpi))]
+
+
+def tesseract_dict(lines: Sequence[str], dpi: int) -> Dict[str, List[Any]]:
+    """Sortie `image_to_data(Output.DICT)` plausible pour ces lignes (sans Tesseract)."""
+    rng = random.Random(len(lines))
+    scale = dpi / 72.0
+    data: Dict[str, List[Any]] = {k: [] for k in (
+        "level", "page_num", "block_num", "par_num", "line_num", "word_num",
+        "left", "top", "width", "height", "conf", "text")}
+    for li, line in enumerate(lines):
+        x = int(50 * scale)
+        top = int((48 + li * 19) * scale)
+        # Lignes de structure (conf -1, texte vide), comme Tesseract
+        for key, value in (("level", 4), ("page_num", 1), ("block_num", 1), ("par_num", 1),
+                           ("line_num", li), ("word_num", 0), ("left", x), ("top", top),
+                           ("width", 0), ("height", 0), ("conf", -1), ("text", "")):
+            data[key].append(value)
+        for wi, word in enumerate(line.split()):
+            width = int(len(word) * 5.5 * scale)
+            for key, value in (("level", 5), ("page_num", 1), ("block_num", 1), ("par_num", 1),
+                               ("line_num", li), ("word_num", wi + 1), ("left", x), ("top", top),
+                               ("width", width), ("height", int(12 * scale)),
+                               ("conf", rng.uniform(0, 96)), ("text", word)):
+                data[key].append(value)
+            x += width + int(3 * scale)
+    return data
+
+
+# --- Mesure ------------------------------------------------------------------
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def measure(fn: Callable[[Any], Any], items: Sequence[Any], repeat: int) -> Dict[str, float]:
+    """
+    Appelle `fn` sur chaque élément, `repeat` fois (après un passage à blanc),
+    puis un passage sous tracemalloc pour le pic mémoire.
+    """
+    for item in items[:1]:
+        fn(item)
+    latencies: List[float] = []
+    t_total = 0.0
+    for _ in range(repeat):
+        for item in items:
+            t0 = time.perf_counter()
+            fn(item)
+            dt = time.perf_counter() - t0
+            latencies.append(dt)
+            t_total += dt
+    tracemalloc.start()
+    try:
+        for item in items:
+            fn(item)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "items": len(items),
+        "throughput": len(latencies) / t_total if t_total else float("inf"),
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "peak_kib": peak / 1024,
+    }
+
+
+def _tesseract_available() -> Optional[str]:
+    """None si Tesseract répond, sinon la raison de l'indisponibilité."""
+    try:
+        engine.get_engine().recognize(Image.new("L", (32, 32), 255), LANG, PSM)
+    except Exception as exc:
+        return f"{type(exc).__name__}: {exc}".splitlines()[0][:120]
+    return None
+
+
+class StubTextractClient:
+    """Client AnalyzeDocument qui renvoie une réponse préparée."""
+
+    def __init__(self, resp: Dict[str, Any]):
+        self.resp = resp
+
+    def analyze_document(self, **kwargs: Any) -> Dict[str, Any]:
+        return self.resp
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    # Cache OCR désactivé : on mesure le calcul, pas les relectures
+    set_ocr_cache(None)
+    pdf = make_invoice_pdf(args.pages)
+    scans = make_scans(pdf, args.dpi, args.noise, args.skew)
+    encoded = []
+    for i, img in enumerate(scans):
+        buf = io.BytesIO()
+        img.save(buf, format="PNG" if i % 2 == 0 else "JPEG", quality=90)
+        encoded.append(buf.getvalue())
+    params = PreprocessParams(mode=args.mode)
+    prep = PreprocessEngine(max_bytes=0)
+    processed = [prep.run(img, params) for img in scans]
+    dicts = [tesseract_dict(invoice_lines(i), args.dpi) for i in range(args.pages)]
+    words = [engine.words_from_data(data).filter_conf(CONF_THR) for data in dicts]
+    responses = [synthetic_response(200, n_tables=1, seed=i) for i in range(args.pages)]
+    suppliers = EntityExtractor()
+    suppliers.add_dictionary("supplier", ["Green Hub France", "Société Exemple SAS"])
+    summaries = [summarize(suppliers.extract(w)) for w in words]
+
+    def normalize(cache_size: int) -> Dict[str, Any]:
+        normalizer = EntityNormalizer(nlp=load_pipeline(), cache_size=cache_size)
+        return measure(normalizer.normalize, summaries, args.repeat)
+
+    stages: Dict[str, Callable[[], Dict[str, Any]]] = {
+        # Page par page, document gardé ouvert par le cache de documents
+        "pdf_render": lambda: measure(
+            lambda i: render_page(pdf, "facture.pdf", i, args.dpi), list(range(args.pages)), args.repeat),
+        "image_decode": lambda: measure(
+            lambda raw: Image.open(io.BytesIO(raw)).convert("RGB"), encoded, args.repeat),
+        "preprocess": lambda: measure(lambda img: prep.run(img, params), scans, args.repeat),
+        "tesseract": lambda: measure(
+            lambda img: engine.get_engine().recognize(img, LANG, PSM), processed, args.repeat),
+        "cleanup": lambda: measure(
+            lambda data: engine.words_from_data(data).filter_conf(CONF_THR), dicts, args.repeat),
+        "zoom_search": lambda: measure(
+            lambda img: find_best_zoom(img, LANG, PSM, CONF_THR, lambda im: prep.run(im, params),
+                                       ocr_layout, zoom_steps=ZOOM_STEPS),
+            scans, args.repeat),
+        "textract_parse": lambda: measure(
+            lambda resp: analyze_document(b"", client=StubTextractClient(resp)), responses, args.repeat),
+        "entities": lambda: measure(get_entity_extractor().extract, words, args.repeat),
+        "nlp_load": lambda: measure(lambda _: load_pipeline(), [None], args.repeat),
+        "normalize": lambda: normalize(0),
+        "normalize_cached": lambda: normalize(1024),
+    }
+    needs_tesseract = {"tesseract", "zoom_search"}
+    missing = _tesseract_available() if needs_tesseract & set(args.stages) else None
+
+    results: Dict[str, Any] = {}
+    for name in args.stages:
+        if name in needs_tesseract and missing:
+            results[name] = {"skipped": missing}
+            continue
+        results[name] = stages[name]()
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "pages": args.pages, "dpi": args.dpi, "noise": args.noise, "skew": args.skew,
+            "mode": args.mode, "repeat": args.repeat,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "stages": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Étapes dont le p50 ou le pic mémoire dépasse la référence de plus de `tolerance`."""
+    regressions = []
+    for name, row in current["stages"].items():
+        ref = baseline.get("stages", {}).get(name)
+        if not ref or "skipped" in row or "skipped" in ref:
+            continue
+        for metric in ("p50_ms", "peak_kib"):
+            if ref[metric] and row[metric] > ref[metric] * (1 + tolerance):
+                regressions.append(f"{name}.{metric} : {ref[metric]:.1f} -> {row[metric]:.1f} "
+                                   f"({(row[metric] / ref[metric] - 1) * 100:+.0f} %)")
+    return regressions
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    meta = report["meta"]
+    print(f"{meta['pages']} page(s) à {meta['dpi']} dpi, bruit {meta['noise']}, "
+          f"inclinaison {meta['skew']}°, {meta['repeat']} passage(s)")
+    print(f"  {'étape':<16} {'débit/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'pic KiB':>10} {'réf. p50':>9}")
+    for name, row in report["stages"].items():
+        if "skipped" in row:
+            print(f"  {name:<16} ignorée ({row['skipped']})")
+            continue
+        ref = (baseline or {}).get("stages", {}).get(name, {})
+        ref_p50 = f"{ref['p50_ms']:9.1f}" if "p50_ms" in ref else f"{'-':>9}"
+        print(f"  {name:<16} {row['throughput']:9.1f} {row['p50_ms']:9.1f} {row['p95_ms']:9.1f} "
+              f"{row['peak_kib']:10.0f} {ref_p50}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    stage_names = ["pdf_render", "image_decode", "preprocess", "tesseract", "cleanup",
+                   "zoom_search", "textract_parse", "entities", "nlp_load", "normalize",
+                   "normalize_cached"]
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=8.0, help="écart-type du bruit (niveaux de gris)")
+    parser.add_argument("--skew", type=float, default=0.8, help="inclinaison (degrés)")
+    parser.add_argument("--mode", choices=["full", "adaptive"], default="adaptive")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stages", nargs="+", choices=stage_names, default=stage_names)
+    parser.add_argument("--json", help="écrit le rapport JSON dans ce fichier")
+    parser.add_argument("--baseline", help="rapport JSON de référence à comparer")
+    parser.add_argument("--save-baseline", help="enregistre ce rapport comme référence")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="dépassement toléré (0.25 = 25 %%)")
+    args = parser.parse_args()
+
+    report = run(args)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    print_report(report, baseline)
+    for path in filter(None, (args.json, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+        print(f"Rapport écrit : {path}")
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"RÉGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"Aucune régression (tolérance {args.tolerance * 100:.0f} %)")
+
+
+if __name__ == "__main__":
+    main()
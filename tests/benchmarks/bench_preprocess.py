@@ -0,0 +1,98 @@
+"""
+Benchmark du prétraitement : chaîne d'origine (objets OpenCV recréés, sans
+cache hors Streamlit) contre `PreprocessEngine` (objets réutilisés, cache à
+clé d'empreinte), puis chaîne complète contre chaîne adaptative sur une page PDF rendue.
+
+Usage :
+    python tests/benchmarks/bench_preprocess.py --pages 8 --size 1654 2339 --repeat 3
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+try:
+    from src.preprocessing import PreprocessEngine, PreprocessParams
+except ImportError:  # lancé depuis tests/benchmarks
+    import os
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+    from src.preprocessing import PreprocessEngine, PreprocessParams
+
+
+def legacy_preprocess(img: Image.Image) -> Image.Image:
+    """Copie de la chaîne d'origine (sans le décorateur Streamlit)."""
+    gray = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2GRAY)
+    cl = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+    th = cv2.adaptiveThreshold(cl, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 15, 3)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    return Image.fromarray(cv2.morphologyEx(th, cv2.MORPH_CLOSE, kernel))
+
+
+def make_page(seed: int, size) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    arr = rng.integers(180, 255, size=(size[1], size[0], 3), dtype=np.uint8)
+    img = Image.fromarray(arr)
+    draw = ImageDraw.Draw(img)
+    for y in range(40, size[1] - 40, 30):
+        draw.text((40, y), f"Ligne {y} facture {seed} montant 1234,56 EUR", fill=(0, 0, 0))
+    return img
+
+
+def render_pdf_page(dpi: int = 200) -> Image.Image:
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    for i in range(40):
+        page.insert_text((40, 40 + i * 19), f"Ligne {i} facture F2024-{i:05d} montant 1234,56 EUR", fontsize=10)
+    pix = page.get_pixmap(dpi=dpi)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+
+def best(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--size", type=int, nargs=2, default=(1654, 2339), metavar=("W", "H"))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = [make_page(i, args.size) for i in range(args.pages)]
+    params = PreprocessParams(mode="full")
+
+    def cold_engine():
+        return PreprocessEngine(max_bytes=0)
+
+    rows = [
+        ("historique, séquentiel", best(lambda: [legacy_preprocess(p) for p in pages], args.repeat)),
+        ("moteur, séquentiel", best(lambda: [cold_engine().run(p, params) for p in pages], args.repeat)),
+    ]
+    warm = PreprocessEngine(max_bytes=2 * 1024 ** 3)
+    for page in pages:
+        warm.run(page, params)
+    rows.append(("moteur, cache chaud", best(lambda: [warm.run(p, params) for p in pages], args.repeat)))
+
+    rendered = render_pdf_page()
+    for mode in ("full", "adaptive"):
+        mode_params = PreprocessParams(mode=mode)
+        rows.append((f"page PDF rendue, {mode}",
+                     best(lambda: cold_engine().run(rendered, mode_params), args.repeat)))
+
+    print(f"{args.pages} page(s) {args.size[0]}x{args.size[1]}, meilleur de {args.repeat}")
+    for label, seconds in rows:
+        print(f"  {label:<40} {seconds * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
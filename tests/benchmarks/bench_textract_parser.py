@@ -0,0 +1,193 @@
+"""
+Benchmark du parseur Textract : parseur historique (block_map + double parcours
++ concaténations) contre `parse_textract` (indexation unique, colonnes).
+
+Usage :
+    python tests/benchmarks/bench_textract_parser.py --pairs 5000 20000 --repeat 5
+
+La colonne « +lignes » inclut la construction des colonnes LINE, que le
+parseur historique ne produisait pas.
+"""
+
+import argparse
+import random
+import time
+from typing import Any, Dict, List
+
+try:
+    from src.textract_service import parse_textract
+except ImportError:  # lancé depuis tests/benchmarks
+    import os
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+    from src.textract_service import parse_textract
+
+
+def legacy_parse_textract_kv(resp: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Copie du parseur d'origine, conservée comme référence de performance."""
+    blocks = resp.get('Blocks', [])
+    block_map = {b['Id']: b for b in blocks}
+    kv_list: List[Dict[str, Any]] = []
+
+    for b in blocks:
+        if b['BlockType'] == 'KEY_VALUE_SET' and 'KEY' in b.get('EntityTypes', []):
+            key_text = ''
+            key_confs: List[float] = []
+            value_text = ''
+            value_confs: List[float] = []
+            for rel in b.get('Relationships', []):
+                if rel['Type'] == 'CHILD':
+                    for cid in rel['Ids']:
+                        word = block_map[cid]
+                        if word['BlockType'] == 'WORD':
+                            key_text += word.get('Text', '') + ' '
+                            key_confs.append(word.get('Confidence', 0.0))
+            for rel in b.get('Relationships', []):
+                if rel['Type'] == 'VALUE':
+                    for vid in rel['Ids']:
+                        vb = block_map[vid]
+                        for vrel in vb.get('Relationships', []):
+                            if vrel['Type'] == 'CHILD':
+                                for cid2 in vrel['Ids']:
+                                    word = block_map[cid2]
+                                    if word['BlockType'] == 'WORD':
+                                        value_text += word.get('Text', '') + ' '
+                                        value_confs.append(word.get('Confidence', 0.0))
+            key_text = key_text.strip()
+            value_text = value_text.strip()
+            avg_conf = round(sum(value_confs) / len(value_confs), 1) if value_confs else 0.0
+            if key_text:
+                kv_list.append({'key': key_text, 'value': value_text, 'conf': avg_conf})
+    return kv_list
+
+
+def synthetic_response(
+    n_pairs: int,
+    words_per_field: int = 3,
+    n_tables: int = 0,
+    table_shape=(10, 5),
+    shared_values: float = 0.1,
+    pages: int = 1,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Réponse AnalyzeDocument synthétique : `n_pairs` paires clé/valeur (une part
+    `shared_values` pointant vers un bloc VALUE partagé), des LINE et des tables.
+    """
+    rng = random.Random(seed)
+    blocks: List[Dict[str, Any]] = []
+    counter = [0]
+
+    def new_id() -> str:
+        counter[0] += 1
+        return f"b{counter[0]}"
+
+    def word(page: int) -> str:
+        wid = new_id()
+        blocks.append({
+            "Id": wid, "BlockType": "WORD", "Page": page,
+            "Text": "".join(rng.choice("ABCDEFGHIJ0123456789") for _ in range(6)),
+            "Confidence": rng.uniform(50, 100),
+        })
+        return wid
+
+    def line(page: int, ids: List[str]) -> None:
+        blocks.append({
+            "Id": new_id(), "BlockType": "LINE", "Page": page, "Text": "ligne",
+            "Confidence": rng.uniform(50, 100),
+            "Geometry": {"BoundingBox": {"Left": rng.random(), "Top": rng.random(),
+                                         "Width": 0.2, "Height": 0.02}},
+            "Relationships": [{"Type": "CHILD", "Ids": ids}],
+        })
+
+    shared_vid = None
+    for i in range(n_pairs):
+        page = 1 + i % pages
+        key_words = [word(page) for _ in range(words_per_field)]
+        if shared_vid is not None and rng.random() < shared_values:
+            vid = shared_vid
+        else:
+            value_words = [word(page) for _ in range(words_per_field)]
+            vid = new_id()
+            blocks.append({
+                "Id": vid, "BlockType": "KEY_VALUE_SET", "EntityTypes": ["VALUE"], "Page": page,
+                "Relationships": [{"Type": "CHILD", "Ids": value_words}],
+            })
+            line(page, value_words)
+            shared_vid = vid
+        blocks.append({
+            "Id": new_id(), "BlockType": "KEY_VALUE_SET", "EntityTypes": ["KEY"], "Page": page,
+            "Relationships": [{"Type": "CHILD", "Ids": key_words}, {"Type": "VALUE", "Ids": [vid]}],
+        })
+        line(page, key_words)
+
+    rows, cols = table_shape
+    for t in range(n_tables):
+        page = 1 + t % pages
+        cell_ids = []
+        for r in range(1, rows + 1):
+            for c in range(1, cols + 1):
+                cid = new_id()
+                blocks.append({
+                    "Id": cid, "BlockType": "CELL", "Page": page, "RowIndex": r, "ColumnIndex": c,
+                    "Confidence": rng.uniform(50, 100),
+                    "Relationships": [{"Type": "CHILD", "Ids": [word(page)]}],
+                })
+                cell_ids.append(cid)
+        blocks.append({
+            "Id": new_id(), "BlockType": "TABLE", "Page": page,
+            "Relationships": [{"Type": "CHILD", "Ids": cell_ids}],
+        })
+
+    rng.shuffle(blocks)
+    return {"Blocks": blocks}
+
+
+def _best_of(fn, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _parse_all(resp: Dict[str, Any]) -> None:
+    # Parcours complet : clé/valeur, tables et lignes
+    parse_textract(resp).lines
+
+
+def run(sizes: List[int], repeat: int = 3, words_per_field: int = 3) -> List[Dict[str, Any]]:
+    rows = []
+    for n in sizes:
+        resp = synthetic_response(n, words_per_field, n_tables=max(1, n // 1000),
+                                  pages=max(1, n // 500))
+        legacy = _best_of(legacy_parse_textract_kv, resp, repeat)
+        columnar = _best_of(parse_textract, resp, repeat)
+        full = _best_of(_parse_all, resp, repeat)
+        rows.append({
+            "pairs": n,
+            "blocks": len(resp["Blocks"]),
+            "legacy_s": legacy,
+            "columnar_s": columnar,
+            "full_s": full,
+            "speedup": legacy / columnar if columnar else float("inf"),
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pairs", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--words", type=int, default=3, help="mots par clé et par valeur")
+    args = parser.parse_args()
+    print(f"{'paires':>8} {'blocs':>9} {'historique':>11} {'colonnes':>10} "
+          f"{'+lignes':>10} {'gain':>6}")
+    for row in run(args.pairs, args.repeat, args.words):
+        print(f"{row['pairs']:>8} {row['blocks']:>9} {row['legacy_s']:>10.4f}s "
+              f"{row['columnar_s']:>9.4f}s {row['full_s']:>9.4f}s {row['speedup']:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark des boîtes de mots : chemin DataFrame d'origine (sortie pytesseract
+en DataFrame, nettoyage, filtre de confiance, cache JSON) contre `WordBoxes`
+(colonnes NumPy, textes internés, cache binaire), sur des sorties Tesseract
+synthétiques. Mesure le temps par page et la mémoire retenue pour un document.
+
+Usage :
+    python tests/benchmarks/bench_wordboxes.py --pages 50 --words 400 --repeat 5
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src.engine import words_from_data
+    from src.wordboxes import OCR_COLUMNS, WordBoxes
+except ImportError:  # lancé depuis tests/benchmarks
+    import os
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+    from src.engine import words_from_data
+    from src.wordboxes import OCR_COLUMNS, WordBoxes
+
+VOCABULARY = ["Facture", "N°", "F2024-00042", "du", "12/03/2024", "Total", "TTC", "1234,56",
+              "EUR", "TVA", "20%", "de", "la", "Green", "Hub", "Client", "Adresse", "Paris"]
+CONF_THR = 30
+
+
+def make_data(seed: int, n_words: int) -> dict:
+    """Sortie `image_to_data(Output.DICT)` d'une page : mots + lignes de structure."""
+    rng = np.random.default_rng(seed)
+    data = {k: [] for k in ("left", "top", "width", "height", "text", "conf",
+                            "block_num", "par_num", "line_num")}
+    for i in range(n_words):
+        if i % 12 == 0:
+            # Ligne de structure (nouvelle ligne) : texte vide, conf -1
+            for k, v in (("text", ""), ("conf", -1)):
+                data[k].append(v)
+            for k in ("left", "top", "width", "height"):
+                data[k].append(0)
+        else:
+            data["text"].append(VOCABULARY[int(rng.integers(len(VOCABULARY)))])
+            data["conf"].append(float(rng.uniform(0, 100)))
+            data["left"].append(int(rng.integers(0, 1500)))
+            data["top"].append(int(rng.integers(0, 2200)))
+            data["width"].append(int(rng.integers(10, 200)))
+            data["height"].append(int(rng.integers(10, 40)))
+        data["block_num"].append(i // 120)
+        data["par_num"].append(i // 60)
+        data["line_num"].append(i // 12)
+    return data
+
+
+def legacy_words(data: dict) -> pd.DataFrame:
+    """Copie du chemin d'origine (Output.DATAFRAME puis nettoyage pandas)."""
+    df = pd.DataFrame(data).replace({"text": {"": np.nan}})
+    df = df.dropna(subset=["text"]).copy()
+    df["conf"] = df["conf"].astype(float)
+    df = df.rename(columns={"left": "x1", "top": "y1", "width": "w", "height": "h"})
+    df["x2"] = df["x1"] + df["w"]
+    df["y2"] = df["y1"] + df["h"]
+    return df[OCR_COLUMNS]
+
+
+def legacy_page(data: dict):
+    df = legacy_words(data)
+    cached = json.dumps({"columns": list(df.columns), "data": df.to_dict("list")}).encode()
+    kept = df[df["conf"] >= CONF_THR]
+    return kept, kept.to_dict("records"), cached
+
+
+def compact_page(data: dict):
+    words = words_from_data(data)
+    cached = words.to_bytes()
+    kept = words.filter_conf(CONF_THR)
+    return kept, kept.to_dict("records"), cached
+
+
+def best(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def retained(build) -> int:
+    """Octets alloués et encore référencés après construction."""
+    tracemalloc.start()
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--words", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = [make_data(i, args.words) for i in range(args.pages)]
+    legacy_cached = [legacy_page(d)[2] for d in pages]
+    compact_cached = [compact_page(d)[2] for d in pages]
+
+    rows = [
+        ("DataFrame : OCR -> filtre -> records", best(lambda: [legacy_page(d) for d in pages], args.repeat)),
+        ("WordBoxes : OCR -> filtre -> records", best(lambda: [compact_page(d) for d in pages], args.repeat)),
+        ("DataFrame : lecture du cache", best(lambda: [
+            pd.DataFrame(json.loads(c)["data"]) for c in legacy_cached], args.repeat)),
+        ("WordBoxes : lecture du cache", best(lambda: [
+            WordBoxes.from_bytes(c) for c in compact_cached], args.repeat)),
+    ]
+
+    print(f"{args.pages} page(s) de {args.words} lignes Tesseract, meilleur de {args.repeat}")
+    for label, seconds in rows:
+        print(f"  {label:<42} {seconds * 1000 / args.pages:8.3f} ms/page")
+
+    mem_legacy = retained(lambda: [legacy_words(d) for d in pages])
+    mem_compact = retained(lambda: [words_from_data(d) for d in pages])
+    print("Mémoire retenue (document entier) :")
+    print(f"  {'DataFrame':<42} {mem_legacy / 1024:8.0f} Kio")
+    print(f"  {'WordBoxes':<42} {mem_compact / 1024:8.0f} Kio")
+    print("Entrée de cache (moyenne par page) :")
+    print(f"  {'DataFrame (JSON)':<42} {sum(map(len, legacy_cached)) / args.pages:8.0f} o")
+    print(f"  {'WordBoxes (binaire)':<42} {sum(map(len, compact_cached)) / args.pages:8.0f} o")
+
+
+if __name__ == "__main__":
+    main()
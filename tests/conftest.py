@@ -0,0 +1,31 @@
+import fitz
+import pytest
+from PIL import Image, ImageDraw
+
+
+def build_pdf(pages=1, label="Page"):
+    """PDF natif de `pages` pages 200 x 100 pt, une ligne « <label> <n> » chacune."""
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page(width=200, height=100).insert_text((20, 50), f"{label} {i + 1}")
+    return doc.tobytes()
+
+
+def build_text_page(char_height=20, size=(800, 600), line_spacing=2, ink="black", paper="white"):
+    """Page synthétique : lignes de « caractères » pleins de hauteur connue."""
+    img = Image.new("RGB", size, paper)
+    draw = ImageDraw.Draw(img)
+    for y in range(20, size[1] - 20, char_height * line_spacing):
+        for x in range(10, size[0] - 20, char_height):
+            draw.rectangle([x, y, x + char_height // 2, y + char_height - 1], fill=ink)
+    return img
+
+
+@pytest.fixture
+def make_pdf():
+    return build_pdf
+
+
+@pytest.fixture
+def make_page():
+    return build_text_page
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+from PIL import Image
+
+from src.backends import BackendRouter, BackendStats, OCRBackend, TextractBackend
+from src.textract_batch import AdaptiveRateLimiter, TextractBatchExecutor
+from src.wordboxes import WordBoxes
+
+
+class FakeBackend(OCRBackend):
+    """Moteur local : latence réglable, échecs injectés, appels annulés comptés."""
+
+    def __init__(self, name, latency, fail=False, cost=0.0):
+        self.name = name
+        self.latency = latency
+        self.fail = fail
+        self.cost_per_page = cost
+        self.expected_latency = latency
+        self.max_batch = 4
+        self.calls = 0
+        self.cancelled = 0
+
+    def recognize_words(self, image, lang='eng', psm=6, conf_thr=30):
+        return asyncio.run(self.recognize_async(image, lang, psm, conf_thr))
+
+    async def recognize_async(self, image, lang='eng', psm=6, conf_thr=30):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.name} indisponible")
+        return WordBoxes([0], [0], [10], [10], [self.name], [90.0])
+
+
+def page():
+    return Image.new("L", (40, 20), 255)
+
+
+def test_router_prefers_fast_and_healthy_backends():
+    slow, fast = FakeBackend("slow", 0.05), FakeBackend("fast", 0.01)
+    router = BackendRouter([slow, fast], hedge_percentile=0)
+    assert router.rank() == [fast, slow]
+    assert router.recognize_words(page()).text.tolist() == ["fast"]
+
+    fast.fail = True
+    for _ in range(10):
+        # Échec du moteur choisi : bascule sur le suivant
+        assert router.recognize_words(page()).text.tolist() == ["slow"]
+    assert router.stats["fast"].error_rate > 0.5
+    assert router.rank() == [slow, fast]
+
+    # Sans appel, le taux d'erreur s'estompe : le moteur redevient candidat
+    now = [0.0]
+    stats = BackendStats(0.01, half_life=60.0, clock=lambda: now[0])
+    stats.record(None, ok=False)
+    now[0] = 60.0
+    assert stats.error_rate == pytest.approx(0.05)
+
+    # Le coût départage deux moteurs aussi rapides
+    cheap, paid = FakeBackend("cheap", 0.01), FakeBackend("paid", 0.01, cost=1.5)
+    assert BackendRouter([paid, cheap], cost_weight=1.0).rank() == [cheap, paid]
+
+
+def test_hedged_request_cancels_the_loser():
+    primary, backup = FakeBackend("primary", 0.02), FakeBackend("backup", 0.05)
+    router = BackendRouter([primary, backup], hedge_percentile=95)
+    for _ in range(5):
+        router.recognize_words(page())
+    calls = backup.calls
+
+    # Le moteur habituel se bloque : relance sur le second après son p95
+    primary.latency = 5.0
+    words = router.recognize_words(page())
+    assert words.text.tolist() == ["backup"]
+    assert backup.calls == calls + 1 and primary.cancelled == 1
+    assert 0.02 <= router.stats["primary"].percentile(100) < 1.0
+
+    with pytest.raises(RuntimeError):
+        BackendRouter([FakeBackend("a", 0.0, fail=True), FakeBackend("b", 0.0, fail=True)]
+                      ).recognize_words(page())
+
+
+def test_batch_recognition_keeps_order():
+    backend = FakeBackend("fake", 0.01)
+    router = BackendRouter([backend], hedge_percentile=0)
+    images = [page() for _ in range(6)]
+    assert len(router.recognize_many(images)) == 6
+    assert backend.calls == 6
+
+    class Echo(OCRBackend):
+        name = "echo"
+        max_batch = 2
+
+        def recognize_words(self, image, lang='eng', psm=6, conf_thr=30):
+            return WordBoxes([0], [0], [1], [1], [str(image.width)], [99.0])
+
+    sized = [Image.new("L", (w, 10), 255) for w in (5, 6, 7)]
+    assert [w.text[0] for w in Echo().recognize_many(sized)] == ["5", "6", "7"]
+    out = asyncio.run(Echo().recognize_many_async(sized))
+    assert [w.text[0] for w in out] == ["5", "6", "7"]
+    assert Echo().recognize(sized[0])["words"][0]["text"] == "5"
+
+
+def test_textract_backend_returns_pixel_boxes():
+    class Client:
+        def analyze_document(self, Document, FeatureTypes):
+            return {"Blocks": [
+                {"Id": "l1", "BlockType": "LINE", "Text": "Total 42", "Confidence": 98.0,
+                 "Geometry": {"BoundingBox": {"Left": 0.1, "Top": 0.5, "Width": 0.5, "Height": 0.1}}},
+                {"Id": "l2", "BlockType": "LINE", "Text": "bruit", "Confidence": 12.0,
+                 "Geometry": {"BoundingBox": {"Left": 0.0, "Top": 0.0, "Width": 0.1, "Height": 0.1}}},
+            ]}
+
+    from src.textract_service import analyze_document
+    executor = TextractBatchExecutor(Client(), limiter=AdaptiveRateLimiter(1000), call=analyze_document)
+    backend = TextractBackend(batch_executor=executor)
+    words = asyncio.run(backend.recognize_async(Image.new("L", (200, 100), 255), conf_thr=30))
+    assert words.text.tolist() == ["Total 42"]
+    assert (words.x1[0], words.y1[0], words.x2[0], words.y2[0]) == (20, 50, 120, 60)
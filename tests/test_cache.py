@@ -0,0 +1,184 @@
+import pandas as pd
+import pytest
+from PIL import Image
+
+import src.ocr as ocr
+from src.cache import (
+    DiskTier,
+    MemoryTier,
+    SharedTier,
+    TieredCache,
+    make_key,
+    set_ocr_cache,
+)
+from src.observability import CACHE_EVENTS
+
+
+class FakeRedis:
+    """Stand-in local de redis.Redis (get / set avec expiration ignorée)."""
+
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, ex=None):
+        self.store[key] = value
+
+
+@pytest.fixture
+def fake_words():
+    return pd.DataFrame({
+        "x1": [0, 10], "y1": [0, 0], "x2": [8, 20], "y2": [5, 5],
+        "text": ["Facture", "123"], "conf": [95.0, 20.0],
+    })
+
+
+@pytest.fixture
+def memory_cache():
+    cache = TieredCache([MemoryTier(8)])
+    set_ocr_cache(cache)
+    yield cache
+    set_ocr_cache(None)
+
+
+def _events(tier, event):
+    return CACHE_EVENTS.labels(tier, event)._value.get()
+
+
+def test_make_key_depends_on_pixels_and_params():
+    white = Image.new("L", (20, 20), 255)
+    black = Image.new("L", (20, 20), 0)
+    assert make_key("ocr", white, lang="fra", psm=6) == make_key("ocr", white.copy(), psm=6, lang="fra")
+    assert make_key("ocr", white, lang="fra", psm=6) != make_key("ocr", black, lang="fra", psm=6)
+    assert make_key("ocr", white, lang="fra", psm=6) != make_key("ocr", white, lang="fra", psm=3)
+
+
+def test_memory_tier_lru_eviction():
+    tier = MemoryTier(max_items=2)
+    before = _events("memory", "eviction")
+    tier.set("a", b"1")
+    tier.set("b", b"2")
+    tier.get("a")
+    tier.set("c", b"3")
+    assert tier.get("b") is None
+    assert tier.get("a") == b"1"
+    assert _events("memory", "eviction") == before + 1
+
+
+def test_disk_tier_size_eviction(tmp_path):
+    import os
+    import time
+
+    tier = DiskTier(str(tmp_path), max_bytes=250)
+    tier.set("old", b"x" * 100)
+    os.utime(tier._path("old"), (time.time() - 60, time.time() - 60))
+    tier.set("mid", b"y" * 100)
+    tier.set("new", b"z" * 100)
+    assert tier.get("old") is None
+    assert tier.get("new") == b"z" * 100
+    # Un nouveau processus retrouve les entrées existantes
+    assert DiskTier(str(tmp_path), max_bytes=250).get("mid") == b"y" * 100
+
+
+def test_disk_tier_evicts_below_the_limit(tmp_path):
+    tier = DiskTier(str(tmp_path), max_bytes=1000)
+    scans = []
+    scan = tier._scan
+    tier._scan = lambda: scans.append(1) or scan()
+    for i in range(30):
+        tier.set(f"k{i}", b"x" * 100)
+    # Une éviction libère 10 % de marge : une seule passe pour deux écritures au moins
+    assert len(scans) <= 10
+    assert tier._total <= 1000
+
+
+def test_shared_tier_backfills_upper_tiers():
+    redis = FakeRedis()
+    replica_a = TieredCache([MemoryTier(4), SharedTier(redis)])
+    replica_b = TieredCache([MemoryTier(4), SharedTier(redis)])
+    replica_a.set("k", b"payload")
+    assert replica_b.tiers[0].get("k") is None
+    assert replica_b.get("k") == b"payload"
+    assert replica_b.tiers[0].get("k") == b"payload"
+
+
+def test_shared_tier_backs_off_after_error():
+    class DownRedis:
+        calls = 0
+
+        def get(self, key):
+            DownRedis.calls += 1
+            raise ConnectionError("redis injoignable")
+
+        def set(self, key, value, ex=None):
+            self.get(key)
+
+    now = [0.0]
+    cache = TieredCache([MemoryTier(4), SharedTier(DownRedis(), backoff=30, clock=lambda: now[0])])
+    assert cache.get("k") is None
+    cache.set("k", b"v")
+    # Niveau coupé après la première erreur : un seul appel réseau
+    assert DownRedis.calls == 1 and cache.get("k") == b"v"
+    now[0] = 31.0
+    cache.tiers[1].set("k", b"v")
+    assert DownRedis.calls == 2
+
+    # Entrée JSON corrompue : absence, comme pour les mots
+    memory = TieredCache([MemoryTier(4)])
+    memory.set("j", b"\xff{pas du json")
+    assert memory.get_json("j") is None
+
+
+def test_ocr_tess_reuses_cached_words(monkeypatch, memory_cache, fake_words):
+    calls = []
+
+    def fake_run(img, lang, psm):
+        calls.append((lang, psm))
+        return fake_words
+
+    monkeypatch.setattr(ocr, "_run_tesseract", fake_run)
+    img = Image.new("L", (40, 10), 255)
+    first = ocr.ocr_tess(img, "fra", 6, 0)
+    second = ocr.ocr_tess(img, "fra", 6, 50)
+    assert len(calls) == 1
+    assert len(first) == 2
+    assert second["text"].tolist() == ["Facture"]
+    assert list(second.columns) == ["x1", "y1", "x2", "y2", "text", "conf"]
+
+
+def test_ocr_tess_errors_are_not_cached(monkeypatch, memory_cache, fake_words):
+    def failing(img, lang, psm):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(ocr, "_run_tesseract", failing)
+    img = Image.new("L", (40, 10), 255)
+    assert ocr.ocr_tess(img, "fra", 6, 0).empty
+    monkeypatch.setattr(ocr, "_run_tesseract", lambda img, lang, psm: fake_words)
+    assert len(ocr.ocr_tess(img, "fra", 6, 0)) == 2
+
+
+_zoom_calls = []
+
+
+def _counting_ocr(img, lang, psm, conf_thr):
+    _zoom_calls.append(img.size)
+    return pd.DataFrame({
+        "x1": [0], "y1": [0], "x2": [5], "y2": [5], "text": ["x"], "conf": [90.0],
+    })
+
+
+def _identity(img):
+    return img
+
+
+def test_find_best_zoom_hits_cache(memory_cache):
+    img = Image.new("RGB", (30, 30), "white")
+    first = ocr.find_best_zoom(img, "fra", 6, 30, _identity, _counting_ocr, [1.0, 2.0])
+    n_calls = len(_zoom_calls)
+    second = ocr.find_best_zoom(img, "fra", 6, 30, _identity, _counting_ocr, [1.0, 2.0])
+    assert len(_zoom_calls) == n_calls
+    assert second[0] == first[0]
+    assert second[4].size == first[4].size
+    assert len(second[5]) == len(first[5])
@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+from PIL import Image
+
+from src import documents
+from src.cache import set_ocr_cache
+from src.documents import DocumentCache, PageRenderer, document_key
+from src.observability import CACHE_EVENTS
+from src.ocr import find_best_zoom
+from src.wordboxes import WordBoxes
+
+
+@pytest.fixture
+def opens(monkeypatch):
+    """Compte les ouvertures de documents."""
+    calls = []
+    real = documents._open_pdf
+
+    def counting(source):
+        calls.append(source)
+        return real(source)
+
+    monkeypatch.setattr(documents, "_open_pdf", counting)
+    return calls
+
+
+def test_handles_are_reused(opens, make_pdf):
+    raw = make_pdf(pages=3)
+    cache = DocumentCache(max_handles=2)
+    hits = CACHE_EVENTS.labels("documents", "hit")._value.get()
+    assert cache.page_count(raw) == 3
+    for index in range(3):
+        cache.render(raw, index, dpi=72)
+    assert len(opens) == 1
+    assert CACHE_EVENTS.labels("documents", "hit")._value.get() == hits + 3
+    assert document_key(raw) == document_key(bytes(raw))
+
+
+def test_lru_eviction_closes_documents(opens, make_pdf):
+    cache = DocumentCache(max_handles=2)
+    a, b, c = make_pdf(label="A"), make_pdf(label="B"), make_pdf(label="C")
+    with cache.document(a) as doc_a:
+        pass
+    cache.page_count(b)
+    cache.page_count(a)
+    cache.page_count(c)  # évince b, le moins récent
+    assert len(cache) == 2 and not doc_a.is_closed
+    cache.page_count(b)
+    assert len(opens) == 4
+    cache.close()
+    assert len(cache) == 0 and doc_a.is_closed
+
+
+def test_render_at_requested_dpi(make_pdf):
+    raw = make_pdf()
+    cache = DocumentCache()
+    assert cache.render(raw, 0, dpi=72).size == (200, 100)
+    assert cache.render(raw, 0, dpi=144).size == (400, 200)
+
+    renderer = PageRenderer(raw, 0, dpi=144, cache=cache)
+    assert renderer().size == (400, 200)
+    assert renderer(1.5).size == (600, 300)
+    # Zone en pixels de l'image de base (144 dpi), rendue au zoom demandé
+    assert renderer(2.0, clip=(0, 50, 400, 150)).size == (800, 200)
+
+
+def test_zoom_search_renders_instead_of_resizing():
+    set_ocr_cache(None)
+    calls = []
+
+    def render_fn(zoom, clip=None):
+        calls.append(zoom)
+        return Image.new("RGB", (int(100 * zoom), int(50 * zoom)), "white")
+
+    def ocr_fn(img, lang, psm, conf_thr):
+        w, _ = img.size
+        return WordBoxes.coerce(pd.DataFrame({
+            "x1": [0], "y1": [0], "x2": [w], "y2": [10], "text": [str(w)], "conf": [90.0],
+        }))
+
+    base = Image.new("RGB", (100, 50), "white")
+    zoom, cnt, _, words, proc, _ = find_best_zoom(
+        base, "fra", 6, 30, lambda im: im, ocr_fn,
+        zoom_steps=[1.0, 2.0], strategy="sweep", render_fn=render_fn,
+    )
+    # Zoom 1 : image de base ; autres zooms (affinage compris) rendus
+    assert 2.0 in calls and 1.0 not in calls
+    assert cnt == 1 and proc.size == (int(100 * zoom), int(50 * zoom))
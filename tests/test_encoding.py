@@ -0,0 +1,48 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.encoding import classify, encode_for_textract
+
+
+def make_photo(size=(600, 400), seed=0):
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+
+
+def test_classify(make_page):
+    assert classify(make_page()) == "bilevel"
+    assert classify(make_page(paper=(150, 150, 150))) == "gray"
+    assert classify(make_page(ink=(200, 0, 0))) == "color"
+
+
+def test_bilevel_page_uses_1bit_png(make_page):
+    page = make_page()
+    encoded = encode_for_textract(page)
+    assert encoded.format == "png-1bit"
+    assert Image.open(io.BytesIO(encoded.data)).mode == "1"
+    rgb = io.BytesIO()
+    page.save(rgb, format="PNG")
+    assert len(encoded.data) < len(rgb.getvalue())
+
+
+def test_oversized_text_is_downscaled(make_page):
+    encoded = encode_for_textract(make_page(char_height=60, size=(1600, 1200)), text_height=24)
+    assert encoded.scale == pytest.approx(24 / 60)
+    assert encoded.size == (640, 480)
+
+
+def test_max_side_is_respected(make_page):
+    encoded = encode_for_textract(make_page(char_height=20, size=(3000, 600)), max_side=1500)
+    assert max(encoded.size) <= 1500
+
+
+def test_falls_back_to_jpeg_ladder_then_raises():
+    photo = make_photo()
+    encoded = encode_for_textract(photo, max_bytes=300_000)
+    assert encoded.format == "jpeg"
+    assert len(encoded.data) <= 300_000
+    with pytest.raises(ValueError):
+        encode_for_textract(photo, max_bytes=100)
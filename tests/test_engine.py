@@ -0,0 +1,118 @@
+import threading
+from types import SimpleNamespace
+
+from PIL import Image
+
+from src import engine
+from src.backends import TesseractBackend
+from src.cache import set_ocr_cache
+
+
+class FakeWord:
+    def __init__(self, text, box, conf, starts=()):
+        self.text, self.box, self.conf = text, box, conf
+        self.starts = starts
+
+    def IsAtBeginningOf(self, level):
+        return level in self.starts
+
+    def GetUTF8Text(self, level):
+        return self.text
+
+    def BoundingBox(self, level):
+        return self.box
+
+    def Confidence(self, level):
+        return self.conf
+
+
+class FakeAPI:
+    created = []
+
+    def __init__(self, lang, psm, oem, path=None):
+        self.lang, self.psm = lang, psm
+        self.images = []
+        self.ended = False
+        FakeAPI.created.append(self)
+
+    def SetImage(self, img):
+        self.images.append(img.size)
+
+    def Recognize(self):
+        return True
+
+    def GetIterator(self):
+        return [
+            FakeWord("Total", (1, 2, 30, 12), 91.5, starts=(0, 2)),
+            FakeWord("42", (35, 2, 50, 12), 12.0),
+            FakeWord("EUR", (1, 20, 30, 30), 88.0, starts=(2,)),
+        ]
+
+    def Clear(self):
+        pass
+
+    def End(self):
+        self.ended = True
+
+
+fake_tesserocr = SimpleNamespace(
+    PyTessBaseAPI=FakeAPI,
+    RIL=SimpleNamespace(BLOCK=0, TEXTLINE=2, WORD=3),
+    OEM=SimpleNamespace(LSTM_ONLY=1),
+    iterate_level=lambda it, level: iter(it),
+)
+
+
+def test_native_pool_reuses_handle_per_thread():
+    FakeAPI.created.clear()
+    pool = engine.NativeEnginePool(fake_tesserocr)
+    img = Image.new("L", (60, 20), 255)
+    df = pool.recognize(img, "fra+eng", 6)
+    pool.recognize(img, "fra+eng", 6)
+    assert len(FakeAPI.created) == 1
+    assert FakeAPI.created[0].images == [(60, 20), (60, 20)]
+    assert list(df.columns) == ["x1", "y1", "x2", "y2", "text", "conf"]
+    assert df["text"].tolist() == ["Total", "42", "EUR"]
+    assert df["line"].tolist() == [0, 0, 1]
+    assert df["block"].tolist() == [0, 0, 0]
+
+    # Un autre thread obtient sa propre poignée
+    t = threading.Thread(target=pool.recognize, args=(img, "fra+eng", 6))
+    t.start()
+    t.join()
+    assert len(FakeAPI.created) == 2
+
+    pool.close()
+    assert all(api.ended for api in FakeAPI.created)
+
+
+def test_build_engine_falls_back_without_binding(monkeypatch):
+    import sys
+
+    monkeypatch.setitem(sys.modules, "tesserocr", None)
+    assert isinstance(engine.build_engine("auto"), engine.SubprocessEngine)
+    assert isinstance(engine.build_engine("native"), engine.SubprocessEngine)
+
+
+def test_tesseract_backend_uses_engine():
+    set_ocr_cache(None)
+    engine.set_engine(engine.NativeEnginePool(fake_tesserocr))
+    try:
+        out = TesseractBackend().recognize(Image.new("L", (60, 20), 255), lang="fra", psm=6, conf_thr=50)
+    finally:
+        engine.set_engine(None)
+    assert [w["text"] for w in out["words"]] == ["Total", "EUR"]
+
+
+def test_subprocess_engine_reads_dict_output(monkeypatch):
+    data = {
+        "left": [0, 1, 35, 1], "top": [0, 2, 2, 20], "width": [60, 29, 15, 29], "height": [40, 10, 10, 10],
+        "text": ["", "Total", "42", "EUR"], "conf": [-1, 91.5, 12, 88],
+        "block_num": [0, 1, 1, 1], "par_num": [0, 1, 1, 2], "line_num": [0, 1, 1, 1],
+    }
+    monkeypatch.setattr(engine.pytesseract, "image_to_data", lambda *a, **k: data)
+    words = engine.SubprocessEngine().recognize(Image.new("L", (60, 40), 255), "fra", 6)
+
+    assert words["text"].tolist() == ["Total", "42", "EUR"]
+    assert words["x2"].tolist() == [30, 50, 30]
+    assert words["line"].tolist() == [0, 0, 1]
@@ -0,0 +1,89 @@
+import pytest
+
+from src.entities import EntityExtractor, load_dictionary_csv, summarize
+from src.wordboxes import WordBoxes
+
+IBAN = "FR76 3000 6000 0112 3456 7890 189"
+
+
+def page_words(lines, page=2, weak=()):
+    """Mots placés ligne par ligne (12 px par caractère, 40 px par ligne) ; `weak` : conf 55."""
+    cols = {k: [] for k in ("x1", "y1", "x2", "y2", "text", "conf", "line")}
+    for li, line in enumerate(lines):
+        x = 10
+        for word in line.split(" "):
+            for key, value in (("x1", x), ("y1", 40 * li), ("x2", x + 12 * len(word)),
+                               ("y2", 40 * li + 30), ("text", word), ("conf", 90.0), ("line", li + 1)):
+                cols[key].append(value)
+            x += 12 * len(word) + 12
+    for i in weak:
+        cols["conf"][i] = 55.0
+    return WordBoxes(**cols).with_page(page)
+
+
+def test_entities_carry_page_boxes_and_confidence():
+    extractor = EntityExtractor()
+    extractor.add_dictionary("supplier", {"Société Exemple": "S001", "ACME": "S002"})
+    words = page_words([
+        "Facture FAC-2024-00042 du 12/05/2025",
+        "Société Exemple SAS - TVA FR40 303 265 045",
+        f"IBAN {IBAN}",
+        "Total 1 234,56 €",
+    ], weak=[1])
+    found = {e.label: e for e in extractor.extract(words)}
+    assert set(found) == {"invoice_number", "date", "supplier", "vat_id", "iban", "amount"}
+
+    invoice = found["invoice_number"]
+    assert (invoice.text, invoice.page, invoice.conf) == ("FAC-2024-00042", 2, 55.0)
+    assert (invoice.x1, invoice.y1, invoice.x2, invoice.y2) == (106, 0, 274, 30)
+    assert found["supplier"].ref == "S001" and found["supplier"].y1 == 40
+    assert found["vat_id"].value == "FR40303265045"
+    assert found["iban"].value == IBAN.replace(" ", "") and found["iban"].x2 == 466
+    # Montant sur une seule ligne, symbole compris
+    assert found["amount"].text == "1 234,56 €" and found["amount"].y1 == 120
+
+
+def test_patterns_validate_and_known_ids_are_referenced():
+    extractor = EntityExtractor()
+    extractor.add_dictionary("iban", {IBAN.replace(" ", ""): "S001"})
+    text = (f"Facture n° 2024/117 - INV-12345 - f1234-56789 - le 31/13/2024 - 31/02/2024 - {IBAN} - "
+            "FR76 3000 6000 0112 3456 7890 188 - FR41 303 265 045 - 1234.50 EUR")
+    entities = extractor.extract_text(text)
+    by_label = {}
+    for e in entities:
+        by_label.setdefault(e.label, []).append(e)
+    assert [e.text for e in by_label["invoice_number"]] == ["2024/117", "INV-12345", "f1234-56789"]
+    # Dates impossibles, IBAN et TVA à clé fausse écartés
+    assert "date" not in by_label and "vat_id" not in by_label
+    assert [(e.text, e.ref) for e in by_label["iban"]] == [(IBAN, "S001")]
+    assert [e.text for e in by_label["amount"]] == ["1234.50 EUR"]
+
+    summary = summarize(entities)
+    assert summary["invoice_number"] == "2024/117"
+    assert summary["dates"] == [] and summary["ibans"] == [IBAN]
+
+
+def test_lines_are_recovered_from_geometry_and_batches(tmp_path):
+    # Mots relus d'un résultat de page : pas d'identifiants de ligne
+    words = page_words(["Reste dû 12", "345,00 € HT"], page=0)
+    words = WordBoxes.from_records(words.to_dict("records")).with_page(0)
+    extractor = EntityExtractor()
+    assert [e.text for e in extractor.extract(words)] == ["345,00 €"]
+
+    path = tmp_path / "ref.csv"
+    path.write_text("# label,term,ref\nsupplier,Green Hub,G1\nsupplier,ACME,\n", encoding="utf-8")
+    assert load_dictionary_csv(extractor, str(path)) == 2
+    docs = [[page_words(["Green Hub France"], page=0), page_words(["acme"], page=1)],
+            [WordBoxes.blank()]]
+    out = extractor.extract_many(docs)
+    assert [(e.value, e.ref, e.page) for e in out[0]] == [("Green Hub", "G1", 0), ("ACME", None, 1)]
+    assert out[1] == []
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("montant 1 234,56 €", ["1 234,56 €"]),
+    ("TTC 1.234,56 EUR, remise 12,50€", ["1.234,56 EUR", "12,50€"]),
+    ("réf 2024.10 sans devise", []),
+])
+def test_amounts(text, expected):
+    assert [e.text for e in EntityExtractor().extract_text(text) if e.label == "amount"] == expected
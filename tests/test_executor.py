@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+
+import pytest
+
+from src.executor import OCRExecutor, in_worker
+
+
+@pytest.fixture
+def executor():
+    ex = OCRExecutor(cpu_budget=2, mode="thread")
+    yield ex
+    ex.shutdown()
+
+
+def test_budget_bounds_concurrency(executor):
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def task(_):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return True
+
+    assert all(f.result() for f in executor.map(task, range(8)))
+    assert peak[0] == 2
+
+
+def test_threads_per_task_divides_budget():
+    ex = OCRExecutor(cpu_budget=4, threads_per_task=2)
+    try:
+        assert ex.workers == 2
+        assert os.environ.get("OMP_THREAD_LIMIT")
+    finally:
+        ex.shutdown()
+
+
+def test_nested_submit_runs_inline(executor):
+    def inner():
+        return in_worker()
+
+    def outer():
+        # Toutes les places du pool peuvent être prises : pas d'interblocage
+        return [executor.submit(inner).result() for _ in range(4)]
+
+    results = [f.result(timeout=5) for f in executor.map(lambda _: outer(), range(4))]
+    assert all(all(r) for r in results)
+
+
+def test_unpicklable_arguments_run_inline():
+    ex = OCRExecutor(cpu_budget=1, mode="process")
+    try:
+        # Lambda dans les arguments : exécution en ligne plutôt qu'un échec au .result()
+        assert ex.submit(len, [lambda: 0, b"page"]).result(timeout=5) == 2
+        assert not ex._picklable(len, ([lambda: 0],))
+        assert ex._picklable(len, ([b"x", 1.0],), {"n": "y"})
+    finally:
+        ex.shutdown()
+
+
+def test_iter_completed_bounds_pending(executor):
+    consumed = []
+
+    def items():
+        for i in range(10):
+            consumed.append(i)
+            yield i
+
+    seen = []
+    for item, future in executor.iter_completed(lambda i: i * i, items(), max_pending=3):
+        # Le générateur n'est jamais consommé plus de 3 éléments en avance
+        assert len(consumed) - len(seen) <= 3
+        seen.append(item)
+        assert future.result() == item * item
+    assert sorted(seen) == list(range(10))
+
+
+def test_queue_metrics(executor):
+    gate = threading.Event()
+    futures = [executor.submit(gate.wait) for _ in range(5)]
+    assert executor.utilisation == 1.0
+    assert executor.queue_depth == 3
+    gate.set()
+    for f in futures:
+        f.result()
+    assert executor.queue_depth == 0
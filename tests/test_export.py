@@ -0,0 +1,73 @@
+import io
+import json
+import os
+import time
+import zipfile
+
+import pandas as pd
+import pytest
+
+from src.export import ZipExport, export_path, open_export, purge_exports
+
+
+def test_entries_are_written_incrementally(tmp_path):
+    export = ZipExport(str(tmp_path), formats=("csv", "json"))
+    export.add("facture 1.pdf", [{"key": "Total", "value": "12 €", "conf": 91.5}])
+    # Rien n'est publié tant que l'export n'est pas fermé
+    assert export_path(export.export_id, str(tmp_path)) is None
+    export.add("facture 1.pdf", [])
+    path = export.close()
+
+    assert export_path(export.export_id, str(tmp_path)) == path
+    with zipfile.ZipFile(path) as zf:
+        assert sorted(zf.namelist()) == [
+            "facture_1.pdf.csv", "facture_1.pdf.json", "facture_1.pdf_2.csv", "facture_1.pdf_2.json",
+        ]
+        df = pd.read_csv(io.BytesIO(zf.read("facture_1.pdf.csv")), encoding="utf-8-sig")
+        assert df.to_dict("records") == [{"key": "Total", "value": "12 €", "conf": 91.5}]
+        assert json.loads(zf.read("facture_1.pdf_2.json")) == []
+
+
+def test_csv_matches_pandas_output(tmp_path):
+    records = [{"key": "Date", "value": "01/02/2024", "conf": 80.0},
+               {"key": "N°", "value": "A, B", "conf": 70.2}]
+    with ZipExport(str(tmp_path)) as export:
+        export.add("doc.png", records)
+    with zipfile.ZipFile(export.path) as zf:
+        data = zf.read("doc.png.csv")
+    assert data == pd.DataFrame(records).to_csv(index=False).encode("utf-8-sig")
+
+
+def test_failed_export_is_discarded(tmp_path):
+    with pytest.raises(RuntimeError):
+        with ZipExport(str(tmp_path)) as export:
+            export.add("a.png", [])
+            raise RuntimeError("boom")
+    assert os.listdir(tmp_path) == []
+
+
+def test_export_path_rejects_unsafe_ids(tmp_path):
+    assert export_path("../etc/passwd", str(tmp_path)) is None
+    assert export_path("0" * 32, str(tmp_path)) is None
+
+
+def test_purge_removes_expired_exports(tmp_path):
+    old = open_export(directory=str(tmp_path))
+    old.add("a.png", [])
+    old_path = old.close()
+    past = time.time() - 7200
+    os.utime(old_path, (past, past))
+
+    fresh = open_export(directory=str(tmp_path))
+    fresh_path = fresh.close()
+    assert not os.path.exists(old_path)
+    assert os.path.exists(fresh_path)
+
+    # Purge directe : exports terminés et abandonnés (.part) au-delà de max_age
+    abandoned = ZipExport(str(tmp_path))
+    abandoned.add("b.png", [])
+    os.utime(abandoned._tmp, (past, past))
+    assert purge_exports(max_age=3600, directory=str(tmp_path)) == 1
+    assert purge_exports(max_age=0, directory=str(tmp_path)) == 1
+    assert os.listdir(tmp_path) == []
+    assert purge_exports(directory=str(tmp_path / "absent")) == 0
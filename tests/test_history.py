@@ -0,0 +1,119 @@
+import threading
+
+import pytest
+
+from src import history
+from src.history import MemoryHistoryStore, SQLiteHistoryStore
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        s = SQLiteHistoryStore(str(tmp_path / "history.db"))
+    else:
+        s = MemoryHistoryStore()
+    yield s
+    s.close()
+
+
+def test_update_keeps_result(store):
+    store.record("facture.pdf", "t1")
+    assert store.get("t1")["status"] == "pending"
+    assert store.update("t1", {"entities": {"montant": ["12 €"]}})
+    entry = store.get("t1")
+    assert entry["status"] == "done"
+    assert entry["result"] == {"entities": {"montant": ["12 €"]}}
+    assert not store.update("inconnu", {})
+
+
+def test_cursor_pagination_and_filters(store):
+    for i in range(7):
+        store.record(f"doc{i}.png" if i % 2 else f"scan{i}.pdf", f"t{i}")
+    store.update("t3", [], status="error")
+
+    seen, cursor = [], None
+    while True:
+        page = store.query(cursor=cursor, limit=3)
+        assert "result" not in page.entries[0]
+        seen += [e["task_id"] for e in page.entries]
+        if page.next_cursor is None:
+            break
+        cursor = page.next_cursor
+    assert seen == [f"t{i}" for i in range(6, -1, -1)]
+
+    assert [e["task_id"] for e in store.query(filename="doc").entries] == ["t5", "t3", "t1"]
+    assert [e["task_id"] for e in store.query(status="error").entries] == ["t3"]
+    assert store.query(status="done").entries == []
+    assert len(list(store.iter_entries(page_size=2, filename="scan"))) == 4
+
+
+def test_record_twice_keeps_result(store):
+    store.record("a.png", "t1")
+    store.update("t1", {"x": 1})
+    # Rerun de l'interface : l'entrée existante n'est pas réinitialisée
+    store.record("a.png", "t1")
+    assert store.get("t1")["status"] == "done"
+    assert store.get("t1")["result"] == {"x": 1}
+    assert len(store.query().entries) == 1
+
+
+def test_filename_prefix_beyond_bmp(store):
+    store.record("scan\U0001F4C4.pdf", "t1")
+    store.record("scan.pdf", "t2")
+    store.record("scbn.pdf", "t3")
+    assert [e["task_id"] for e in store.query(filename="scan").entries] == ["t2", "t1"]
+    assert [e["task_id"] for e in store.query(filename="scan\U0001F4C4").entries] == ["t1"]
+
+
+def test_sqlite_filters_use_indexes(tmp_path):
+    store = SQLiteHistoryStore(str(tmp_path / "history.db"))
+    store.record("scan.pdf", "t1")
+    store.record("scan\U0010FFFFx.pdf", "t2")
+    store.record("scao.pdf", "t3")
+    assert [e["task_id"] for e in store.query(filename="scan").entries] == ["t2", "t1"]
+    assert [e["task_id"] for e in store.query(filename="\U0010FFFF").entries] == []
+
+    conn = store._connect()
+    for filters in ({"filename": "zz"}, {"since": 0.0}, {"until": 1e12}, {"since": 0.0, "until": 1e12}):
+        args = {"status": None, "filename": None, "since": None, "until": None, **filters}
+        sql, params = store._select(after=None, limit=50, include_result=False, **args)
+        plan = " ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        assert "SCAN history" not in plan, (filters, plan)
+    store.close()
+
+
+def test_invalid_cursor(store):
+    with pytest.raises(ValueError):
+        store.query(cursor="abc")
+
+
+def test_sqlite_is_durable_and_thread_safe(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = SQLiteHistoryStore(path)
+
+    def _worker(n):
+        for i in range(20):
+            store.record("f.png", f"{n}-{i}")
+            store.update(f"{n}-{i}", {"i": i})
+
+    threads = [threading.Thread(target=_worker, args=(n,)) for n in range(4)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    store.close()
+
+    reopened = SQLiteHistoryStore(path)
+    assert len(list(reopened.iter_entries(status="done"))) == 80
+    assert reopened.get("2-7")["result"] == {"i": 7}
+
+
+def test_module_api_uses_configured_store():
+    history.set_history_store(MemoryHistoryStore())
+    try:
+        history.record_entry("a.png", "t1")
+        history.update_entry("t1", {"ok": True})
+        assert history.get_history() == [history.get_entry("t1")]
+        assert history.query_history(status="done").entries[0]["task_id"] == "t1"
+    finally:
+        history.set_history_store(None)
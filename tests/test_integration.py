@@ -9,6 +9,7 @@ from src.preprocessing import preprocess
 from src.ocr import ocr_tess, find_best_zoom
 from src.textract_service import textract_parse
 from src.utils import extract_entities_ocr
+from src.wordboxes import WordBoxes
 
 FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
 PDF_FILE = os.path.join(FIXTURES_DIR, 'Facture.pdf')
@@ -47,8 +48,8 @@ def test_ocr_e2e(pdf_image):
     # Preprocess and run OCR
     proc = preprocess(pdf_image)
     df = ocr_tess(proc, lang='fra+eng', psm=6, conf_thr=30)
-    assert isinstance(df, pd.DataFrame)
-    assert not df.empty, "Expected OCR DataFrame to have at least one row"
+    assert isinstance(df, WordBoxes)
+    assert not df.empty, "Expected OCR words to have at least one row"
 
 
 def test_extract_entities(pdf_image):
@@ -70,7 +71,7 @@ def test_find_best_zoom(pdf_image):
     assert isinstance(z, float)
     assert isinstance(cnt, int)
     assert isinstance(mc, float)
-    assert isinstance(df_best, pd.DataFrame)
+    assert isinstance(df_best, WordBoxes)
     assert isinstance(summary, pd.DataFrame)
     assert not summary.empty, "Expected summary DataFrame to have rows"
 
@@ -80,7 +81,7 @@ def test_csv_generation(pdf_image, tmp_path):
     proc = preprocess(pdf_image)
     df = ocr_tess(proc, lang='fra+eng', psm=6, conf_thr=30)
     csv_path = tmp_path / "ocr_output.csv"
-    df.to_csv(csv_path, index=False)
+    df.to_frame().to_csv(csv_path, index=False)
     assert csv_path.exists()
     # Read back and verify columns
     df2 = pd.read_csv(csv_path)
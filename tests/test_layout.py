@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+from PIL import Image, ImageDraw
+
+from src import engine
+from src.cache import set_ocr_cache
+from src.layout import find_text_regions, ocr_layout, plan_regions
+from src.observability import OCR_BLANK_PAGES, OCR_PIXELS
+
+
+class CropEngine:
+    """Un mot par zone, en haut à gauche du découpage reçu."""
+
+    name = "fake"
+
+    def __init__(self):
+        self.sizes = []
+
+    def recognize(self, img, lang, psm):
+        self.sizes.append(img.size)
+        return pd.DataFrame({
+            "x1": [1], "y1": [2], "x2": [11], "y2": [12], "text": ["mot"], "conf": [90.0],
+        })
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def crop_engine():
+    set_ocr_cache(None)
+    eng = CropEngine()
+    engine.set_engine(eng)
+    yield eng
+    engine.set_engine(None)
+
+
+def two_blocks_page():
+    img = Image.new("L", (800, 1000), 255)
+    draw = ImageDraw.Draw(img)
+    draw.text((60, 60), "Facture F2024-00042", fill=0)
+    draw.text((60, 75), "Client : Green Hub", fill=0)
+    draw.text((500, 800), "Total TTC 1234,56 EUR", fill=0)
+    return img
+
+
+def test_blank_page_is_not_ocred(crop_engine):
+    img = Image.new("L", (600, 800), 255)
+    # Poussière de numérisation
+    arr = np.asarray(img).copy()
+    arr[100, 100] = arr[400, 300] = 0
+    img = Image.fromarray(arr)
+
+    blank_before = OCR_BLANK_PAGES._value.get()
+    skipped_before = OCR_PIXELS.labels("skipped")._value.get()
+    assert find_text_regions(arr) == []
+    assert ocr_layout(img, "fra", 6, 30).empty
+    assert crop_engine.sizes == []
+    assert OCR_BLANK_PAGES._value.get() == blank_before + 1
+    assert OCR_PIXELS.labels("skipped")._value.get() == skipped_before + 600 * 800
+
+
+def test_short_content_is_not_blank(crop_engine):
+    img = Image.new("L", (600, 800), 255)
+    ImageDraw.Draw(img).text((300, 400), "OK", fill=0)
+    [region] = find_text_regions(np.asarray(img))
+    assert region[0] < 300 < region[2] and region[1] < 402 < region[3]
+    assert ocr_layout(img, "fra", 6, 30)["text"].tolist() == ["mot"]
+    assert len(crop_engine.sizes) == 1
+
+
+def test_text_blocks_are_ocred_as_crops(crop_engine):
+    img = two_blocks_page()
+    regions = find_text_regions(np.asarray(img))
+    assert len(regions) == 2
+    top, bottom = regions
+    assert top[1] < 60 < top[3] and bottom[1] < 800 < bottom[3]
+
+    ocr_before = OCR_PIXELS.labels("ocr")._value.get()
+    words = ocr_layout(img, "fra", 6, 30)
+    assert sorted(crop_engine.sizes) == sorted((b[2] - b[0], b[3] - b[1]) for b in regions)
+    # Boîtes ramenées dans le repère de la page, blocs distincts
+    assert words["x1"].tolist() == [top[0] + 1, bottom[0] + 1]
+    assert words["y1"].tolist() == [top[1] + 2, bottom[1] + 2]
+    assert words["block"].tolist() == [0, 1]
+    ocred = OCR_PIXELS.labels("ocr")._value.get() - ocr_before
+    assert ocred == sum((b[2] - b[0]) * (b[3] - b[1]) for b in regions)
+    assert ocred < 0.2 * 800 * 1000
+
+
+def test_many_regions_fall_back_to_enclosing_box():
+    regions = [(i * 10, 5, i * 10 + 5, 15) for i in range(5)]
+    assert plan_regions(regions, (100, 100), max_regions=3) == [(0, 5, 45, 15)]
+    assert plan_regions(regions, (100, 100), max_regions=10) == regions
+    assert plan_regions([(0, 0, 90, 90)], (100, 100), max_coverage=0.5) == [(0, 0, 90, 90)]
@@ -0,0 +1,59 @@
+import spacy
+
+from src import nlp_postprocessing
+from src.nlp_postprocessing import EntityNormalizer, load_pipeline, normalize_amount, normalize_date
+
+
+class CountingNLP:
+    """Tokeniseur français vierge qui compte les appels à `pipe`."""
+
+    def __init__(self):
+        self.nlp = spacy.blank("fr")
+        self.batches = []
+
+    def pipe(self, texts, batch_size, n_process):
+        texts = list(texts)
+        self.batches.append(texts)
+        return self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+
+
+def test_rules_do_not_load_the_model():
+    nlp_postprocessing.set_nlp(None)
+    out = EntityNormalizer().normalize({
+        "invoice_number": "F2024-00001",
+        "dates": ["12/05/2025", "2025-02-30"],
+        "amounts": ["1 234,56 €", "1.234,5 EUR", "12.50€", "1.234 €"],
+        "ibans": ["fr76 3000 6000 0112 3456 7890 189"],
+    })
+    assert nlp_postprocessing._nlp is None
+    assert out["invoice_number"] == "F2024-00001"
+    assert out["normalized"] == {
+        "dates": ["2025-05-12", None],
+        "amounts": ["1234.56", "1234.50", "12.50", "1234.00"],
+        "ibans": ["FR7630006000011234567890189"],
+    }
+    assert normalize_date("31/12/2024") == "2024-12-31" and normalize_amount("abc €") is None
+
+
+def test_names_are_batched_and_cached():
+    nlp = CountingNLP()
+    normalizer = EntityNormalizer(nlp=nlp, batch_size=8)
+    batch = [
+        {"suppliers": ["Société Exemple S.A.S.", "ACME SARL"], "dates": ["01/02/2024"]},
+        {"suppliers": ["ACME SARL"], "dates": ["01/02/2024"]},
+    ]
+    out = normalizer.normalize_many(batch)
+    assert nlp.batches == [["Société Exemple S.A.S.", "ACME SARL"]]
+    assert out[0]["normalized"]["suppliers"] == ["SOCIETE EXEMPLE", "ACME"]
+    assert out[1]["normalized"] == {"suppliers": ["ACME"], "dates": ["2024-02-01"]}
+
+    # Valeurs déjà vues : aucun nouveau passage spaCy
+    normalizer.normalize({"suppliers": ["ACME SARL", "Société Exemple S.A.S."]})
+    assert len(nlp.batches) == 1
+    normalizer.normalize({"suppliers": ["Green Hub"]})
+    assert nlp.batches[-1] == ["Green Hub"]
+
+
+def test_missing_model_falls_back_to_tokenizer():
+    nlp = load_pipeline("modele_absent_xx", components=())
+    assert nlp.pipe_names == [] and [t.text for t in nlp("Green Hub SAS")] == ["Green", "Hub", "SAS"]
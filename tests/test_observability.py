@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from fastapi.testclient import TestClient
+
+from src.observability import CACHE_EVENTS, app, series
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+POOL_SCRIPT = textwrap.dedent("""
+    from prometheus_client import generate_latest
+
+    from src.executor import configure_executor
+    from src.observability import CACHE_EVENTS, metrics_registry, series
+
+
+    def hit(_):
+        series(CACHE_EVENTS, "memory", "hit").inc()
+
+
+    if __name__ == "__main__":
+        executor = configure_executor(cpu_budget=2, mode="process")
+        for future in executor.map(hit, range(6)):
+            future.result()
+        hit(None)
+        executor.shutdown()
+        print(generate_latest(metrics_registry()).decode())
+""")
+
+
+def test_process_pool_metrics_are_aggregated(tmp_path):
+    metrics_dir = tmp_path / "prom"
+    metrics_dir.mkdir()
+    script = tmp_path / "pool.py"
+    script.write_text(POOL_SCRIPT)
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(metrics_dir), PYTHONPATH=ROOT)
+    out = subprocess.run([sys.executable, str(script)], env=env, cwd=ROOT,
+                         capture_output=True, text=True, timeout=120, check=True).stdout
+
+    # Incréments des processus du pool et du processus principal réunis
+    line = next(row for row in out.splitlines()
+                if row.startswith('ocr_greenhub_cache_events_total{event="hit",tier="memory"}'))
+    assert float(line.split()[-1]) == 7.0
+    # Jauges : une seule série pour le pod (somme des processus vivants)
+    workers = [row for row in out.splitlines() if row.startswith("ocr_greenhub_executor_workers")]
+    assert workers == ["ocr_greenhub_executor_workers 2.0"]
+    assert len(list(metrics_dir.glob("counter_*.db"))) >= 2
+
+
+def test_single_metrics_endpoint():
+    series(CACHE_EVENTS, "memory", "miss").inc()
+    client = TestClient(app)
+    assert client.get("/healthz").json() == {"status": "ok"}
+    body = client.get("/metrics").text
+    assert 'ocr_greenhub_cache_events_total{event="miss",tier="memory"}' in body
+    assert series(CACHE_EVENTS, "memory", "miss") is CACHE_EVENTS.labels("memory", "miss")
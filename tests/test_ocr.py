@@ -1,8 +1,8 @@
 import pytest
 import numpy as np
 from PIL import Image
-import pandas as pd
 from src.ocr import ocr_tess
+from src.wordboxes import WordBoxes
 
 def make_test_image():
     # Create a simple 100x30 white image with black text using PIL
@@ -21,8 +21,8 @@ def test_ocr_tess_basic(conf_thr, expected_min_conf):
     img = make_test_image()
     # Run OCR
     df = ocr_tess(img, lang='eng', psm=6, conf_thr=conf_thr)
-    # Should return a DataFrame with expected columns
-    assert isinstance(df, pd.DataFrame)
+    # Should return word boxes with expected columns
+    assert isinstance(df, WordBoxes)
     for col in ['x1','y1','x2','y2','text','conf']:
         assert col in df.columns
     # All confidences should be >= threshold
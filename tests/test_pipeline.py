@@ -0,0 +1,121 @@
+import io
+import queue
+import threading
+import time
+
+import pandas as pd
+import pytest
+from PIL import Image
+
+from src import engine
+from src.cache import set_ocr_cache
+from src.extensions import convert_pdf_to_images, count_pages, iter_document_pages, render_page
+from src.pipeline import _render_worker, process_document
+
+
+def make_tiff(n_frames):
+    frames = [Image.new("RGB", (50, 30), (i * 40, 255, 255)) for i in range(n_frames)]
+    buf = io.BytesIO()
+    frames[0].save(buf, format="TIFF", save_all=True, append_images=frames[1:])
+    return buf.getvalue()
+
+
+class FakeEngine:
+    name = "fake"
+
+    def __init__(self):
+        self.calls = 0
+
+    def recognize(self, img, lang, psm):
+        self.calls += 1
+        return pd.DataFrame({
+            "x1": [0], "y1": [0], "x2": [5], "y2": [5], "text": ["mot"], "conf": [90.0],
+        })
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_engine():
+    set_ocr_cache(None)
+    eng = FakeEngine()
+    engine.set_engine(eng)
+    yield eng
+    engine.set_engine(None)
+
+
+def test_pdf_and_tiff_pages(make_pdf):
+    pdf = make_pdf(3)
+    assert count_pages(pdf, "doc.PDF") == 3
+    assert len(convert_pdf_to_images(pdf, dpi=72)) == 3
+    tiff = make_tiff(4)
+    assert count_pages(tiff, "scan.tiff") == 4
+    assert len(list(iter_document_pages(tiff, "scan.tiff"))) == 4
+
+
+def test_process_document_yields_every_page(fake_engine, make_pdf):
+    pdf = make_pdf(5)
+    results = list(process_document(pdf, "doc.pdf", "fra", 6, 30, lambda im: im,
+                                    auto_zoom=False, dpi=72, max_pending=2))
+    assert sorted(r.page for r in results) == list(range(5))
+    assert all(r.error is None and r.count == 1 for r in results)
+    assert fake_engine.calls == 5
+
+
+def test_process_document_can_stop_early(fake_engine, make_pdf):
+    pdf = make_pdf(20)
+    stream = process_document(pdf, "doc.pdf", "fra", 6, 30, lambda im: im,
+                              auto_zoom=False, dpi=72, max_pending=1)
+    first = next(stream)
+    stream.close()
+    assert first.count == 1
+    assert fake_engine.calls < 20
+
+
+@pytest.mark.parametrize("fail", [False, True])
+def test_render_worker_exits_when_consumer_leaves(fail):
+    closed = []
+
+    def pages():
+        try:
+            yield Image.new("RGB", (10, 10))
+            if fail:
+                raise RuntimeError("page illisible")
+        finally:
+            closed.append(True)
+
+    # File pleine dès la première page : le _DONE (ou l'erreur) final ne passe pas
+    out = queue.Queue(maxsize=1)
+    stop = threading.Event()
+    worker = threading.Thread(target=_render_worker, args=(pages(), out, stop), daemon=True)
+    worker.start()
+    while not out.full():
+        time.sleep(0.01)
+    time.sleep(0.2)
+    stop.set()
+    worker.join(timeout=2)
+    assert not worker.is_alive()
+    assert closed == [True]
+
+
+def test_page_errors_do_not_abort_document(fake_engine):
+    def flaky(img):
+        raise RuntimeError("prétraitement impossible")
+
+    results = list(process_document(make_tiff(2), "scan.tif", "fra", 6, 30, flaky,
+                                    auto_zoom=False))
+    assert len(results) == 2
+    assert all(r.error for r in results)
+
+
+def test_render_page_from_path(tmp_path, make_pdf):
+    pdf = tmp_path / "scan.pdf"
+    pdf.write_bytes(make_pdf(3))
+    assert count_pages(str(pdf), "scan.pdf") == 3
+    page = render_page(str(pdf), "scan.pdf", 2, dpi=72)
+    assert page.size == (200, 100)
+
+    tiff = tmp_path / "scan.tiff"
+    tiff.write_bytes(make_tiff(2))
+    assert render_page(str(tiff), "scan.tiff", 1).getpixel((0, 0)) == (40, 255, 255)
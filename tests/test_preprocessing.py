@@ -0,0 +1,148 @@
+import cv2
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+from src import preprocessing
+from src.preprocessing import (
+    PreprocessEngine,
+    PreprocessParams,
+    analyze_page,
+    preprocess,
+    preprocess_report,
+    set_preprocess_engine,
+)
+
+
+def noisy_page(seed=0, size=(240, 120)):
+    """Fond bruité propre à la graine : une graine = des pixels (et une clé de cache) distincts."""
+    rng = np.random.default_rng(seed)
+    arr = rng.integers(150, 255, size=(size[1], size[0], 3), dtype=np.uint8)
+    img = Image.fromarray(arr)
+    ImageDraw.Draw(img).text((10, 40), f"Facture {seed}", fill=(0, 0, 0))
+    return img
+
+
+def reference(img, params=PreprocessParams()):
+    """Chaîne d'origine, objets OpenCV recréés à chaque appel."""
+    gray = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2GRAY)
+    cl = cv2.createCLAHE(clipLimit=params.clip_limit, tileGridSize=params.tile_grid_size).apply(gray)
+    th = cv2.adaptiveThreshold(cl, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                               params.thresh_block_size, params.thresh_C)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, params.morph_kernel)
+    return np.asarray(cv2.morphologyEx(th, cv2.MORPH_CLOSE, kernel))
+
+
+@pytest.fixture
+def engine():
+    eng = PreprocessEngine(max_bytes=10 * 1024 * 1024)
+    set_preprocess_engine(eng)
+    yield eng
+    set_preprocess_engine(None)
+
+
+@pytest.fixture
+def count_runs(monkeypatch):
+    calls = []
+    real = preprocessing._run
+
+    def counting(img, params):
+        calls.append(img.size)
+        return real(img, params)
+
+    monkeypatch.setattr(preprocessing, "_run", counting)
+    return calls
+
+
+def test_matches_reference_pipeline(engine):
+    img = noisy_page()
+    assert np.array_equal(np.asarray(preprocess(img, mode="full")), reference(img))
+    params = PreprocessParams(clip_limit=3.0, thresh_block_size=31, morph_kernel=(2, 2), mode="full")
+    assert np.array_equal(np.asarray(engine.run(img, params)), reference(img, params))
+
+
+def test_cache_hits_on_same_pixels(engine, count_runs):
+    first = preprocess(noisy_page(1))
+    second = preprocess(noisy_page(1))
+    assert len(count_runs) == 1
+    assert np.array_equal(np.asarray(first), np.asarray(second))
+    # Paramètres ou mode différents : nouvelle entrée
+    preprocess(noisy_page(1), thresh_C=5)
+    preprocess(noisy_page(1), mode="full")
+    assert len(count_runs) == 3
+
+
+def test_cached_image_is_not_shared(engine):
+    out = preprocess(noisy_page(2))
+    out.paste(0, (0, 0, out.width, out.height))
+    again = preprocess(noisy_page(2))
+    assert np.asarray(again).max() == 255
+
+
+def test_cache_bounded_in_bytes(count_runs):
+    eng = PreprocessEngine(max_bytes=240 * 120 * 2)
+    for seed in range(3):
+        eng.run(noisy_page(seed))
+    assert len(eng) == 2
+    eng.run(noisy_page(0))
+    assert len(count_runs) == 4
+
+
+def test_invalid_input():
+    with pytest.raises(ValueError):
+        preprocess("pas une image")
+
+
+def text_page(fg=0, bg=255, size=(800, 600)):
+    img = Image.new("L", size, bg)
+    draw = ImageDraw.Draw(img)
+    for y in range(30, size[1] - 30, 28):
+        draw.text((30, y), "Facture F2024-00123 montant total 1234,56 EUR", fill=fg, font_size=18)
+    return img
+
+
+def degraded_pages():
+    rng = np.random.default_rng(0)
+    clean = text_page()
+    noisy = np.asarray(clean, dtype=np.float32) + rng.normal(0, 25, (600, 800))
+    yy, xx = np.mgrid[0:600, 0:800]
+    light = 0.45 + 0.55 * (xx / 800) * (0.6 + 0.4 * yy / 600)
+    photo = np.asarray(text_page(fg=30, bg=235), dtype=np.float32) * light
+    return {
+        "binary": clean.point(lambda v: 255 if v > 128 else 0),
+        "clean": clean.filter(ImageFilter.GaussianBlur(0.5)),
+        "low_contrast": text_page(fg=140, bg=190),
+        "noisy": Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8)),
+        "photo": Image.fromarray(np.clip(photo, 0, 255).astype(np.uint8)).filter(ImageFilter.GaussianBlur(0.8)),
+    }
+
+
+def test_analyzer_classifies_pages():
+    kinds = {name: analyze_page(np.asarray(img)).kind for name, img in degraded_pages().items()}
+    assert kinds == {name: name for name in kinds}
+
+
+def test_adaptive_runs_minimal_chain(engine):
+    pages = degraded_pages()
+    report = preprocess_report(preprocess(pages["clean"], mode="adaptive"))
+    assert report.kind == "clean"
+    assert report.chain == ("gray", "otsu")
+    assert set(report.timings) == {"gray", "analyze", "otsu"}
+
+    report = preprocess_report(preprocess(pages["photo"], mode="adaptive"))
+    assert report.chain == ("gray", "clahe", "adaptive", "close")
+
+    # Mode explicite : chaîne complète, sans analyse
+    report = preprocess_report(preprocess(pages["clean"], mode="full"))
+    assert (report.kind, report.chain) == ("full", ("gray", "clahe", "adaptive", "close"))
+
+
+def test_adaptive_output_is_binary(engine):
+    for img in degraded_pages().values():
+        out = np.asarray(preprocess(img, mode="adaptive"))
+        assert set(np.unique(out)) <= {0, 255}
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        PreprocessParams(mode="rapide")
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from src.progress import (
+    MemoryProgressChannel,
+    RedisProgressChannel,
+    SQLiteProgressChannel,
+    format_sse,
+    publish_progress,
+    read_progress,
+    read_progress_async,
+    set_progress_channel,
+)
+
+
+class StubRedis:
+    """Listes Redis en mémoire (rpush, lrange, expire)."""
+
+    def __init__(self):
+        self.lists = {}
+        self.ttls = {}
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+        return len(self.lists[key])
+
+    def lrange(self, key, start, end):
+        items = self.lists.get(key, [])
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    def expire(self, key, ttl):
+        self.ttls[key] = ttl
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def channel(request, tmp_path):
+    if request.param == "memory":
+        chan = MemoryProgressChannel()
+    elif request.param == "sqlite":
+        chan = SQLiteProgressChannel(str(tmp_path / "progress.db"))
+        chan.poll_interval = 0.01
+    else:
+        chan = RedisProgressChannel(StubRedis())
+        chan.poll_interval = 0.01
+    set_progress_channel(chan)
+    yield chan
+    set_progress_channel(None)
+    chan.close()
+
+
+def test_events_are_numbered_per_job(channel):
+    assert publish_progress("a", "queued", page_count=2) == 1
+    assert publish_progress("b", "queued", page_count=1) == 1
+    assert publish_progress("a", "page", page=0, text="x") == 2
+
+    events = read_progress("a")
+    assert [(e["seq"], e["type"]) for e in events] == [(1, "queued"), (2, "page")]
+    assert events[1]["text"] == "x"
+    assert read_progress("a", after=2) == []
+
+
+def test_read_blocks_until_next_event(channel):
+    publish_progress("job", "queued", page_count=1)
+    timer = threading.Timer(0.1, publish_progress, ("job", "done"))
+    timer.start()
+    t0 = time.monotonic()
+    events = read_progress("job", after=1, timeout=5)
+    timer.join()
+
+    assert [e["type"] for e in events] == ["done"]
+    assert time.monotonic() - t0 < 2
+
+
+def test_read_times_out_without_event(channel):
+    t0 = time.monotonic()
+    assert read_progress("silence", timeout=0.1) == []
+    assert time.monotonic() - t0 >= 0.1
+
+
+def test_async_readers_wait_without_threads(channel):
+    channel.poll_interval = 0.01
+
+    async def _readers():
+        # Plus de lecteurs que de threads disponibles : l'attente est un asyncio.sleep
+        waiting = [read_progress_async("job", timeout=5) for _ in range(100)]
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, lambda: threading.Thread(target=publish_progress, args=("job", "page")).start())
+        return await asyncio.gather(*waiting)
+
+    results = asyncio.run(_readers())
+    assert all([e["type"] for e in events] == ["page"] for events in results)
+    assert asyncio.run(read_progress_async("silence", timeout=0.05)) == []
+
+
+def test_sqlite_purges_expired_events(tmp_path):
+    chan = SQLiteProgressChannel(str(tmp_path / "progress.db"), ttl=60)
+    chan.publish("old", {"type": "queued", "ts": time.time() - 3600})
+    chan.publish("new", {"type": "done", "ts": time.time()})
+    assert chan.fetch("old") == []
+    assert [e["type"] for e in chan.fetch("new")] == ["done"]
+
+
+def test_publish_never_raises():
+    class Broken(MemoryProgressChannel):
+        def publish(self, job_id, event):
+            raise ConnectionError("canal indisponible")
+
+    set_progress_channel(Broken())
+    try:
+        assert publish_progress("job", "queued") is None
+    finally:
+        set_progress_channel(None)
+
+
+def test_format_sse():
+    text = format_sse({"seq": 3, "type": "page", "text": "Facture"})
+    lines = text.split("\n")
+    assert lines[:2] == ["id: 3", "event: page"]
+    assert json.loads(lines[2][len("data: "):])["text"] == "Facture"
+    assert text.endswith("\n\n")
+
+
+def test_sse_endpoint_streams_until_terminal_event():
+    from fastapi.testclient import TestClient
+    from src.api import app
+
+    set_progress_channel(MemoryProgressChannel())
+    try:
+        publish_progress("doc-sse", "queued", page_count=1)
+        publish_progress("doc-sse", "page", page=0, text="Facture")
+        publish_progress("doc-sse", "done", page_count=1)
+        client = TestClient(app)
+
+        resp = client.get("/results/doc-sse/events")
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        kinds = [line.split(": ", 1)[1] for line in resp.text.splitlines() if line.startswith("event:")]
+        assert kinds == ["queued", "page", "done"]
+
+        # Reprise après déconnexion : seuls les événements suivants
+        resp = client.get("/results/doc-sse/events", headers={"Last-Event-ID": "2"})
+        kinds = [line.split(": ", 1)[1] for line in resp.text.splitlines() if line.startswith("event:")]
+        assert kinds == ["done"]
+    finally:
+        set_progress_channel(None)
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import time
+
+import pytest
+
+from src.spool import LocalSpool, S3Spool
+
+
+class StubS3:
+    """Bucket S3 en mémoire (sous-ensemble d'API utilisé par S3Spool)."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = bytes(Body)
+
+    def upload_file(self, Filename, Bucket, Key):
+        with open(Filename, "rb") as fh:
+            self.objects[Key] = fh.read()
+
+    def download_file(self, Bucket, Key, Filename):
+        with open(Filename, "wb") as fh:
+            fh.write(self.objects[Key])
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+    def list_objects_v2(self, Bucket, Prefix, MaxKeys=1000):
+        keys = sorted(k for k in self.objects if k.startswith(Prefix))[:MaxKeys]
+        return {"KeyCount": len(keys), "Contents": [{"Key": k} for k in keys]}
+
+
+def sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_local_put_stream_is_content_addressed(tmp_path):
+    spool = LocalSpool(str(tmp_path))
+    digest = spool.put_stream([b"abc", b"def"], "doc-1")
+
+    assert digest == sha(b"abcdef")
+    with spool.open_blob(digest) as path:
+        assert path == str(tmp_path / digest[:2] / digest)
+        assert open(path, "rb").read() == b"abcdef"
+    assert os.listdir(tmp_path / "tmp") == []
+
+
+def test_local_blob_is_kept_until_last_release(tmp_path):
+    spool = LocalSpool(str(tmp_path))
+    digest = spool.put_bytes(b"scan", "doc-1")
+    assert spool.put_bytes(b"scan", "doc-2") == digest
+
+    assert spool.release(digest, "doc-1") is False
+    with spool.open_blob(digest) as path:
+        assert os.path.isfile(path)
+    assert spool.release(digest, "doc-2") is True
+    with pytest.raises(FileNotFoundError):
+        with spool.open_blob(digest):
+            pass
+    # Libération répétée (errback + nettoyage) sans effet
+    assert spool.release(digest, "doc-2") is False
+
+
+def test_local_writer_discarded_on_error(tmp_path):
+    spool = LocalSpool(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        with spool.writer() as w:
+            w.write(b"partiel")
+            raise RuntimeError("upload interrompu")
+    assert os.listdir(tmp_path / "tmp") == []
+
+
+def test_local_purge_removes_orphans(tmp_path):
+    spool = LocalSpool(str(tmp_path))
+    old = spool.put_bytes(b"ancien", "doc-1")
+    fresh = spool.put_bytes(b"recent", "doc-2")
+    past = time.time() - 7200
+    os.utime(spool.blob_path(old), (past, past))
+
+    assert spool.purge(max_age=3600) == 1
+    assert not os.path.exists(spool.blob_path(old))
+    assert not os.path.exists(tmp_path / "holds" / old)
+    assert os.path.exists(spool.blob_path(fresh))
+
+
+def test_invalid_digest_rejected(tmp_path):
+    spool = LocalSpool(str(tmp_path))
+    with pytest.raises(ValueError):
+        spool.blob_path("../../etc/passwd")
+    with pytest.raises(ValueError):
+        spool.put_bytes(b"x", "../doc")
+
+
+def test_s3_roundtrip_and_release(tmp_path):
+    s3 = StubS3()
+    writer_side = S3Spool(s3, "bucket", prefix="spool/", cache_dir=str(tmp_path / "api"))
+    digest = writer_side.put_stream([b"page ", b"unique"], "doc-1")
+    assert s3.objects[f"spool/{digest}"] == b"page unique"
+    assert f"spool/holds/{digest}/doc-1" in s3.objects
+
+    # Un worker sans copie locale télécharge et vérifie le blob
+    worker_side = S3Spool(s3, "bucket", prefix="spool/", cache_dir=str(tmp_path / "worker"))
+    with worker_side.open_blob(digest) as path:
+        assert open(path, "rb").read() == b"page unique"
+
+    assert worker_side.release(digest, "doc-1") is True
+    assert s3.objects == {}
+
+
+def test_s3_rejects_corrupted_blob(tmp_path):
+    s3 = StubS3()
+    digest = sha(b"attendu")
+    s3.objects[f"spool/{digest}"] = b"altere"
+    spool = S3Spool(s3, "bucket", prefix="spool/", cache_dir=str(tmp_path))
+    with pytest.raises(ValueError):
+        with spool.open_blob(digest):
+            pass
+    assert not os.path.exists(tmp_path / digest)
@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import threading
+
+import pandas as pd
+import pytest
+
+from src import engine, tasks
+from src.cache import set_ocr_cache
+from src.history import MemoryHistoryStore, get_entry, record_entry, set_history_store
+from src.progress import MemoryProgressChannel, publish_progress, read_progress, set_progress_channel
+from src.spool import LocalSpool, set_spool
+
+# Broker et résultats en mémoire : ni Redis ni worker externe
+tasks.app.conf.update(
+    broker_url="memory://",
+    result_backend="cache+memory://",
+    task_always_eager=True,
+    task_eager_propagates=True,
+    task_store_eager_result=True,
+    result_chord_retry_interval=0.05,
+)
+
+
+class PageEngine:
+    """Renvoie un mot par page ; échoue `failures` fois sur l'appel numéro `fail_on`."""
+
+    name = "fake"
+
+    def __init__(self, fail_on=None, failures=0):
+        self.calls = 0
+        self.fail_on = fail_on
+        self.failures = failures
+
+    def recognize(self, img, lang, psm):
+        self.calls += 1
+        if self.calls == self.fail_on and self.failures:
+            self.failures -= 1
+            self.fail_on += 1
+            raise RuntimeError("moteur indisponible")
+        return pd.DataFrame({
+            "x1": [0], "y1": [0], "x2": [5], "y2": [5],
+            "text": [f"F2024-{self.calls:05d}"], "conf": [90.0],
+        })
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def history(tmp_path):
+    store = MemoryHistoryStore()
+    set_history_store(store)
+    set_ocr_cache(None)
+    set_spool(LocalSpool(str(tmp_path / "spool")))
+    set_progress_channel(MemoryProgressChannel())
+    yield store
+    set_history_store(None)
+    set_spool(None)
+    set_progress_channel(None)
+    engine.set_engine(None)
+
+
+def spooled_blobs(tmp_path):
+    return [p for p in (tmp_path / "spool").glob("??/*")]
+
+
+def test_document_fans_out_one_task_per_page(history, tmp_path, make_pdf):
+    eng = PageEngine()
+    engine.set_engine(eng)
+    record_entry("doc.pdf", "doc-1")
+
+    doc_id = tasks.process_file("doc.pdf", make_pdf(3), task_id="doc-1")
+
+    assert doc_id == "doc-1"
+    assert eng.calls == 3
+    res = tasks.get_results(doc_id)
+    assert res["state"] == "SUCCESS"
+    result = res["result"]
+    assert result["page_count"] == 3
+    assert [p["page"] for p in result["pages"]] == [0, 1, 2]
+    assert result["entities"]["invoice_number"] == "F2024-00001"
+    entry = get_entry("doc-1")
+    assert entry["status"] == "done"
+    assert entry["result"]["page_count"] == 3
+    # Résultat persisté : le blob est libéré
+    assert spooled_blobs(tmp_path) == []
+
+    events = read_progress("doc-1")
+    kinds = [e["type"] for e in events]
+    assert kinds[0] == "queued" and kinds[-1] == "done"
+    assert sorted(e["page"] for e in events if e["type"] == "page") == [0, 1, 2]
+    assert [e["stage"] for e in events if e["type"] == "stage" and e["page"] == 0] == [
+        "render", "preprocess", "ocr"
+    ]
+    (prep,) = [e for e in events if e["type"] == "stage" and e["page"] == 0 and e["stage"] == "preprocess"]
+    assert prep["chain"][0] == "gray"
+    res = tasks.get_results(doc_id, after=len(events) - 1)
+    assert [e["type"] for e in res["events"]] == ["done"]
+    assert res["cursor"] == len(events)
+
+
+def test_upload_endpoint_spools_and_processes(history, tmp_path, make_pdf):
+    from fastapi.testclient import TestClient
+    from src.api import app as api
+
+    engine.set_engine(PageEngine())
+    resp = TestClient(api).post("/upload/", files=[("files", ("doc.pdf", make_pdf(2), "application/pdf"))])
+    [tid] = resp.json()["task_ids"]
+    assert get_entry(tid)["status"] == "done"
+    assert get_entry(tid)["result"]["page_count"] == 2
+    assert spooled_blobs(tmp_path) == []
+
+
+def test_pages_are_routed_across_backends(history, make_pdf):
+    from src.backends import BackendRouter, OCRBackend, set_router
+    from src.wordboxes import WordBoxes
+
+    class Down(OCRBackend):
+        name, expected_latency = "down", 0.01
+
+        def recognize_words(self, image, lang='eng', psm=6, conf_thr=30):
+            raise RuntimeError("moteur indisponible")
+
+    class Up(OCRBackend):
+        name, expected_latency = "up", 0.02
+
+        def recognize_words(self, image, lang='eng', psm=6, conf_thr=30):
+            return WordBoxes([0], [0], [5], [5], ["F2024-00042"], [90.0])
+
+    set_router(BackendRouter([Down(), Up()], hedge_percentile=0))
+    try:
+        record_entry("doc.pdf", "doc-5")
+        tasks.process_file("doc.pdf", make_pdf(2), task_id="doc-5")
+    finally:
+        set_router(None)
+    result = tasks.get_results("doc-5")["result"]
+    # Le moteur en échec bascule sur le suivant, page par page
+    assert [[w["text"] for w in p["words"]] for p in result["pages"]] == [["F2024-00042"]] * 2
+
+
+def test_failed_page_is_retried_alone(history, make_pdf):
+    from celery.contrib.testing.worker import start_worker
+
+    # Échec au 2e appel : seule cette page est relancée
+    eng = PageEngine(fail_on=2, failures=1)
+    engine.set_engine(eng)
+    record_entry("doc.pdf", "doc-2")
+    tasks.app.conf.task_always_eager = False
+    try:
+        with start_worker(tasks.app, pool="solo", perform_ping_check=False):
+            tasks.process_file("doc.pdf", make_pdf(3), task_id="doc-2")
+            result = tasks.app.AsyncResult("doc-2").get(timeout=30)
+    finally:
+        tasks.app.conf.task_always_eager = True
+
+    assert eng.calls == 4
+    assert [p["page"] for p in result["pages"]] == [0, 1, 2]
+    assert [e["page"] for e in read_progress("doc-2") if e["type"] == "retry"] == [1]
+    assert get_entry("doc-2")["status"] == "done"
+
+
+def test_page_tasks_carry_only_the_digest(history, tmp_path, monkeypatch, make_pdf):
+    sent = []
+    monkeypatch.setattr(tasks, "chord", lambda header: sent.append(header) or (lambda body: None))
+    pdf = make_pdf(2)
+
+    tasks.process_file("doc.pdf", pdf, task_id="doc-3")
+
+    (header,) = sent
+    digest = hashlib.sha256(pdf).hexdigest()
+    assert [t.args for t in header.tasks] == [
+        ("doc-3", "doc.pdf", digest, 0, tasks.DEFAULT_OCR_PARAMS),
+        ("doc-3", "doc.pdf", digest, 1, tasks.DEFAULT_OCR_PARAMS),
+    ]
+    # Le blob attend les workers
+    assert [p.name for p in spooled_blobs(tmp_path)] == [digest]
+
+
+def test_failed_dispatch_releases_blob(history, tmp_path):
+    with pytest.raises(Exception):
+        tasks.process_file("doc.pdf", b"pas un pdf", task_id="doc-4")
+    assert spooled_blobs(tmp_path) == []
+    assert [e["type"] for e in read_progress("doc-4")] == ["error"]
+
+
+def test_get_results_pending():
+    assert tasks.get_results("inconnu") == {"task_id": "inconnu", "state": "PENDING"}
+
+
+def test_long_poll_returns_on_next_event(history):
+    publish_progress("doc-lp", "queued", page_count=1)
+    first = tasks.get_results("doc-lp", after=0)
+    assert first["state"] == "PENDING"
+    assert first["cursor"] == 1
+
+    timer = threading.Timer(0.05, publish_progress, ("doc-lp", "page"), {"page": 0, "text": "ok"})
+    timer.start()
+    nxt = tasks.get_results("doc-lp", after=first["cursor"], wait=5)
+    timer.join()
+    assert [e["type"] for e in nxt["events"]] == ["page"]
+    assert nxt["cursor"] == 2
+
+    # Variante de l'API : même réponse, attente sur la boucle d'événements
+    timer = threading.Timer(0.05, publish_progress, ("doc-lp", "done"), {"page_count": 1})
+    timer.start()
+    last = asyncio.run(tasks.get_results_async("doc-lp", after=nxt["cursor"], wait=5))
+    timer.join()
+    assert [e["type"] for e in last["events"]] == ["done"] and last["cursor"] == 3
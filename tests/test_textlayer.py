@@ -0,0 +1,110 @@
+import io
+import os
+
+import fitz
+import pandas as pd
+import pytest
+from PIL import Image, ImageDraw
+
+from src import engine
+from src.cache import set_ocr_cache
+from src.pipeline import process_document
+from src.textlayer import TextLayerPage, iter_document_contents, load_text_layer, read_text_layer
+
+FACTURE = os.path.join(os.path.dirname(__file__), "fixtures", "Facture.pdf")
+
+
+class RecordingEngine:
+    name = "fake"
+
+    def __init__(self):
+        self.sizes = []
+
+    def recognize(self, img, lang, psm):
+        self.sizes.append(img.size)
+        return pd.DataFrame({
+            "x1": [2], "y1": [3], "x2": [40], "y2": [15], "text": ["Tampon"], "conf": [80.0],
+        })
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def recording_engine():
+    set_ocr_cache(None)
+    eng = RecordingEngine()
+    engine.set_engine(eng)
+    yield eng
+    engine.set_engine(None)
+
+
+def facture_bytes():
+    with open(FACTURE, "rb") as fh:
+        return fh.read()
+
+
+def mixed_pdf(rotation=0):
+    """Texte natif en haut, image d'un tampon (texte rastérisé) en bas."""
+    stamp = Image.new("RGB", (300, 120), "white")
+    ImageDraw.Draw(stamp).text((20, 50), "PAYE LE 12/03/2024", fill="black")
+    buf = io.BytesIO()
+    stamp.save(buf, format="PNG")
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_text((40, 60), "Facture F2024-00042 Green Hub Total 1234,56 EUR", fontsize=10)
+    page.insert_image(fitz.Rect(300, 600, 450, 660), stream=buf.getvalue())
+    page.set_rotation(rotation)
+    return doc.tobytes()
+
+
+def test_born_digital_page_is_read_without_ocr(recording_engine):
+    content = load_text_layer(FACTURE, "Facture.pdf", 0, dpi=144)
+    assert isinstance(content, TextLayerPage)
+    assert content.regions == []
+    assert content.size == (1190, 1684)
+    words = content.words
+    assert words["text"][0] == "Hostinger"
+    # Points PDF -> pixels à 144 dpi
+    assert words["x1"][0] == 29 and words["y1"][0] == 92
+    assert set(words["conf"].tolist()) == {100.0}
+    assert words["line"][3] == 1
+
+    results = list(process_document(facture_bytes(), "Facture.pdf", "fra", 6, 30, lambda im: im))
+    assert len(results) == 1 and results[0].count == len(words)
+    assert recording_engine.sizes == []
+
+
+def test_image_regions_are_ocred(recording_engine):
+    contents = list(iter_document_contents(mixed_pdf(), "mixed.pdf"))
+    assert len(contents) == 1
+    [(box, crop)] = contents[0].regions
+    assert box == (833, 1666, 1250, 1834)
+
+    [result] = process_document(mixed_pdf(), "mixed.pdf", "fra", 6, 30, lambda im: im)
+    assert len(recording_engine.sizes) == 1
+    stamp = result.words[result.words["text"] == "Tampon"]
+    assert len(stamp) == 1
+    # Boîte du mot OCRisé ramenée dans le repère de la page
+    assert 833 < stamp["x1"][0] < 1250 and 1666 < stamp["y1"][0] < 1834
+    assert stamp["block"][0] > result.words["block"][:-1].max()
+
+
+def test_rotated_page_regions_follow_the_words():
+    [content] = iter_document_contents(mixed_pdf(rotation=90), "rotated.pdf")
+    assert content.size == (2339, 1653)
+    [(box, crop)] = content.regions
+    # Tampon tourné avec la page : boîte et rendu dans le repère affiché
+    assert box == (505, 833, 673, 1250)
+    assert crop.size == (box[2] - box[0], box[3] - box[1])
+    assert all(content.words["x2"] <= content.size[0]) and all(content.words["y2"] <= content.size[1])
+
+
+def test_pages_without_text_layer_are_rasterized():
+    doc = fitz.open()
+    doc.new_page(width=200, height=100).insert_text((20, 50), "Page 1")
+    page = fitz.open(stream=doc.tobytes(), filetype="pdf")[0]
+    assert read_text_layer(page) is None
+    [content] = iter_document_contents(doc.tobytes(), "scan.pdf", dpi=72)
+    assert isinstance(content, Image.Image)
+    assert load_text_layer(b"", "scan.png", 0) is None
@@ -0,0 +1,126 @@
+import threading
+import time
+
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from src.textract_batch import AdaptiveRateLimiter, TextractBatchExecutor
+
+
+def throttle(code="ThrottlingException"):
+    return ClientError({"Error": {"Code": code, "Message": "Rate exceeded"}}, "AnalyzeDocument")
+
+
+class StubTextract:
+    """Client Textract local : latence injectée et limitations des N premiers appels."""
+
+    def __init__(self, latency=0.01, throttle_first=0, fail_names=(), errors=()):
+        self.latency = latency
+        self.throttle_first = throttle_first
+        self.errors = list(errors)
+        self.fail_names = set(fail_names)
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def analyze_document(self, Document, FeatureTypes):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.latency)
+            if n <= len(self.errors):
+                raise self.errors[n - 1]
+            if n <= self.throttle_first:
+                raise throttle("ProvisionedThroughputExceededException" if n % 2 else "ThrottlingException")
+            if Document["Bytes"] in self.fail_names:
+                raise ValueError("document illisible")
+            key = Document["Bytes"].decode()
+            return {"Blocks": [
+                {"Id": "k", "BlockType": "KEY_VALUE_SET", "EntityTypes": ["KEY"],
+                 "Relationships": [{"Type": "CHILD", "Ids": ["w"]}, {"Type": "VALUE", "Ids": ["v"]}]},
+                {"Id": "w", "BlockType": "WORD", "Text": "Fichier", "Confidence": 99.0},
+                {"Id": "v", "BlockType": "KEY_VALUE_SET", "EntityTypes": ["VALUE"],
+                 "Relationships": [{"Type": "CHILD", "Ids": ["x"]}]},
+                {"Id": "x", "BlockType": "WORD", "Text": key, "Confidence": 95.0},
+            ]}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def make_executor(client, **kwargs):
+    limiter = AdaptiveRateLimiter(rate=1000, min_rate=1, increase=1)
+    return TextractBatchExecutor(client=client, limiter=limiter, base_delay=0.001, **kwargs)
+
+
+def test_bounded_concurrency_and_completion_order():
+    client = StubTextract(latency=0.02)
+    batch = make_executor(client, max_concurrency=3)
+    items = [(f"f{i}", f"doc{i}".encode()) for i in range(12)]
+    results = batch.run(items)
+    assert sorted(k for k, _, _ in results) == sorted(k for k, _ in items)
+    assert all(err is None for _, _, err in results)
+    assert {kv[0]["value"] for _, kv, _ in results} == {f"doc{i}" for i in range(12)}
+    assert client.peak <= 3
+
+
+def test_throttling_is_retried_and_slows_down():
+    client = StubTextract(throttle_first=3)
+    batch = make_executor(client, max_concurrency=1)
+    results = batch.run([("a", b"a"), ("b", b"b")])
+    assert all(err is None for _, _, err in results)
+    assert client.calls == 5
+    assert batch.limiter.rate < 1000
+
+
+def test_non_throttling_errors_are_reported_per_item():
+    client = StubTextract(fail_names={b"bad"})
+    batch = make_executor(client, max_concurrency=2)
+    results = {k: (kv, err) for k, kv, err in batch.run([("ok", b"ok"), ("bad", b"bad")])}
+    assert results["ok"][1] is None
+    assert isinstance(results["bad"][1], ValueError)
+    assert client.calls == 2
+
+
+def test_transient_errors_are_retried_without_slowing_down():
+    server_error = ClientError(
+        {"Error": {"Code": "InternalServerError", "Message": "boom"},
+         "ResponseMetadata": {"HTTPStatusCode": 500}}, "AnalyzeDocument")
+    unavailable = ClientError(
+        {"Error": {"Code": "Unknown"}, "ResponseMetadata": {"HTTPStatusCode": 503}}, "AnalyzeDocument")
+    reset = EndpointConnectionError(endpoint_url="https://textract")
+    client = StubTextract(errors=[server_error, unavailable, reset])
+    batch = make_executor(client, max_concurrency=1)
+    [(_, kv, err)] = batch.run([("a", b"a")])
+    assert err is None and kv[0]["value"] == "a"
+    assert client.calls == 4
+    assert batch.limiter.rate == 1000
+
+
+def test_retries_exhausted_raise_throttle():
+    client = StubTextract(throttle_first=100)
+    batch = make_executor(client, max_concurrency=1, max_retries=2)
+    [(_, _, err)] = batch.run([("a", b"a")])
+    assert isinstance(err, ClientError)
+    assert client.calls == 3
+
+
+def test_rate_limiter_aimd():
+    now = [0.0]
+    slept = []
+
+    def sleep(d):
+        slept.append(d)
+        now[0] += d
+
+    limiter = AdaptiveRateLimiter(rate=10, min_rate=1, max_rate=20, clock=lambda: now[0], sleep=sleep)
+    limiter.acquire()
+    limiter.acquire()
+    assert slept == [0.1]
+    limiter.on_throttle()
+    assert limiter.rate == 5
+    limiter.on_success()
+    assert limiter.rate == 5.1
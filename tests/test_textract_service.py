@@ -1,5 +1,5 @@
 import pytest
-from src.textract_service import parse_textract_kv
+from src.textract_service import parse_textract, parse_textract_kv
 
 def fake_blocks_response():
     # Simulate minimal Textract response with one key-value
@@ -23,3 +23,49 @@ def test_parse_textract_kv():
     assert kvs and kvs[0]['key'] == 'Invoice'
     assert kvs[0]['value'] == '12345'
     assert 'conf' in kvs[0]
+
+
+def test_parse_textract_tables_and_lines():
+    resp = fake_blocks_response()
+    resp['Blocks'] += [
+        {'Id': '5', 'BlockType': 'TABLE', 'Page': 2, 'Relationships': [{'Type': 'CHILD', 'Ids': ['6', '7']}]},
+        {'Id': '6', 'BlockType': 'CELL', 'RowIndex': 1, 'ColumnIndex': 1, 'Confidence': 90.0,
+         'Relationships': [{'Type': 'CHILD', 'Ids': ['8']}]},
+        {'Id': '7', 'BlockType': 'CELL', 'RowIndex': 1, 'ColumnIndex': 2, 'Confidence': 80.0},
+        {'Id': '8', 'BlockType': 'WORD', 'Text': 'Total'},
+        {'Id': '9', 'BlockType': 'LINE', 'Text': 'Invoice 12345', 'Confidence': 99.0,
+         'Geometry': {'BoundingBox': {'Left': 0.1, 'Top': 0.2, 'Width': 0.3, 'Height': 0.04}}},
+    ]
+    result = parse_textract(resp)
+    assert result.tables['text'] == ['Total', '']
+    assert result.tables['col'] == [1, 2]
+    assert result.tables['page'] == [2, 2]
+    assert result.lines['text'] == ['Invoice 12345']
+    assert result.lines['left'] == [0.1]
+    frames = result.to_frames()
+    assert list(frames['kv']['key']) == ['Invoice']
+    assert len(frames['tables']) == 2
+
+
+def test_parse_textract_shared_value():
+    blocks = [
+        {'Id': 'k1', 'BlockType': 'KEY_VALUE_SET', 'EntityTypes': ['KEY'],
+         'Relationships': [{'Type': 'CHILD', 'Ids': ['w1']}, {'Type': 'VALUE', 'Ids': ['v']}]},
+        {'Id': 'k2', 'BlockType': 'KEY_VALUE_SET', 'EntityTypes': ['KEY'],
+         'Relationships': [{'Type': 'CHILD', 'Ids': ['w2']}, {'Type': 'VALUE', 'Ids': ['v']}]},
+        {'Id': 'v', 'BlockType': 'KEY_VALUE_SET', 'EntityTypes': ['VALUE'],
+         'Relationships': [{'Type': 'CHILD', 'Ids': ['w3', 'w4']}]},
+        {'Id': 'w1', 'BlockType': 'WORD', 'Text': 'Date', 'Confidence': 90.0},
+        {'Id': 'w2', 'BlockType': 'WORD', 'Text': 'Echeance', 'Confidence': 90.0},
+        {'Id': 'w3', 'BlockType': 'WORD', 'Text': '01/02/2024', 'Confidence': 80.0},
+        {'Id': 'w4', 'BlockType': 'WORD', 'Text': 'inclus', 'Confidence': 60.0},
+    ]
+    kvs = parse_textract_kv({'Blocks': blocks})
+    assert [kv['value'] for kv in kvs] == ['01/02/2024 inclus'] * 2
+    assert kvs[0]['conf'] == 70.0
+
+
+def test_parse_textract_matches_legacy_parser():
+    bench = pytest.importorskip('tests.benchmarks.bench_textract_parser')
+    resp = bench.synthetic_response(300, n_tables=2, pages=3, seed=1)
+    assert parse_textract_kv(resp) == bench.legacy_parse_textract_kv(resp)
@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from PIL import Image
+from prometheus_client import REGISTRY
+
+from src import tasks
+from src.cache import set_ocr_cache
+from src.executor import get_executor
+from src.ocr import find_best_zoom
+from src.tracing import (
+    OTLPJsonExporter, current_span, get_request_id, get_span_exporter, request_context,
+    set_span_exporter, span,
+)
+from src.wordboxes import WordBoxes
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture
+def collector():
+    """Collecteur OTLP/HTTP local : garde les corps JSON reçus."""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.append((self.path, json.loads(body)))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    exporter = OTLPJsonExporter(f"http://127.0.0.1:{server.server_port}", interval=60)
+    set_span_exporter(exporter)
+    yield exporter, received
+    set_span_exporter(None)
+    server.shutdown()
+
+
+def test_spans_nest_and_follow_executor_tasks():
+    before = sample("ocr_greenhub_stage_seconds_count", stage="inner")
+
+    def task():
+        with span("inner") as inner:
+            return get_request_id(), inner.parent_id
+
+    with request_context("req-1") as request_id:
+        with span("outer") as outer:
+            assert current_span() is outer
+            seen_id, parent_id = get_executor().submit(task).result()
+    assert request_id == seen_id == "req-1"
+    assert parent_id == outer.span_id and outer.parent_id is None
+    assert get_request_id() is None and current_span() is None
+    assert sample("ocr_greenhub_stage_seconds_count", stage="inner") == before + 1
+
+
+def test_zoom_search_spans_are_exported(collector):
+    exporter, received = collector
+    set_ocr_cache(None)
+
+    def ocr_fn(img, lang, psm, conf_thr):
+        return WordBoxes.coerce(pd.DataFrame({
+            "x1": [0], "y1": [0], "x2": [10], "y2": [10], "text": ["mot"], "conf": [90.0],
+        }))
+
+    tries = sample("ocr_greenhub_zoom_seconds_count", zoom="2")
+    with request_context():
+        find_best_zoom(Image.new("RGB", (60, 40), "white"), "fra", 6, 30, lambda im: im, ocr_fn,
+                       zoom_steps=[1.0, 2.0], strategy="sweep")
+    exporter.flush()
+
+    assert received and received[0][0] == "/v1/traces"
+    spans = [sp for _, body in received
+             for rs in body["resourceSpans"] for ss in rs["scopeSpans"] for sp in ss["spans"]]
+    names = {sp["name"] for sp in spans}
+    assert {"zoom_search", "zoom_sweep", "zoom_try", "resize", "preprocess", "ocr"} <= names
+    assert len({sp["traceId"] for sp in spans}) == 1
+    by_id = {sp["spanId"]: sp for sp in spans}
+    [root] = [sp for sp in spans if "parentSpanId" not in sp]
+    assert root["name"] == "zoom_search"
+    # Essais de zoom exécutés sur l'exécuteur, rattachés au balayage
+    for sp in spans:
+        if sp["name"] == "zoom_try":
+            assert by_id[sp["parentSpanId"]]["name"] in ("zoom_sweep", "zoom_refine")
+    assert sample("ocr_greenhub_zoom_seconds_count", zoom="2") == tries + 1
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork indisponible")
+def test_forked_child_rebuilds_its_exporter(collector):
+    exporter, _ = collector
+    assert get_span_exporter() is exporter
+    pid = os.fork()
+    if pid == 0:
+        # L'exporteur hérité n'a plus de thread d'export dans l'enfant
+        os._exit(0 if get_span_exporter() is not exporter else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert get_span_exporter() is exporter
+
+
+def test_request_id_travels_in_celery_headers():
+    headers = {}
+    with request_context("doc-42"):
+        tasks._publish_request_id(headers=headers)
+    assert headers == {"request_id": "doc-42"}
+
+    task = SimpleNamespace(request=SimpleNamespace(request_id="doc-42"))
+    tasks._bind_task_request_id(task_id="t1", task=task)
+    assert get_request_id() == "doc-42"
+    tasks._reset_task_request_id(task_id="t1")
+    assert get_request_id() is None
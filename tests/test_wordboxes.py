@@ -0,0 +1,79 @@
+import json
+
+import numpy as np
+import pytest
+
+from src.wordboxes import OCR_COLUMNS, WordBoxes
+
+
+@pytest.fixture
+def words():
+    return WordBoxes(
+        x1=[0, 10, 0], y1=[0, 0, 12], x2=[8, 20, 9], y2=[5, 5, 17],
+        text=["Facture", "123", "Facture"], conf=[95.0, 20.0, 80.5],
+        block=[0, 0, 1], line=[0, 0, 1],
+    )
+
+
+def test_columns_and_interned_text(words):
+    assert len(words) == 3
+    assert words.columns == OCR_COLUMNS
+    assert words["x1"].dtype == np.int32 and words["conf"].dtype == np.float32
+    # Mots identiques : un seul objet str
+    assert words["text"][0] is words["text"][2]
+    with pytest.raises(KeyError):
+        words["inconnu"]
+
+
+def test_slice_is_a_view_and_filter_keeps_ids(words):
+    head = words[:2]
+    assert np.shares_memory(head["x1"], words["x1"])
+    assert head["text"].tolist() == ["Facture", "123"]
+
+    kept = words.filter_conf(50)
+    assert kept["text"].tolist() == ["Facture", "Facture"]
+    assert kept["line"].tolist() == [0, 1]
+    assert words.filter_conf(0) is words
+
+
+def test_concat_with_page_numbers(words):
+    both = WordBoxes.concat([words.with_page(2), WordBoxes.blank(), words[:1].with_page(1)])
+    assert len(both) == 4
+    assert both["page"].tolist() == [2, 2, 2, 1]
+    assert np.shares_memory(words.with_page(2)["conf"], words["conf"])
+    assert WordBoxes.concat([]).empty
+
+
+def test_frame_and_records_conversion(words):
+    df = words.to_frame()
+    assert list(df.columns) == OCR_COLUMNS
+    assert df["text"].tolist() == ["Facture", "123", "Facture"]
+    assert list(words.to_frame(OCR_COLUMNS + ["line"]).columns)[-1] == "line"
+
+    records = words.to_dict("records")
+    assert records[0] == {"x1": 0, "y1": 0, "x2": 8, "y2": 5, "text": "Facture", "conf": 95.0}
+    # Types natifs : sérialisable en JSON (résultats Celery, historique)
+    json.dumps(records)
+
+    again = WordBoxes.coerce(df)
+    assert again["text"].tolist() == words["text"].tolist()
+    assert WordBoxes.from_records(records)["conf"].tolist() == words["conf"].tolist()
+    with pytest.raises(TypeError):
+        WordBoxes.coerce([1, 2])
+
+
+def test_bytes_roundtrip(words):
+    data = words.to_bytes()
+    back = WordBoxes.from_bytes(data)
+    for col in WordBoxes.__slots__:
+        assert back[col].tolist() == words[col].tolist()
+    assert WordBoxes.from_bytes(WordBoxes.blank().to_bytes()).empty
+    # Plus compact que le JSON par colonnes de l'ancien cache (page réaliste)
+    page = WordBoxes.concat([words] * 100)
+    assert len(page.to_bytes()) < len(json.dumps(page.to_frame().to_dict("list")))
+
+
+def test_bytes_roundtrip_outside_uint16():
+    words = WordBoxes([-3], [0], [70000], [5], ["x"], [50.0])
+    back = WordBoxes.from_bytes(words.to_bytes())
+    assert back["x1"].tolist() == [-3] and back["x2"].tolist() == [70000]
@@ -0,0 +1,82 @@
+from concurrent.futures import Future
+
+import pandas as pd
+from PIL import Image
+
+import src.ocr
+from src.cache import set_ocr_cache
+from src.ocr import estimate_text_height, find_best_zoom
+
+# Caractères de 10 px, une ligne toutes les trois hauteurs
+SMALL_PAGE = {"char_height": 10, "size": (400, 300), "line_spacing": 3}
+
+
+class RecordingOCR:
+    def __init__(self):
+        self.sizes = []
+
+    def __call__(self, img, lang, psm, conf_thr):
+        self.sizes.append(img.size)
+        return pd.DataFrame({
+            "x1": [0], "y1": [0], "x2": [1], "y2": [1], "text": ["a"], "conf": [80.0],
+        })
+
+
+def test_estimate_text_height(make_page):
+    height, ink = estimate_text_height(make_page(**SMALL_PAGE))
+    assert height == 10
+    assert ink.any()
+
+
+def test_predict_ocrs_full_page_once(make_page):
+    set_ocr_cache(None)
+    page = make_page(**SMALL_PAGE)
+    ocr = RecordingOCR()
+    z, cnt, mc, df, proc, summary = find_best_zoom(
+        page, "fra", 6, 30, lambda im: im, ocr, strategy="predict"
+    )
+    full_pages = [s for s in ocr.sizes if s[1] == int(page.size[1] * z)]
+    assert len(full_pages) == 1
+    assert ocr.sizes[-1] == (int(page.size[0] * z), int(page.size[1] * z))
+    # 24 px visés pour des caractères de 10 px
+    assert z in (2.0, 2.5, 3.0)
+    assert set(summary.columns) >= {"zoom", "count", "mean_conf", "score", "stage"}
+    assert summary["stage"].iloc[-1] == "page"
+    assert proc.size == ocr.sizes[-1]
+
+
+def test_predict_ignores_failed_candidates(monkeypatch, make_page):
+    class BrokenExecutor:
+        def submit(self, fn, *args):
+            future = Future()
+            future.set_exception(RuntimeError("tâche non transmise au pool"))
+            return future
+
+    set_ocr_cache(None)
+    monkeypatch.setattr(src.ocr, "get_executor", BrokenExecutor)
+    ocr = RecordingOCR()
+    z, cnt, *_, summary = find_best_zoom(make_page(**SMALL_PAGE), "fra", 6, 30, lambda im: im, ocr,
+                                         strategy="predict")
+    # Aucun candidat lisible : zoom prédit, une seule passe pleine page
+    assert cnt == 1 and len(ocr.sizes) == 1
+    assert summary["stage"].tolist() == ["page"]
+
+
+def test_blank_page_single_pass():
+    set_ocr_cache(None)
+    ocr = RecordingOCR()
+    z, *_, summary = find_best_zoom(
+        Image.new("RGB", (200, 100), "white"), "fra", 6, 30, lambda im: im, ocr
+    )
+    assert z == 1.0
+    assert len(ocr.sizes) == 1
+    assert summary["stage"].tolist() == ["blank"]
+
+
+def test_sweep_strategy_still_available(make_page):
+    set_ocr_cache(None)
+    ocr = RecordingOCR()
+    z, *_, summary = find_best_zoom(
+        make_page(**SMALL_PAGE), "fra", 6, 30, lambda im: im, ocr, zoom_steps=[1.0, 2.0], strategy="sweep"
+    )
+    assert sorted(summary["zoom"]) == [1.0, 1.5, 2.0]